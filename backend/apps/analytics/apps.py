@@ -5,3 +5,10 @@ class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.analytics'
     verbose_name = 'Analytics'
+
+    def ready(self):
+        """
+        Import signals when app is ready.
+        This keeps the materialized client metrics in sync.
+        """
+        import apps.analytics.signals  # noqa: F401
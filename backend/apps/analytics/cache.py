@@ -0,0 +1,159 @@
+"""
+Caché de resultados de analytics por tenant
+Cada resultado se guarda bajo (centro, sucursal, endpoint, parámetros
+normalizados, versión). Las versiones son contadores por sucursal: una escritura
+en los datos de una sucursal incrementa su contador (y el de la vista "todas las
+sucursales") y las entradas viejas quedan huérfanas hasta que expiran.
+Invalidar es O(1) y no toca los datos de otros centros.
+
+Las señales que incrementan las versiones están en analytics/signals.py.
+"""
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'analytics'
+
+# Scope de las consultas sin sucursal: agregan todas, así que cualquier
+# escritura las invalida
+ALL_BRANCHES = 'all'
+
+STATS_FIELDS = ['hits', 'misses', 'compute_ms']
+
+
+def _version_key(scope):
+    return f'{KEY_PREFIX}:version:{scope}'
+
+
+def _stats_key(endpoint, field):
+    return f'{KEY_PREFIX}:stats:{endpoint}:{field}'
+
+
+def _incr(key, delta=1):
+    """incr que crea la clave si no existe (las versiones y stats no expiran)"""
+    cache.add(key, 0, timeout=None)
+    return cache.incr(key, delta)
+
+
+def get_version(scope):
+    return cache.get(_version_key(scope)) or 0
+
+
+def bump_branch_version(sucursal_id):
+    """
+    Invalida los resultados cacheados de una sucursal (y los globales).
+    Un problema de caché nunca debe romper la escritura que lo dispara.
+    """
+    if not sucursal_id:
+        return
+    try:
+        _incr(_version_key(sucursal_id))
+        _incr(_version_key(ALL_BRANCHES))
+    except Exception:
+        logger.warning('No se pudo invalidar el caché de analytics de la sucursal %s',
+                       sucursal_id, exc_info=True)
+
+
+def normalize_params(query_params):
+    """
+    Parámetros ordenados y sin vacíos, para que ?a=1&b=2 y ?b=2&a=1 compartan entrada
+    """
+    return '&'.join(
+        f'{key}={value}'
+        for key in sorted(query_params)
+        for value in sorted(query_params.getlist(key))
+        if value != ''
+    )
+
+
+def build_key(centro_id, sucursal_id, endpoint, params, version):
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return f'{KEY_PREFIX}:result:{centro_id}:{sucursal_id or ALL_BRANCHES}:{endpoint}:{version}:{digest}'
+
+
+def _record(endpoint, field, delta=1):
+    try:
+        _incr(_stats_key(endpoint, field), delta)
+    except Exception:
+        pass
+
+
+def get_stats(endpoints):
+    """
+    Hits, misses y tiempo de cálculo por endpoint:
+    {endpoint: {'hits', 'misses', 'hit_rate', 'avg_compute_ms'}}
+    """
+    keys = [_stats_key(e, f) for e in endpoints for f in STATS_FIELDS]
+    values = cache.get_many(keys)
+
+    stats = {}
+    for endpoint in endpoints:
+        hits = values.get(_stats_key(endpoint, 'hits'), 0)
+        misses = values.get(_stats_key(endpoint, 'misses'), 0)
+        compute_ms = values.get(_stats_key(endpoint, 'compute_ms'), 0)
+        stats[endpoint] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses) * 100, 1) if hits + misses else 0,
+            'avg_compute_ms': round(compute_ms / misses, 1) if misses else 0,
+        }
+    return stats
+
+
+# Endpoints registrados con el decorador, para exponer sus estadísticas
+CACHED_ENDPOINTS = []
+
+
+def cached_analytics(timeout, endpoint=None):
+    """
+    Decorador para el ``get`` de las APIViews de analytics.
+
+    Reemplaza a ``cache_page``: la clave incluye el centro del usuario y la
+    versión de la sucursal pedida, y solo se cachean respuestas 200.
+    """
+    def decorator(view_method):
+        name = endpoint or view_method.__qualname__.split('.')[0]
+        CACHED_ENDPOINTS.append(name)
+
+        @wraps(view_method)
+        def wrapper(view, request, *args, **kwargs):
+            sucursal_id = request.query_params.get('sucursal_id') or None
+            params = normalize_params(request.query_params)
+            if kwargs:
+                params += '|' + '&'.join(f'{k}={v}' for k, v in sorted(kwargs.items()))
+
+            try:
+                version = get_version(sucursal_id or ALL_BRANCHES)
+                key = build_key(
+                    getattr(request.user, 'centro_estetica_id', None),
+                    sucursal_id, name, params, version
+                )
+                data = cache.get(key)
+            except Exception:
+                logger.warning('Caché de analytics no disponible', exc_info=True)
+                return view_method(view, request, *args, **kwargs)
+
+            if data is not None:
+                _record(name, 'hits')
+                return Response(data)
+
+            started = time.monotonic()
+            response = view_method(view, request, *args, **kwargs)
+            _record(name, 'misses')
+            _record(name, 'compute_ms', int((time.monotonic() - started) * 1000))
+
+            if response.status_code == 200:
+                try:
+                    cache.set(key, response.data, timeout)
+                except Exception:
+                    logger.warning('No se pudo guardar en el caché de analytics', exc_info=True)
+            return response
+
+        return wrapper
+    return decorator
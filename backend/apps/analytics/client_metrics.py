@@ -0,0 +1,233 @@
+"""
+Mantenimiento de ClienteMetricas
+Las métricas de un cliente se refrescan por partes (LTV o visitas) cada vez que
+se guarda una transacción o un turno suyo, y la tabla completa se puede
+reconstruir con consultas agrupadas (comando ``recalcular_metricas_clientes``).
+"""
+
+from django.apps import apps as django_apps
+from django.db.models import Sum
+from django.utils import timezone
+
+from .segmentation import LTV_TRANSACTION_TYPES
+
+
+METRIC_FIELDS = [
+    'ltv', 'visitas_completadas', 'primera_visita', 'ultima_visita',
+    'frecuencia_promedio_dias', 'actualizado_en',
+]
+
+
+def _model(registry, app_label, model_name):
+    return (registry or django_apps).get_model(app_label, model_name)
+
+
+def visit_metrics(visitas):
+    """
+    Métricas de visitas a partir de las fechas de los turnos completados,
+    ordenadas de la más vieja a la más nueva.
+
+    La frecuencia promedia los días entre visitas consecutivas, ignorando las
+    del mismo día (mismo criterio que usaba get_client_frequency).
+    """
+    if not visitas:
+        return {
+            'visitas_completadas': 0,
+            'primera_visita': None,
+            'ultima_visita': None,
+            'frecuencia_promedio_dias': None,
+        }
+
+    intervals = []
+    for i in range(1, len(visitas)):
+        delta = (visitas[i] - visitas[i - 1]).days
+        if delta > 0:
+            intervals.append(delta)
+
+    average_interval = sum(intervals) / len(intervals) if intervals else None
+
+    return {
+        'visitas_completadas': len(visitas),
+        'primera_visita': visitas[0],
+        'ultima_visita': visitas[-1],
+        'frecuencia_promedio_dias': round(average_interval, 1) if average_interval else None,
+    }
+
+
+def _client_exists(cliente_id):
+    Cliente = _model(None, 'clientes', 'Cliente')
+    return Cliente.objects.filter(pk=cliente_id).exists()
+
+
+def _ltv(cliente_id):
+    Transaction = _model(None, 'finanzas', 'Transaction')
+    return Transaction.objects.filter(
+        client_id=cliente_id,
+        type__in=LTV_TRANSACTION_TYPES
+    ).aggregate(total=Sum('amount'))['total'] or 0
+
+
+def _visits(cliente_id):
+    Turno = _model(None, 'turnos', 'Turno')
+    return visit_metrics(list(Turno.objects.filter(
+        cliente_id=cliente_id,
+        estado='COMPLETADO'
+    ).order_by('fecha_hora_inicio').values_list('fecha_hora_inicio', flat=True)))
+
+
+def refresh_ltv(cliente_id):
+    """
+    Recalcula el LTV de un cliente (una agregación + el upsert)
+    """
+    ClienteMetricas = _model(None, 'analytics', 'ClienteMetricas')
+    metricas, _ = ClienteMetricas.objects.update_or_create(
+        cliente_id=cliente_id, defaults={'ltv': _ltv(cliente_id)}
+    )
+    return metricas
+
+
+def refresh_visits(cliente_id):
+    """
+    Recalcula las métricas de visitas de un cliente a partir de sus turnos completados
+    """
+    ClienteMetricas = _model(None, 'analytics', 'ClienteMetricas')
+    metricas, _ = ClienteMetricas.objects.update_or_create(
+        cliente_id=cliente_id, defaults=_visits(cliente_id)
+    )
+    return metricas
+
+
+def refresh_visits_many(cliente_ids):
+    """
+    refresh_visits para varios clientes: una lectura de sus turnos completados
+    y un upsert por lote que solo toca los campos de visitas
+    """
+    Turno = _model(None, 'turnos', 'Turno')
+    ClienteMetricas = _model(None, 'analytics', 'ClienteMetricas')
+
+    cliente_ids = set(cliente_ids)
+    if not cliente_ids:
+        return
+
+    visitas = {cliente_id: [] for cliente_id in cliente_ids}
+    for cliente_id, fecha in Turno.objects.filter(
+        cliente_id__in=cliente_ids,
+        estado='COMPLETADO'
+    ).order_by('cliente_id', 'fecha_hora_inicio').values_list('cliente_id', 'fecha_hora_inicio'):
+        visitas[cliente_id].append(fecha)
+
+    now = timezone.now()
+    ClienteMetricas.objects.bulk_create(
+        [
+            ClienteMetricas(cliente_id=cliente_id, actualizado_en=now, **visit_metrics(fechas))
+            for cliente_id, fechas in visitas.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['cliente'],
+        update_fields=[field for field in METRIC_FIELDS if field != 'ltv'],
+    )
+
+
+def refresh_client_metrics(cliente_id):
+    refresh_ltv(cliente_id)
+    return refresh_visits(cliente_id)
+
+
+def refresh_if_client_exists(cliente_id):
+    """
+    Para los borrados: se corre después del commit y el cliente puede haber
+    sido borrado en la misma transacción (el borrado en cascada de sus turnos
+    es lo que dispara el refresco).
+    """
+    if _client_exists(cliente_id):
+        refresh_client_metrics(cliente_id)
+
+
+def get_client_metrics(cliente_id):
+    """
+    Métricas de un cliente. Si todavía no tiene fila (cliente sin actividad o
+    tabla sin reconstruir) se calculan en el momento sin guardarlas: leer no
+    escribe. La fila la crean las señales o ``recalcular_metricas_clientes``.
+    """
+    ClienteMetricas = _model(None, 'analytics', 'ClienteMetricas')
+    try:
+        return ClienteMetricas.objects.get(cliente_id=cliente_id)
+    except ClienteMetricas.DoesNotExist:
+        return ClienteMetricas(cliente_id=cliente_id, ltv=_ltv(cliente_id), **_visits(cliente_id))
+
+
+def rebuild_client_metrics(centro_id=None, batch_size=1000, registry=None):
+    """
+    Reconstruye ClienteMetricas para todos los clientes (o los de un centro).
+
+    Una agregación para el LTV, una lectura ordenada de los turnos completados
+    (por streaming, sin cargarlos todos en memoria) y upserts por lotes.
+    ``registry`` permite usarla desde una migración con los modelos históricos.
+
+    Devuelve la cantidad de clientes procesados.
+    """
+    Cliente = _model(registry, 'clientes', 'Cliente')
+    Turno = _model(registry, 'turnos', 'Turno')
+    Transaction = _model(registry, 'finanzas', 'Transaction')
+    ClienteMetricas = _model(registry, 'analytics', 'ClienteMetricas')
+
+    clientes_qs = Cliente.objects.all()
+    transactions_qs = Transaction.objects.filter(
+        type__in=LTV_TRANSACTION_TYPES,
+        client__isnull=False
+    )
+    turnos_qs = Turno.objects.filter(estado='COMPLETADO')
+    if centro_id:
+        clientes_qs = clientes_qs.filter(centro_estetica_id=centro_id)
+        transactions_qs = transactions_qs.filter(client__centro_estetica_id=centro_id)
+        turnos_qs = turnos_qs.filter(cliente__centro_estetica_id=centro_id)
+
+    ltv_by_client = dict(
+        transactions_qs.order_by().values('client_id').annotate(
+            total=Sum('amount')
+        ).values_list('client_id', 'total')
+    )
+
+    visits_by_client = {}
+    current_id, visitas = None, []
+    for cliente_id, fecha in turnos_qs.order_by(
+        'cliente_id', 'fecha_hora_inicio'
+    ).values_list('cliente_id', 'fecha_hora_inicio').iterator(chunk_size=5000):
+        if cliente_id != current_id:
+            if current_id is not None:
+                visits_by_client[current_id] = visit_metrics(visitas)
+            current_id, visitas = cliente_id, []
+        visitas.append(fecha)
+    if current_id is not None:
+        visits_by_client[current_id] = visit_metrics(visitas)
+
+    now = timezone.now()
+    empty_visits = visit_metrics([])
+    processed = 0
+    batch = []
+
+    for cliente_id in clientes_qs.order_by().values_list('id', flat=True).iterator(chunk_size=5000):
+        batch.append(ClienteMetricas(
+            cliente_id=cliente_id,
+            ltv=ltv_by_client.get(cliente_id) or 0,
+            actualizado_en=now,
+            **visits_by_client.get(cliente_id, empty_visits)
+        ))
+        if len(batch) >= batch_size:
+            processed += _upsert(ClienteMetricas, batch)
+            batch = []
+
+    if batch:
+        processed += _upsert(ClienteMetricas, batch)
+
+    return processed
+
+
+def _upsert(ClienteMetricas, batch):
+    ClienteMetricas.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['cliente'],
+        update_fields=METRIC_FIELDS,
+    )
+    return len(batch)
@@ -11,10 +11,12 @@ from django.db.models import Sum, Count, Max, Q, F
 from datetime import date, datetime, timedelta
 
 from apps.turnos.models import Turno
-from apps.finanzas.models import Transaction
 from apps.clientes.models import Cliente
 from apps.inventario.models import Producto
 
+from . import rollups
+from .models import ResumenDiario
+
 
 def _proximo_cumpleanos(fecha_nac, hoy):
     """
@@ -75,12 +77,30 @@ class DashboardHomeView(APIView):
                 fecha_hora_inicio__date=today
             )
 
-        # Contar por estado
-        citas_pendientes = turnos_hoy.filter(estado='PENDIENTE').count()
-        citas_confirmadas = turnos_hoy.filter(estado='CONFIRMADO').count()
-        citas_completadas = turnos_hoy.filter(estado='COMPLETADO').count()
-        citas_canceladas = turnos_hoy.filter(estado='CANCELADO').count()
-        citas_no_show = turnos_hoy.filter(estado='NO_SHOW').count()
+        # Contar por estado: la sucursal completa sale del resumen del día; las
+        # citas propias de un empleado, de una sola consulta agregada
+        if user_role == 'EMPLEADO':
+            por_estado = turnos_hoy.order_by().aggregate(
+                pendientes=Count('id', filter=Q(estado='PENDIENTE')),
+                confirmadas=Count('id', filter=Q(estado='CONFIRMADO')),
+                completadas=Count('id', filter=Q(estado='COMPLETADO')),
+                canceladas=Count('id', filter=Q(estado='CANCELADO')),
+                no_show=Count('id', filter=Q(estado='NO_SHOW')),
+            )
+        else:
+            resumen_hoy = ResumenDiario.objects.filter(sucursal=sucursal, fecha=today).first()
+            por_estado = {
+                'pendientes': resumen_hoy.turnos_pendientes if resumen_hoy else 0,
+                'confirmadas': resumen_hoy.turnos_confirmados if resumen_hoy else 0,
+                'completadas': resumen_hoy.turnos_completados if resumen_hoy else 0,
+                'canceladas': resumen_hoy.turnos_cancelados if resumen_hoy else 0,
+                'no_show': resumen_hoy.turnos_no_show if resumen_hoy else 0,
+            }
+        citas_pendientes = por_estado['pendientes']
+        citas_confirmadas = por_estado['confirmadas']
+        citas_completadas = por_estado['completadas']
+        citas_canceladas = por_estado['canceladas']
+        citas_no_show = por_estado['no_show']
 
         # Próximas 3 citas de hoy
         proximas_citas = turnos_hoy.filter(
@@ -97,36 +117,27 @@ class DashboardHomeView(APIView):
             'estado': turno.estado,
         } for turno in proximas_citas]
 
-        # ========== INGRESOS DEL DÍA (solo Admin/Manager) ==========
+        # ========== INGRESOS DEL DÍA Y DEL MES (solo Admin/Manager) ==========
         if can_view_financials:
-            ingresos_hoy = Transaction.objects.filter(
-                branch=sucursal,
-                date=today,
-                type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            gastos_hoy = Transaction.objects.filter(
-                branch=sucursal,
-                date=today,
-                type='EXPENSE'
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            # ========== INGRESOS DEL MES ==========
+            # Día y mes en curso desde los resúmenes diarios (≤ 31 filas)
             inicio_mes = today.replace(day=1)
+            hoy = Q(fecha=today)
+
+            totales = ResumenDiario.objects.filter(
+                sucursal=sucursal,
+                fecha__gte=inicio_mes,
+                fecha__lte=today
+            ).aggregate(
+                ingresos_hoy=Sum(rollups.INCOME_TOTAL, filter=hoy),
+                gastos_hoy=Sum('egresos', filter=hoy),
+                ingresos_mes=Sum(rollups.INCOME_TOTAL),
+                gastos_mes=Sum('egresos')
+            )
 
-            ingresos_mes = Transaction.objects.filter(
-                branch=sucursal,
-                date__gte=inicio_mes,
-                date__lte=today,
-                type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            gastos_mes = Transaction.objects.filter(
-                branch=sucursal,
-                date__gte=inicio_mes,
-                date__lte=today,
-                type='EXPENSE'
-            ).aggregate(total=Sum('amount'))['total'] or 0
+            ingresos_hoy = totales['ingresos_hoy'] or 0
+            gastos_hoy = totales['gastos_hoy'] or 0
+            ingresos_mes = totales['ingresos_mes'] or 0
+            gastos_mes = totales['gastos_mes'] or 0
         else:
             ingresos_hoy = 0
             gastos_hoy = 0
@@ -1,19 +1,23 @@
 """
 Views para exportación de Analytics (CSV, Excel, PDF)
+Los tres formatos leen de un ReportDataset (report_dataset.py): cada sección
+se consulta una vez y el detalle de transacciones se recorre en streaming.
 """
 
+import codecs
 import csv
 import io
 from datetime import datetime
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count, Q, OuterRef, Subquery, FloatField
-from django.db.models.functions import TruncDate, Coalesce
 from dateutil.relativedelta import relativedelta
 
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 
 from reportlab.lib import colors
@@ -23,262 +27,324 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 
-from apps.turnos.models import Turno
-from apps.finanzas.models import Transaction
-from apps.servicios.models import Servicio
-from apps.inventario.models import Producto
-from apps.clientes.models import Cliente
 from .permissions import IsAdminOrManager
+from .report_dataset import EXPORT_CHUNK_SIZE, ReportDataset
+
+
+# Líneas CSV que se juntan antes de entregarlas al servidor
+EXPORT_LINES_PER_CHUNK = 500
+
+CSV_MODES = ['summary', 'transactions']
+
+TRANSACTION_HEADERS = ['Fecha', 'Tipo', 'Categoría', 'Descripción', 'Cliente', 'Método de Pago', 'Monto']
+
+
+def _date_range(request):
+    """
+    Rango pedido en start_date / end_date (YYYY-MM-DD); los últimos 30 días
+    si falta o no se puede leer.
+    """
+    start_date_str = request.query_params.get('start_date')
+    end_date_str = request.query_params.get('end_date')
+
+    if start_date_str and end_date_str:
+        try:
+            return (
+                datetime.strptime(start_date_str, '%Y-%m-%d').date(),
+                datetime.strptime(end_date_str, '%Y-%m-%d').date()
+            )
+        except ValueError:
+            pass
+
+    end_date = datetime.now().date()
+    return end_date - relativedelta(days=30), end_date
+
+
+class _Echo:
+    """Buffer de una línea: csv.writer escribe y writerow devuelve el texto"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, lines_per_chunk=EXPORT_LINES_PER_CHUNK):
+    """
+    Convierte un iterable de filas en chunks CSV codificados en UTF-8, con el
+    BOM al principio para que Excel detecte la codificación. Nunca tiene más de
+    ``lines_per_chunk`` líneas en memoria.
+
+    Los chunks salen como bytes: con charset utf-8-sig la respuesta repetiría
+    el BOM en cada chunk.
+    """
+    writer = csv.writer(_Echo())
+    yield codecs.BOM_UTF8
+
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= lines_per_chunk:
+            yield ''.join(chunk).encode('utf-8')
+            chunk = []
+    if chunk:
+        yield ''.join(chunk).encode('utf-8')
+
+
+def summary_rows(dataset):
+    """
+    Filas del reporte resumen. Cada sección se consulta recién cuando el
+    stream llega a ella.
+    """
+    # ========== SECTION 1: RESUMEN EJECUTIVO ==========
+    yield ['RESUMEN EJECUTIVO']
+    yield ['Período', f'{dataset.start_date} a {dataset.end_date}']
+    yield []
+
+    kpis = dataset.kpis
+    yield ['Métrica', 'Valor']
+    yield ['Total Ingresos', f"${kpis['ingresos']:,.2f}"]
+    yield ['Total Gastos', f"${kpis['gastos']:,.2f}"]
+    yield ['Ganancia Neta', f"${kpis['ganancia']:,.2f}"]
+    yield ['Total Citas Completadas', kpis['turnos_completados']]
+    yield ['Clientes Nuevos', kpis['clientes_nuevos']]
+    yield []
+    yield []
+
+    # ========== SECTION 2: INGRESOS POR DÍA ==========
+    yield ['INGRESOS DIARIOS']
+    yield ['Fecha', 'Ingresos', 'Cantidad de Transacciones']
+    for day, total, count in dataset.daily_income:
+        yield [day.strftime('%Y-%m-%d'), f'${total:,.2f}', count]
+    yield []
+    yield []
+
+    # ========== SECTION 3: TOP SERVICIOS ==========
+    yield ['TOP SERVICIOS']
+    yield ['Servicio', 'Cantidad', 'Ingresos']
+    for nombre, cantidad, ingresos in dataset.top_services:
+        yield [nombre, cantidad, f'${ingresos:,.2f}']
+    yield []
+    yield []
+
+    # ========== SECTION 4: TOP PRODUCTOS ==========
+    yield ['TOP PRODUCTOS']
+    yield ['Producto', 'Stock Actual', 'Precio', 'Valor Total']
+    for nombre, stock_actual, precio, valor in dataset.top_products:
+        yield [nombre, stock_actual, f'${precio:,.2f}', f'${valor:,.2f}']
+    yield []
+    yield []
+
+    # ========== SECTION 5: TOP CLIENTES ==========
+    yield ['TOP CLIENTES']
+    yield ['Cliente', 'Email', 'Teléfono', 'Total Visitas', 'LTV']
+    for nombre, email, telefono, visitas, ltv in dataset.top_clients:
+        yield [nombre, email, telefono, visitas, f'${ltv:,.2f}']
+    yield []
+    yield []
+
+    # ========== SECTION 6: MÉTODOS DE PAGO ==========
+    yield ['DISTRIBUCIÓN POR MÉTODO DE PAGO']
+    yield ['Método de Pago', 'Cantidad', 'Total']
+    for method, cantidad, total in dataset.payment_methods:
+        yield [method, cantidad, f'${total:,.2f}']
+
+
+def transaction_rows(dataset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Una fila por transacción del período. La memoria no depende del largo
+    del rango.
+    """
+    yield TRANSACTION_HEADERS
+    for fecha, tipo, categoria, descripcion, cliente, medio, monto in dataset.transactions(chunk_size):
+        yield [fecha.strftime('%Y-%m-%d'), tipo, categoria, descripcion, cliente, medio, f'{monto:.2f}']
 
 
 class ExportCSVView(APIView):
     """
     GET /api/analytics/export/csv/
 
-    Exporta datos de analytics en formato CSV
+    Exporta datos de analytics en formato CSV. La respuesta se envía en
+    streaming mientras se leen las filas, así que la memoria del worker no
+    crece con el rango.
     Query params:
     - start_date: YYYY-MM-DD (requerido)
     - end_date: YYYY-MM-DD (requerido)
+    - mode: 'summary' (default, reporte por secciones) | 'transactions'
+      (una fila por transacción del período)
     """
 
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
     def get(self, request):
-        # Get date range from params
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-
-        if not start_date_str or not end_date_str:
-            # Default to last 30 days if not provided
-            end_date = datetime.now().date()
-            start_date = end_date - relativedelta(days=30)
-        else:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            except ValueError:
-                start_date = datetime.now().date() - relativedelta(days=30)
-                end_date = datetime.now().date()
+        start_date, end_date = _date_range(request)
+
+        mode = request.query_params.get('mode', 'summary')
+        if mode not in CSV_MODES:
+            return Response(
+                {'error': f"mode debe ser uno de: {', '.join(CSV_MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         # Get user's sucursal for multi-tenancy
-        sucursal = request.user.sucursal
+        dataset = ReportDataset(request.user.sucursal, start_date, end_date)
 
-        # Create the HttpResponse object with CSV header
-        response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-        filename = f'analytics_{start_date}_{end_date}.csv'
+        if mode == 'transactions':
+            rows = transaction_rows(dataset)
+            filename = f'transacciones_{start_date}_{end_date}.csv'
+        else:
+            rows = summary_rows(dataset)
+            filename = f'analytics_{start_date}_{end_date}.csv'
+
+        # Las consultas corren mientras el servidor consume el generador
+        response = StreamingHttpResponse(
+            stream_csv(rows), content_type='text/csv; charset=utf-8'
+        )
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
-        # Write BOM for Excel compatibility
-        response.write('\ufeff')
 
-        writer = csv.writer(response)
+def _report_progress(progress, value):
+    if progress:
+        progress(value)
 
-        # ========== SECTION 1: RESUMEN EJECUTIVO ==========
-        writer.writerow(['RESUMEN EJECUTIVO'])
-        writer.writerow(['Período', f'{start_date} a {end_date}'])
-        writer.writerow([])
 
-        # Get KPIs
-        turnos_completados = Turno.objects.filter(
-            sucursal=sucursal,
-            estado='COMPLETADO',
-            fecha_hora_inicio__date__gte=start_date,
-            fecha_hora_inicio__date__lte=end_date
-        )
+def _add_excel_styles(wb):
+    """
+    Registra los estilos con nombre del reporte: cada celda guarda solo la
+    referencia al estilo en vez de su propia copia de fuente, borde y formato.
+    """
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    for style in (
+        NamedStyle('reporte_titulo', font=Font(bold=True, size=14)),
+        NamedStyle('reporte_subtitulo', font=Font(italic=True)),
+        NamedStyle(
+            'reporte_encabezado',
+            font=Font(bold=True, color="FFFFFF", size=12),
+            fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+            alignment=Alignment(horizontal='center', vertical='center'),
+            border=border
+        ),
+        NamedStyle('reporte_celda', border=border),
+        NamedStyle('reporte_centrado', border=border, alignment=Alignment(horizontal='center')),
+        NamedStyle('reporte_moneda', border=border, alignment=Alignment(horizontal='right'),
+                   number_format='"$"#,##0.00'),
+        NamedStyle('reporte_fecha', border=border, number_format='DD/MM/YYYY'),
+    ):
+        wb.add_named_style(style)
+
+
+def _excel_cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def _excel_sheet(wb, title, heading, headers, widths):
+    """
+    Hoja write_only con título y encabezados. Los anchos tienen que fijarse
+    antes de la primera fila: después ya no se pueden cambiar.
+    """
+    ws = wb.create_sheet(title)
+    for index, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+    ws.append([_excel_cell(ws, heading, 'reporte_titulo')])
+    ws.append([])
+    ws.append([_excel_cell(ws, header, 'reporte_encabezado') for header in headers])
+    return ws
 
-        total_turnos = turnos_completados.count()
-
-        # Revenue
-        ingresos_totales = Transaction.objects.filter(
-            sucursal=sucursal,
-            date__gte=start_date,
-            date__lte=end_date,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        # Expenses
-        gastos_totales = Transaction.objects.filter(
-            sucursal=sucursal,
-            date__gte=start_date,
-            date__lte=end_date,
-            type='EXPENSE'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        # Profit
-        ganancia_neta = ingresos_totales - gastos_totales
-
-        # Clients
-        clientes_nuevos = Cliente.objects.filter(
-            centro_estetica=sucursal.centro_estetica,
-            creado_en__date__gte=start_date,
-            creado_en__date__lte=end_date
-        ).count()
-
-        writer.writerow(['Métrica', 'Valor'])
-        writer.writerow(['Total Ingresos', f'${ingresos_totales:,.2f}'])
-        writer.writerow(['Total Gastos', f'${gastos_totales:,.2f}'])
-        writer.writerow(['Ganancia Neta', f'${ganancia_neta:,.2f}'])
-        writer.writerow(['Total Citas Completadas', total_turnos])
-        writer.writerow(['Clientes Nuevos', clientes_nuevos])
-        writer.writerow([])
-        writer.writerow([])
-
-        # ========== SECTION 2: INGRESOS POR DÍA ==========
-        writer.writerow(['INGRESOS DIARIOS'])
-        writer.writerow(['Fecha', 'Ingresos', 'Cantidad de Transacciones'])
-
-        # Group income by day
-        from django.db.models.functions import TruncDate
-
-        daily_income = Transaction.objects.filter(
-            sucursal=sucursal,
-            date__gte=start_date,
-            date__lte=end_date,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
-        ).annotate(
-            day=TruncDate('date')
-        ).values('day').annotate(
-            total=Sum('amount'),
-            count=Count('id')
-        ).order_by('day')
-
-        for item in daily_income:
-            writer.writerow([
-                item['day'].strftime('%Y-%m-%d'),
-                f"${item['total']:,.2f}",
-                item['count']
-            ])
-
-        writer.writerow([])
-        writer.writerow([])
-
-        # ========== SECTION 3: TOP SERVICIOS ==========
-        writer.writerow(['TOP SERVICIOS'])
-        writer.writerow(['Servicio', 'Cantidad', 'Ingresos'])
-
-        top_services = Turno.objects.filter(
-            sucursal=sucursal,
-            estado='COMPLETADO',
-            fecha_hora_inicio__date__gte=start_date,
-            fecha_hora_inicio__date__lte=end_date
-        ).values(
-            'servicio__nombre'
-        ).annotate(
-            cantidad=Count('id'),
-            ingresos=Sum('monto_total')
-        ).order_by('-cantidad')[:20]
-
-        for service in top_services:
-            writer.writerow([
-                service['servicio__nombre'] or 'Sin servicio',
-                service['cantidad'],
-                f"${service['ingresos'] or 0:,.2f}"
-            ])
-
-        writer.writerow([])
-        writer.writerow([])
-
-        # ========== SECTION 4: TOP PRODUCTOS ==========
-        writer.writerow(['TOP PRODUCTOS'])
-        writer.writerow(['Producto', 'Stock Actual', 'Precio', 'Valor Total'])
-
-        top_products = Producto.objects.filter(
-            sucursal=sucursal,
-            activo=True
-        ).order_by('-stock_actual')[:20]
-
-        for product in top_products:
-            valor_total = product.stock_actual * product.precio
-            writer.writerow([
-                product.nombre,
-                product.stock_actual,
-                f"${product.precio:,.2f}",
-                f"${valor_total:,.2f}"
-            ])
-
-        writer.writerow([])
-        writer.writerow([])
-
-        # ========== SECTION 5: TOP CLIENTES ==========
-        writer.writerow(['TOP CLIENTES'])
-        writer.writerow(['Cliente', 'Email', 'Teléfono', 'Total Visitas', 'LTV'])
-
-        # Get top clients by total spending
-        from django.db.models import OuterRef, Subquery, FloatField
-        from django.db.models.functions import Coalesce
-
-        # Calculate LTV for each client
-        client_spending = Transaction.objects.filter(
-            client_id=OuterRef('id'),
-            sucursal=sucursal,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT']
-        ).values('client_id').annotate(
-            total_spent=Sum('amount')
-        ).values('total_spent')
-
-        # Get clients with LTV and visit count
-        top_clients = Cliente.objects.filter(
-            centro_estetica=sucursal.centro_estetica
-        ).annotate(
-            ltv=Coalesce(
-                Subquery(client_spending, output_field=FloatField()),
-                0.0
-            ),
-            visitas=Count(
-                'turnos',
-                filter=Q(
-                    turnos__sucursal=sucursal,
-                    turnos__estado='COMPLETADO'
-                )
-            )
-        ).filter(
-            visitas__gt=0
-        ).order_by('-ltv')[:20]
-
-        for client in top_clients:
-            writer.writerow([
-                f"{client.nombre} {client.apellido}",
-                client.email or 'N/A',
-                client.telefono or 'N/A',
-                client.visitas,
-                f"${client.ltv:,.2f}"
-            ])
-
-        writer.writerow([])
-        writer.writerow([])
-
-        # ========== SECTION 6: MÉTODOS DE PAGO ==========
-        writer.writerow(['DISTRIBUCIÓN POR MÉTODO DE PAGO'])
-        writer.writerow(['Método de Pago', 'Cantidad', 'Total'])
-
-        payment_methods = Transaction.objects.filter(
-            sucursal=sucursal,
-            date__gte=start_date,
-            date__lte=end_date,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
-        ).values('payment_method').annotate(
-            cantidad=Count('id'),
-            total=Sum('amount')
-        ).order_by('-total')
-
-        payment_method_labels = {
-            'CASH': 'Efectivo',
-            'BANK_TRANSFER': 'Transferencia',
-            'DEBIT_CARD': 'Débito',
-            'CREDIT_CARD': 'Crédito',
-            'MERCADOPAGO': 'Mercado Pago',
-            'OTHER': 'Otro'
-        }
-
-        for method in payment_methods:
-            label = payment_method_labels.get(method['payment_method'], method['payment_method'])
-            writer.writerow([
-                label,
-                method['cantidad'],
-                f"${method['total']:,.2f}"
-            ])
 
-        return response
+def _excel_rows(ws, rows, styles):
+    """
+    Agrega las filas con un estilo por columna. Las columnas con estilo None
+    van como valor plano, que es bastante más barato de serializar.
+    """
+    for row in rows:
+        ws.append([
+            _excel_cell(ws, value, style) if style else value
+            for value, style in zip(row, styles)
+        ])
+
+
+def render_excel(sucursal, start_date, end_date, progress=None):
+    """
+    Arma el reporte Excel de un período y devuelve el .xlsx en bytes.
+    ``progress`` (opcional) recibe el porcentaje avanzado a medida que se
+    arman las hojas.
+
+    El libro es write_only: cada fila se serializa al agregarla, así que la
+    hoja de transacciones no se arma entera en memoria.
+    """
+    dataset = ReportDataset(sucursal, start_date, end_date)
+    wb = Workbook(write_only=True)
+    _add_excel_styles(wb)
+
+    _report_progress(progress, 10)
+
+    # ========== SHEET 1: RESUMEN EJECUTIVO ==========
+    ws = wb.create_sheet("Resumen Ejecutivo")
+    ws.column_dimensions['A'].width = 25
+    ws.column_dimensions['B'].width = 20
+    ws.append([_excel_cell(ws, 'RESUMEN EJECUTIVO - ANALYTICS', 'reporte_titulo')])
+    ws.append([_excel_cell(
+        ws, f'Período: {start_date.strftime("%d/%m/%Y")} - {end_date.strftime("%d/%m/%Y")}',
+        'reporte_subtitulo'
+    )])
+    ws.append([])
+    ws.append([_excel_cell(ws, header, 'reporte_encabezado') for header in ('Métrica', 'Valor')])
+
+    kpis = dataset.kpis
+    _excel_rows(ws, [
+        ('Total Ingresos', kpis['ingresos']),
+        ('Total Gastos', kpis['gastos']),
+        ('Ganancia Neta', kpis['ganancia']),
+    ], ('reporte_celda', 'reporte_moneda'))
+    _excel_rows(ws, [
+        ('Total Citas Completadas', kpis['turnos_completados']),
+        ('Clientes Nuevos', kpis['clientes_nuevos']),
+    ], ('reporte_celda', 'reporte_celda'))
+
+    _report_progress(progress, 30)
+
+    # ========== SHEET 2: INGRESOS DIARIOS ==========
+    ws = _excel_sheet(wb, "Ingresos Diarios", 'INGRESOS DIARIOS',
+                      ('Fecha', 'Ingresos', 'Cantidad'), (15, 18, 12))
+    _excel_rows(ws, dataset.daily_income, ('reporte_fecha', 'reporte_moneda', 'reporte_centrado'))
+
+    _report_progress(progress, 45)
+
+    # ========== SHEET 3: TOP SERVICIOS ==========
+    ws = _excel_sheet(wb, "Top Servicios", 'TOP SERVICIOS',
+                      ('Servicio', 'Cantidad', 'Ingresos'), (30, 12, 18))
+    _excel_rows(ws, dataset.top_services, ('reporte_celda', 'reporte_centrado', 'reporte_moneda'))
+
+    _report_progress(progress, 55)
+
+    # ========== SHEET 4: TOP CLIENTES ==========
+    ws = _excel_sheet(wb, "Top Clientes", 'TOP CLIENTES',
+                      ('Cliente', 'Email', 'Teléfono', 'Visitas', 'LTV'), (25, 30, 15, 10, 18))
+    _excel_rows(ws, dataset.top_clients, (
+        'reporte_celda', 'reporte_celda', 'reporte_celda', 'reporte_centrado', 'reporte_moneda'
+    ))
+
+    _report_progress(progress, 65)
+
+    # ========== SHEET 5: TRANSACCIONES ==========
+    # Puede tener cientos de miles de filas: solo fecha y monto llevan estilo
+    ws = _excel_sheet(wb, "Transacciones", 'TRANSACCIONES', TRANSACTION_HEADERS,
+                      (12, 22, 20, 40, 25, 16, 14))
+    _excel_rows(ws, dataset.transactions(), (
+        'reporte_fecha', None, None, None, None, None, 'reporte_moneda'
+    ))
+
+    _report_progress(progress, 90)
+
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
 
 
 class ExportExcelView(APIView):
@@ -294,287 +360,16 @@ class ExportExcelView(APIView):
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
     def get(self, request):
-        # Get date range from params
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-
-        if not start_date_str or not end_date_str:
-            # Default to last 30 days if not provided
-            end_date = datetime.now().date()
-            start_date = end_date - relativedelta(days=30)
-        else:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            except ValueError:
-                start_date = datetime.now().date() - relativedelta(days=30)
-                end_date = datetime.now().date()
+        start_date, end_date = _date_range(request)
 
         # Get user's sucursal for multi-tenancy
         sucursal = request.user.sucursal
 
-        # Create workbook
-        wb = Workbook()
-
-        # Define styles
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=12)
-        header_alignment = Alignment(horizontal='center', vertical='center')
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-        # ========== SHEET 1: RESUMEN EJECUTIVO ==========
-        ws1 = wb.active
-        ws1.title = "Resumen Ejecutivo"
-
-        # Title
-        ws1['A1'] = 'RESUMEN EJECUTIVO - ANALYTICS'
-        ws1['A1'].font = Font(bold=True, size=16)
-        ws1.merge_cells('A1:D1')
-
-        # Period
-        ws1['A2'] = f'Período: {start_date.strftime("%d/%m/%Y")} - {end_date.strftime("%d/%m/%Y")}'
-        ws1['A2'].font = Font(italic=True)
-        ws1.merge_cells('A2:D2')
-
-        # Get KPIs
-        turnos_completados = Turno.objects.filter(
-            sucursal=sucursal,
-            estado='COMPLETADO',
-            fecha_hora_inicio__date__gte=start_date,
-            fecha_hora_inicio__date__lte=end_date
-        )
-        total_turnos = turnos_completados.count()
-
-        ingresos_totales = Transaction.objects.filter(
-            sucursal=sucursal,
-            date__gte=start_date,
-            date__lte=end_date,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        gastos_totales = Transaction.objects.filter(
-            sucursal=sucursal,
-            date__gte=start_date,
-            date__lte=end_date,
-            type='EXPENSE'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        ganancia_neta = ingresos_totales - gastos_totales
-
-        clientes_nuevos = Cliente.objects.filter(
-            centro_estetica=sucursal.centro_estetica,
-            creado_en__date__gte=start_date,
-            creado_en__date__lte=end_date
-        ).count()
-
-        # Headers
-        ws1['A4'] = 'Métrica'
-        ws1['B4'] = 'Valor'
-        for cell in ['A4', 'B4']:
-            ws1[cell].fill = header_fill
-            ws1[cell].font = header_font
-            ws1[cell].alignment = header_alignment
-            ws1[cell].border = border
-
-        # Data
-        metrics = [
-            ('Total Ingresos', f'${ingresos_totales:,.2f}'),
-            ('Total Gastos', f'${gastos_totales:,.2f}'),
-            ('Ganancia Neta', f'${ganancia_neta:,.2f}'),
-            ('Total Citas Completadas', total_turnos),
-            ('Clientes Nuevos', clientes_nuevos),
-        ]
-
-        row = 5
-        for metric, value in metrics:
-            ws1[f'A{row}'] = metric
-            ws1[f'B{row}'] = value
-            ws1[f'A{row}'].border = border
-            ws1[f'B{row}'].border = border
-            if isinstance(value, str) and '$' in value:
-                ws1[f'B{row}'].alignment = Alignment(horizontal='right')
-            row += 1
-
-        # Column widths
-        ws1.column_dimensions['A'].width = 25
-        ws1.column_dimensions['B'].width = 20
-
-        # ========== SHEET 2: INGRESOS DIARIOS ==========
-        ws2 = wb.create_sheet("Ingresos Diarios")
-
-        # Title
-        ws2['A1'] = 'INGRESOS DIARIOS'
-        ws2['A1'].font = Font(bold=True, size=14)
-
-        # Headers
-        ws2['A3'] = 'Fecha'
-        ws2['B3'] = 'Ingresos'
-        ws2['C3'] = 'Cantidad'
-        for cell in ['A3', 'B3', 'C3']:
-            ws2[cell].fill = header_fill
-            ws2[cell].font = header_font
-            ws2[cell].alignment = header_alignment
-            ws2[cell].border = border
-
-        # Data
-        daily_income = Transaction.objects.filter(
-            sucursal=sucursal,
-            date__gte=start_date,
-            date__lte=end_date,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
-        ).annotate(
-            day=TruncDate('date')
-        ).values('day').annotate(
-            total=Sum('amount'),
-            count=Count('id')
-        ).order_by('day')
-
-        row = 4
-        for item in daily_income:
-            ws2[f'A{row}'] = item['day'].strftime('%d/%m/%Y')
-            ws2[f'B{row}'] = float(item['total'])
-            ws2[f'C{row}'] = item['count']
-            ws2[f'A{row}'].border = border
-            ws2[f'B{row}'].border = border
-            ws2[f'C{row}'].border = border
-            ws2[f'B{row}'].number_format = '"$"#,##0.00'
-            ws2[f'B{row}'].alignment = Alignment(horizontal='right')
-            ws2[f'C{row}'].alignment = Alignment(horizontal='center')
-            row += 1
-
-        # Column widths
-        ws2.column_dimensions['A'].width = 15
-        ws2.column_dimensions['B'].width = 18
-        ws2.column_dimensions['C'].width = 12
-
-        # ========== SHEET 3: TOP SERVICIOS ==========
-        ws3 = wb.create_sheet("Top Servicios")
-
-        # Title
-        ws3['A1'] = 'TOP SERVICIOS'
-        ws3['A1'].font = Font(bold=True, size=14)
-
-        # Headers
-        ws3['A3'] = 'Servicio'
-        ws3['B3'] = 'Cantidad'
-        ws3['C3'] = 'Ingresos'
-        for cell in ['A3', 'B3', 'C3']:
-            ws3[cell].fill = header_fill
-            ws3[cell].font = header_font
-            ws3[cell].alignment = header_alignment
-            ws3[cell].border = border
-
-        # Data
-        top_services = Turno.objects.filter(
-            sucursal=sucursal,
-            estado='COMPLETADO',
-            fecha_hora_inicio__date__gte=start_date,
-            fecha_hora_inicio__date__lte=end_date
-        ).values(
-            'servicio__nombre'
-        ).annotate(
-            cantidad=Count('id'),
-            ingresos=Sum('monto_total')
-        ).order_by('-cantidad')[:20]
-
-        row = 4
-        for service in top_services:
-            ws3[f'A{row}'] = service['servicio__nombre'] or 'Sin servicio'
-            ws3[f'B{row}'] = service['cantidad']
-            ws3[f'C{row}'] = float(service['ingresos'] or 0)
-            ws3[f'A{row}'].border = border
-            ws3[f'B{row}'].border = border
-            ws3[f'C{row}'].border = border
-            ws3[f'B{row}'].alignment = Alignment(horizontal='center')
-            ws3[f'C{row}'].number_format = '"$"#,##0.00'
-            ws3[f'C{row}'].alignment = Alignment(horizontal='right')
-            row += 1
-
-        # Column widths
-        ws3.column_dimensions['A'].width = 30
-        ws3.column_dimensions['B'].width = 12
-        ws3.column_dimensions['C'].width = 18
-
-        # ========== SHEET 4: TOP CLIENTES ==========
-        ws4 = wb.create_sheet("Top Clientes")
-
-        # Title
-        ws4['A1'] = 'TOP CLIENTES'
-        ws4['A1'].font = Font(bold=True, size=14)
-
-        # Headers
-        ws4['A3'] = 'Cliente'
-        ws4['B3'] = 'Email'
-        ws4['C3'] = 'Teléfono'
-        ws4['D3'] = 'Visitas'
-        ws4['E3'] = 'LTV'
-        for cell in ['A3', 'B3', 'C3', 'D3', 'E3']:
-            ws4[cell].fill = header_fill
-            ws4[cell].font = header_font
-            ws4[cell].alignment = header_alignment
-            ws4[cell].border = border
-
-        # Data
-        client_spending = Transaction.objects.filter(
-            client_id=OuterRef('id'),
-            sucursal=sucursal,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT']
-        ).values('client_id').annotate(
-            total_spent=Sum('amount')
-        ).values('total_spent')
-
-        top_clients = Cliente.objects.filter(
-            centro_estetica=sucursal.centro_estetica
-        ).annotate(
-            ltv=Coalesce(
-                Subquery(client_spending, output_field=FloatField()),
-                0.0
-            ),
-            visitas=Count(
-                'turnos',
-                filter=Q(
-                    turnos__sucursal=sucursal,
-                    turnos__estado='COMPLETADO'
-                )
-            )
-        ).filter(
-            visitas__gt=0
-        ).order_by('-ltv')[:20]
-
-        row = 4
-        for client in top_clients:
-            ws4[f'A{row}'] = f"{client.nombre} {client.apellido}"
-            ws4[f'B{row}'] = client.email or 'N/A'
-            ws4[f'C{row}'] = client.telefono or 'N/A'
-            ws4[f'D{row}'] = client.visitas
-            ws4[f'E{row}'] = float(client.ltv)
-            for col in ['A', 'B', 'C', 'D', 'E']:
-                ws4[f'{col}{row}'].border = border
-            ws4[f'D{row}'].alignment = Alignment(horizontal='center')
-            ws4[f'E{row}'].number_format = '"$"#,##0.00'
-            ws4[f'E{row}'].alignment = Alignment(horizontal='right')
-            row += 1
-
-        # Column widths
-        ws4.column_dimensions['A'].width = 25
-        ws4.column_dimensions['B'].width = 30
-        ws4.column_dimensions['C'].width = 15
-        ws4.column_dimensions['D'].width = 10
-        ws4.column_dimensions['E'].width = 18
-
-        # Save to BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        content = render_excel(sucursal, start_date, end_date)
 
         # Create response
         response = HttpResponse(
-            output.getvalue(),
+            content,
             content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
         filename = f'analytics_{start_date}_{end_date}.xlsx'
@@ -583,291 +378,218 @@ class ExportExcelView(APIView):
         return response
 
 
-class ExportPDFView(APIView):
+def render_pdf(sucursal, start_date, end_date, progress=None):
     """
-    GET /api/analytics/export/pdf/
-
-    Exporta datos de analytics en formato PDF con tablas formateadas
-    Query params:
-    - start_date: YYYY-MM-DD (requerido)
-    - end_date: YYYY-MM-DD (requerido)
+    Arma el reporte PDF de un período y devuelve el documento en bytes.
+    ``progress`` (opcional) recibe el porcentaje avanzado por sección.
     """
+    # Create PDF buffer
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+
+    # Container for PDF elements
+    elements = []
+
+    # Define styles
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#2563eb'),
+        spaceAfter=12,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    )
+
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=16,
+        textColor=colors.HexColor('#2563eb'),
+        spaceAfter=10,
+        spaceBefore=15,
+        fontName='Helvetica-Bold'
+    )
+
+    normal_style = styles['Normal']
+
+    # Title
+    title = Paragraph("REPORTE DE ANALYTICS", title_style)
+    elements.append(title)
+
+    # Period
+    period = Paragraph(
+        f"Período: {start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}",
+        normal_style
+    )
+    elements.append(period)
+    elements.append(Spacer(1, 0.3*inch))
+
+    _report_progress(progress, 10)
+
+    dataset = ReportDataset(sucursal, start_date, end_date)
+
+    # ========== SECTION 1: RESUMEN EJECUTIVO ==========
+    elements.append(Paragraph("Resumen Ejecutivo", heading_style))
+
+    kpis = dataset.kpis
+
+    # KPIs table
+    kpi_data = [
+        ['Métrica', 'Valor'],
+        ['Total Ingresos', f"${kpis['ingresos']:,.2f}"],
+        ['Total Gastos', f"${kpis['gastos']:,.2f}"],
+        ['Ganancia Neta', f"${kpis['ganancia']:,.2f}"],
+        ['Total Citas Completadas', str(kpis['turnos_completados'])],
+        ['Clientes Nuevos', str(kpis['clientes_nuevos'])],
+    ]
+
+    kpi_table = Table(kpi_data, colWidths=[3*inch, 2*inch])
+    kpi_table.setStyle(TableStyle([
+        # Header
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+        # Body
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('TOPPADDING', (0, 1), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+
+        # Grid
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ]))
+
+    elements.append(kpi_table)
+    elements.append(Spacer(1, 0.3*inch))
+
+    _report_progress(progress, 40)
+
+    # ========== SECTION 2: TOP SERVICIOS ==========
+    elements.append(Paragraph("Top 10 Servicios", heading_style))
+
+    services_data = [['Servicio', 'Cantidad', 'Ingresos']]
+    for nombre, cantidad, ingresos in dataset.top_services[:10]:
+        services_data.append([nombre, str(cantidad), f'${ingresos:,.2f}'])
+
+    if len(services_data) > 1:
+        services_table = Table(services_data, colWidths=[3*inch, 1*inch, 1.5*inch])
+        services_table.setStyle(TableStyle([
+            # Header
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
 
-    permission_classes = [IsAuthenticated, IsAdminOrManager]
+            # Body
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+            ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 1), (1, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('TOPPADDING', (0, 1), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 5),
 
-    def get(self, request):
-        # Get date range from params
-        start_date_str = request.query_params.get('start_date')
-        end_date_str = request.query_params.get('end_date')
-
-        if not start_date_str or not end_date_str:
-            # Default to last 30 days if not provided
-            end_date = datetime.now().date()
-            start_date = end_date - relativedelta(days=30)
-        else:
-            try:
-                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            except ValueError:
-                start_date = datetime.now().date() - relativedelta(days=30)
-                end_date = datetime.now().date()
+            # Grid
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ]))
+        elements.append(services_table)
+    else:
+        elements.append(Paragraph("No hay datos de servicios para este período", normal_style))
 
-        # Get user's sucursal for multi-tenancy
-        sucursal = request.user.sucursal
+    elements.append(Spacer(1, 0.3*inch))
 
-        # Create PDF buffer
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-
-        # Container for PDF elements
-        elements = []
-
-        # Define styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#2563eb'),
-            spaceAfter=12,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
+    _report_progress(progress, 70)
 
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=16,
-            textColor=colors.HexColor('#2563eb'),
-            spaceAfter=10,
-            spaceBefore=15,
-            fontName='Helvetica-Bold'
-        )
-
-        normal_style = styles['Normal']
+    # ========== SECTION 3: TOP CLIENTES ==========
+    elements.append(Paragraph("Top 10 Clientes", heading_style))
 
-        # Title
-        title = Paragraph("REPORTE DE ANALYTICS", title_style)
-        elements.append(title)
+    clients_data = [['Cliente', 'Visitas', 'LTV']]
+    for nombre, _email, _telefono, visitas, ltv in dataset.top_clients[:10]:
+        clients_data.append([nombre, str(visitas), f'${ltv:,.2f}'])
 
-        # Period
-        period = Paragraph(
-            f"Período: {start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}",
-            normal_style
-        )
-        elements.append(period)
-        elements.append(Spacer(1, 0.3*inch))
-
-        # ========== SECTION 1: RESUMEN EJECUTIVO ==========
-        elements.append(Paragraph("Resumen Ejecutivo", heading_style))
-
-        # Get KPIs
-        turnos_completados = Turno.objects.filter(
-            sucursal=sucursal,
-            estado='COMPLETADO',
-            fecha_hora_inicio__date__gte=start_date,
-            fecha_hora_inicio__date__lte=end_date
-        )
-        total_turnos = turnos_completados.count()
-
-        ingresos_totales = Transaction.objects.filter(
-            branch=sucursal,
-            date__gte=start_date,
-            date__lte=end_date,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        gastos_totales = Transaction.objects.filter(
-            branch=sucursal,
-            date__gte=start_date,
-            date__lte=end_date,
-            type='EXPENSE'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-
-        ganancia_neta = ingresos_totales - gastos_totales
-
-        clientes_nuevos = Cliente.objects.filter(
-            centro_estetica=sucursal.centro_estetica,
-            creado_en__date__gte=start_date,
-            creado_en__date__lte=end_date
-        ).count()
-
-        # KPIs table
-        kpi_data = [
-            ['Métrica', 'Valor'],
-            ['Total Ingresos', f'${ingresos_totales:,.2f}'],
-            ['Total Gastos', f'${gastos_totales:,.2f}'],
-            ['Ganancia Neta', f'${ganancia_neta:,.2f}'],
-            ['Total Citas Completadas', str(total_turnos)],
-            ['Clientes Nuevos', str(clientes_nuevos)],
-        ]
-
-        kpi_table = Table(kpi_data, colWidths=[3*inch, 2*inch])
-        kpi_table.setStyle(TableStyle([
+    if len(clients_data) > 1:
+        clients_table = Table(clients_data, colWidths=[3.5*inch, 1*inch, 1.5*inch])
+        clients_table.setStyle(TableStyle([
             # Header
             ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
             ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
             ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
 
             # Body
             ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
             ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
             ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+            ('ALIGN', (1, 1), (1, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
             ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('TOPPADDING', (0, 1), (-1, -1), 5),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 5),
 
             # Grid
             ('GRID', (0, 0), (-1, -1), 1, colors.grey),
         ]))
+        elements.append(clients_table)
+    else:
+        elements.append(Paragraph("No hay datos de clientes para este período", normal_style))
+
+    # Footer
+    elements.append(Spacer(1, 0.5*inch))
+    footer_text = f"Generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M')} - {sucursal.centro_estetica.nombre}"
+    footer = Paragraph(footer_text, ParagraphStyle(
+        'Footer',
+        parent=normal_style,
+        fontSize=8,
+        textColor=colors.grey,
+        alignment=TA_CENTER
+    ))
+    elements.append(footer)
+
+    # Build PDF
+    doc.build(elements)
+
+    # Get PDF from buffer
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
 
-        elements.append(kpi_table)
-        elements.append(Spacer(1, 0.3*inch))
-
-        # ========== SECTION 2: TOP SERVICIOS ==========
-        elements.append(Paragraph("Top 10 Servicios", heading_style))
-
-        top_services = Turno.objects.filter(
-            sucursal=sucursal,
-            estado='COMPLETADO',
-            fecha_hora_inicio__date__gte=start_date,
-            fecha_hora_inicio__date__lte=end_date
-        ).values(
-            'servicio__nombre'
-        ).annotate(
-            cantidad=Count('id'),
-            ingresos=Sum('monto_total')
-        ).order_by('-cantidad')[:10]
-
-        services_data = [['Servicio', 'Cantidad', 'Ingresos']]
-        for service in top_services:
-            services_data.append([
-                service['servicio__nombre'] or 'Sin servicio',
-                str(service['cantidad']),
-                f"${service['ingresos'] or 0:,.2f}"
-            ])
-
-        if len(services_data) > 1:
-            services_table = Table(services_data, colWidths=[3*inch, 1*inch, 1.5*inch])
-            services_table.setStyle(TableStyle([
-                # Header
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-
-                # Body
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 1), (1, -1), 'CENTER'),
-                ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('TOPPADDING', (0, 1), (-1, -1), 5),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 5),
-
-                # Grid
-                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ]))
-            elements.append(services_table)
-        else:
-            elements.append(Paragraph("No hay datos de servicios para este período", normal_style))
-
-        elements.append(Spacer(1, 0.3*inch))
-
-        # ========== SECTION 3: TOP CLIENTES ==========
-        elements.append(Paragraph("Top 10 Clientes", heading_style))
-
-        # Calculate LTV for each client
-        client_spending = Transaction.objects.filter(
-            client_id=OuterRef('id'),
-            branch=sucursal,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT']
-        ).values('client_id').annotate(
-            total_spent=Sum('amount')
-        ).values('total_spent')
-
-        top_clients = Cliente.objects.filter(
-            centro_estetica=sucursal.centro_estetica
-        ).annotate(
-            ltv=Coalesce(
-                Subquery(client_spending, output_field=FloatField()),
-                0.0
-            ),
-            visitas=Count(
-                'turnos',
-                filter=Q(
-                    turnos__sucursal=sucursal,
-                    turnos__estado='COMPLETADO'
-                )
-            )
-        ).filter(
-            visitas__gt=0
-        ).order_by('-ltv')[:10]
-
-        clients_data = [['Cliente', 'Visitas', 'LTV']]
-        for client in top_clients:
-            clients_data.append([
-                f"{client.nombre} {client.apellido}",
-                str(client.visitas),
-                f"${client.ltv:,.2f}"
-            ])
-
-        if len(clients_data) > 1:
-            clients_table = Table(clients_data, colWidths=[3.5*inch, 1*inch, 1.5*inch])
-            clients_table.setStyle(TableStyle([
-                # Header
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 11),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-
-                # Body
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 1), (1, -1), 'CENTER'),
-                ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-                ('TOPPADDING', (0, 1), (-1, -1), 5),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 5),
-
-                # Grid
-                ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ]))
-            elements.append(clients_table)
-        else:
-            elements.append(Paragraph("No hay datos de clientes para este período", normal_style))
-
-        # Footer
-        elements.append(Spacer(1, 0.5*inch))
-        footer_text = f"Generado el {datetime.now().strftime('%d/%m/%Y a las %H:%M')} - {sucursal.centro_estetica.nombre}"
-        footer = Paragraph(footer_text, ParagraphStyle(
-            'Footer',
-            parent=normal_style,
-            fontSize=8,
-            textColor=colors.grey,
-            alignment=TA_CENTER
-        ))
-        elements.append(footer)
-
-        # Build PDF
-        doc.build(elements)
-
-        # Get PDF from buffer
-        pdf = buffer.getvalue()
-        buffer.close()
+
+class ExportPDFView(APIView):
+    """
+    GET /api/analytics/export/pdf/
+
+    Exporta datos de analytics en formato PDF con tablas formateadas
+    Query params:
+    - start_date: YYYY-MM-DD (requerido)
+    - end_date: YYYY-MM-DD (requerido)
+    """
+
+    permission_classes = [IsAuthenticated, IsAdminOrManager]
+
+    def get(self, request):
+        start_date, end_date = _date_range(request)
+
+        # Get user's sucursal for multi-tenancy
+        sucursal = request.user.sucursal
+
+        pdf = render_pdf(sucursal, start_date, end_date)
 
         # Create response
         response = HttpResponse(content_type='application/pdf')
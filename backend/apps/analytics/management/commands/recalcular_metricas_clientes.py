@@ -0,0 +1,46 @@
+"""
+Rebuild the materialized client metrics (ClienteMetricas) from scratch.
+
+The table is kept up to date by signals on every turno and transaction save,
+but writes that skip signals (queryset .update(), bulk_create, raw SQL, data
+fixed by hand) leave it stale. This recomputes every row from the source data
+with a few grouped queries and batched upserts, so it is safe to run anytime.
+
+    python manage.py recalcular_metricas_clientes
+    python manage.py recalcular_metricas_clientes --centro 3
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.analytics.client_metrics import rebuild_client_metrics
+from apps.empleados.models import CentroEstetica
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las métricas materializadas de clientes (LTV, visitas, frecuencia)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--centro', type=int,
+            help='Recalcular solo los clientes de este centro. Por defecto, todos'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Filas por upsert (default 1000)'
+        )
+
+    def handle(self, *args, **options):
+        centro_id = options.get('centro')
+        if centro_id and not CentroEstetica.objects.filter(pk=centro_id).exists():
+            raise CommandError(f'No existe el centro {centro_id}')
+
+        inicio = time.monotonic()
+        procesados = rebuild_client_metrics(
+            centro_id=centro_id, batch_size=options['batch_size']
+        )
+        duracion = time.monotonic() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Métricas recalculadas para {procesados} clientes en {duracion:.1f}s'
+        ))
@@ -0,0 +1,64 @@
+"""
+Rebuild the daily analytics rollups (ResumenDiario, ResumenDiarioMedioPago,
+ResumenDiarioClientes) for a date range.
+
+Signals recompute the affected day on every transaction, turno and client
+write, but writes that skip signals (queryset .update(), bulk_create, raw SQL)
+leave the rollups stale. This deletes the rollups in the range and rebuilds
+them with one grouped query per table, so it doubles as a repair tool.
+
+    python manage.py recalcular_resumenes_diarios
+    python manage.py recalcular_resumenes_diarios --sucursal 2 --desde 2026-01-01
+"""
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.analytics.rollups import rebuild_rollups
+from apps.empleados.models import Sucursal
+
+
+def _fecha(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {value} (formato YYYY-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los resúmenes diarios de analytics (ingresos, turnos, medios de pago, altas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sucursal', type=int,
+            help='Recalcular solo esta sucursal (y las altas de clientes de su centro)'
+        )
+        parser.add_argument('--desde', type=_fecha, help='Primer día a recalcular (YYYY-MM-DD)')
+        parser.add_argument('--hasta', type=_fecha, help='Último día a recalcular (YYYY-MM-DD)')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Filas por insert (default 1000)'
+        )
+
+    def handle(self, *args, **options):
+        sucursal_id = options.get('sucursal')
+        desde, hasta = options.get('desde'), options.get('hasta')
+
+        if sucursal_id and not Sucursal.objects.filter(pk=sucursal_id).exists():
+            raise CommandError(f'No existe la sucursal {sucursal_id}')
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde debe ser anterior a --hasta')
+
+        inicio = time.monotonic()
+        escritos = rebuild_rollups(
+            sucursal_id=sucursal_id, desde=desde, hasta=hasta,
+            batch_size=options['batch_size']
+        )
+        duracion = time.monotonic() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resúmenes recalculados en {duracion:.1f}s: {escritos['dias']} días, "
+            f"{escritos['medios_de_pago']} filas de medios de pago, "
+            f"{escritos['clientes']} días de altas de clientes"
+        ))
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ("clientes", "0008_remove_usuariocliente_push_token"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClienteMetricas",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "ltv",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Total gastado en servicios y productos",
+                        max_digits=12,
+                    ),
+                ),
+                ("visitas_completadas", models.PositiveIntegerField(default=0)),
+                ("primera_visita", models.DateTimeField(blank=True, null=True)),
+                ("ultima_visita", models.DateTimeField(blank=True, null=True)),
+                (
+                    "frecuencia_promedio_dias",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Promedio de días entre visitas completadas (ignora visitas del mismo día)",
+                        null=True,
+                    ),
+                ),
+                ("actualizado_en", models.DateTimeField(auto_now=True)),
+                (
+                    "cliente",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metricas",
+                        to="clientes.cliente",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Métricas de Cliente",
+                "verbose_name_plural": "Métricas de Clientes",
+                "indexes": [
+                    models.Index(fields=["-ltv"], name="analytics_c_ltv_f1b431_idx")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def backfill_cliente_metricas(apps, schema_editor):
+    """Calcula las métricas de todos los clientes existentes."""
+    from apps.analytics.client_metrics import rebuild_client_metrics
+
+    rebuild_client_metrics(registry=apps)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('finanzas', '0006_transaction_service'),
+        ('turnos', '0002_alter_turno_creado_por'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_cliente_metricas, noop_reverse),
+    ]
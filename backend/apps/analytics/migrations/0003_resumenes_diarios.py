@@ -0,0 +1,154 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("empleados", "0004_alter_centroestetica_logo"),
+        ("analytics", "0002_backfill_cliente_metricas"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResumenDiarioMedioPago",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fecha", models.DateField()),
+                ("medio_pago", models.CharField(max_length=20)),
+                (
+                    "monto",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("cantidad", models.PositiveIntegerField(default=0)),
+                (
+                    "sucursal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="resumenes_medio_pago",
+                        to="empleados.sucursal",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Resumen Diario por Medio de Pago",
+                "verbose_name_plural": "Resúmenes Diarios por Medio de Pago",
+            },
+        ),
+        migrations.CreateModel(
+            name="ResumenDiarioClientes",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fecha", models.DateField()),
+                ("clientes_nuevos", models.PositiveIntegerField(default=0)),
+                (
+                    "centro_estetica",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="resumenes_clientes",
+                        to="empleados.centroestetica",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Resumen Diario de Clientes",
+                "verbose_name_plural": "Resúmenes Diarios de Clientes",
+            },
+        ),
+        migrations.CreateModel(
+            name="ResumenDiario",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fecha", models.DateField()),
+                (
+                    "ingresos_servicios",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "ingresos_productos",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "ingresos_otros",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("cantidad_ingresos", models.PositiveIntegerField(default=0)),
+                (
+                    "egresos",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("cantidad_egresos", models.PositiveIntegerField(default=0)),
+                ("turnos_pendientes", models.PositiveIntegerField(default=0)),
+                ("turnos_confirmados", models.PositiveIntegerField(default=0)),
+                ("turnos_completados", models.PositiveIntegerField(default=0)),
+                ("turnos_cancelados", models.PositiveIntegerField(default=0)),
+                ("turnos_no_show", models.PositiveIntegerField(default=0)),
+                (
+                    "monto_turnos_completados",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Suma de monto_total de los turnos completados",
+                        max_digits=14,
+                    ),
+                ),
+                ("actualizado_en", models.DateTimeField(auto_now=True)),
+                (
+                    "sucursal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="resumenes_diarios",
+                        to="empleados.sucursal",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Resumen Diario",
+                "verbose_name_plural": "Resúmenes Diarios",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="resumendiariomediopago",
+            constraint=models.UniqueConstraint(
+                fields=("sucursal", "fecha", "medio_pago"),
+                name="resumen_medio_pago_unico",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="resumendiarioclientes",
+            constraint=models.UniqueConstraint(
+                fields=("centro_estetica", "fecha"), name="resumen_clientes_unico"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="resumendiario",
+            constraint=models.UniqueConstraint(
+                fields=("sucursal", "fecha"), name="resumen_diario_unico"
+            ),
+        ),
+    ]
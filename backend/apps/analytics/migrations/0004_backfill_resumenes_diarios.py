@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def backfill_resumenes_diarios(apps, schema_editor):
+    """Arma los resúmenes diarios de todo el historial."""
+    from apps.analytics.rollups import rebuild_rollups
+
+    rebuild_rollups(registry=apps)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_resumenes_diarios'),
+        ('clientes', '0008_remove_usuariocliente_push_token'),
+        ('finanzas', '0006_transaction_service'),
+        ('turnos', '0002_alter_turno_creado_por'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_resumenes_diarios, noop_reverse),
+    ]
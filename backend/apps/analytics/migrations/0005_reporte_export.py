@@ -0,0 +1,100 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("empleados", "0004_alter_centroestetica_logo"),
+        ("analytics", "0004_backfill_resumenes_diarios"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReporteExport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "formato",
+                    models.CharField(
+                        choices=[("xlsx", "Excel"), ("pdf", "PDF")], max_length=4
+                    ),
+                ),
+                ("fecha_desde", models.DateField()),
+                ("fecha_hasta", models.DateField()),
+                (
+                    "version_datos",
+                    models.PositiveIntegerField(
+                        help_text="Versión de los datos de la sucursal al pedirlo (analytics/cache.py)"
+                    ),
+                ),
+                (
+                    "estado",
+                    models.CharField(
+                        choices=[
+                            ("PENDIENTE", "Pendiente"),
+                            ("PROCESANDO", "Procesando"),
+                            ("LISTO", "Listo"),
+                            ("ERROR", "Error"),
+                        ],
+                        default="PENDIENTE",
+                        max_length=10,
+                    ),
+                ),
+                ("progreso", models.PositiveSmallIntegerField(default=0)),
+                ("archivo", models.FileField(blank=True, upload_to="reportes/%Y/%m/")),
+                ("error", models.TextField(blank=True)),
+                ("creado_en", models.DateTimeField(auto_now_add=True)),
+                ("iniciado_en", models.DateTimeField(blank=True, null=True)),
+                ("terminado_en", models.DateTimeField(blank=True, null=True)),
+                (
+                    "solicitado_por",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="reportes_export",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "sucursal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reportes_export",
+                        to="empleados.sucursal",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Reporte Exportado",
+                "verbose_name_plural": "Reportes Exportados",
+                "ordering": ["-creado_en"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="reporteexport",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("estado", "ERROR"), _negated=True),
+                fields=(
+                    "sucursal",
+                    "formato",
+                    "fecha_desde",
+                    "fecha_hasta",
+                    "version_datos",
+                ),
+                name="reporte_export_unico",
+            ),
+        ),
+    ]
@@ -1,4 +1,219 @@
 from django.db import models
 
-# Analytics no requiere modelos propios - usa queries agregadas sobre otros modelos
-# Este archivo se deja vacío intencionalmente
+from apps.clientes.models import Cliente
+from apps.empleados.models import CentroEstetica, Sucursal, Usuario
+
+# Analytics trabaja con queries agregadas sobre los modelos de las otras apps.
+# Los modelos de acá son solo resúmenes materializados de esas queries: se
+# pueden reconstruir enteros desde los datos de origen en cualquier momento.
+
+
+class ClienteMetricas(models.Model):
+    """
+    Métricas por cliente precalculadas (LTV, visitas, frecuencia)
+
+    Se actualiza por cliente desde las señales de Turno y Transaction
+    (ver analytics/signals.py) y se reconstruye completa con
+    ``python manage.py recalcular_metricas_clientes``.
+    """
+    cliente = models.OneToOneField(
+        Cliente,
+        on_delete=models.CASCADE,
+        related_name='metricas'
+    )
+
+    ltv = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text="Total gastado en servicios y productos"
+    )
+    visitas_completadas = models.PositiveIntegerField(default=0)
+    primera_visita = models.DateTimeField(null=True, blank=True)
+    ultima_visita = models.DateTimeField(null=True, blank=True)
+    frecuencia_promedio_dias = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Promedio de días entre visitas completadas (ignora visitas del mismo día)"
+    )
+
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Métricas de Cliente'
+        verbose_name_plural = 'Métricas de Clientes'
+        indexes = [
+            models.Index(fields=['-ltv']),
+        ]
+
+    def __str__(self):
+        return f"Métricas de {self.cliente}"
+
+
+class ResumenDiario(models.Model):
+    """
+    Totales de un día de una sucursal: ingresos por tipo, egresos y turnos por
+    estado. Los rangos de los dashboards suman estas filas en vez de agregar
+    las transacciones y turnos crudos.
+
+    Se recalcula por día desde las señales de Transaction y Turno (ver
+    analytics/rollups.py) y se reconstruye con
+    ``python manage.py recalcular_resumenes_diarios``.
+    """
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name='resumenes_diarios'
+    )
+    fecha = models.DateField()
+
+    # Transacciones
+    ingresos_servicios = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ingresos_productos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ingresos_otros = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad_ingresos = models.PositiveIntegerField(default=0)
+    egresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad_egresos = models.PositiveIntegerField(default=0)
+
+    # Turnos (por fecha local de inicio)
+    turnos_pendientes = models.PositiveIntegerField(default=0)
+    turnos_confirmados = models.PositiveIntegerField(default=0)
+    turnos_completados = models.PositiveIntegerField(default=0)
+    turnos_cancelados = models.PositiveIntegerField(default=0)
+    turnos_no_show = models.PositiveIntegerField(default=0)
+    monto_turnos_completados = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        help_text="Suma de monto_total de los turnos completados"
+    )
+
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Resumen Diario'
+        verbose_name_plural = 'Resúmenes Diarios'
+        constraints = [
+            models.UniqueConstraint(fields=['sucursal', 'fecha'], name='resumen_diario_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.sucursal} - {self.fecha}"
+
+
+class ResumenDiarioMedioPago(models.Model):
+    """
+    Ingresos de un día de una sucursal por método de pago
+    """
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name='resumenes_medio_pago'
+    )
+    fecha = models.DateField()
+    medio_pago = models.CharField(max_length=20)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Resumen Diario por Medio de Pago'
+        verbose_name_plural = 'Resúmenes Diarios por Medio de Pago'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sucursal', 'fecha', 'medio_pago'], name='resumen_medio_pago_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.sucursal} - {self.fecha} - {self.medio_pago}"
+
+
+class ResumenDiarioClientes(models.Model):
+    """
+    Altas de clientes de un día. Los clientes son del centro, no de una
+    sucursal, así que este resumen va por centro.
+    """
+    centro_estetica = models.ForeignKey(
+        CentroEstetica,
+        on_delete=models.CASCADE,
+        related_name='resumenes_clientes'
+    )
+    fecha = models.DateField()
+    clientes_nuevos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Resumen Diario de Clientes'
+        verbose_name_plural = 'Resúmenes Diarios de Clientes'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['centro_estetica', 'fecha'], name='resumen_clientes_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.centro_estetica} - {self.fecha}"
+
+
+class ReporteExport(models.Model):
+    """
+    Generación de un reporte Excel/PDF fuera del request (ver analytics/reports.py).
+
+    Pedidos idénticos (sucursal, formato, rango) con la misma versión de datos
+    de la sucursal comparten el mismo trabajo y el mismo archivo.
+    """
+
+    class Formato(models.TextChoices):
+        EXCEL = 'xlsx', 'Excel'
+        PDF = 'pdf', 'PDF'
+
+    class Estado(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', 'Pendiente'
+        PROCESANDO = 'PROCESANDO', 'Procesando'
+        LISTO = 'LISTO', 'Listo'
+        ERROR = 'ERROR', 'Error'
+
+    sucursal = models.ForeignKey(
+        Sucursal,
+        on_delete=models.CASCADE,
+        related_name='reportes_export'
+    )
+    solicitado_por = models.ForeignKey(
+        Usuario,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reportes_export'
+    )
+    formato = models.CharField(max_length=4, choices=Formato.choices)
+    fecha_desde = models.DateField()
+    fecha_hasta = models.DateField()
+    version_datos = models.PositiveIntegerField(
+        help_text="Versión de los datos de la sucursal al pedirlo (analytics/cache.py)"
+    )
+
+    estado = models.CharField(max_length=10, choices=Estado.choices, default=Estado.PENDIENTE)
+    progreso = models.PositiveSmallIntegerField(default=0)
+    # Storage por defecto (disco privado): el reporte tiene datos financieros y de clientes
+    archivo = models.FileField(upload_to='reportes/%Y/%m/', blank=True)
+    error = models.TextField(blank=True)
+
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    terminado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Reporte Exportado'
+        verbose_name_plural = 'Reportes Exportados'
+        ordering = ['-creado_en']
+        constraints = [
+            # Un solo trabajo vivo por pedido y versión de datos: dos POST
+            # simultáneos no pueden generar el mismo archivo dos veces
+            models.UniqueConstraint(
+                fields=['sucursal', 'formato', 'fecha_desde', 'fecha_hasta', 'version_datos'],
+                condition=~models.Q(estado='ERROR'),
+                name='reporte_export_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_formato_display()} {self.sucursal} {self.fecha_desde} - {self.fecha_hasta}"
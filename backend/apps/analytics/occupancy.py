@@ -0,0 +1,248 @@
+"""
+Motor de ocupación de la agenda
+Arma la grilla día de semana × hora con una sola consulta agrupada sobre los
+turnos (en hora local) y la compara contra la capacidad real de los
+profesionales en el período: su horario laboral, sus días laborales y la
+granularidad de su agenda.
+
+La ocupación se mide en minutos: minutos de turnos dentro de la celda sobre
+minutos reservables de los profesionales en esa celda. Un turno que cruza la
+hora reparte sus minutos entre las celdas que ocupa; la cantidad de turnos se
+cuenta en la hora en que empieza.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, ExtractMinute
+
+from apps.empleados.models import Usuario
+from apps.turnos.models import Turno
+from apps.turnos.services import DIAS_SEMANA, horario_laboral
+
+
+# Día ISO (1 = lunes) → nombre que usa el frontend. El orden de salida arranca
+# en domingo, como siempre devolvió la API.
+DAY_NAMES = {
+    1: 'Monday', 2: 'Tuesday', 3: 'Wednesday', 4: 'Thursday',
+    5: 'Friday', 6: 'Saturday', 7: 'Sunday',
+}
+OUTPUT_DAY_ORDER = [7, 1, 2, 3, 4, 5, 6]
+
+TIME_SLOTS = {
+    'morning': (6, 12),
+    'afternoon': (12, 18),
+    'evening': (18, 24),
+}
+
+GRANULARITIES = ['slot', 'hour']
+
+HEATMAP_STATES = [Turno.Estado.COMPLETADO, Turno.Estado.CONFIRMADO]
+
+
+def _minutes(duration):
+    return duration.total_seconds() / 60 if duration else 0
+
+
+def _spread(weekday, hour, minute, minutes):
+    """
+    Reparte los minutos de un turno que empieza a las ``hour:minute`` entre
+    las celdas (día ISO, hora) que ocupa; pasada la medianoche sigue en el día
+    siguiente.
+    """
+    offset = minute
+    while minutes > 0:
+        tramo = min(60 - offset, minutes)
+        yield (weekday, hour), tramo
+        minutes -= tramo
+        offset = 0
+        hour += 1
+        if hour == 24:
+            hour, weekday = 0, weekday % 7 + 1
+
+
+def booked_by_cell(sucursal_id, start_date, end_date):
+    """
+    Turnos por (día ISO, hora) en una sola consulta agrupada:
+    {(weekday, hour): {'count', 'minutes', 'completed', 'completed_minutes'}}
+
+    Se agrupa por hora y minuto de inicio y duración (pocas combinaciones: las
+    marca la agenda) y los minutos de cada grupo se reparten entre las horas
+    que cubre. ``count`` y ``completed`` cuentan en la hora de inicio.
+
+    ExtractIsoWeekDay / ExtractHour usan la zona horaria activa, así que las
+    celdas quedan en hora local.
+    """
+    turnos_qs = Turno.objects.filter(
+        fecha_hora_inicio__date__gte=start_date,
+        fecha_hora_inicio__date__lte=end_date,
+        estado__in=HEATMAP_STATES
+    )
+    if sucursal_id:
+        turnos_qs = turnos_qs.filter(sucursal_id=sucursal_id)
+
+    rows = turnos_qs.order_by().annotate(
+        weekday=ExtractIsoWeekDay('fecha_hora_inicio'),
+        hour=ExtractHour('fecha_hora_inicio'),
+        minute=ExtractMinute('fecha_hora_inicio'),
+        duration=ExpressionWrapper(
+            F('fecha_hora_fin') - F('fecha_hora_inicio'), output_field=DurationField()
+        )
+    ).values('weekday', 'hour', 'minute', 'duration').annotate(
+        count=Count('id'),
+        completed=Count('id', filter=Q(estado=Turno.Estado.COMPLETADO))
+    )
+
+    cells = defaultdict(lambda: {'count': 0, 'minutes': 0, 'completed': 0, 'completed_minutes': 0})
+    for row in rows:
+        start = cells[(row['weekday'], row['hour'])]
+        start['count'] += row['count']
+        start['completed'] += row['completed']
+        for key, minutes in _spread(row['weekday'], row['hour'], row['minute'],
+                                    _minutes(row['duration'])):
+            cells[key]['minutes'] += minutes * row['count']
+            cells[key]['completed_minutes'] += minutes * row['completed']
+    return dict(cells)
+
+
+def _weekday_occurrences(start_date, end_date):
+    """Cuántas veces aparece cada día ISO en el período"""
+    occurrences = defaultdict(int)
+    day = start_date
+    while day <= end_date:
+        occurrences[day.isoweekday()] += 1
+        day += timedelta(days=1)
+    return occurrences
+
+
+def _bookable_minutes_by_hour(profesional):
+    """
+    Minutos reservables por hora del día en una jornada del profesional.
+
+    La agenda ofrece turnos cada ``intervalo_minutos`` desde el inicio de la
+    jornada; el resto que no completa un intervalo al final no es reservable.
+    """
+    inicio, fin = horario_laboral(profesional)
+    intervalo = profesional.intervalo_minutos or 30
+
+    apertura = datetime.combine(datetime.min.date(), inicio)
+    cierre = datetime.combine(datetime.min.date(), fin)
+    jornada = int((cierre - apertura).total_seconds() // 60)
+    if jornada <= 0:
+        return {}
+    cierre = apertura + timedelta(minutes=jornada - jornada % intervalo)
+
+    by_hour = defaultdict(float)
+    cursor = apertura
+    while cursor < cierre:
+        next_hour = cursor.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        tramo_fin = min(next_hour, cierre)
+        by_hour[cursor.hour] += (tramo_fin - cursor).total_seconds() / 60
+        cursor = tramo_fin
+    return by_hour
+
+
+def professionals_for_branch(sucursal_id=None):
+    profesionales = Usuario.objects.filter(activo=True)
+    if sucursal_id:
+        return profesionales.filter(sucursal_id=sucursal_id)
+    return profesionales.filter(sucursal__isnull=False)
+
+
+def capacity_by_cell(sucursal_id, start_date, end_date):
+    """
+    Minutos reservables por (día ISO, hora) sumando a todos los profesionales
+    activos de la sucursal en cada día del período en que trabajan.
+
+    Sin días laborales cargados se asume que trabaja todos los días, y sin
+    horario se usa el horario por defecto de la agenda (igual que turnos.services).
+    """
+    occurrences = _weekday_occurrences(start_date, end_date)
+    capacity = defaultdict(float)
+
+    profesionales = professionals_for_branch(sucursal_id).only(
+        'id', 'horario_inicio', 'horario_fin', 'dias_laborales', 'intervalo_minutos'
+    )
+    for profesional in profesionales:
+        by_hour = _bookable_minutes_by_hour(profesional)
+        for weekday, times in occurrences.items():
+            if profesional.dias_laborales and DIAS_SEMANA[weekday - 1] not in profesional.dias_laborales:
+                continue
+            for hour, minutes in by_hour.items():
+                capacity[(weekday, hour)] += minutes * times
+
+    return capacity
+
+
+def occupancy_percentage(booked_minutes, capacity_minutes):
+    """Porcentaje de ocupación con tope en 100"""
+    if capacity_minutes <= 0:
+        return 100.0 if booked_minutes > 0 else 0.0
+    return round(min(booked_minutes / capacity_minutes * 100, 100), 1)
+
+
+class OccupancyGrid:
+    """
+    Grilla de ocupación de un período: turnos y capacidad por celda
+    (día ISO, hora). Se calcula una vez y se puede leer por día o por franja.
+    """
+
+    def __init__(self, sucursal_id, start_date, end_date):
+        self.booked = booked_by_cell(sucursal_id, start_date, end_date)
+        self.capacity = capacity_by_cell(sucursal_id, start_date, end_date)
+
+    def _sum(self, weekday, hours, key):
+        booked = sum(self.booked.get((weekday, h), {}).get(key, 0) for h in hours)
+        capacity = sum(self.capacity.get((weekday, h), 0) for h in hours)
+        return booked, capacity
+
+    def by_weekday(self):
+        """
+        Turnos completados y ocupación por día de la semana
+        """
+        result = []
+        for weekday in OUTPUT_DAY_ORDER:
+            count, _ = self._sum(weekday, range(24), 'completed')
+            minutes, capacity = self._sum(weekday, range(24), 'completed_minutes')
+            result.append({
+                'day': DAY_NAMES[weekday],
+                'count': count,
+                'occupancy_percentage': occupancy_percentage(minutes, capacity)
+            })
+        return result
+
+    def heatmap(self, granularity='slot'):
+        """
+        Ocupación (completados + confirmados) por día y franja horaria.
+
+        - ``slot``: franjas fijas morning / afternoon / evening
+        - ``hour``: una celda por hora, para las horas con capacidad o con turnos
+        """
+        if granularity == 'hour':
+            hours = sorted({h for _, h in self.capacity} | {h for _, h in self.booked})
+            return [
+                {
+                    'day': DAY_NAMES[weekday],
+                    'hours': [self._hour_cell(weekday, hour) for hour in hours]
+                }
+                for weekday in OUTPUT_DAY_ORDER
+            ]
+
+        result = []
+        for weekday in OUTPUT_DAY_ORDER:
+            day_data = {'day': DAY_NAMES[weekday]}
+            for slot_name, (start_hour, end_hour) in TIME_SLOTS.items():
+                minutes, capacity = self._sum(weekday, range(start_hour, end_hour), 'minutes')
+                day_data[slot_name] = occupancy_percentage(minutes, capacity)
+            result.append(day_data)
+        return result
+
+    def _hour_cell(self, weekday, hour):
+        cell = self.booked.get((weekday, hour), {})
+        return {
+            'hour': hour,
+            'count': cell.get('count', 0),
+            'occupancy_percentage': occupancy_percentage(
+                cell.get('minutes', 0), self.capacity.get((weekday, hour), 0)
+            )
+        }
@@ -0,0 +1,178 @@
+"""
+Datos de los reportes exportables
+Un ReportDataset junta lo que muestran los tres formatos (CSV, Excel, PDF) de
+un período: cada sección se consulta una sola vez, la primera vez que un
+formato la pide, y el detalle de transacciones se recorre en streaming.
+
+Los totales, ingresos diarios y medios de pago salen de los resúmenes diarios
+(analytics/rollups.py); los rankings, de consultas agregadas acotadas.
+"""
+from functools import cached_property
+
+from django.db.models import Count, FloatField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from apps.clientes.models import Cliente
+from apps.finanzas.models import Transaction
+from apps.inventario.models import Producto
+from apps.turnos.models import Turno
+
+from . import rollups
+
+# Filas por viaje al servidor al recorrer el detalle de transacciones
+EXPORT_CHUNK_SIZE = 2000
+
+TOP_LIMIT = 20
+
+PAYMENT_METHOD_LABELS = {
+    'CASH': 'Efectivo',
+    'BANK_TRANSFER': 'Transferencia',
+    'DEBIT_CARD': 'Débito',
+    'CREDIT_CARD': 'Crédito',
+    'MERCADOPAGO': 'Mercado Pago',
+    'OTHER': 'Otro'
+}
+
+TRANSACTION_TYPE_LABELS = dict(Transaction.TransactionType.choices)
+
+
+class ReportDataset:
+    """
+    Secciones del reporte de una sucursal en un período. Las propiedades son
+    listas chicas y se calculan una vez; ``transactions()`` es un generador.
+    """
+
+    def __init__(self, sucursal, start_date, end_date):
+        self.sucursal = sucursal
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def _daily_rows(self):
+        return rollups.daily_rows(self.sucursal.id, self.start_date, self.end_date)
+
+    @cached_property
+    def kpis(self):
+        """
+        Ingresos, gastos, ganancia, citas completadas y clientes nuevos
+        """
+        totales = self._daily_rows().aggregate(
+            ingresos=Sum(rollups.INCOME_TOTAL),
+            gastos=Sum('egresos'),
+            turnos=Sum('turnos_completados')
+        )
+        ingresos = totales['ingresos'] or 0
+        gastos = totales['gastos'] or 0
+        return {
+            'ingresos': ingresos,
+            'gastos': gastos,
+            'ganancia': ingresos - gastos,
+            'turnos_completados': totales['turnos'] or 0,
+            'clientes_nuevos': rollups.new_clients(self.sucursal.id, self.start_date, self.end_date),
+        }
+
+    @cached_property
+    def daily_income(self):
+        """[(fecha, total, cantidad)] de los días con ingresos"""
+        return list(
+            self._daily_rows().filter(cantidad_ingresos__gt=0).annotate(
+                total=rollups.INCOME_TOTAL
+            ).order_by('fecha').values_list('fecha', 'total', 'cantidad_ingresos')
+        )
+
+    @cached_property
+    def payment_methods(self):
+        """[(etiqueta, cantidad, total)] de los ingresos, de mayor a menor"""
+        rows = rollups.payment_method_rows(
+            self.sucursal.id, self.start_date, self.end_date
+        ).values('medio_pago').annotate(
+            cantidad=Sum('cantidad'),
+            total=Sum('monto')
+        ).order_by('-total').values_list('medio_pago', 'cantidad', 'total')
+
+        return [
+            (PAYMENT_METHOD_LABELS.get(method, method), cantidad, total)
+            for method, cantidad, total in rows
+        ]
+
+    @cached_property
+    def top_services(self):
+        """[(servicio, cantidad, ingresos)] por turnos completados"""
+        rows = Turno.objects.filter(
+            sucursal=self.sucursal,
+            estado='COMPLETADO',
+            fecha_hora_inicio__date__gte=self.start_date,
+            fecha_hora_inicio__date__lte=self.end_date
+        ).values('servicio__nombre').annotate(
+            cantidad=Count('id'),
+            ingresos=Sum('monto_total')
+        ).order_by('-cantidad').values_list('servicio__nombre', 'cantidad', 'ingresos')[:TOP_LIMIT]
+
+        return [(nombre or 'Sin servicio', cantidad, ingresos or 0) for nombre, cantidad, ingresos in rows]
+
+    @cached_property
+    def top_products(self):
+        """[(producto, stock, precio, valor)] de los productos activos con más stock"""
+        rows = Producto.objects.filter(
+            sucursal=self.sucursal,
+            activo=True
+        ).order_by('-stock_actual').values_list('nombre', 'stock_actual', 'precio_venta')[:TOP_LIMIT]
+
+        return [(nombre, stock, precio, stock * precio) for nombre, stock, precio in rows]
+
+    @cached_property
+    def top_clients(self):
+        """[(cliente, email, teléfono, visitas, ltv)] por LTV en la sucursal"""
+        client_spending = Transaction.objects.filter(
+            client_id=OuterRef('id'),
+            branch=self.sucursal,
+            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT']
+        ).values('client_id').annotate(
+            total_spent=Sum('amount')
+        ).values('total_spent')
+
+        rows = Cliente.objects.filter(
+            centro_estetica=self.sucursal.centro_estetica
+        ).annotate(
+            ltv=Coalesce(Subquery(client_spending, output_field=FloatField()), 0.0),
+            visitas=Count(
+                'turnos',
+                filter=Q(turnos__sucursal=self.sucursal, turnos__estado='COMPLETADO')
+            )
+        ).filter(
+            visitas__gt=0
+        ).order_by('-ltv').values_list(
+            'nombre', 'apellido', 'email', 'telefono', 'visitas', 'ltv'
+        )[:TOP_LIMIT]
+
+        return [
+            (f'{nombre} {apellido}', email or 'N/A', telefono or 'N/A', visitas, ltv)
+            for nombre, apellido, email, telefono, visitas, ltv in rows
+        ]
+
+    def transactions(self, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Una tupla por transacción del período:
+        (fecha, tipo, categoría, descripción, cliente, método de pago, monto).
+        Lee con values_list + iterator: la memoria no depende del rango.
+        """
+        rows = Transaction.objects.filter(
+            branch=self.sucursal,
+            date__gte=self.start_date,
+            date__lte=self.end_date
+        ).order_by('date', 'id').values_list(
+            'date', 'type', 'category__name', 'description',
+            'client__nombre', 'client__apellido', 'payment_method', 'amount'
+        )
+
+        for fecha, tipo, categoria, descripcion, nombre, apellido, medio, monto in rows.iterator(
+            chunk_size=chunk_size
+        ):
+            yield (
+                fecha,
+                TRANSACTION_TYPE_LABELS.get(tipo, tipo),
+                categoria or '',
+                descripcion,
+                f'{nombre} {apellido}' if nombre else '',
+                PAYMENT_METHOD_LABELS.get(medio, medio),
+                monto,
+            )
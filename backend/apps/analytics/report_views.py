@@ -0,0 +1,110 @@
+"""
+Views de los trabajos de exportación de reportes (ver analytics/reports.py)
+"""
+
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import ReporteExport
+from .permissions import IsAdminOrManager
+from .reports import solicitar_reporte
+from .serializers import ReporteExportSerializer
+
+
+class ReportJobListView(APIView):
+    """
+    POST /api/analytics/reports/
+
+    Pide un reporte Excel o PDF. Responde enseguida con el trabajo (202 si es
+    nuevo, 200 si reutiliza uno igual con los mismos datos).
+    Body:
+    - format: 'xlsx' | 'pdf'
+    - start_date: YYYY-MM-DD (default: hace 30 días)
+    - end_date: YYYY-MM-DD (default: hoy)
+    """
+
+    permission_classes = [IsAuthenticated, IsAdminOrManager]
+
+    def post(self, request):
+        formato = request.data.get('format')
+        if formato not in ReporteExport.Formato.values:
+            return Response(
+                {'error': f"format debe ser uno de: {', '.join(ReporteExport.Formato.values)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        start_date_str = request.data.get('start_date')
+        end_date_str = request.data.get('end_date')
+        if not start_date_str or not end_date_str:
+            end_date = datetime.now().date()
+            start_date = end_date - relativedelta(days=30)
+        else:
+            try:
+                start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+                end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+            except ValueError:
+                return Response(
+                    {'error': 'Formato de fecha inválido. Use YYYY-MM-DD'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        if start_date > end_date:
+            return Response(
+                {'error': 'start_date debe ser anterior a end_date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        reporte, reutilizado = solicitar_reporte(
+            request.user.sucursal, formato, start_date, end_date, usuario=request.user
+        )
+        # Sin worker el archivo ya se generó al confirmar: devolver el estado real
+        reporte.refresh_from_db()
+
+        return Response(
+            ReporteExportSerializer(reporte, context={'request': request}).data,
+            status=status.HTTP_200_OK if reutilizado else status.HTTP_202_ACCEPTED
+        )
+
+
+class ReportJobDetailView(APIView):
+    """
+    GET /api/analytics/reports/{id}/
+
+    Estado y progreso del trabajo; incluye download_url cuando está listo
+    """
+
+    permission_classes = [IsAuthenticated, IsAdminOrManager]
+
+    def get(self, request, pk):
+        reporte = get_object_or_404(ReporteExport, pk=pk, sucursal=request.user.sucursal)
+        return Response(ReporteExportSerializer(reporte, context={'request': request}).data)
+
+
+class ReportJobDownloadView(APIView):
+    """
+    GET /api/analytics/reports/{id}/download/
+
+    Descarga el archivo generado
+    """
+
+    permission_classes = [IsAuthenticated, IsAdminOrManager]
+
+    def get(self, request, pk):
+        reporte = get_object_or_404(ReporteExport, pk=pk, sucursal=request.user.sucursal)
+        if reporte.estado != ReporteExport.Estado.LISTO:
+            return Response(
+                {'error': 'El reporte todavía no está listo', 'estado': reporte.estado},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return FileResponse(
+            reporte.archivo.open('rb'),
+            as_attachment=True,
+            filename=f'analytics_{reporte.fecha_desde}_{reporte.fecha_hasta}.{reporte.formato}'
+        )
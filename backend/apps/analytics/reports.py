@@ -0,0 +1,182 @@
+"""
+Trabajos de exportación de reportes (Excel / PDF)
+El POST crea un ReporteExport y lo encola en Celery; el archivo se genera
+fuera del request, se guarda en el storage y el cliente consulta el estado
+hasta que tiene la URL de descarga.
+
+Sin worker de Celery (REPORTES_EN_CELERY=False, como hoy en producción) o si
+el broker no responde, el mismo runner corre en el proceso web: el POST tarda
+lo que tarda el archivo pero el resto del flujo es idéntico.
+
+Pedidos iguales (sucursal, formato, rango) comparten trabajo mientras la
+versión de datos de la sucursal (la misma que invalida el caché de analytics)
+no cambie. Cuando la versión nueva queda lista, las anteriores terminadas del
+mismo pedido se borran con su archivo.
+"""
+import logging
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .cache import get_version
+from .export_views import render_excel, render_pdf
+from .models import ReporteExport
+
+logger = logging.getLogger(__name__)
+
+RENDERERS = {
+    ReporteExport.Formato.EXCEL: render_excel,
+    ReporteExport.Formato.PDF: render_pdf,
+}
+
+# Un archivo listo se reutiliza a lo sumo este tiempo aunque la versión no
+# cambie: las versiones viven en el caché y vuelven a cero si se pierden
+REUSO_MAXIMO = timedelta(hours=24)
+
+# Un trabajo que lleva más que esto esperando (o generándose, contado desde
+# que un runner lo tomó) se da por perdido (worker caído)
+TRABAJO_COLGADO = timedelta(minutes=30)
+
+
+def _vigente(reporte, ahora):
+    if reporte.estado == ReporteExport.Estado.LISTO:
+        return reporte.creado_en >= ahora - REUSO_MAXIMO
+    if reporte.estado == ReporteExport.Estado.PROCESANDO and reporte.iniciado_en:
+        return reporte.iniciado_en >= ahora - TRABAJO_COLGADO
+    return reporte.creado_en >= ahora - TRABAJO_COLGADO
+
+
+def _descartar(reporte):
+    """
+    Borra el trabajo solo si sigue como se leyó: si un runner lo tomó o lo
+    terminó en el medio, queda. Devuelve si se borró.
+    """
+    borrados, _ = ReporteExport.objects.filter(
+        pk=reporte.pk, estado=reporte.estado, iniciado_en=reporte.iniciado_en
+    ).delete()
+    if borrados and reporte.archivo:
+        reporte.archivo.delete(save=False)
+    return bool(borrados)
+
+
+def _descartar_reemplazados(reporte):
+    """
+    Borra los trabajos terminados del mismo pedido anteriores a ``reporte``.
+    Los que siguen en curso se dejan: su runner todavía los va a guardar.
+    """
+    reemplazados = ReporteExport.objects.filter(
+        sucursal_id=reporte.sucursal_id,
+        formato=reporte.formato,
+        fecha_desde=reporte.fecha_desde,
+        fecha_hasta=reporte.fecha_hasta,
+        estado__in=[ReporteExport.Estado.LISTO, ReporteExport.Estado.ERROR],
+        creado_en__lt=reporte.creado_en,
+    )
+    for viejo in reemplazados:
+        _descartar(viejo)
+
+
+def solicitar_reporte(sucursal, formato, fecha_desde, fecha_hasta, usuario=None):
+    """
+    Devuelve ``(reporte, reutilizado)``. Si no hay un trabajo vigente para el
+    mismo pedido y versión de datos, crea uno y lo despacha al confirmar la
+    transacción.
+    """
+    clave = {
+        'sucursal': sucursal,
+        'formato': formato,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+        'version_datos': get_version(sucursal.id),
+    }
+    existente = ReporteExport.objects.filter(**clave).exclude(
+        estado=ReporteExport.Estado.ERROR
+    ).first()
+
+    if existente:
+        if _vigente(existente, timezone.now()):
+            return existente, True
+        _descartar(existente)
+
+    try:
+        with transaction.atomic():
+            reporte = ReporteExport.objects.create(solicitado_por=usuario, **clave)
+    except IntegrityError:
+        # Otro request creó el mismo trabajo entre la consulta y el insert
+        return ReporteExport.objects.exclude(estado=ReporteExport.Estado.ERROR).get(**clave), True
+
+    transaction.on_commit(partial(despachar, reporte.id))
+    return reporte, False
+
+
+def despachar(reporte_id):
+    """
+    Encola la generación en Celery o, sin worker, la corre acá mismo
+    """
+    if settings.REPORTES_EN_CELERY:
+        from .tasks import generar_reporte_task
+
+        try:
+            generar_reporte_task.delay(reporte_id)
+            return
+        except Exception:
+            logger.warning('No se pudo encolar el reporte %s; se genera en el proceso web',
+                           reporte_id, exc_info=True)
+    generar_reporte(reporte_id)
+
+
+def _set_progreso(reporte_id, valor):
+    ReporteExport.objects.filter(pk=reporte_id).update(progreso=valor)
+
+
+def generar_reporte(reporte_id):
+    """
+    Genera el archivo de un trabajo pendiente. El paso a PROCESANDO es un
+    UPDATE condicional: si dos runners reciben el mismo trabajo, solo uno lo
+    genera. El resultado se guarda con otro, por si el trabajo se dio por
+    colgado y se borró mientras tanto: entonces el archivo se descarta.
+    Devuelve el estado final (o None si el trabajo no estaba pendiente o ya
+    no existe).
+    """
+    tomado = ReporteExport.objects.filter(
+        pk=reporte_id, estado=ReporteExport.Estado.PENDIENTE
+    ).update(estado=ReporteExport.Estado.PROCESANDO, iniciado_en=timezone.now(), progreso=5)
+    if not tomado:
+        return None
+
+    reporte = ReporteExport.objects.select_related('sucursal__centro_estetica').get(pk=reporte_id)
+    try:
+        contenido = RENDERERS[reporte.formato](
+            reporte.sucursal, reporte.fecha_desde, reporte.fecha_hasta,
+            progress=partial(_set_progreso, reporte_id)
+        )
+        nombre = f'analytics_{reporte.fecha_desde}_{reporte.fecha_hasta}.{reporte.formato}'
+        reporte.archivo.save(nombre, ContentFile(contenido), save=False)
+    except Exception as exc:
+        logger.exception('Falló la generación del reporte %s', reporte_id)
+        reporte.estado = ReporteExport.Estado.ERROR
+        reporte.error = str(exc)[:500]
+    else:
+        reporte.estado = ReporteExport.Estado.LISTO
+        reporte.progreso = 100
+
+    reporte.terminado_en = timezone.now()
+    guardado = ReporteExport.objects.filter(
+        pk=reporte_id, estado=ReporteExport.Estado.PROCESANDO
+    ).update(
+        estado=reporte.estado, progreso=reporte.progreso, archivo=reporte.archivo.name or '',
+        error=reporte.error, terminado_en=reporte.terminado_en,
+    )
+    if not guardado:
+        logger.info('El reporte %s se reemplazó mientras se generaba; se descarta el archivo',
+                    reporte_id)
+        if reporte.archivo:
+            reporte.archivo.delete(save=False)
+        return None
+    if reporte.estado == ReporteExport.Estado.LISTO:
+        _descartar_reemplazados(reporte)
+    return reporte.estado
@@ -0,0 +1,320 @@
+"""
+Resúmenes diarios (rollups) de analytics
+Mantiene ResumenDiario, ResumenDiarioMedioPago y ResumenDiarioClientes: cada
+escritura recalcula solo el día afectado (unas pocas agregaciones sobre las
+filas de ese día) y el comando ``recalcular_resumenes_diarios`` los reconstruye
+por rango con consultas agrupadas.
+
+El recálculo corre después del commit de quien escribió y con la fila del día
+bloqueada: dos transacciones que tocan el mismo día no se pisan, la segunda
+agrega viendo lo que la primera ya confirmó.
+
+Las lecturas de rangos (dashboard, evolución de ingresos, tendencias) suman a
+lo sumo una fila por sucursal y día.
+"""
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .cache import bump_branch_version
+
+INCOME_TYPES = ['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
+
+TRANSACTION_FIELDS = [
+    'ingresos_servicios', 'ingresos_productos', 'ingresos_otros',
+    'cantidad_ingresos', 'egresos', 'cantidad_egresos',
+]
+
+TURNO_FIELDS = [
+    'turnos_pendientes', 'turnos_confirmados', 'turnos_completados',
+    'turnos_cancelados', 'turnos_no_show', 'monto_turnos_completados',
+]
+
+# Expresiones para sumar sobre ResumenDiario
+INCOME_TOTAL = F('ingresos_servicios') + F('ingresos_productos') + F('ingresos_otros')
+TURNOS_TOTAL = (
+    F('turnos_pendientes') + F('turnos_confirmados') + F('turnos_completados')
+    + F('turnos_cancelados') + F('turnos_no_show')
+)
+
+
+def _model(registry, app_label, model_name):
+    return (registry or django_apps).get_model(app_label, model_name)
+
+
+def _transaction_aggregates():
+    return {
+        'ingresos_servicios': Sum('amount', filter=Q(type='INCOME_SERVICE')),
+        'ingresos_productos': Sum('amount', filter=Q(type='INCOME_PRODUCT')),
+        'ingresos_otros': Sum('amount', filter=Q(type='INCOME_OTHER')),
+        'cantidad_ingresos': Count('id', filter=Q(type__in=INCOME_TYPES)),
+        'egresos': Sum('amount', filter=Q(type='EXPENSE')),
+        'cantidad_egresos': Count('id', filter=Q(type='EXPENSE')),
+    }
+
+
+def _turno_aggregates():
+    return {
+        'turnos_pendientes': Count('id', filter=Q(estado='PENDIENTE')),
+        'turnos_confirmados': Count('id', filter=Q(estado='CONFIRMADO')),
+        'turnos_completados': Count('id', filter=Q(estado='COMPLETADO')),
+        'turnos_cancelados': Count('id', filter=Q(estado='CANCELADO')),
+        'turnos_no_show': Count('id', filter=Q(estado='NO_SHOW')),
+        'monto_turnos_completados': Sum('monto_total', filter=Q(estado='COMPLETADO')),
+    }
+
+
+def _values(row, fields):
+    return {field: row.get(field) or 0 for field in fields}
+
+
+def local_date(value):
+    return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+
+
+# ---------------------------------------------------------------- #
+# Recalculo de un día (desde las señales)
+# ---------------------------------------------------------------- #
+
+def _lock_day(model, **day):
+    """
+    Crea la fila del día si falta y la bloquea hasta el fin de la transacción:
+    los recálculos del mismo día se hacen de a uno, y cada uno agrega después de
+    que el anterior confirmó.
+    """
+    model.objects.get_or_create(**day)
+    list(model.objects.select_for_update().filter(**day).values_list('pk', flat=True))
+
+
+def _upsert_daily(sucursal_id, fecha, fields, values):
+    ResumenDiario = _model(None, 'analytics', 'ResumenDiario')
+    ResumenDiario.objects.bulk_create(
+        [ResumenDiario(sucursal_id=sucursal_id, fecha=fecha, actualizado_en=timezone.now(), **values)],
+        update_conflicts=True,
+        unique_fields=['sucursal', 'fecha'],
+        update_fields=fields + ['actualizado_en'],
+    )
+
+
+def refresh_transactions_day(sucursal_id, fecha):
+    """
+    Recalcula los totales de transacciones y los medios de pago de un día
+    """
+    Transaction = _model(None, 'finanzas', 'Transaction')
+    ResumenDiario = _model(None, 'analytics', 'ResumenDiario')
+    ResumenDiarioMedioPago = _model(None, 'analytics', 'ResumenDiarioMedioPago')
+
+    day_qs = Transaction.objects.filter(branch_id=sucursal_id, date=fecha).order_by()
+
+    with transaction.atomic():
+        _lock_day(ResumenDiario, sucursal_id=sucursal_id, fecha=fecha)
+        totals = day_qs.aggregate(**_transaction_aggregates())
+        _upsert_daily(sucursal_id, fecha, TRANSACTION_FIELDS, _values(totals, TRANSACTION_FIELDS))
+
+        ResumenDiarioMedioPago.objects.filter(sucursal_id=sucursal_id, fecha=fecha).delete()
+        ResumenDiarioMedioPago.objects.bulk_create(
+            ResumenDiarioMedioPago(
+                sucursal_id=sucursal_id, fecha=fecha, medio_pago=row['payment_method'],
+                monto=row['monto'] or 0, cantidad=row['cantidad']
+            )
+            for row in day_qs.filter(type__in=INCOME_TYPES).values('payment_method').annotate(
+                monto=Sum('amount'), cantidad=Count('id')
+            )
+        )
+    # El caché de la sucursal se invalidó al escribir; lo que se haya cacheado
+    # antes de este recálculo leyó el resumen viejo
+    bump_branch_version(sucursal_id)
+
+
+def refresh_turnos_day(sucursal_id, fecha):
+    """
+    Recalcula los turnos por estado de un día (fecha local de inicio)
+    """
+    Turno = _model(None, 'turnos', 'Turno')
+    ResumenDiario = _model(None, 'analytics', 'ResumenDiario')
+
+    with transaction.atomic():
+        _lock_day(ResumenDiario, sucursal_id=sucursal_id, fecha=fecha)
+        totals = Turno.objects.filter(
+            sucursal_id=sucursal_id, fecha_hora_inicio__date=fecha
+        ).order_by().aggregate(**_turno_aggregates())
+        _upsert_daily(sucursal_id, fecha, TURNO_FIELDS, _values(totals, TURNO_FIELDS))
+    bump_branch_version(sucursal_id)
+
+
+def refresh_clients_day(centro_id, fecha):
+    """
+    Recalcula las altas de clientes de un día de un centro
+    """
+    Cliente = _model(None, 'clientes', 'Cliente')
+    ResumenDiarioClientes = _model(None, 'analytics', 'ResumenDiarioClientes')
+
+    with transaction.atomic():
+        _lock_day(ResumenDiarioClientes, centro_estetica_id=centro_id, fecha=fecha)
+        nuevos = Cliente.objects.filter(centro_estetica_id=centro_id, creado_en__date=fecha).count()
+        ResumenDiarioClientes.objects.filter(
+            centro_estetica_id=centro_id, fecha=fecha
+        ).update(clientes_nuevos=nuevos)
+
+
+def transaction_day(instance):
+    return (instance.branch_id, instance.date)
+
+
+def turno_day(instance):
+    inicio = instance.fecha_hora_inicio
+    return (instance.sucursal_id, local_date(inicio) if inicio else None)
+
+
+def refresh_after_commit(refresh, owner_model, day):
+    """
+    Recalcula el día después del commit de la escritura, cuando sus filas ya
+    son visibles para cualquier otra transacción que recalcule el mismo día.
+    Solo si la sucursal (o el centro) sigue existiendo: en un borrado en cascada
+    el resumen ya se borró y no debe recrearse.
+    """
+    owner_id, fecha = day
+    if not (owner_id and fecha):
+        return
+
+    def run():
+        if owner_model.objects.filter(pk=owner_id).exists():
+            refresh(owner_id, fecha)
+
+    transaction.on_commit(run)
+
+
+def refresh_days(refresh, owner_model, previous, current):
+    """
+    Recalcula (después del commit) el día actual de la instancia y, si se movió
+    de sucursal o de fecha, también el día donde estaba antes
+    """
+    for day in {previous, current}:
+        refresh_after_commit(refresh, owner_model, day)
+
+
+# ---------------------------------------------------------------- #
+# Reconstrucción por rango (comando / migración)
+# ---------------------------------------------------------------- #
+
+def _in_range(qs, field, desde, hasta):
+    if desde:
+        qs = qs.filter(**{f'{field}__gte': desde})
+    if hasta:
+        qs = qs.filter(**{f'{field}__lte': hasta})
+    return qs
+
+
+def rebuild_rollups(sucursal_id=None, desde=None, hasta=None, batch_size=1000, registry=None):
+    """
+    Reconstruye los resúmenes diarios de un rango (o de todo el historial) con
+    una consulta agrupada por tabla. Borra los resúmenes del rango antes de
+    escribir, así también repara días que ya no tienen datos.
+
+    ``registry`` permite usarla desde una migración con los modelos históricos.
+    Devuelve la cantidad de filas escritas por tabla.
+    """
+    Transaction = _model(registry, 'finanzas', 'Transaction')
+    Turno = _model(registry, 'turnos', 'Turno')
+    Cliente = _model(registry, 'clientes', 'Cliente')
+    Sucursal = _model(registry, 'empleados', 'Sucursal')
+    ResumenDiario = _model(registry, 'analytics', 'ResumenDiario')
+    ResumenDiarioMedioPago = _model(registry, 'analytics', 'ResumenDiarioMedioPago')
+    ResumenDiarioClientes = _model(registry, 'analytics', 'ResumenDiarioClientes')
+
+    transactions_qs = _in_range(Transaction.objects.order_by(), 'date', desde, hasta)
+    turnos_qs = _in_range(Turno.objects.order_by(), 'fecha_hora_inicio__date', desde, hasta)
+    clientes_qs = _in_range(Cliente.objects.order_by(), 'creado_en__date', desde, hasta)
+    daily_qs = _in_range(ResumenDiario.objects.all(), 'fecha', desde, hasta)
+    methods_qs = _in_range(ResumenDiarioMedioPago.objects.all(), 'fecha', desde, hasta)
+    clients_rollup_qs = _in_range(ResumenDiarioClientes.objects.all(), 'fecha', desde, hasta)
+
+    if sucursal_id:
+        centro_id = Sucursal.objects.values_list('centro_estetica_id', flat=True).get(pk=sucursal_id)
+        transactions_qs = transactions_qs.filter(branch_id=sucursal_id)
+        turnos_qs = turnos_qs.filter(sucursal_id=sucursal_id)
+        clientes_qs = clientes_qs.filter(centro_estetica_id=centro_id)
+        daily_qs = daily_qs.filter(sucursal_id=sucursal_id)
+        methods_qs = methods_qs.filter(sucursal_id=sucursal_id)
+        clients_rollup_qs = clients_rollup_qs.filter(centro_estetica_id=centro_id)
+
+    now = timezone.now()
+    days = {}
+
+    for row in transactions_qs.values('branch_id', 'date').annotate(**_transaction_aggregates()):
+        days[(row['branch_id'], row['date'])] = _values(row, TRANSACTION_FIELDS)
+
+    for row in turnos_qs.annotate(dia=TruncDate('fecha_hora_inicio')).values(
+        'sucursal_id', 'dia'
+    ).annotate(**_turno_aggregates()):
+        days.setdefault((row['sucursal_id'], row['dia']), {}).update(_values(row, TURNO_FIELDS))
+
+    daily = [
+        ResumenDiario(sucursal_id=sucursal, fecha=fecha, actualizado_en=now, **values)
+        for (sucursal, fecha), values in days.items()
+    ]
+
+    methods = [
+        ResumenDiarioMedioPago(
+            sucursal_id=row['branch_id'], fecha=row['date'], medio_pago=row['payment_method'],
+            monto=row['monto'] or 0, cantidad=row['cantidad']
+        )
+        for row in transactions_qs.filter(type__in=INCOME_TYPES).values(
+            'branch_id', 'date', 'payment_method'
+        ).annotate(monto=Sum('amount'), cantidad=Count('id'))
+    ]
+
+    clients = [
+        ResumenDiarioClientes(
+            centro_estetica_id=row['centro_estetica_id'], fecha=row['dia'],
+            clientes_nuevos=row['nuevos']
+        )
+        for row in clientes_qs.annotate(dia=TruncDate('creado_en')).values(
+            'centro_estetica_id', 'dia'
+        ).annotate(nuevos=Count('id'))
+    ]
+
+    with transaction.atomic():
+        daily_qs.delete()
+        methods_qs.delete()
+        clients_rollup_qs.delete()
+        ResumenDiario.objects.bulk_create(daily, batch_size=batch_size)
+        ResumenDiarioMedioPago.objects.bulk_create(methods, batch_size=batch_size)
+        ResumenDiarioClientes.objects.bulk_create(clients, batch_size=batch_size)
+
+    return {'dias': len(daily), 'medios_de_pago': len(methods), 'clientes': len(clients)}
+
+
+# ---------------------------------------------------------------- #
+# Lectura
+# ---------------------------------------------------------------- #
+
+def daily_rows(sucursal_id=None, start_date=None, end_date=None):
+    ResumenDiario = _model(None, 'analytics', 'ResumenDiario')
+    return _in_range(
+        ResumenDiario.objects.filter(sucursal_id=sucursal_id) if sucursal_id else ResumenDiario.objects.all(),
+        'fecha', start_date, end_date
+    ).order_by()
+
+
+def payment_method_rows(sucursal_id=None, start_date=None, end_date=None):
+    ResumenDiarioMedioPago = _model(None, 'analytics', 'ResumenDiarioMedioPago')
+    qs = ResumenDiarioMedioPago.objects.all()
+    if sucursal_id:
+        qs = qs.filter(sucursal_id=sucursal_id)
+    return _in_range(qs, 'fecha', start_date, end_date).order_by()
+
+
+def new_clients(sucursal_id=None, start_date=None, end_date=None):
+    """
+    Altas de clientes en el rango. Con sucursal, las del centro de esa sucursal.
+    """
+    ResumenDiarioClientes = _model(None, 'analytics', 'ResumenDiarioClientes')
+    qs = ResumenDiarioClientes.objects.all()
+    if sucursal_id:
+        qs = qs.filter(centro_estetica__sucursales__id=sucursal_id)
+    return _in_range(qs, 'fecha', start_date, end_date).aggregate(
+        total=Sum('clientes_nuevos')
+    )['total'] or 0
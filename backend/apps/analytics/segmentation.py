@@ -0,0 +1,185 @@
+"""
+Motor de segmentación de clientes
+Calcula VIP / ACTIVE / AT_RISK / INACTIVE / NEW para todos los clientes de una
+sucursal con una cantidad fija de consultas agrupadas, sin recorrer cliente por
+cliente.
+
+Los criterios son los mismos que usaba ``get_client_status``:
+- VIP: LTV dentro del top 20% del ranking global de LTV (si hay más de 5 en el ranking)
+- ACTIVE / AT_RISK / INACTIVE: días desde la última visita completada (30 / 90)
+- NEW: alta hace 30 días o menos (tiene prioridad sobre el resto)
+"""
+
+from django.db.models import F, Max, Sum, Window
+from django.db.models.functions import Rank, RowNumber
+from django.utils import timezone
+
+from apps.turnos.models import Turno
+from apps.finanzas.models import Transaction
+from apps.clientes.models import Cliente
+
+
+LTV_TRANSACTION_TYPES = ['INCOME_SERVICE', 'INCOME_PRODUCT']
+
+# Top 20% del ranking de LTV, solo si el ranking tiene más de 5 entradas
+VIP_TOP_SHARE = 0.2
+VIP_MIN_RANKED = 5
+
+NEW_CLIENT_DAYS = 30
+ACTIVE_DAYS = 30
+AT_RISK_DAYS = 90
+
+SEGMENTS = ['VIP', 'ACTIVE', 'AT_RISK', 'INACTIVE', 'NEW']
+
+
+def ltv_ranking():
+    """
+    LTV agrupado por cliente sobre todas las transacciones de ingreso.
+
+    ``order_by()`` vacío es necesario: el ordering por defecto de Transaction
+    (-date, -created_at) se colaría en el GROUP BY.
+    """
+    return Transaction.objects.filter(
+        type__in=LTV_TRANSACTION_TYPES
+    ).order_by().values('client_id').annotate(
+        client_ltv=Sum('amount')
+    )
+
+
+def _vip_cutoff():
+    """
+    Posición del ranking que marca el corte VIP: int(n * 0.2), o None si el
+    ranking tiene 5 entradas o menos.
+    """
+    total_ranked = ltv_ranking().count()
+    if total_ranked <= VIP_MIN_RANKED:
+        return None
+    return int(total_ranked * VIP_TOP_SHARE)
+
+
+def get_vip_threshold():
+    """
+    LTV mínimo para ser VIP: el valor en la posición del corte dentro del
+    ranking descendente. 0 si no hay suficientes clientes para calcularlo.
+    """
+    cutoff = _vip_cutoff()
+    if not cutoff:
+        return 0
+
+    threshold = list(
+        ltv_ranking().annotate(
+            position=Window(RowNumber(), order_by=F('client_ltv').desc())
+        ).filter(
+            position=cutoff
+        ).values_list('client_ltv', flat=True)
+    )
+    return threshold[0] if threshold else 0
+
+
+def get_vip_client_ids():
+    """
+    Ids de los clientes VIP (LTV >= umbral).
+
+    Tener LTV >= al valor de la posición del corte es lo mismo que tener
+    RANK() <= esa posición, así que el ranking se filtra con la window function
+    en la base y nunca se trae entero a Python.
+    """
+    cutoff = _vip_cutoff()
+    if not cutoff:
+        return set()
+
+    top = list(
+        ltv_ranking().annotate(
+            position=Window(Rank(), order_by=F('client_ltv').desc())
+        ).filter(
+            position__lte=cutoff
+        ).values_list('client_id', 'client_ltv')
+    )
+
+    # El mínimo del top es el umbral; con umbral 0 no hay VIPs
+    if not top or min(client_ltv for _, client_ltv in top) <= 0:
+        return set()
+
+    # El ranking incluye el grupo de transacciones sin cliente: cuenta para el
+    # corte (como siempre) pero no es un cliente que se pueda etiquetar
+    return {client_id for client_id, _ in top if client_id is not None}
+
+
+def status_from_last_visit(last_visit, today=None):
+    """
+    Estado según la fecha/hora de la última visita completada (None = nunca vino)
+    """
+    if not last_visit:
+        return 'INACTIVE'
+
+    today = today or timezone.now().date()
+    days_since_last = (today - last_visit.date()).days
+
+    if days_since_last <= ACTIVE_DAYS:
+        return 'ACTIVE'
+    elif days_since_last <= AT_RISK_DAYS:
+        return 'AT_RISK'
+    return 'INACTIVE'
+
+
+def is_new_client(creado_en, today=None):
+    today = today or timezone.now().date()
+    return bool(creado_en) and (today - creado_en.date()).days <= NEW_CLIENT_DAYS
+
+
+def clients_for_branch(sucursal_id=None):
+    clientes_qs = Cliente.objects.all()
+    if sucursal_id:
+        clientes_qs = clientes_qs.filter(centro_estetica__sucursales__id=sucursal_id)
+    return clientes_qs
+
+
+def last_visits(clientes_qs=None):
+    """
+    Última visita completada por cliente en una sola consulta agrupada:
+    {cliente_id: fecha_hora_inicio}
+    """
+    turnos_qs = Turno.objects.filter(estado='COMPLETADO')
+    if clientes_qs is not None:
+        turnos_qs = turnos_qs.filter(cliente__in=clientes_qs.values('id'))
+
+    return dict(
+        turnos_qs.order_by().values('cliente_id').annotate(
+            last_visit=Max('fecha_hora_inicio')
+        ).values_list('cliente_id', 'last_visit')
+    )
+
+
+def segment_clients(sucursal_id=None):
+    """
+    Estado de cada cliente de la sucursal: {cliente_id: 'VIP' | 'ACTIVE' | ...}
+
+    Consultas: conteo + ranking del LTV, clientes y últimas visitas (4 en total,
+    sin importar cuántos clientes tenga la sucursal).
+    """
+    today = timezone.now().date()
+    clientes_qs = clients_for_branch(sucursal_id)
+
+    vip_ids = get_vip_client_ids()
+    visits = last_visits(clientes_qs if sucursal_id else None)
+
+    statuses = {}
+    for cliente_id, creado_en in clientes_qs.order_by().values_list('id', 'creado_en'):
+        if is_new_client(creado_en, today):
+            statuses[cliente_id] = 'NEW'
+        elif cliente_id in vip_ids:
+            statuses[cliente_id] = 'VIP'
+        else:
+            statuses[cliente_id] = status_from_last_visit(visits.get(cliente_id), today)
+
+    return statuses
+
+
+def count_segments(sucursal_id=None):
+    """
+    Cantidad de clientes por segmento
+    """
+    segmentation = {segment: 0 for segment in SEGMENTS}
+    for status in segment_clients(sucursal_id).values():
+        segmentation[status] += 1
+    return segmentation
@@ -1 +1,27 @@
 from rest_framework import serializers
+from django.urls import reverse
+
+from .models import ReporteExport
+
+
+class ReporteExportSerializer(serializers.ModelSerializer):
+    """
+    Estado de un trabajo de exportación. ``download_url`` aparece cuando el
+    archivo está listo.
+    """
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReporteExport
+        fields = [
+            'id', 'formato', 'fecha_desde', 'fecha_hasta', 'estado', 'progreso',
+            'error', 'download_url', 'creado_en', 'iniciado_en', 'terminado_en',
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.estado != ReporteExport.Estado.LISTO:
+            return None
+        url = reverse('report-job-download', args=[obj.id])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,178 @@
+"""
+Signals de analytics:
+- mantienen ClienteMetricas al día cuando cambian los turnos o las
+  transacciones de un cliente;
+- recalculan, después del commit, los resúmenes diarios del día (y de la
+  sucursal) tocado por cada transacción, turno o alta de cliente;
+- invalidan, también después del commit, el caché de resultados de la
+  sucursal afectada cuando cambian los datos que alimentan los dashboards.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.clientes.models import Cliente
+from apps.empleados.models import CentroEstetica, Sucursal
+from apps.finanzas.models import Transaction
+from apps.inventario.models import Producto
+from apps.servicios.models import AlquilerMaquina, MaquinaAlquilada, Servicio
+from apps.turnos.models import Turno
+from apps.turnos.signals import estados_cambiados
+
+from . import client_metrics, rollups
+from .cache import bump_branch_version
+
+
+def _refresh_previous_client(previous, current):
+    """
+    Si el guardado pasó la fila a otro cliente, el anterior también cambió.
+    Después del commit: el cambio pudo venir del borrado de ese cliente.
+    """
+    if previous and previous != current:
+        transaction.on_commit(partial(client_metrics.refresh_if_client_exists, previous))
+
+
+@receiver(post_save, sender=Transaction)
+def refresh_ltv_on_transaction_save(sender, instance, **kwargs):
+    # Sin filtrar por tipo: una edición puede sacar la transacción del LTV
+    if instance.client_id:
+        client_metrics.refresh_ltv(instance.client_id)
+    _refresh_previous_client(instance._metrics_client, instance.client_id)
+    instance._metrics_client = instance.client_id
+
+
+@receiver(post_delete, sender=Transaction)
+def refresh_ltv_on_transaction_delete(sender, instance, **kwargs):
+    if instance.client_id and instance.type in client_metrics.LTV_TRANSACTION_TYPES:
+        transaction.on_commit(
+            partial(client_metrics.refresh_if_client_exists, instance.client_id)
+        )
+
+
+@receiver(post_save, sender=Turno)
+def refresh_visits_on_turno_save(sender, instance, created, **kwargs):
+    """
+    Solo los turnos completados cuentan como visita: se refresca cuando el turno
+    está completado o cuando lo estaba antes de este guardado.
+    """
+    previous_estado = getattr(instance, '_previous_estado', None)
+    if Turno.Estado.COMPLETADO in (instance.estado, previous_estado):
+        client_metrics.refresh_visits(instance.cliente_id)
+        _refresh_previous_client(instance._metrics_client, instance.cliente_id)
+    instance._metrics_client = instance.cliente_id
+
+
+@receiver(post_delete, sender=Turno)
+def refresh_visits_on_turno_delete(sender, instance, **kwargs):
+    # Después del commit: si el turno se borra en cascada con su cliente, la
+    # fila de métricas ya no debe recrearse
+    if instance.estado == Turno.Estado.COMPLETADO:
+        transaction.on_commit(
+            partial(client_metrics.refresh_if_client_exists, instance.cliente_id)
+        )
+
+
+@receiver(estados_cambiados, sender=Turno)
+def refresh_on_turno_states_changed(sender, turnos, anteriores, **kwargs):
+    """
+    Cambio de estado masivo (turnos.services.cambiar_estados): visitas de los
+    clientes cuyos turnos entran o salen de COMPLETADO, los resúmenes de los
+    días tocados y el caché de cada sucursal, una vez por cada uno
+    """
+    client_metrics.refresh_visits_many(
+        turno.cliente_id for turno in turnos
+        if Turno.Estado.COMPLETADO in (turno.estado, anteriores[turno.id])
+    )
+    for day in {rollups.turno_day(turno) for turno in turnos}:
+        rollups.refresh_after_commit(rollups.refresh_turnos_day, Sucursal, day)
+    for sucursal_id in {turno.sucursal_id for turno in turnos}:
+        transaction.on_commit(partial(bump_branch_version, sucursal_id))
+
+
+# Resúmenes diarios. En post_init se guardan el día y el cliente con los que se
+# cargó la instancia, para recalcular también el día viejo y las métricas del
+# cliente anterior si el guardado la mueve. Se lee __dict__ para no disparar la
+# carga de campos diferidos.
+
+@receiver(post_init, sender=Transaction)
+def remember_transaction_day(sender, instance, **kwargs):
+    instance._rollup_day = (instance.__dict__.get('branch_id'), instance.__dict__.get('date'))
+    instance._metrics_client = instance.__dict__.get('client_id')
+
+
+@receiver(post_save, sender=Transaction)
+def refresh_rollup_on_transaction_save(sender, instance, **kwargs):
+    current = rollups.transaction_day(instance)
+    rollups.refresh_days(rollups.refresh_transactions_day, Sucursal, instance._rollup_day, current)
+    instance._rollup_day = current
+
+
+@receiver(post_delete, sender=Transaction)
+def refresh_rollup_on_transaction_delete(sender, instance, **kwargs):
+    rollups.refresh_after_commit(rollups.refresh_transactions_day, Sucursal, instance._rollup_day)
+
+
+@receiver(post_init, sender=Turno)
+def remember_turno_day(sender, instance, **kwargs):
+    inicio = instance.__dict__.get('fecha_hora_inicio')
+    instance._rollup_day = (
+        instance.__dict__.get('sucursal_id'), rollups.local_date(inicio) if inicio else None
+    )
+    instance._metrics_client = instance.__dict__.get('cliente_id')
+
+
+@receiver(post_save, sender=Turno)
+def refresh_rollup_on_turno_save(sender, instance, **kwargs):
+    current = rollups.turno_day(instance)
+    rollups.refresh_days(rollups.refresh_turnos_day, Sucursal, instance._rollup_day, current)
+    instance._rollup_day = current
+
+
+@receiver(post_delete, sender=Turno)
+def refresh_rollup_on_turno_delete(sender, instance, **kwargs):
+    rollups.refresh_after_commit(rollups.refresh_turnos_day, Sucursal, instance._rollup_day)
+
+
+@receiver(post_save, sender=Cliente)
+def refresh_rollup_on_cliente_create(sender, instance, created, **kwargs):
+    if created:
+        rollups.refresh_after_commit(
+            rollups.refresh_clients_day, CentroEstetica,
+            (instance.centro_estetica_id, rollups.local_date(instance.creado_en))
+        )
+
+
+@receiver(post_delete, sender=Cliente)
+def refresh_rollup_on_cliente_delete(sender, instance, **kwargs):
+    rollups.refresh_after_commit(
+        rollups.refresh_clients_day, CentroEstetica,
+        (instance.centro_estetica_id, rollups.local_date(instance.creado_en))
+    )
+
+
+# Modelo → campo con la sucursal a invalidar
+CACHE_INVALIDATING_MODELS = {
+    Transaction: 'branch_id',
+    Turno: 'sucursal_id',
+    Producto: 'sucursal_id',
+    Servicio: 'sucursal_id',
+    MaquinaAlquilada: 'sucursal_id',
+    AlquilerMaquina: 'sucursal_id',
+}
+
+
+def invalidate_branch_cache(sender, instance, **kwargs):
+    # Después del commit: antes, un request podría leer la versión nueva,
+    # calcular con los datos viejos y cachearlos bajo la clave nueva
+    transaction.on_commit(partial(
+        bump_branch_version, getattr(instance, CACHE_INVALIDATING_MODELS[sender])
+    ))
+
+
+for _model in CACHE_INVALIDATING_MODELS:
+    post_save.connect(invalidate_branch_cache, sender=_model,
+                      dispatch_uid=f'analytics_cache_{_model.__name__}_save')
+    post_delete.connect(invalidate_branch_cache, sender=_model,
+                        dispatch_uid=f'analytics_cache_{_model.__name__}_delete')
@@ -0,0 +1,12 @@
+"""
+Celery tasks de analytics
+"""
+from celery import shared_task
+
+from . import reports
+
+
+@shared_task
+def generar_reporte_task(reporte_id):
+    """Genera el archivo de un ReporteExport pendiente."""
+    return reports.generar_reporte(reporte_id)
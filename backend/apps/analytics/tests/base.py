@@ -0,0 +1,72 @@
+"""Fixtures compartidas por los tests de analytics."""
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.clientes.models import Cliente
+from apps.empleados.models import CentroEstetica, Sucursal, Usuario
+from apps.finanzas.models import Transaction, TransactionCategory
+from apps.servicios.models import Servicio
+from apps.turnos.models import Turno
+
+
+class AnalyticsTestBase(TestCase):
+    def setUp(self):
+        self.centro = CentroEstetica.objects.create(
+            nombre='Centro', telefono='1111', email='c@centro.com'
+        )
+        self.sucursal = Sucursal.objects.create(
+            centro_estetica=self.centro, nombre='Suc', direccion='Calle 1',
+            telefono='1111', ciudad='CABA', provincia='BA',
+        )
+        self.profesional = Usuario.objects.create_user(
+            username='ana', password='x', first_name='Ana',
+            centro_estetica=self.centro, sucursal=self.sucursal,
+        )
+        self.servicio = Servicio.objects.create(
+            sucursal=self.sucursal, nombre='Facial',
+            duracion_minutos=60, precio=Decimal('20000'),
+        )
+        # La categoría la crea la señal de Sucursal
+        self.categoria = TransactionCategory.objects.get(
+            branch=self.sucursal, name='Servicios', type='INCOME'
+        )
+        self.hoy = timezone.now()
+
+    # Los resúmenes diarios se recalculan después del commit; el TestCase nunca
+    # confirma, así que los helpers corren esos callbacks al crear.
+
+    def crear_cliente(self, nombre='Flor', dias_de_alta=365, centro=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente = Cliente.objects.create(
+                centro_estetica=centro or self.centro,
+                nombre=nombre, apellido='A', telefono='11',
+            )
+        # creado_en es auto_now_add: se retrocede con update()
+        Cliente.objects.filter(pk=cliente.pk).update(
+            creado_en=self.hoy - timedelta(days=dias_de_alta)
+        )
+        return cliente
+
+    def crear_ingreso(self, cliente, monto, dias_atras=10, tipo='INCOME_SERVICE', **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Transaction.objects.create(
+                branch=self.sucursal, category=self.categoria, type=tipo,
+                amount=Decimal(monto), date=(self.hoy - timedelta(days=dias_atras)).date(),
+                description='Ingreso', client=cliente, **kwargs,
+            )
+
+    def crear_turno(self, cliente, dias_atras=10, estado=Turno.Estado.COMPLETADO, hora=10, **kwargs):
+        inicio = timezone.make_aware(timezone.datetime.combine(
+            timezone.localdate() - timedelta(days=dias_atras), time(hora, 0)
+        ))
+        with self.captureOnCommitCallbacks(execute=True):
+            return Turno.objects.create(
+                sucursal=self.sucursal, cliente=cliente, servicio=self.servicio,
+                profesional=kwargs.pop('profesional', self.profesional),
+                fecha_hora_inicio=inicio,
+                fecha_hora_fin=inicio + timedelta(minutes=self.servicio.duracion_minutos),
+                estado=estado, monto_total=self.servicio.precio, **kwargs,
+            )
@@ -0,0 +1,143 @@
+"""
+Tests del caché de analytics por tenant (apps.analytics.cache).
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.analytics import cache as analytics_cache
+from apps.empleados.models import CentroEstetica, Sucursal, Usuario
+from apps.finanzas.models import Transaction, TransactionCategory
+from apps.inventario.models import Producto
+
+from .base import AnalyticsTestBase
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM)
+class CacheAnalyticsTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        # LocMem es por proceso: no arrastrar entradas ni contadores de otros tests
+        cache.clear()
+        self.admin = Usuario.objects.create_user(
+            username='admin', password='x', centro_estetica=self.centro,
+            sucursal=self.sucursal, rol=Usuario.Rol.ADMIN,
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+        otro_centro = CentroEstetica.objects.create(nombre='Otro', telefono='2', email='o@o.com')
+        self.otra_sucursal = Sucursal.objects.create(
+            centro_estetica=otro_centro, nombre='Suc 2', direccion='Calle 2',
+            telefono='2', ciudad='CABA', provincia='BA',
+        )
+        self.otro_admin = Usuario.objects.create_user(
+            username='otro', password='x', centro_estetica=otro_centro,
+            sucursal=self.otra_sucursal, rol=Usuario.Rol.ADMIN,
+        )
+
+    def resumen(self, api=None, sucursal=None, **params):
+        params.setdefault('sucursal_id', (sucursal or self.sucursal).id)
+        response = (api or self.api).get(reverse('dashboard-revenue'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ingresos(self, data):
+        return sum(item['total_revenue'] for item in data['evolution'])
+
+    def ingreso(self, sucursal, monto):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Transaction.objects.create(
+                branch=sucursal, type='INCOME_SERVICE', amount=Decimal(monto),
+                category=TransactionCategory.objects.get(branch=sucursal, name='Servicios', type='INCOME'),
+                date=self.hoy.date(), description='Ingreso',
+            )
+
+    def test_segunda_lectura_sale_del_cache(self):
+        self.resumen()
+        with self.assertNumQueries(0):
+            self.resumen()
+
+    def test_parametros_en_otro_orden_comparten_entrada(self):
+        self.resumen(start_date='2026-01-01', end_date='2026-01-31')
+        with self.assertNumQueries(0):
+            self.api.get(
+                f"{reverse('dashboard-revenue')}?end_date=2026-01-31"
+                f"&sucursal_id={self.sucursal.id}&start_date=2026-01-01"
+            )
+
+    def test_escritura_invalida_solo_su_sucursal(self):
+        self.resumen()
+        self.resumen(api=self._api(self.otro_admin), sucursal=self.otra_sucursal)
+
+        self.ingreso(self.sucursal, '1000')
+
+        self.assertEqual(self.ingresos(self.resumen()), 1000.0)
+        # La otra sucursal sigue cacheada
+        with self.assertNumQueries(0):
+            self.resumen(api=self._api(self.otro_admin), sucursal=self.otra_sucursal)
+
+    def test_otras_entidades_invalidan(self):
+        version = analytics_cache.get_version(self.sucursal.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(
+                sucursal=self.sucursal, nombre='Crema',
+                precio_costo=Decimal('100'), precio_venta=Decimal('200'),
+            )
+        self.crear_turno(self.crear_cliente())
+
+        # Producto, turno y el resumen diario que el turno recalcula al confirmarse
+        self.assertEqual(analytics_cache.get_version(self.sucursal.id), version + 3)
+        self.assertEqual(analytics_cache.get_version(self.otra_sucursal.id), 0)
+
+    def test_la_version_cambia_recien_al_confirmar(self):
+        version = analytics_cache.get_version(self.sucursal.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Producto.objects.create(
+                sucursal=self.sucursal, nombre='Crema',
+                precio_costo=Decimal('100'), precio_venta=Decimal('200'),
+            )
+            # Un request en el medio todavía ve los datos viejos: no debe
+            # poder guardarlos bajo la versión nueva
+            self.assertEqual(analytics_cache.get_version(self.sucursal.id), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(analytics_cache.get_version(self.sucursal.id), version + 1)
+
+    def test_la_clave_incluye_el_centro(self):
+        # Misma URL pedida por usuarios de centros distintos: entradas distintas
+        self.resumen()
+        with self.assertNumQueries(0):
+            self.resumen()
+
+        otro = self._api(self.otro_admin)
+        response = otro.get(reverse('dashboard-revenue'), {'sucursal_id': self.sucursal.id})
+        self.assertEqual(response.status_code, 200)
+        stats = analytics_cache.get_stats(['RevenueAnalyticsView'])['RevenueAnalyticsView']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_estadisticas(self):
+        self.resumen()
+        self.resumen()
+
+        response = self.api.get(reverse('cache-stats'))
+
+        self.assertEqual(response.status_code, 200)
+        resumen = response.data['endpoints']['RevenueAnalyticsView']
+        self.assertEqual(resumen['hits'], 1)
+        self.assertEqual(resumen['misses'], 1)
+        self.assertEqual(resumen['hit_rate'], 50.0)
+        self.assertIn('OccupancyAnalyticsView', response.data['endpoints'])
+
+    def _api(self, user):
+        api = APIClient()
+        api.force_authenticate(user)
+        return api
@@ -0,0 +1,312 @@
+"""
+Tests de la tabla materializada ClienteMetricas (apps.analytics.client_metrics).
+
+Se mantiene por señales al guardar turnos y transacciones, se reconstruye con el
+comando ``recalcular_metricas_clientes`` y alimenta a los calculadores de clientes.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.analytics.client_metrics import rebuild_client_metrics
+from apps.analytics.models import ClienteMetricas
+from apps.analytics.utils import AnalyticsCalculator
+from apps.clientes.models import Cliente
+from apps.clientes.services import fusionar_clientes
+from apps.empleados.models import Usuario
+from apps.finanzas.models import Transaction
+from apps.turnos.models import Turno
+
+from .base import AnalyticsTestBase
+
+
+class MetricasIncrementalesTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.cliente = self.crear_cliente('Flor')
+
+    def metricas(self):
+        return ClienteMetricas.objects.get(cliente=self.cliente)
+
+    def test_ingreso_suma_al_ltv(self):
+        self.crear_ingreso(self.cliente, '1500')
+        self.crear_ingreso(self.cliente, '500', tipo='INCOME_PRODUCT')
+
+        self.assertEqual(self.metricas().ltv, Decimal('2000'))
+
+    def test_borrar_ingreso_resta_del_ltv(self):
+        self.crear_ingreso(self.cliente, '1500')
+        ingreso = self.crear_ingreso(self.cliente, '500')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingreso.delete()
+
+        self.assertEqual(self.metricas().ltv, Decimal('1500'))
+
+    def test_visitas_completadas_y_frecuencia(self):
+        primera = self.crear_turno(self.cliente, dias_atras=30)
+        self.crear_turno(self.cliente, dias_atras=20)
+        ultima = self.crear_turno(self.cliente, dias_atras=10)
+        self.crear_turno(self.cliente, dias_atras=5, estado=Turno.Estado.CANCELADO)
+
+        metricas = self.metricas()
+        self.assertEqual(metricas.visitas_completadas, 3)
+        self.assertEqual(metricas.frecuencia_promedio_dias, 10.0)
+        self.assertEqual(metricas.primera_visita, primera.fecha_hora_inicio)
+        self.assertEqual(metricas.ultima_visita, ultima.fecha_hora_inicio)
+
+    def test_turno_que_deja_de_estar_completado(self):
+        turno = self.crear_turno(self.cliente, dias_atras=10)
+        self.assertEqual(self.metricas().visitas_completadas, 1)
+
+        turno.estado = Turno.Estado.CANCELADO
+        turno.save()
+
+        metricas = self.metricas()
+        self.assertEqual(metricas.visitas_completadas, 0)
+        self.assertIsNone(metricas.ultima_visita)
+
+    def test_borrar_cliente_no_recrea_sus_metricas(self):
+        self.crear_turno(self.cliente, dias_atras=10)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente.delete()
+
+        self.assertFalse(ClienteMetricas.objects.exists())
+
+    def test_pasar_a_otro_cliente_recalcula_los_dos(self):
+        otro = self.crear_cliente('Otra')
+        ingreso = self.crear_ingreso(self.cliente, '1500')
+        turno = self.crear_turno(self.cliente, dias_atras=10)
+
+        ingreso = Transaction.objects.get(pk=ingreso.pk)
+        turno = Turno.objects.get(pk=turno.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingreso.client = otro
+            ingreso.save()
+            turno.cliente = otro
+            turno.save()
+
+        self.assertEqual((self.metricas().ltv, self.metricas().visitas_completadas), (0, 0))
+        metricas_otro = ClienteMetricas.objects.get(cliente=otro)
+        self.assertEqual((metricas_otro.ltv, metricas_otro.visitas_completadas), (Decimal('1500'), 1))
+
+    def test_fusion_recalcula_la_principal(self):
+        duplicado = self.crear_cliente('Flor bis')
+        self.crear_ingreso(self.cliente, '1000')
+        self.crear_ingreso(duplicado, '2500')
+        self.crear_turno(duplicado, dias_atras=3)
+
+        fusionar_clientes(self.cliente, duplicado)
+
+        metricas = self.metricas()
+        self.assertEqual(metricas.ltv, Decimal('3500'))
+        self.assertEqual(metricas.visitas_completadas, 1)
+        self.assertEqual(ClienteMetricas.objects.count(), 1)
+
+
+class ReconstruccionTests(AnalyticsTestBase):
+    def test_reconstruye_lo_que_las_senales_no_vieron(self):
+        con_datos = self.crear_cliente('Con datos')
+        sin_datos = self.crear_cliente('Sin datos')
+        self.crear_ingreso(con_datos, '700')
+        self.crear_turno(con_datos, dias_atras=40)
+        self.crear_turno(con_datos, dias_atras=10)
+
+        # Escrituras que no pasan por señales dejan la tabla desactualizada
+        Transaction.objects.filter(client=con_datos).update(amount=Decimal('900'))
+        ClienteMetricas.objects.all().delete()
+
+        out = StringIO()
+        call_command('recalcular_metricas_clientes', stdout=out)
+
+        metricas = ClienteMetricas.objects.get(cliente=con_datos)
+        self.assertEqual(metricas.ltv, Decimal('900'))
+        self.assertEqual(metricas.visitas_completadas, 2)
+        self.assertEqual(metricas.frecuencia_promedio_dias, 30.0)
+        self.assertEqual(ClienteMetricas.objects.get(cliente=sin_datos).ltv, 0)
+        self.assertIn('2 clientes', out.getvalue())
+
+    def test_reconstruir_es_idempotente(self):
+        cliente = self.crear_cliente()
+        self.crear_ingreso(cliente, '700')
+
+        rebuild_client_metrics()
+        rebuild_client_metrics()
+
+        self.assertEqual(ClienteMetricas.objects.count(), 1)
+        self.assertEqual(ClienteMetricas.objects.get().ltv, Decimal('700'))
+
+
+class CalculadoresTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.clientes = []
+        for i, monto in enumerate(['1000', '6000', '12000', '30000', '60000', '80000']):
+            cliente = self.crear_cliente(f'C{i}')
+            self.crear_ingreso(cliente, monto)
+            self.crear_turno(cliente, dias_atras=10 + i * 15)
+            self.clientes.append(cliente)
+        # Sin actividad: cuenta en la distribución pero no en el top
+        self.sin_actividad = self.crear_cliente('Nada')
+
+    def test_top_clientes(self):
+        top = AnalyticsCalculator.get_top_clients(self.sucursal.id, limit=3)
+
+        self.assertEqual([c['client_id'] for c in top], [
+            self.clientes[5].id, self.clientes[4].id, self.clientes[3].id,
+        ])
+        self.assertEqual(top[0]['ltv'], 80000.0)
+        self.assertEqual(top[0]['visits_count'], 1)
+        self.assertEqual(top[0]['status'], 'VIP')
+        self.assertEqual(top[1]['status'], 'AT_RISK')
+
+    def test_distribucion_de_ltv(self):
+        distribucion = {
+            r['range']: r['count']
+            for r in AnalyticsCalculator.get_ltv_distribution(self.sucursal.id)
+        }
+
+        self.assertEqual(distribucion, {
+            '$0 - $5,000': 2,
+            '$5,000 - $10,000': 1,
+            '$10,000 - $20,000': 1,
+            '$20,000 - $50,000': 1,
+            '$50,000+': 2,
+        })
+
+    def test_consultas_no_dependen_de_los_clientes(self):
+        with self.assertNumQueries(3):
+            AnalyticsCalculator.get_top_clients(self.sucursal.id)
+        with self.assertNumQueries(1):
+            AnalyticsCalculator.get_ltv_distribution(self.sucursal.id)
+
+        for i in range(20):
+            cliente = self.crear_cliente(f'Extra {i}')
+            self.crear_ingreso(cliente, '100')
+
+        with self.assertNumQueries(3):
+            AnalyticsCalculator.get_top_clients(self.sucursal.id)
+        with self.assertNumQueries(1):
+            AnalyticsCalculator.get_ltv_distribution(self.sucursal.id)
+
+    def test_cliente_sin_fila_se_calcula_al_leer_sin_guardarla(self):
+        cliente = self.clientes[2]
+        ClienteMetricas.objects.filter(cliente=cliente).delete()
+
+        self.assertEqual(AnalyticsCalculator.get_client_lifetime_value(cliente.id), 12000.0)
+        self.assertFalse(ClienteMetricas.objects.filter(cliente=cliente).exists())
+
+
+class ComportamientoTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.cliente = self.crear_cliente()
+        admin = Usuario.objects.create_user(
+            username='admin', password='x', centro_estetica=self.centro,
+            sucursal=self.sucursal, rol=Usuario.Rol.ADMIN,
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(admin)
+
+    def comportamiento(self):
+        response = self.api.get(reverse('client-behavior', args=[self.cliente.id]))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_visitas_y_ltv_salen_de_las_metricas(self):
+        for dias in (40, 20, 10):
+            self.crear_turno(self.cliente, dias_atras=dias)
+        self.crear_turno(self.cliente, dias_atras=5, estado=Turno.Estado.NO_SHOW)
+        self.crear_ingreso(self.cliente, '9000')
+        # Lo que dice la tabla es lo que se muestra
+        ClienteMetricas.objects.filter(cliente=self.cliente).update(ltv=Decimal('31000'))
+
+        data = self.comportamiento()
+
+        self.assertEqual(data['metrics']['total_visits'], 3)
+        self.assertEqual(data['metrics']['lifetime_value'], 31000.0)
+        self.assertEqual(data['score_breakdown']['monetary_score'], 18)
+        self.assertEqual(data['activity_heatmap']['active_days'], 3)
+        self.assertEqual(data['behavior_metrics']['average_interval_days'], 15.0)
+        self.assertEqual(
+            (data['behavior_metrics']['total_appointments'], data['behavior_metrics']['no_show_count']),
+            (4, 1),
+        )
+
+    def test_consultas_no_dependen_de_las_visitas(self):
+        def consultas():
+            with CaptureQueriesContext(connection) as capturadas:
+                self.comportamiento()
+            return len(capturadas)
+
+        self.crear_turno(self.cliente, dias_atras=30)
+        pocas = consultas()
+        for dias in range(1, 25):
+            self.crear_turno(self.cliente, dias_atras=dias)
+
+        self.assertEqual(consultas(), pocas)
+
+    def test_sin_visitas(self):
+        self.assertEqual(self.comportamiento()['interpretation'], 'Sin datos')
+
+
+@pytest.mark.benchmark
+class MetricasBenchmark(AnalyticsTestBase):
+    """
+    100.000 clientes cargados con bulk_create (sin señales), reconstrucción
+    completa y lectura del top y la distribución.
+    """
+    CLIENTES = 100_000
+
+    def setUp(self):
+        super().setUp()
+        Cliente.objects.bulk_create(
+            Cliente(centro_estetica=self.centro, nombre=f'C{i}', apellido='B', telefono='11')
+            for i in range(self.CLIENTES)
+        )
+        ids = list(Cliente.objects.values_list('id', flat=True))
+        Transaction.objects.bulk_create(
+            Transaction(
+                branch=self.sucursal, category=self.categoria, type='INCOME_SERVICE',
+                amount=Decimal(1000 + (i * 37) % 90000), date=self.hoy.date(),
+                description='Ingreso', client_id=cliente_id,
+            )
+            for i, cliente_id in enumerate(ids) if i % 2 == 0
+        )
+        Turno.objects.bulk_create(
+            Turno(
+                sucursal=self.sucursal, cliente_id=cliente_id, servicio=self.servicio,
+                profesional=self.profesional,
+                fecha_hora_inicio=self.hoy - timedelta(days=i % 150 + k * 30),
+                fecha_hora_fin=self.hoy - timedelta(days=i % 150 + k * 30) + timedelta(hours=1),
+                estado=Turno.Estado.COMPLETADO, monto_total=Decimal('20000'),
+            )
+            for i, cliente_id in enumerate(ids) if i % 3 == 0
+            for k in range(3)
+        )
+
+    def test_reconstruccion_y_lectura_con_100k_clientes(self):
+        inicio = time.perf_counter()
+        procesados = rebuild_client_metrics()
+        reconstruccion = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with self.assertNumQueries(4):
+            top = AnalyticsCalculator.get_top_clients(self.sucursal.id)
+            distribucion = AnalyticsCalculator.get_ltv_distribution(self.sucursal.id)
+        lectura = time.perf_counter() - inicio
+
+        self.assertEqual(procesados, self.CLIENTES)
+        self.assertEqual(len(top), 20)
+        self.assertEqual(sum(r['count'] for r in distribucion), self.CLIENTES)
+        print(f'\nMétricas de {self.CLIENTES} clientes: reconstrucción {reconstruccion:.2f}s, '
+              f'top + distribución {lectura:.3f}s')
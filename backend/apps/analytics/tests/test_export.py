@@ -0,0 +1,214 @@
+"""
+Tests de los exports (apps.analytics.export_views): CSV en streaming y Excel
+write_only sobre el mismo ReportDataset.
+"""
+import codecs
+import csv
+import io
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.urls import reverse
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+
+from apps.analytics import export_views
+from apps.empleados.models import Usuario
+from apps.finanzas.models import Transaction
+
+from .base import AnalyticsTestBase
+
+
+class ExportCSVTestBase(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.admin = Usuario.objects.create_user(
+            username='admin', password='x', centro_estetica=self.centro,
+            sucursal=self.sucursal, rol=Usuario.Rol.ADMIN,
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def exportar(self, **params):
+        response = self.api.get(reverse('export-csv'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def filas(self, response):
+        contenido = b''.join(response.streaming_content)
+        self.assertTrue(contenido.startswith(codecs.BOM_UTF8))
+        contenido = contenido.decode('utf-8-sig')
+        return list(csv.reader(io.StringIO(contenido)))
+
+
+class ExportDatosBase(ExportCSVTestBase):
+    def setUp(self):
+        super().setUp()
+        self.cliente = self.crear_cliente()
+        self.crear_ingreso(self.cliente, '1500', dias_atras=3, payment_method='CASH')
+        self.crear_ingreso(None, '400', dias_atras=2, tipo='EXPENSE', payment_method='CASH')
+        self.crear_turno(self.cliente, dias_atras=3)
+        self.params = {
+            'start_date': (self.hoy - timedelta(days=10)).date().isoformat(),
+            'end_date': self.hoy.date().isoformat(),
+        }
+
+
+class ExportCSVTests(ExportDatosBase):
+    def test_resumen_en_streaming(self):
+        response = self.exportar(**self.params)
+
+        self.assertTrue(response.streaming)
+        filas = self.filas(response)
+        self.assertIn(['Total Ingresos', '$1,500.00'], filas)
+        self.assertIn(['Ganancia Neta', '$1,100.00'], filas)
+        self.assertIn(['Total Citas Completadas', '1'], filas)
+        self.assertIn(['Efectivo', '1', '$1,500.00'], filas)
+
+    def test_detalle_de_transacciones(self):
+        filas = self.filas(self.exportar(mode='transactions', **self.params))
+
+        self.assertEqual(filas[0][0], 'Fecha')
+        self.assertEqual([fila[1] for fila in filas[1:]], ['Ingreso por Servicio', 'Gasto'])
+        self.assertEqual(filas[1][4], 'Flor A')
+        self.assertEqual(filas[1][6], '1500.00')
+
+    def test_modo_invalido(self):
+        response = self.api.get(reverse('export-csv'), {'mode': 'todo'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_agrupa_lineas_por_chunk(self):
+        chunks = list(export_views.stream_csv(([i] for i in range(1200)), lines_per_chunk=500))
+
+        # BOM + 3 chunks de hasta 500 líneas
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(chunks[0], codecs.BOM_UTF8)
+        self.assertEqual(chunks[-1].count(b'\n'), 200)
+
+
+class ExportExcelTests(ExportDatosBase):
+    def render(self):
+        return export_views.render_excel(self.sucursal, (self.hoy - timedelta(days=10)).date(), self.hoy.date())
+
+    def test_libro_con_todas_las_hojas(self):
+        wb = load_workbook(io.BytesIO(self.render()))
+
+        self.assertEqual(wb.sheetnames, [
+            'Resumen Ejecutivo', 'Ingresos Diarios', 'Top Servicios', 'Top Clientes', 'Transacciones'
+        ])
+        resumen = {fila[0]: fila[1] for fila in wb['Resumen Ejecutivo'].iter_rows(min_row=5, values_only=True)}
+        self.assertEqual(resumen['Ganancia Neta'], 1100)
+        self.assertEqual(resumen['Total Citas Completadas'], 1)
+
+        transacciones = list(wb['Transacciones'].iter_rows(min_row=4, values_only=True))
+        self.assertEqual([fila[1] for fila in transacciones], ['Ingreso por Servicio', 'Gasto'])
+        self.assertEqual(transacciones[0][6], 1500)
+        self.assertEqual(wb['Transacciones']['G4'].style, 'reporte_moneda')
+
+    def test_cada_seccion_se_consulta_una_vez(self):
+        # KPIs (resumen diario + altas), ingresos diarios, servicios, clientes
+        # y el detalle de transacciones
+        with self.assertNumQueries(6):
+            self.render()
+
+    def test_pdf_usa_el_mismo_dataset(self):
+        with self.assertNumQueries(4):
+            pdf = export_views.render_pdf(self.sucursal, (self.hoy - timedelta(days=10)).date(), self.hoy.date())
+
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+
+@pytest.mark.benchmark
+class ExportCSVBenchmark(ExportCSVTestBase):
+    """
+    Tres años de transacciones (300.000 filas): el pico de memoria del export
+    detallado de 30 días y el de 3 años deben ser del mismo orden.
+    """
+    DIAS = 3 * 365
+    TRANSACCIONES = 300_000
+
+    def setUp(self):
+        super().setUp()
+        Transaction.objects.bulk_create((
+            Transaction(
+                branch=self.sucursal, category=self.categoria, type='INCOME_SERVICE',
+                amount=Decimal(1000 + i % 500), payment_method='CASH',
+                date=(self.hoy - timedelta(days=i % self.DIAS)).date(),
+                description=f'Servicio {i}',
+            )
+            for i in range(self.TRANSACCIONES)
+        ), batch_size=5000)
+
+    def medir(self, dias):
+        response = self.exportar(
+            mode='transactions',
+            start_date=(self.hoy - timedelta(days=dias - 1)).date().isoformat(),
+            end_date=self.hoy.date().isoformat(),
+        )
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        lineas = sum(chunk.count(b'\n') for chunk in response.streaming_content)
+        duracion = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return lineas - 1, pico, duracion
+
+    def test_memoria_constante(self):
+        filas_mes, pico_mes, duracion_mes = self.medir(30)
+        filas_total, pico_total, duracion_total = self.medir(self.DIAS)
+
+        self.assertEqual(filas_total, self.TRANSACCIONES)
+        self.assertLess(pico_total, pico_mes * 2)
+        print(f'\nExport CSV: 30 días {filas_mes} filas, pico {pico_mes / 1024:.0f} KiB, '
+              f'{duracion_mes:.2f}s | 3 años {filas_total} filas, pico {pico_total / 1024:.0f} KiB, '
+              f'{duracion_total:.2f}s')
+
+
+@pytest.mark.benchmark
+class ExportExcelBenchmark(ExportCSVTestBase):
+    """
+    Reporte Excel con 100.000 transacciones: pico de memoria y tiempo del
+    libro write_only.
+    """
+    TRANSACCIONES = 100_000
+
+    def setUp(self):
+        super().setUp()
+        Transaction.objects.bulk_create((
+            Transaction(
+                branch=self.sucursal, category=self.categoria, type='INCOME_SERVICE',
+                amount=Decimal(1000 + i % 500), payment_method='CASH',
+                date=(self.hoy - timedelta(days=i % 365)).date(),
+                description=f'Servicio {i}',
+            )
+            for i in range(self.TRANSACCIONES)
+        ), batch_size=5000)
+
+    def render(self):
+        return export_views.render_excel(
+            self.sucursal, (self.hoy - timedelta(days=365)).date(), self.hoy.date()
+        )
+
+    def test_memoria_y_tiempo(self):
+        # El tiempo se mide sin tracemalloc, que multiplica el costo de openpyxl
+        inicio = time.perf_counter()
+        contenido = self.render()
+        duracion = time.perf_counter() - inicio
+
+        tracemalloc.start()
+        self.render()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        hoja = load_workbook(io.BytesIO(contenido), read_only=True)['Transacciones']
+        filas = sum(1 for _ in hoja.iter_rows(min_row=4, values_only=True))
+        self.assertEqual(filas, self.TRANSACCIONES)
+        # Las filas se serializan al agregarlas: en memoria queda el .xlsx
+        # comprimido, no las celdas
+        self.assertLess(pico, len(contenido) * 4 + 16 * 1024 * 1024)
+        print(f'\nExport Excel: {filas} transacciones, {len(contenido) / 1024:.0f} KiB, '
+              f'pico {pico / 1024 / 1024:.1f} MiB, {duracion:.2f}s')
@@ -0,0 +1,158 @@
+"""
+Tests de la rotación de inventario (AnalyticsCalculator.get_inventory_rotation).
+
+Las ventas se cuentan por las claves de producto (movimientos SALIDA y el FK de
+producto de las transacciones importadas), no por coincidencias en la descripción.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+
+from apps.analytics.utils import AnalyticsCalculator
+from apps.finanzas.models import Transaction
+from apps.inventario.models import CategoriaProducto, MovimientoInventario, Producto
+
+from .base import AnalyticsTestBase
+
+
+class RotacionInventarioTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        categoria = CategoriaProducto.objects.create(sucursal=self.sucursal, nombre='Cremas')
+        # Nombres que se pisan: con el LIKE sobre la descripción se contaban mutuamente
+        self.crema = self.crear_producto('Crema', stock=30, categoria=categoria)
+        self.crema_noche = self.crear_producto('Crema de noche', stock=5)
+        self.sin_ventas = self.crear_producto('Serum', stock=10)
+
+    def crear_producto(self, nombre, stock, **kwargs):
+        return Producto.objects.create(
+            sucursal=self.sucursal, nombre=nombre, stock_actual=Decimal(stock),
+            precio_costo=Decimal('100'), precio_venta=Decimal('200'), **kwargs
+        )
+
+    def vender(self, producto, cantidad, dias_atras=5):
+        movimiento = MovimientoInventario.objects.create(
+            producto=producto, tipo='SALIDA', cantidad=Decimal(cantidad),
+            stock_anterior=producto.stock_actual, stock_nuevo=producto.stock_actual,
+        )
+        MovimientoInventario.objects.filter(pk=movimiento.pk).update(
+            creado_en=self.hoy - timedelta(days=dias_atras)
+        )
+        return movimiento
+
+    def rotacion(self, days=90):
+        datos = AnalyticsCalculator.get_inventory_rotation(self.sucursal.id, days=days)
+        return {item['product_id']: item for item in datos['products']}
+
+    def test_cuenta_unidades_por_producto(self):
+        self.vender(self.crema, 40)
+        self.vender(self.crema, 50)
+        self.vender(self.crema_noche, 9)
+
+        rotacion = self.rotacion()
+
+        crema = rotacion[self.crema.id]
+        self.assertEqual(crema['units_sold'], 90.0)
+        self.assertEqual(crema['sales_count'], 2)
+        self.assertEqual(crema['rotation_rate'], 1.0)
+        self.assertEqual(crema['speed'], 'FAST')
+        # 30 unidades a 1 por día
+        self.assertEqual(crema['days_of_inventory'], 30.0)
+        self.assertEqual(crema['category'], 'Cremas')
+
+        self.assertEqual(rotacion[self.crema_noche.id]['units_sold'], 9.0)
+        self.assertEqual(rotacion[self.sin_ventas.id]['speed'], 'DEAD')
+        self.assertEqual(rotacion[self.sin_ventas.id]['days_of_inventory'], 999)
+
+    def test_ventas_fuera_del_periodo_no_cuentan(self):
+        self.vender(self.crema, 10, dias_atras=120)
+
+        self.assertEqual(self.rotacion()[self.crema.id]['units_sold'], 0)
+
+    def test_ventas_importadas_con_producto(self):
+        # Importadas (Conto): FK de producto sin movimiento de inventario
+        for _ in range(3):
+            Transaction.objects.create(
+                branch=self.sucursal, category=self.categoria, type='INCOME_PRODUCT',
+                amount=Decimal('200'), date=self.hoy.date(), description='1x Crema',
+                product=self.crema,
+            )
+        # La transacción generada por el movimiento no se cuenta dos veces
+        self.vender(self.crema, 2)
+
+        crema = self.rotacion()[self.crema.id]
+        self.assertEqual(crema['units_sold'], 5.0)
+        self.assertEqual(crema['sales_count'], 4)
+
+    def test_ventas_importadas_cuentan_la_cantidad_de_la_linea(self):
+        Transaction.objects.create(
+            branch=self.sucursal, category=self.categoria, type='INCOME_PRODUCT',
+            amount=Decimal('600'), date=self.hoy.date(), description='3x Crema',
+            product=self.crema, quantity=Decimal('3'),
+        )
+        # Importada antes de guardar la cantidad: cuenta una unidad
+        Transaction.objects.create(
+            branch=self.sucursal, category=self.categoria, type='INCOME_PRODUCT',
+            amount=Decimal('200'), date=self.hoy.date(), description='Crema',
+            product=self.crema,
+        )
+
+        crema = self.rotacion()[self.crema.id]
+        self.assertEqual(crema['units_sold'], 4.0)
+        self.assertEqual(crema['sales_count'], 2)
+
+    def test_una_sola_consulta(self):
+        for producto in (self.crema, self.crema_noche, self.sin_ventas):
+            self.vender(producto, 1)
+
+        with self.assertNumQueries(1):
+            AnalyticsCalculator.get_inventory_rotation(self.sucursal.id)
+
+
+@pytest.mark.benchmark
+class RotacionInventarioBenchmark(AnalyticsTestBase):
+    """
+    5.000 productos y 500.000 ventas (movimientos SALIDA) en una sucursal.
+    Se cargan con bulk_create, sin pasar por la señal que crea las transacciones.
+    """
+    PRODUCTOS = 5_000
+    VENTAS = 500_000
+
+    def setUp(self):
+        super().setUp()
+        Producto.objects.bulk_create(
+            Producto(
+                sucursal=self.sucursal, nombre=f'Producto {i}', stock_actual=Decimal(i % 200),
+                precio_costo=Decimal('100'), precio_venta=Decimal('200'),
+            )
+            for i in range(self.PRODUCTOS)
+        )
+        ids = list(Producto.objects.values_list('id', flat=True))
+        # Las ventas se concentran en la primera mitad del catálogo; el resto queda sin movimiento
+        vendidos = ids[:self.PRODUCTOS // 2]
+        movimientos = (
+            MovimientoInventario(
+                producto_id=vendidos[i % len(vendidos)], tipo='SALIDA',
+                cantidad=Decimal(1 + i % 3), stock_anterior=0, stock_nuevo=0,
+            )
+            for i in range(self.VENTAS)
+        )
+        MovimientoInventario.objects.bulk_create(movimientos, batch_size=10_000)
+        # Un cuarto de las ventas quedan fuera del período analizado
+        viejas = MovimientoInventario.objects.order_by('id').values('id')[:self.VENTAS // 4]
+        MovimientoInventario.objects.filter(id__in=viejas).update(
+            creado_en=self.hoy - timedelta(days=200)
+        )
+
+    def test_rotacion_de_5k_productos(self):
+        inicio = time.perf_counter()
+        with self.assertNumQueries(1):
+            datos = AnalyticsCalculator.get_inventory_rotation(self.sucursal.id)
+        duracion = time.perf_counter() - inicio
+
+        self.assertEqual(datos['summary']['total_products'], self.PRODUCTOS)
+        self.assertEqual(datos['summary']['dead_stock_count'], self.PRODUCTOS // 2)
+        self.assertLess(duracion, 1.0)
+        print(f'\nRotación de {self.PRODUCTOS} productos con {self.VENTAS} ventas: {duracion:.3f}s')
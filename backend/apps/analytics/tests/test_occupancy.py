@@ -0,0 +1,115 @@
+"""
+Tests del motor de ocupación (apps.analytics.occupancy).
+
+La grilla sale de una consulta agrupada por día ISO y hora local, y la
+capacidad de la agenda real de los profesionales.
+"""
+from datetime import time, timedelta
+
+from django.utils import timezone
+
+from apps.analytics import occupancy
+from apps.analytics.utils import AnalyticsCalculator
+from apps.turnos.models import Turno
+
+from .base import AnalyticsTestBase
+
+
+class OcupacionTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        # Lunes de 9 a 13:45 con turnos de 60': el último tramo no entra, la
+        # jornada reservable es de 9 a 13 (240 minutos)
+        self.profesional.horario_inicio = time(9, 0)
+        self.profesional.horario_fin = time(13, 45)
+        self.profesional.dias_laborales = ['lunes']
+        self.profesional.intervalo_minutos = 60
+        self.profesional.save()
+
+        hoy = timezone.localdate()
+        self.dias_al_lunes = hoy.weekday() + 7  # el lunes de la semana pasada
+        self.desde = hoy - timedelta(days=13)  # dos semanas: dos lunes
+        self.hasta = hoy
+        self.cliente = self.crear_cliente()
+
+    def ocupacion(self, granularity='slot'):
+        return AnalyticsCalculator.get_occupancy(
+            self.sucursal.id, self.desde, self.hasta, granularity
+        )
+
+    def test_por_dia_usa_la_agenda_del_profesional(self):
+        self.crear_turno(self.cliente, dias_atras=self.dias_al_lunes, hora=10)
+        self.crear_turno(self.cliente, dias_atras=self.dias_al_lunes, hora=11)
+
+        por_dia = {d['day']: d for d in self.ocupacion()['by_weekday']}
+
+        # 120 minutos sobre 2 lunes × 240 minutos
+        self.assertEqual(por_dia['Monday'], {
+            'day': 'Monday', 'count': 2, 'occupancy_percentage': 25.0
+        })
+        self.assertEqual(por_dia['Tuesday']['occupancy_percentage'], 0)
+        self.assertEqual(list(por_dia), [
+            'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'
+        ])
+
+    def test_heatmap_por_franja(self):
+        self.crear_turno(self.cliente, dias_atras=self.dias_al_lunes, hora=10)
+        self.crear_turno(
+            self.cliente, dias_atras=self.dias_al_lunes, hora=12, estado=Turno.Estado.CONFIRMADO
+        )
+        # Los cancelados no ocupan
+        self.crear_turno(
+            self.cliente, dias_atras=self.dias_al_lunes, hora=9, estado=Turno.Estado.CANCELADO
+        )
+
+        lunes = next(d for d in self.ocupacion()['heatmap'] if d['day'] == 'Monday')
+
+        # Mañana: 60' sobre 2 × 180' (9 a 12); tarde: 60' sobre 2 × 60' (12 a 13)
+        self.assertEqual(lunes, {
+            'day': 'Monday', 'morning': 16.7, 'afternoon': 50.0, 'evening': 0.0
+        })
+
+    def test_heatmap_por_hora(self):
+        self.crear_turno(self.cliente, dias_atras=self.dias_al_lunes, hora=10)
+
+        heatmap = self.ocupacion('hour')['heatmap']
+        lunes = next(d for d in heatmap if d['day'] == 'Monday')
+
+        self.assertEqual([c['hour'] for c in lunes['hours']], [9, 10, 11, 12])
+        self.assertEqual(lunes['hours'][1], {'hour': 10, 'count': 1, 'occupancy_percentage': 50.0})
+
+    def test_un_turno_que_cruza_la_hora_reparte_sus_minutos(self):
+        turno = self.crear_turno(self.cliente, dias_atras=self.dias_al_lunes, hora=10)
+        turno.fecha_hora_inicio += timedelta(minutes=30)
+        turno.fecha_hora_fin = turno.fecha_hora_inicio + timedelta(minutes=90)
+        turno.save()
+
+        lunes = next(d for d in self.ocupacion('hour')['heatmap'] if d['day'] == 'Monday')
+        celdas = {c['hour']: c for c in lunes['hours']}
+
+        # 10:30 a 12:00: 30' en la celda de las 10 y 60' en la de las 11, sobre 2 × 60'
+        self.assertEqual(celdas[10], {'hour': 10, 'count': 1, 'occupancy_percentage': 25.0})
+        self.assertEqual(celdas[11], {'hour': 11, 'count': 0, 'occupancy_percentage': 50.0})
+        self.assertEqual(celdas[12]['occupancy_percentage'], 0)
+
+    def test_pasada_la_medianoche_sigue_en_el_dia_siguiente(self):
+        cells = dict(occupancy._spread(7, 23, 30, 90))
+
+        self.assertEqual(cells, {(7, 23): 30, (1, 0): 60})
+
+    def test_turno_fuera_de_agenda_se_ve_igual(self):
+        # Un martes no hay capacidad: si hay turnos, la celda figura llena
+        self.crear_turno(self.cliente, dias_atras=self.dias_al_lunes - 1, hora=10)
+
+        martes = next(d for d in self.ocupacion()['heatmap'] if d['day'] == 'Tuesday')
+
+        self.assertEqual(martes['morning'], 100.0)
+
+    def test_cantidad_de_consultas_fija(self):
+        for semana in range(2):
+            for hora in (9, 10, 11):
+                self.crear_turno(self.cliente, dias_atras=self.dias_al_lunes - semana * 7, hora=hora)
+
+        # Turnos agrupados + profesionales
+        with self.assertNumQueries(2):
+            occupancy.OccupancyGrid(self.sucursal.id, self.desde, self.hasta).heatmap('hour')
@@ -0,0 +1,221 @@
+"""
+Tests de los trabajos de exportación de reportes (apps.analytics.reports).
+"""
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.analytics import reports
+from apps.analytics.models import ReporteExport
+from apps.empleados.models import Usuario
+
+from .base import AnalyticsTestBase
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM, REPORTES_EN_CELERY=False)
+class ReportesTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.admin = Usuario.objects.create_user(
+            username='admin', password='x', centro_estetica=self.centro,
+            sucursal=self.sucursal, rol=Usuario.Rol.ADMIN,
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+        self.cliente = self.crear_cliente()
+        self.crear_ingreso(self.cliente, '1500', dias_atras=3)
+        self.crear_turno(self.cliente, dias_atras=3)
+        self.body = {
+            'format': 'xlsx',
+            'start_date': (self.hoy - timedelta(days=10)).date().isoformat(),
+            'end_date': self.hoy.date().isoformat(),
+        }
+
+    def pedir(self, **cambios):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.post(reverse('report-jobs'), {**self.body, **cambios}, format='json')
+
+    def estado(self, reporte_id):
+        return self.api.get(reverse('report-job-detail', args=[reporte_id])).data
+
+    def test_genera_excel_y_lo_descarga(self):
+        response = self.pedir()
+
+        self.assertEqual(response.status_code, 202)
+        estado = self.estado(response.data['id'])
+        self.assertEqual((estado['estado'], estado['progreso']), ('LISTO', 100))
+        self.assertTrue(estado['download_url'].endswith(f"/reports/{response.data['id']}/download/"))
+
+        descarga = self.api.get(reverse('report-job-download', args=[response.data['id']]))
+        self.assertEqual(descarga.status_code, 200)
+        self.assertTrue(b''.join(descarga.streaming_content).startswith(b'PK'))
+
+    def test_genera_pdf(self):
+        reporte = ReporteExport.objects.get(pk=self.pedir(format='pdf').data['id'])
+
+        self.assertEqual(reporte.estado, ReporteExport.Estado.LISTO)
+        with reporte.archivo.open('rb') as archivo:
+            self.assertTrue(archivo.read().startswith(b'%PDF'))
+
+    def test_pedidos_iguales_comparten_trabajo(self):
+        primero = self.pedir()
+        segundo = self.pedir()
+
+        self.assertEqual(segundo.status_code, 200)
+        self.assertEqual(segundo.data['id'], primero.data['id'])
+        self.assertEqual(ReporteExport.objects.count(), 1)
+
+    def test_datos_nuevos_generan_otro_trabajo(self):
+        primero = self.pedir()
+        self.crear_ingreso(self.cliente, '300', dias_atras=1)
+
+        segundo = self.pedir()
+
+        self.assertEqual(segundo.status_code, 202)
+        self.assertNotEqual(segundo.data['id'], primero.data['id'])
+
+    def test_la_version_nueva_borra_la_reemplazada(self):
+        primero = ReporteExport.objects.get(pk=self.pedir().data['id'])
+        archivo = primero.archivo.name
+        otro_formato = self.pedir(format='pdf')
+        self.crear_ingreso(self.cliente, '300', dias_atras=1)
+
+        segundo = self.pedir()
+
+        self.assertEqual(
+            set(ReporteExport.objects.values_list('id', flat=True)),
+            {segundo.data['id'], otro_formato.data['id']},
+        )
+        self.assertFalse(primero.archivo.storage.exists(archivo))
+
+    def test_una_version_en_curso_no_se_borra(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            en_curso, _ = reports.solicitar_reporte(self.sucursal, 'xlsx', self.hoy.date(), self.hoy.date())
+        self.crear_ingreso(self.cliente, '300', dias_atras=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo, _ = reports.solicitar_reporte(self.sucursal, 'xlsx', self.hoy.date(), self.hoy.date())
+
+        self.assertEqual(ReporteExport.objects.get(pk=nuevo.pk).estado, ReporteExport.Estado.LISTO)
+        self.assertEqual(reports.generar_reporte(en_curso.id), ReporteExport.Estado.LISTO)
+
+    def test_un_archivo_viejo_no_se_reutiliza(self):
+        primero = self.pedir()
+        ReporteExport.objects.filter(pk=primero.data['id']).update(
+            creado_en=timezone.now() - reports.REUSO_MAXIMO - timedelta(minutes=1)
+        )
+
+        segundo = self.pedir()
+
+        self.assertEqual(segundo.status_code, 202)
+        self.assertEqual(list(ReporteExport.objects.values_list('id', flat=True)), [segundo.data['id']])
+
+    def test_un_trabajo_largo_en_curso_no_se_da_por_colgado(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            reporte, _ = reports.solicitar_reporte(self.sucursal, 'xlsx', self.hoy.date(), self.hoy.date())
+        ReporteExport.objects.filter(pk=reporte.pk).update(
+            estado=ReporteExport.Estado.PROCESANDO,
+            creado_en=timezone.now() - reports.TRABAJO_COLGADO - timedelta(minutes=10),
+            iniciado_en=timezone.now() - timedelta(minutes=5),
+        )
+
+        otro, reutilizado = reports.solicitar_reporte(self.sucursal, 'xlsx', self.hoy.date(), self.hoy.date())
+
+        self.assertEqual((otro.pk, reutilizado), (reporte.pk, True))
+
+    def test_un_trabajo_colgado_en_proceso_se_reemplaza(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            reporte, _ = reports.solicitar_reporte(self.sucursal, 'xlsx', self.hoy.date(), self.hoy.date())
+        ReporteExport.objects.filter(pk=reporte.pk).update(
+            estado=ReporteExport.Estado.PROCESANDO,
+            iniciado_en=timezone.now() - reports.TRABAJO_COLGADO - timedelta(minutes=1),
+        )
+
+        with self.captureOnCommitCallbacks(execute=False):
+            otro, reutilizado = reports.solicitar_reporte(self.sucursal, 'xlsx', self.hoy.date(), self.hoy.date())
+
+        self.assertFalse(reutilizado)
+        self.assertFalse(ReporteExport.objects.filter(pk=reporte.pk).exists())
+
+    def test_un_trabajo_borrado_mientras_se_genera_no_deja_archivo(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            reporte, _ = reports.solicitar_reporte(self.sucursal, 'xlsx', self.hoy.date(), self.hoy.date())
+        render = reports.RENDERERS['xlsx']
+
+        def reemplazado(*args, **kwargs):
+            contenido = render(*args, **kwargs)
+            ReporteExport.objects.filter(pk=reporte.pk).delete()
+            return contenido
+
+        with mock.patch.dict(reports.RENDERERS, {'xlsx': reemplazado}):
+            self.assertIsNone(reports.generar_reporte(reporte.id))
+
+        media = ReporteExport._meta.get_field('archivo').storage.location
+        self.assertEqual([archivos for _, _, archivos in os.walk(media) if archivos], [])
+
+    def test_un_runner_por_trabajo(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            reporte, _ = reports.solicitar_reporte(self.sucursal, 'xlsx', self.hoy.date(), self.hoy.date())
+
+        self.assertEqual(reports.generar_reporte(reporte.id), ReporteExport.Estado.LISTO)
+        self.assertIsNone(reports.generar_reporte(reporte.id))
+
+    def test_error_se_registra_y_permite_reintentar(self):
+        with mock.patch.dict(reports.RENDERERS, {'xlsx': mock.Mock(side_effect=ValueError('sin datos'))}):
+            fallido = self.pedir()
+
+        self.assertEqual(self.estado(fallido.data['id'])['estado'], 'ERROR')
+        self.assertEqual(self.estado(fallido.data['id'])['error'], 'sin datos')
+
+        reintento = self.pedir()
+        self.assertEqual(reintento.status_code, 202)
+        self.assertEqual(self.estado(reintento.data['id'])['estado'], 'LISTO')
+
+    @override_settings(REPORTES_EN_CELERY=True)
+    def test_encola_en_celery(self):
+        with mock.patch('apps.analytics.tasks.generar_reporte_task.delay') as delay:
+            response = self.pedir()
+
+        delay.assert_called_once_with(response.data['id'])
+        self.assertEqual(self.estado(response.data['id'])['estado'], 'PENDIENTE')
+
+    @override_settings(REPORTES_EN_CELERY=True)
+    def test_sin_broker_genera_en_el_request(self):
+        with mock.patch('apps.analytics.tasks.generar_reporte_task.delay', side_effect=OSError('broker')):
+            response = self.pedir()
+
+        self.assertEqual(self.estado(response.data['id'])['estado'], 'LISTO')
+
+    def test_descarga_antes_de_tiempo_y_otra_sucursal(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            reporte, _ = reports.solicitar_reporte(self.sucursal, 'pdf', self.hoy.date(), self.hoy.date())
+
+        self.assertEqual(self.api.get(reverse('report-job-download', args=[reporte.id])).status_code, 409)
+
+        otro = Usuario.objects.create_user(
+            username='otro', password='x', centro_estetica=self.centro, rol=Usuario.Rol.ADMIN,
+        )
+        api = APIClient()
+        api.force_authenticate(otro)
+        self.assertEqual(api.get(reverse('report-job-detail', args=[reporte.id])).status_code, 404)
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.pedir(format='docx').status_code, 400)
+        self.assertEqual(self.pedir(start_date='ayer').status_code, 400)
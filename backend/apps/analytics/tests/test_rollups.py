@@ -0,0 +1,403 @@
+"""
+Tests de los resúmenes diarios (apps.analytics.rollups).
+
+Las señales recalculan el día tocado por cada escritura, el comando
+``recalcular_resumenes_diarios`` los reconstruye por rango y los reportes de
+ingresos, turnos y medios de pago los leen en lugar de agregar los datos crudos.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+import threading
+import time
+
+import pytest
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.analytics import rollups
+from apps.analytics.models import ResumenDiario, ResumenDiarioClientes, ResumenDiarioMedioPago
+from apps.analytics.utils import AnalyticsCalculator
+from apps.empleados.models import CentroEstetica, Sucursal, Usuario
+from apps.finanzas.models import Transaction, TransactionCategory
+from apps.turnos.models import Turno
+
+from .base import AnalyticsTestBase
+
+
+class ResumenIncrementalTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.cliente = self.crear_cliente()
+        self.dia = (self.hoy - timedelta(days=10)).date()
+
+    def resumen(self, fecha=None):
+        return ResumenDiario.objects.get(sucursal=self.sucursal, fecha=fecha or self.dia)
+
+    def test_transacciones_por_tipo_y_medio_de_pago(self):
+        self.crear_ingreso(self.cliente, '1000', payment_method='CASH')
+        self.crear_ingreso(self.cliente, '500', tipo='INCOME_PRODUCT', payment_method='CASH')
+        self.crear_ingreso(self.cliente, '300', tipo='INCOME_OTHER', payment_method='DEBIT_CARD')
+        self.crear_ingreso(None, '200', tipo='EXPENSE', payment_method='CASH')
+
+        resumen = self.resumen()
+        self.assertEqual(resumen.ingresos_servicios, Decimal('1000'))
+        self.assertEqual(resumen.ingresos_productos, Decimal('500'))
+        self.assertEqual(resumen.ingresos_otros, Decimal('300'))
+        self.assertEqual(resumen.cantidad_ingresos, 3)
+        self.assertEqual((resumen.egresos, resumen.cantidad_egresos), (Decimal('200'), 1))
+
+        # Los egresos no cuentan como medio de pago de ingresos
+        medios = dict(ResumenDiarioMedioPago.objects.filter(
+            sucursal=self.sucursal, fecha=self.dia
+        ).values_list('medio_pago', 'monto'))
+        self.assertEqual(medios, {'CASH': Decimal('1500'), 'DEBIT_CARD': Decimal('300')})
+
+    def test_mover_una_transaccion_recalcula_ambos_dias(self):
+        ingreso = self.crear_ingreso(self.cliente, '1000')
+        otro_dia = self.dia - timedelta(days=3)
+
+        ingreso = Transaction.objects.get(pk=ingreso.pk)
+        ingreso.date = otro_dia
+        with self.captureOnCommitCallbacks(execute=True):
+            ingreso.save()
+
+        self.assertEqual(self.resumen().ingresos_servicios, 0)
+        self.assertEqual(self.resumen(otro_dia).ingresos_servicios, Decimal('1000'))
+
+    def test_borrar_transaccion(self):
+        self.crear_ingreso(self.cliente, '1000')
+        ingreso = self.crear_ingreso(self.cliente, '400')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingreso.delete()
+
+        self.assertEqual(self.resumen().ingresos_servicios, Decimal('1000'))
+        self.assertEqual(self.resumen().cantidad_ingresos, 1)
+
+    def test_turnos_por_estado(self):
+        turno = self.crear_turno(self.cliente, dias_atras=10, estado=Turno.Estado.PENDIENTE)
+        self.crear_turno(self.cliente, dias_atras=10, hora=11)
+
+        resumen = self.resumen(rollups.local_date(turno.fecha_hora_inicio))
+        self.assertEqual((resumen.turnos_pendientes, resumen.turnos_completados), (1, 1))
+        self.assertEqual(resumen.monto_turnos_completados, self.servicio.precio)
+
+        turno.estado = Turno.Estado.CANCELADO
+        with self.captureOnCommitCallbacks(execute=True):
+            turno.save()
+
+        resumen.refresh_from_db()
+        self.assertEqual((resumen.turnos_pendientes, resumen.turnos_cancelados), (0, 1))
+
+    def test_reprogramar_turno_mueve_el_conteo(self):
+        turno = self.crear_turno(self.cliente, dias_atras=10)
+        dia_original = rollups.local_date(turno.fecha_hora_inicio)
+
+        turno = Turno.objects.get(pk=turno.pk)
+        turno.fecha_hora_inicio -= timedelta(days=2)
+        turno.fecha_hora_fin -= timedelta(days=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            turno.save()
+
+        self.assertEqual(self.resumen(dia_original).turnos_completados, 0)
+        self.assertEqual(self.resumen(dia_original - timedelta(days=2)).turnos_completados, 1)
+
+    def test_alta_de_cliente(self):
+        self.crear_cliente('Nueva')
+
+        # La señal recalcula el día del alta; el cliente del setUp ya fue
+        # retrocedido con update() y no cuenta
+        altas = ResumenDiarioClientes.objects.get(
+            centro_estetica=self.centro, fecha=rollups.local_date(self.hoy)
+        )
+        self.assertEqual(altas.clientes_nuevos, 1)
+
+    def test_borrado_en_cascada_desde_el_cliente(self):
+        turno = self.crear_turno(self.cliente)
+        dia = rollups.local_date(turno.fecha_hora_inicio)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente.delete()
+
+        self.assertEqual(self.resumen(dia).turnos_completados, 0)
+
+
+class ResumenConcurrenteTests(TransactionTestCase):
+    """Dos transacciones que escriben el mismo día a la vez, cada una en su hilo."""
+
+    def setUp(self):
+        centro = CentroEstetica.objects.create(nombre='Centro', telefono='1', email='c@c.com')
+        self.sucursal = Sucursal.objects.create(
+            centro_estetica=centro, nombre='Suc', direccion='Calle 1',
+            telefono='1', ciudad='CABA', provincia='BA',
+        )
+        self.categoria = TransactionCategory.objects.get(
+            branch=self.sucursal, name='Servicios', type='INCOME'
+        )
+        self.dia = timezone.localdate()
+
+    def ingreso(self, monto):
+        return Transaction.objects.create(
+            branch=self.sucursal, category=self.categoria, type='INCOME_SERVICE',
+            amount=Decimal(monto), date=self.dia, description='Ingreso',
+        )
+
+    def test_ninguna_pisa_a_la_otra(self):
+        escrita, seguir = threading.Event(), threading.Event()
+
+        def lenta():
+            try:
+                with transaction.atomic():
+                    self.ingreso('1000')
+                    escrita.set()
+                    seguir.wait(5)
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=lenta)
+        hilo.start()
+        escrita.wait(5)
+        # Se confirma mientras la otra sigue abierta: su recálculo no la ve
+        self.ingreso('400')
+        seguir.set()
+        hilo.join()
+
+        resumen = ResumenDiario.objects.get(sucursal=self.sucursal, fecha=self.dia)
+        self.assertEqual(resumen.ingresos_servicios, Decimal('1400'))
+        self.assertEqual(resumen.cantidad_ingresos, 2)
+
+
+class ReconstruccionTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.cliente = self.crear_cliente(dias_de_alta=5)
+        self.crear_ingreso(self.cliente, '1000', dias_atras=10, payment_method='CASH')
+        self.crear_ingreso(self.cliente, '700', dias_atras=40, tipo='INCOME_PRODUCT')
+        self.crear_ingreso(None, '300', dias_atras=10, tipo='EXPENSE')
+        self.crear_turno(self.cliente, dias_atras=10)
+        self.crear_turno(self.cliente, dias_atras=40, estado=Turno.Estado.NO_SHOW)
+
+    def snapshot(self):
+        return {
+            'dias': sorted(ResumenDiario.objects.values_list(
+                'sucursal_id', 'fecha', 'ingresos_servicios', 'ingresos_productos', 'egresos',
+                'cantidad_ingresos', 'turnos_completados', 'turnos_no_show', 'monto_turnos_completados'
+            )),
+            'medios': sorted(ResumenDiarioMedioPago.objects.values_list(
+                'sucursal_id', 'fecha', 'medio_pago', 'monto', 'cantidad'
+            )),
+        }
+
+    def test_reconstruir_coincide_con_las_senales(self):
+        incremental = self.snapshot()
+
+        rollups.rebuild_rollups()
+
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_repara_escrituras_sin_senales(self):
+        Transaction.objects.filter(type='INCOME_SERVICE').update(amount=Decimal('5000'))
+        Turno.objects.all().delete()
+        ResumenDiario.objects.filter(fecha=(self.hoy - timedelta(days=40)).date()).delete()
+
+        rollups.rebuild_rollups()
+
+        servicios = ResumenDiario.objects.aggregate(total=rollups.Sum('ingresos_servicios'))['total']
+        self.assertEqual(servicios, Decimal('5000'))
+        self.assertEqual(ResumenDiario.objects.aggregate(
+            total=rollups.Sum(rollups.TURNOS_TOTAL))['total'], 0)
+        self.assertTrue(ResumenDiario.objects.filter(ingresos_productos=Decimal('700')).exists())
+
+    def test_altas_por_fecha_real(self):
+        rollups.rebuild_rollups()
+
+        altas = dict(ResumenDiarioClientes.objects.values_list('fecha', 'clientes_nuevos'))
+        self.assertEqual(altas, {rollups.local_date(self.hoy - timedelta(days=5)): 1})
+
+    def test_rango_solo_toca_sus_dias(self):
+        Transaction.objects.all().update(amount=Decimal('1'))
+        desde = (self.hoy - timedelta(days=20)).date()
+
+        rollups.rebuild_rollups(sucursal_id=self.sucursal.id, desde=desde)
+
+        self.assertEqual(ResumenDiario.objects.get(fecha=(self.hoy - timedelta(days=10)).date()).egresos, 1)
+        # El día 40 queda como estaba
+        self.assertEqual(
+            ResumenDiario.objects.get(fecha=(self.hoy - timedelta(days=40)).date()).ingresos_productos,
+            Decimal('700')
+        )
+
+    def test_comando(self):
+        dias = ResumenDiario.objects.count()
+        ResumenDiario.objects.all().delete()
+        out = StringIO()
+
+        call_command('recalcular_resumenes_diarios', stdout=out)
+
+        self.assertIn('Resúmenes recalculados', out.getvalue())
+        self.assertEqual(ResumenDiario.objects.count(), dias)
+
+
+class LecturaDesdeResumenesTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        self.cliente = self.crear_cliente()
+        for dias, monto, tipo, medio in [
+            (3, '1000', 'INCOME_SERVICE', 'CASH'),
+            (3, '200', 'INCOME_PRODUCT', 'DEBIT_CARD'),
+            (12, '800', 'INCOME_SERVICE', 'CASH'),
+            (25, '50', 'INCOME_OTHER', 'MERCADOPAGO'),
+            (12, '400', 'EXPENSE', 'CASH'),
+        ]:
+            self.crear_ingreso(self.cliente, monto, dias_atras=dias, tipo=tipo, payment_method=medio)
+        self.crear_turno(self.cliente, dias_atras=3)
+        self.crear_turno(self.cliente, dias_atras=12, estado=Turno.Estado.CANCELADO)
+        self.end = self.hoy.date()
+        self.start = self.end - timedelta(days=28)
+
+    def test_metricas_del_periodo(self):
+        metricas = AnalyticsCalculator._get_period_metrics(self.sucursal.id, self.start, self.end)
+
+        self.assertEqual(metricas['revenue'], Decimal('2050'))
+        self.assertEqual(metricas['services_revenue'], Decimal('1800'))
+        self.assertEqual(metricas['appointments'], 1)
+        self.assertEqual(metricas['completion_rate'], 50.0)
+        self.assertEqual(metricas['avg_ticket'], 512.5)
+
+    def test_resumen_por_sucursal_cuenta_altas_del_centro(self):
+        # Antes filtraba Cliente por un campo inexistente y fallaba con sucursal
+        rollups.rebuild_rollups()
+        self.crear_cliente('Nueva', dias_de_alta=2)
+        rollups.rebuild_rollups()
+
+        metricas = AnalyticsCalculator._get_period_metrics(self.sucursal.id, self.start, self.end)
+
+        self.assertEqual(metricas['new_clients'], 1)
+
+    def test_evolucion_por_mes_y_semana(self):
+        por_dia = AnalyticsCalculator.get_revenue_evolution(self.sucursal.id, self.start, self.end)
+        por_mes = AnalyticsCalculator.get_revenue_evolution(
+            self.sucursal.id, self.start, self.end, 'month'
+        )
+        por_semana = AnalyticsCalculator.get_revenue_evolution(
+            self.sucursal.id, self.start, self.end, 'week'
+        )
+
+        # Los días con solo egresos o turnos no aparecen
+        self.assertEqual(len(por_dia), 3)
+        for serie in (por_dia, por_mes, por_semana):
+            self.assertEqual(sum(item['total_revenue'] for item in serie), 2050.0)
+        self.assertEqual(sum(item['services_revenue'] for item in por_semana), 1800.0)
+
+    def test_medios_de_pago(self):
+        medios = AnalyticsCalculator.get_revenue_by_payment_method(
+            self.sucursal.id, self.start, self.end
+        )
+
+        self.assertEqual(
+            [(m['method'], m['amount'], m['count']) for m in medios],
+            [('CASH', 1800.0, 2), ('DEBIT_CARD', 200.0, 1), ('MERCADOPAGO', 50.0, 1)]
+        )
+
+    def test_tendencias_estacionales(self):
+        turno = Turno.objects.get(estado=Turno.Estado.COMPLETADO)
+        fecha = rollups.local_date(turno.fecha_hora_inicio)
+
+        trends = AnalyticsCalculator.get_seasonal_trends(self.sucursal.id, fecha.year)
+
+        mes = trends['monthly_trends'][fecha.month - 1]
+        self.assertEqual((mes['appointments'], mes['revenue']), (1, 20000.0))
+        self.assertEqual(trends['total_year_appointments'], 1)
+
+    def test_rango_largo_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            AnalyticsCalculator.get_revenue_evolution(
+                self.sucursal.id, self.end - timedelta(days=365), self.end, 'month'
+            )
+
+    def test_summary_de_finanzas(self):
+        admin = Usuario.objects.create_user(
+            username='admin', password='x', centro_estetica=self.centro,
+            sucursal=self.sucursal, rol=Usuario.Rol.ADMIN,
+        )
+        api = APIClient()
+        api.force_authenticate(admin)
+        url = reverse('transaction-summary')
+        params = {'date_from': self.start.isoformat(), 'date_to': self.end.isoformat()}
+
+        desde_resumenes = api.get(url, params).data
+        # Con un filtro que los resúmenes no tienen, agrega las transacciones
+        por_tipo = api.get(url, {**params, 'type': 'INCOME_SERVICE'}).data
+
+        self.assertEqual(desde_resumenes['income'], {'total': 2050.0, 'count': 4})
+        self.assertEqual(desde_resumenes['expense'], {'total': 400.0, 'count': 1})
+        self.assertEqual(por_tipo['income'], {'total': 1800.0, 'count': 2})
+        self.assertEqual(api.get(url, {'date_from': 'no-es-fecha'}).status_code, 400)
+
+
+@pytest.mark.benchmark
+class ResumenesBenchmark(AnalyticsTestBase):
+    """
+    Dos años de historia (200.000 transacciones, 50.000 turnos) cargados con
+    bulk_create: reconstrucción completa y resumen del dashboard de un año
+    contra la agregación cruda.
+    """
+    DIAS = 730
+    TRANSACCIONES = 200_000
+    TURNOS = 50_000
+
+    def setUp(self):
+        super().setUp()
+        cliente = self.crear_cliente()
+        tipos = ['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER', 'EXPENSE']
+        medios = ['CASH', 'DEBIT_CARD', 'CREDIT_CARD', 'MERCADOPAGO']
+        Transaction.objects.bulk_create((
+            Transaction(
+                branch=self.sucursal, category=self.categoria, type=tipos[i % 4],
+                payment_method=medios[i % 3], amount=Decimal(1000 + i % 500),
+                date=(self.hoy - timedelta(days=i % self.DIAS)).date(), description='Mov',
+            )
+            for i in range(self.TRANSACCIONES)
+        ), batch_size=5000)
+        Turno.objects.bulk_create((
+            Turno(
+                sucursal=self.sucursal, cliente=cliente, servicio=self.servicio,
+                profesional=self.profesional,
+                fecha_hora_inicio=self.hoy - timedelta(days=i % self.DIAS, hours=i % 8),
+                fecha_hora_fin=self.hoy - timedelta(days=i % self.DIAS, hours=i % 8) + timedelta(hours=1),
+                estado=Turno.Estado.COMPLETADO, monto_total=Decimal('20000'),
+            )
+            for i in range(self.TURNOS)
+        ), batch_size=5000)
+
+    def test_resumen_anual(self):
+        end = self.hoy.date()
+        start = end - timedelta(days=365)
+
+        inicio = time.perf_counter()
+        crudo = Transaction.objects.filter(
+            branch=self.sucursal, date__gte=start, date__lte=end, type__in=rollups.INCOME_TYPES
+        ).aggregate(total=rollups.Sum('amount'))['total']
+        agregacion_cruda = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        escritos = rollups.rebuild_rollups()
+        reconstruccion = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        resumen = AnalyticsCalculator.get_dashboard_summary(self.sucursal.id, start, end)
+        evolucion = AnalyticsCalculator.get_revenue_evolution(self.sucursal.id, start, end, 'month')
+        lectura = time.perf_counter() - inicio
+
+        # Los turnos en hora local pueden caer un día antes del primer día de transacciones
+        self.assertIn(escritos['dias'], (self.DIAS, self.DIAS + 1))
+        self.assertEqual(resumen['kpis']['total_revenue'], crudo)
+        self.assertEqual(sum(item['total_revenue'] for item in evolucion), float(crudo))
+        print(f'\nResúmenes de {self.DIAS} días: reconstrucción {reconstruccion:.2f}s, '
+              f'dashboard + evolución de un año {lectura:.3f}s '
+              f'(suma cruda de ingresos del año: {agregacion_cruda:.3f}s)')
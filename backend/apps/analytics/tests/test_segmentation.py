@@ -0,0 +1,164 @@
+"""
+Tests del motor de segmentación de clientes (apps.analytics.segmentation).
+
+El motor reemplaza al loop que llamaba a ``get_client_status`` por cada cliente:
+tiene que dar las mismas etiquetas con una cantidad fija de consultas.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+
+from apps.analytics import segmentation
+from apps.analytics.utils import AnalyticsCalculator
+from apps.clientes.models import Cliente
+from apps.empleados.models import CentroEstetica, Sucursal
+from apps.finanzas.models import Transaction
+from apps.turnos.models import Turno
+
+from .base import AnalyticsTestBase
+
+
+class SegmentacionTests(AnalyticsTestBase):
+    def setUp(self):
+        super().setUp()
+        # Seis clientes en el ranking de LTV → corte en int(6 * 0.2) = 1: solo el primero es VIP
+        self.vip = self.crear_cliente('Vip')
+        self.crear_ingreso(self.vip, '90000')
+        self.crear_turno(self.vip, dias_atras=200)
+
+        self.activa = self.crear_cliente('Activa')
+        self.crear_ingreso(self.activa, '5000')
+        self.crear_turno(self.activa, dias_atras=10)
+
+        self.en_riesgo = self.crear_cliente('Riesgo')
+        self.crear_ingreso(self.en_riesgo, '4000')
+        self.crear_turno(self.en_riesgo, dias_atras=60)
+
+        self.inactiva = self.crear_cliente('Inactiva')
+        self.crear_ingreso(self.inactiva, '3000')
+        self.crear_turno(self.inactiva, dias_atras=120)
+
+        self.sin_visitas = self.crear_cliente('SinVisitas')
+        self.crear_ingreso(self.sin_visitas, '2000')
+        # Un turno cancelado no cuenta como visita
+        self.crear_turno(self.sin_visitas, dias_atras=5, estado=Turno.Estado.CANCELADO)
+
+        # Cliente nueva: aunque gaste como VIP, manda la antigüedad
+        self.nueva = self.crear_cliente('Nueva', dias_de_alta=5)
+        self.crear_ingreso(self.nueva, '1000')
+
+    def test_etiquetas_por_cliente(self):
+        estados = segmentation.segment_clients(self.sucursal.id)
+
+        self.assertEqual(estados, {
+            self.vip.id: 'VIP',
+            self.activa.id: 'ACTIVE',
+            self.en_riesgo.id: 'AT_RISK',
+            self.inactiva.id: 'INACTIVE',
+            self.sin_visitas.id: 'INACTIVE',
+            self.nueva.id: 'NEW',
+        })
+
+    def test_coincide_con_el_estado_individual(self):
+        """La segmentación por conjuntos y get_client_status no pueden divergir."""
+        estados = segmentation.segment_clients(self.sucursal.id)
+
+        for cliente_id, estado in estados.items():
+            if estado == 'NEW':
+                continue
+            self.assertEqual(AnalyticsCalculator.get_client_status(cliente_id), estado)
+
+    def test_conteo_por_segmento(self):
+        self.assertEqual(AnalyticsCalculator.get_client_segmentation(self.sucursal.id), {
+            'VIP': 1, 'ACTIVE': 1, 'AT_RISK': 1, 'INACTIVE': 2, 'NEW': 1,
+        })
+
+    def test_empates_en_el_umbral_son_todos_vip(self):
+        empatada = self.crear_cliente('Empatada')
+        self.crear_ingreso(empatada, '90000')
+        # 7 en el ranking → corte en 1, pero las dos primeras tienen el mismo LTV
+        estados = segmentation.segment_clients(self.sucursal.id)
+
+        self.assertEqual(estados[self.vip.id], 'VIP')
+        self.assertEqual(estados[empatada.id], 'VIP')
+
+    def test_sin_ranking_suficiente_no_hay_vip(self):
+        Transaction.objects.filter(client__in=[self.activa, self.en_riesgo]).delete()
+
+        estados = segmentation.segment_clients(self.sucursal.id)
+
+        self.assertEqual(segmentation.get_vip_threshold(), 0)
+        self.assertEqual(estados[self.vip.id], 'INACTIVE')
+
+    def test_clientes_de_otro_centro_no_se_cuentan(self):
+        otro_centro = CentroEstetica.objects.create(nombre='Otro', telefono='2', email='o@o.com')
+        Sucursal.objects.create(
+            centro_estetica=otro_centro, nombre='Suc 2', direccion='Calle 2',
+            telefono='2', ciudad='CABA', provincia='BA',
+        )
+        ajena = self.crear_cliente('Ajena', centro=otro_centro)
+
+        self.assertNotIn(ajena.id, segmentation.segment_clients(self.sucursal.id))
+
+    def test_cantidad_de_consultas_no_depende_de_los_clientes(self):
+        with self.assertNumQueries(4):
+            segmentation.count_segments(self.sucursal.id)
+
+        for i in range(20):
+            cliente = self.crear_cliente(f'Extra {i}')
+            self.crear_ingreso(cliente, '100')
+            self.crear_turno(cliente, dias_atras=i)
+
+        with self.assertNumQueries(4):
+            segmentation.count_segments(self.sucursal.id)
+
+
+@pytest.mark.benchmark
+class SegmentacionBenchmark(AnalyticsTestBase):
+    """
+    50.000 clientes en una sucursal. Se cargan con bulk_create para no pasar por
+    las señales: lo que se mide es la segmentación, no la carga.
+    """
+    CLIENTES = 50_000
+
+    def setUp(self):
+        super().setUp()
+        alta = self.hoy - timedelta(days=400)
+        Cliente.objects.bulk_create(
+            Cliente(centro_estetica=self.centro, nombre=f'C{i}', apellido='B', telefono='11')
+            for i in range(self.CLIENTES)
+        )
+        Cliente.objects.update(creado_en=alta)
+        ids = list(Cliente.objects.values_list('id', flat=True))
+
+        # Dos de cada cinco clientes compraron algo; uno de cada tres vino alguna vez
+        Transaction.objects.bulk_create(
+            Transaction(
+                branch=self.sucursal, category=self.categoria, type='INCOME_SERVICE',
+                amount=Decimal(1000 + (i * 37) % 50000), date=self.hoy.date(),
+                description='Ingreso', client_id=cliente_id,
+            )
+            for i, cliente_id in enumerate(ids) if i % 5 < 2
+        )
+        Turno.objects.bulk_create(
+            Turno(
+                sucursal=self.sucursal, cliente_id=cliente_id, servicio=self.servicio,
+                profesional=self.profesional,
+                fecha_hora_inicio=self.hoy - timedelta(days=i % 150),
+                fecha_hora_fin=self.hoy - timedelta(days=i % 150) + timedelta(hours=1),
+                estado=Turno.Estado.COMPLETADO, monto_total=Decimal('20000'),
+            )
+            for i, cliente_id in enumerate(ids) if i % 3 == 0
+        )
+
+    def test_segmentacion_de_50k_clientes(self):
+        inicio = time.perf_counter()
+        with self.assertNumQueries(4):
+            conteo = AnalyticsCalculator.get_client_segmentation(self.sucursal.id)
+        duracion = time.perf_counter() - inicio
+
+        self.assertEqual(sum(conteo.values()), self.CLIENTES)
+        self.assertGreater(conteo['VIP'], 0)
+        print(f'\nSegmentación de {self.CLIENTES} clientes: {duracion:.2f}s -> {conteo}')
@@ -23,6 +23,9 @@ from .views import (
     ClientProductsView,
     ClientServicesView,
     ClientBehaviorView,
+
+    # Caché
+    AnalyticsCacheStatsView,
 )
 
 from .export_views import (
@@ -32,6 +35,13 @@ from .export_views import (
     ExportPDFView,
 )
 
+from .report_views import (
+    # Reportes asíncronos
+    ReportJobListView,
+    ReportJobDetailView,
+    ReportJobDownloadView,
+)
+
 from .dashboard_home_views import (
     # Dashboard Home (Página Principal)
     DashboardHomeView,
@@ -69,4 +79,12 @@ urlpatterns = [
     path('export/csv/', ExportCSVView.as_view(), name='export-csv'),
     path('export/excel/', ExportExcelView.as_view(), name='export-excel'),
     path('export/pdf/', ExportPDFView.as_view(), name='export-pdf'),
+
+    # ========== REPORTES ASÍNCRONOS (EXCEL / PDF) ==========
+    path('reports/', ReportJobListView.as_view(), name='report-jobs'),
+    path('reports/<int:pk>/', ReportJobDetailView.as_view(), name='report-job-detail'),
+    path('reports/<int:pk>/download/', ReportJobDownloadView.as_view(), name='report-job-download'),
+
+    # ========== CACHÉ ==========
+    path('cache/stats/', AnalyticsCacheStatsView.as_view(), name='cache-stats'),
 ]
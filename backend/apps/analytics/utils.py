@@ -3,19 +3,23 @@ Utilidades para cálculos de analytics
 Contiene funciones para agregaciones SQL optimizadas y cálculos de métricas
 """
 
-from django.db.models import Sum, Count, Avg, Q, F, FloatField, DecimalField, ExpressionWrapper
-from django.db.models.functions import TruncMonth, TruncWeek, TruncDay, ExtractWeekDay, ExtractHour, ExtractMonth
+from django.db.models import (
+    Sum, Count, Avg, Q, F, FloatField, DecimalField, ExpressionWrapper, OuterRef, Subquery, Value
+)
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek, TruncDay, ExtractWeekDay, ExtractHour, ExtractMonth
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
 
 from apps.turnos.models import Turno
 from apps.finanzas.models import Transaction
-from apps.clientes.models import Cliente
 from apps.servicios.models import Servicio
 from apps.inventario.models import Producto, MovimientoInventario
 from apps.empleados.models import Usuario
 
+from . import client_metrics, occupancy, rollups, segmentation
+from .models import ClienteMetricas
+
 
 class AnalyticsCalculator:
     """
@@ -92,71 +96,53 @@ class AnalyticsCalculator:
     def _get_period_metrics(sucursal_id, start_date, end_date):
         """
         Obtiene métricas para un período específico
+
+        Ingresos, turnos y altas salen de los resúmenes diarios (una fila por
+        sucursal y día); solo los clientes activos necesitan los turnos crudos.
         """
-        # Filtro base de transacciones
-        transactions_qs = Transaction.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        )
-        if sucursal_id:
-            transactions_qs = transactions_qs.filter(branch_id=sucursal_id)
-
-        # Ingresos por tipo
-        revenue_data = transactions_qs.filter(
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
-        ).aggregate(
-            total=Sum('amount'),
-            services=Sum('amount', filter=Q(type='INCOME_SERVICE')),
-            products=Sum('amount', filter=Q(type='INCOME_PRODUCT')),
-            other=Sum('amount', filter=Q(type='INCOME_OTHER')),
-            count=Count('id')
+        daily = rollups.daily_rows(sucursal_id, start_date, end_date).aggregate(
+            services=Sum('ingresos_servicios'),
+            products=Sum('ingresos_productos'),
+            other=Sum('ingresos_otros'),
+            count=Sum('cantidad_ingresos'),
+            turnos=Sum(rollups.TURNOS_TOTAL),
+            completed=Sum('turnos_completados')
         )
 
-        # Filtro base de turnos
+        services = daily['services'] or 0
+        products = daily['products'] or 0
+        other = daily['other'] or 0
+        revenue = services + products + other
+
+        total_turnos = daily['turnos'] or 0
+        completed_turnos = daily['completed'] or 0
+        completion_rate = (completed_turnos / total_turnos * 100) if total_turnos > 0 else 0
+
+        # Clientes activos (con al menos 1 turno en el período)
         turnos_qs = Turno.objects.filter(
             fecha_hora_inicio__date__gte=start_date,
             fecha_hora_inicio__date__lte=end_date
         )
         if sucursal_id:
             turnos_qs = turnos_qs.filter(sucursal_id=sucursal_id)
-
-        # Métricas de turnos
-        turnos_data = turnos_qs.aggregate(
-            total=Count('id'),
-            completed=Count('id', filter=Q(estado='COMPLETADO')),
-            canceled=Count('id', filter=Q(estado='CANCELADO')),
-            no_show=Count('id', filter=Q(estado='NO_SHOW'))
-        )
-
-        total_turnos = turnos_data['total'] or 0
-        completed_turnos = turnos_data['completed'] or 0
-        completion_rate = (completed_turnos / total_turnos * 100) if total_turnos > 0 else 0
-
-        # Clientes activos (con al menos 1 turno en el período)
         active_clients = turnos_qs.values('cliente_id').distinct().count()
 
-        # Clientes nuevos (primera visita en este período)
-        new_clients = Cliente.objects.filter(
-            creado_en__date__gte=start_date,
-            creado_en__date__lte=end_date
-        )
-        if sucursal_id:
-            new_clients = new_clients.filter(sucursal__id=sucursal_id)
-        new_clients_count = new_clients.count()
+        # Clientes nuevos (altas del período en el centro)
+        new_clients_count = rollups.new_clients(sucursal_id, start_date, end_date)
 
         # Tasa de retención (clientes que volvieron vs nuevos)
         returning_clients = active_clients - new_clients_count
         retention_rate = (returning_clients / active_clients * 100) if active_clients > 0 else 0
 
         # Ticket promedio
-        revenue_count = revenue_data['count'] or 0
-        avg_ticket = (revenue_data['total'] / revenue_count) if revenue_count > 0 else 0
+        revenue_count = daily['count'] or 0
+        avg_ticket = (revenue / revenue_count) if revenue_count > 0 else 0
 
         return {
-            'revenue': revenue_data['total'] or 0,
-            'services_revenue': revenue_data['services'] or 0,
-            'products_revenue': revenue_data['products'] or 0,
-            'other_revenue': revenue_data['other'] or 0,
+            'revenue': revenue,
+            'services_revenue': services,
+            'products_revenue': products,
+            'other_revenue': other,
             'appointments': completed_turnos,
             'completion_rate': round(completion_rate, 2),
             'active_clients': active_clients,
@@ -183,16 +169,13 @@ class AnalyticsCalculator:
         """
         Obtiene la evolución de ingresos en el tiempo
         granularity: 'day', 'week', 'month'
+
+        Semanas y meses se arman sumando los resúmenes diarios.
         """
-        transactions_qs = Transaction.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
+        daily_qs = rollups.daily_rows(sucursal_id, start_date, end_date).filter(
+            cantidad_ingresos__gt=0
         )
 
-        if sucursal_id:
-            transactions_qs = transactions_qs.filter(branch_id=sucursal_id)
-
         # Seleccionar función de truncado según granularidad
         if granularity == 'month':
             trunc_func = TruncMonth
@@ -205,12 +188,12 @@ class AnalyticsCalculator:
             date_format = '%Y-%m-%d'
 
         # Agrupar por período
-        evolution = transactions_qs.annotate(
-            period=trunc_func('date')
+        evolution = daily_qs.annotate(
+            period=trunc_func('fecha')
         ).values('period').annotate(
-            services_revenue=Sum('amount', filter=Q(type='INCOME_SERVICE')),
-            products_revenue=Sum('amount', filter=Q(type='INCOME_PRODUCT')),
-            total_revenue=Sum('amount')
+            services_revenue=Sum('ingresos_servicios'),
+            products_revenue=Sum('ingresos_productos'),
+            total_revenue=Sum(rollups.INCOME_TOTAL)
         ).order_by('period')
 
         # Formatear resultados
@@ -230,18 +213,11 @@ class AnalyticsCalculator:
         """
         Obtiene distribución de ingresos por método de pago
         """
-        transactions_qs = Transaction.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT', 'INCOME_OTHER']
-        )
-
-        if sucursal_id:
-            transactions_qs = transactions_qs.filter(branch_id=sucursal_id)
-
-        by_method = transactions_qs.values('payment_method').annotate(
-            amount=Sum('amount'),
-            count=Count('id')
+        by_method = rollups.payment_method_rows(sucursal_id, start_date, end_date).values(
+            'medio_pago'
+        ).annotate(
+            amount=Sum('monto'),
+            count=Sum('cantidad')
         ).order_by('-amount')
 
         total_revenue = sum(item['amount'] for item in by_method if item['amount'])
@@ -250,7 +226,7 @@ class AnalyticsCalculator:
         for item in by_method:
             if item['amount']:
                 result.append({
-                    'method': item['payment_method'],
+                    'method': item['medio_pago'],
                     'amount': float(item['amount']),
                     'percentage': round((item['amount'] / total_revenue * 100), 2) if total_revenue > 0 else 0,
                     'count': item['count']
@@ -481,174 +457,90 @@ class AnalyticsCalculator:
     def get_client_lifetime_value(cliente_id):
         """
         Calcula el Lifetime Value total de un cliente
+        Lee de ClienteMetricas (mantenida por señales)
         """
-        ltv = Transaction.objects.filter(
-            client_id=cliente_id,
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT']
-        ).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-
-        return float(ltv)
+        return float(client_metrics.get_client_metrics(cliente_id).ltv)
 
     @staticmethod
     def get_client_frequency(cliente_id):
         """
         Calcula la frecuencia promedio de visitas en días
+        Lee de ClienteMetricas (mantenida por señales)
         """
-        visitas = list(Turno.objects.filter(
-            cliente_id=cliente_id,
-            estado='COMPLETADO'
-        ).order_by('fecha_hora_inicio').values_list('fecha_hora_inicio', flat=True))
-
-        if len(visitas) < 2:
-            return None
-
-        # Calcular intervalos entre visitas consecutivas
-        intervals = []
-        for i in range(1, len(visitas)):
-            delta = (visitas[i] - visitas[i-1]).days
-            if delta > 0:  # Ignorar visitas el mismo día
-                intervals.append(delta)
-
-        average_interval = sum(intervals) / len(intervals) if intervals else None
-        return round(average_interval, 1) if average_interval else None
+        return client_metrics.get_client_metrics(cliente_id).frecuencia_promedio_dias
 
     @staticmethod
     def get_client_status(cliente_id):
         """
         Determina el estado del cliente: VIP, ACTIVE, AT_RISK, INACTIVE
         """
-        # Obtener LTV del cliente
-        ltv = AnalyticsCalculator.get_client_lifetime_value(cliente_id)
-
-        # Obtener percentil 80 (top 20%) de LTV
-        all_clients_ltv = Transaction.objects.filter(
-            type__in=['INCOME_SERVICE', 'INCOME_PRODUCT']
-        ).values('client_id').annotate(
-            client_ltv=Sum('amount')
-        ).order_by('-client_ltv')
-
-        # Si hay suficientes clientes, calcular threshold VIP
-        vip_threshold = 0
-        if all_clients_ltv.count() > 5:
-            threshold_index = int(all_clients_ltv.count() * 0.2)
-            vip_clients = list(all_clients_ltv)[:threshold_index]
-            if vip_clients:
-                vip_threshold = min([c['client_ltv'] for c in vip_clients])
-
-        # Check VIP
-        if ltv >= vip_threshold and vip_threshold > 0:
-            return 'VIP'
-
-        # Obtener última visita
-        last_visit = Turno.objects.filter(
-            cliente_id=cliente_id,
-            estado='COMPLETADO'
-        ).order_by('-fecha_hora_inicio').first()
+        metricas = client_metrics.get_client_metrics(cliente_id)
 
-        if not last_visit:
-            return 'INACTIVE'
-
-        days_since_last = (timezone.now().date() - last_visit.fecha_hora_inicio.date()).days
+        # Check VIP: LTV del cliente contra el umbral del top 20%
+        vip_threshold = segmentation.get_vip_threshold()
+        if metricas.ltv >= vip_threshold and vip_threshold > 0:
+            return 'VIP'
 
-        # Determinar estado según días desde última visita
-        if days_since_last <= 30:
-            return 'ACTIVE'
-        elif days_since_last <= 90:
-            return 'AT_RISK'
-        else:
-            return 'INACTIVE'
+        return segmentation.status_from_last_visit(metricas.ultima_visita)
 
     @staticmethod
     def get_client_segmentation(sucursal_id=None):
         """
         Segmenta todos los clientes por estado
+        Usa consultas agrupadas: la cantidad de queries no depende de la cantidad de clientes
         """
-        clientes_qs = Cliente.objects.all()
-        if sucursal_id:
-            clientes_qs = clientes_qs.filter(centro_estetica__sucursales__id=sucursal_id)
-
-        segmentation = {
-            'VIP': 0,
-            'ACTIVE': 0,
-            'AT_RISK': 0,
-            'INACTIVE': 0,
-            'NEW': 0
-        }
-
-        # Esto puede ser lento con muchos clientes - considerar caché
-        for cliente in clientes_qs:
-            # Clientes nuevos (menos de 30 días)
-            if cliente.creado_en and (timezone.now().date() - cliente.creado_en.date()).days <= 30:
-                segmentation['NEW'] += 1
-            else:
-                status = AnalyticsCalculator.get_client_status(cliente.id)
-                segmentation[status] += 1
-
-        return segmentation
+        return segmentation.count_segments(sucursal_id)
 
     @staticmethod
     def get_top_clients(sucursal_id=None, limit=20):
         """
         Obtiene los top clientes por LTV (Lifetime Value)
+        Lee de ClienteMetricas: una consulta para el top y dos para el umbral VIP
         """
-        from apps.finanzas.models import Transaction
+        clientes_qs = segmentation.clients_for_branch(sucursal_id)
 
-        # Obtener clientes
-        clientes_qs = Cliente.objects.all()
-        if sucursal_id:
-            clientes_qs = clientes_qs.filter(centro_estetica__sucursales__id=sucursal_id)
+        # Solo clientes con actividad
+        top = ClienteMetricas.objects.filter(
+            cliente__in=clientes_qs.values('id')
+        ).filter(
+            Q(ltv__gt=0) | Q(visitas_completadas__gt=0)
+        ).select_related('cliente').order_by(
+            '-ltv', 'cliente__apellido', 'cliente__nombre'
+        )[:limit]
+
+        vip_threshold = segmentation.get_vip_threshold()
+        today = timezone.now().date()
 
-        # Calcular LTV por cliente usando transacciones
         clients_data = []
-        for cliente in clientes_qs:
-            # Calcular LTV (total gastado)
-            ltv = Transaction.objects.filter(
-                client_id=cliente.id,
-                type__in=['INCOME_SERVICE', 'INCOME_PRODUCT']
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            # Contar visitas (turnos completados)
-            visits_count = Turno.objects.filter(
-                cliente_id=cliente.id,
-                estado='COMPLETADO'
-            ).count()
-
-            # Última visita
-            last_visit = Turno.objects.filter(
-                cliente_id=cliente.id,
-                estado='COMPLETADO'
-            ).order_by('-fecha_hora_inicio').first()
-
-            last_visit_date = last_visit.fecha_hora_inicio.date() if last_visit else None
-
-            # Determinar estado
-            status = AnalyticsCalculator.get_client_status(cliente.id)
-
-            if ltv > 0 or visits_count > 0:  # Solo incluir clientes con actividad
-                clients_data.append({
-                    'client_id': cliente.id,
-                    'client_name': f"{cliente.nombre} {cliente.apellido}",
-                    'email': cliente.email or '',
-                    'phone': cliente.telefono or '',
-                    'ltv': float(ltv),
-                    'visits_count': visits_count,
-                    'last_visit': last_visit_date.isoformat() if last_visit_date else None,
-                    'status': status
-                })
+        for metricas in top:
+            cliente = metricas.cliente
 
-        # Ordenar por LTV descendente y tomar top N
-        clients_data.sort(key=lambda x: x['ltv'], reverse=True)
-        return clients_data[:limit]
+            if metricas.ltv >= vip_threshold and vip_threshold > 0:
+                status = 'VIP'
+            else:
+                status = segmentation.status_from_last_visit(metricas.ultima_visita, today)
+
+            last_visit_date = metricas.ultima_visita.date() if metricas.ultima_visita else None
+
+            clients_data.append({
+                'client_id': cliente.id,
+                'client_name': f"{cliente.nombre} {cliente.apellido}",
+                'email': cliente.email or '',
+                'phone': cliente.telefono or '',
+                'ltv': float(metricas.ltv),
+                'visits_count': metricas.visitas_completadas,
+                'last_visit': last_visit_date.isoformat() if last_visit_date else None,
+                'status': status
+            })
+
+        return clients_data
 
     @staticmethod
     def get_ltv_distribution(sucursal_id=None):
         """
         Obtiene la distribución de clientes por rangos de LTV
+        Un solo aggregate con un Count condicional por rango sobre ClienteMetricas
         """
-        from apps.finanzas.models import Transaction
-
         # Definir rangos de LTV (max_value None significa infinito para el último rango)
         ranges = [
             {'label': '$0 - $5,000', 'min': 0, 'max': 5000},
@@ -658,72 +550,50 @@ class AnalyticsCalculator:
             {'label': '$50,000+', 'min': 50000, 'max': None}  # None = sin límite superior
         ]
 
-        # Obtener clientes
-        clientes_qs = Cliente.objects.all()
-        if sucursal_id:
-            clientes_qs = clientes_qs.filter(centro_estetica__sucursales__id=sucursal_id)
-
-        # Inicializar contadores
-        distribution = {r['label']: 0 for r in ranges}
-
-        # Calcular LTV para cada cliente y clasificar
-        for cliente in clientes_qs:
-            ltv = Transaction.objects.filter(
-                client_id=cliente.id,
-                type__in=['INCOME_SERVICE', 'INCOME_PRODUCT']
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            # Clasificar en rango
-            for range_def in ranges:
-                max_val = range_def['max']
-                if max_val is None:  # Último rango sin límite superior
-                    if ltv >= range_def['min']:
-                        distribution[range_def['label']] += 1
-                        break
-                elif range_def['min'] <= ltv < max_val:
-                    distribution[range_def['label']] += 1
-                    break
-
-        # Convertir a formato de respuesta
-        result = [
+        # Clientes sin fila de métricas no tienen actividad: LTV 0
+        clientes_qs = segmentation.clients_for_branch(sucursal_id).annotate(
+            client_ltv=Coalesce('metricas__ltv', Decimal('0'))
+        )
+
+        counters = {}
+        for i, range_def in enumerate(ranges):
+            range_filter = Q(client_ltv__gte=range_def['min'])
+            if range_def['max'] is not None:
+                range_filter &= Q(client_ltv__lt=range_def['max'])
+            counters[f'range_{i}'] = Count('id', filter=range_filter)
+
+        counts = clientes_qs.order_by().aggregate(**counters)
+
+        return [
             {
-                'range': label,
-                'count': count,
-                'min_value': next(r['min'] for r in ranges if r['label'] == label),
-                'max_value': next(r['max'] for r in ranges if r['label'] == label)
+                'range': range_def['label'],
+                'count': counts[f'range_{i}'],
+                'min_value': range_def['min'],
+                'max_value': range_def['max']
             }
-            for label, count in distribution.items()
+            for i, range_def in enumerate(ranges)
         ]
 
-        return result
-
     @staticmethod
     def get_seasonal_trends(sucursal_id=None, year=None):
         """
         Obtiene tendencias estacionales por mes y trimestre
         """
-        from datetime import datetime
-        from apps.finanzas.models import Transaction
-
         # Si no se especifica año, usar el actual
         if not year:
             year = datetime.now().year
 
-        # Filtrar turnos completados del año
-        turnos_qs = Turno.objects.filter(
-            estado='COMPLETADO',
-            fecha_hora_inicio__year=year
+        # Turnos completados del año, por mes, desde los resúmenes diarios
+        daily_qs = rollups.daily_rows(sucursal_id).filter(
+            fecha__year=year,
+            turnos_completados__gt=0
         )
 
-        if sucursal_id:
-            turnos_qs = turnos_qs.filter(sucursal_id=sucursal_id)
-
-        # Agrupar por mes
-        monthly_data = turnos_qs.annotate(
-            month=ExtractMonth('fecha_hora_inicio')
+        monthly_data = daily_qs.annotate(
+            month=ExtractMonth('fecha')
         ).values('month').annotate(
-            appointments=Count('id'),
-            revenue=Sum('monto_total')
+            appointments=Sum('turnos_completados'),
+            revenue=Sum('monto_turnos_completados')
         ).order_by('month')
 
         # Convertir a diccionario para fácil acceso
@@ -788,44 +658,79 @@ class AnalyticsCalculator:
     def get_inventory_rotation(sucursal_id=None, days=90):
         """
         Obtiene análisis de rotación de inventario de productos
-        """
-        from apps.inventario.models import Producto
-        from apps.finanzas.models import Transaction
-        from datetime import datetime, timedelta
-        from django.utils import timezone
 
+        Una sola consulta: cada producto trae sus unidades vendidas en el período
+        como subconsultas sobre las claves de producto (movimientos SALIDA y
+        ventas importadas con el FK de producto pero sin movimiento, p.ej. Conto,
+        con la cantidad de la línea).
+        """
         # Fecha de inicio para el período de análisis
         start_date = timezone.now().date() - timedelta(days=days)
+        start_datetime = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+
+        salidas = MovimientoInventario.objects.filter(
+            producto=OuterRef('pk'),
+            tipo='SALIDA',
+            creado_en__gte=start_datetime
+        ).order_by().values('producto')
+
+        # Una línea importada sin cantidad (anterior al campo) cuenta como una unidad
+        ventas_importadas = Transaction.objects.filter(
+            product=OuterRef('pk'),
+            type='INCOME_PRODUCT',
+            inventory_movement__isnull=True,
+            date__gte=start_date
+        ).order_by().values('product')
+
+        decimal_zero = Value(Decimal('0'), output_field=DecimalField())
 
         # Obtener productos
         productos_qs = Producto.objects.filter(activo=True)
         if sucursal_id:
             productos_qs = productos_qs.filter(sucursal_id=sucursal_id)
 
-        rotation_data = []
+        productos = productos_qs.order_by().annotate(
+            units_moved=Coalesce(
+                Subquery(salidas.annotate(total=Sum('cantidad')).values('total')),
+                decimal_zero
+            ),
+            moves_count=Coalesce(
+                Subquery(salidas.annotate(total=Count('id')).values('total')), 0
+            ),
+            imported_count=Coalesce(
+                Subquery(ventas_importadas.annotate(total=Count('id')).values('total')), 0
+            ),
+            imported_units=Coalesce(
+                Subquery(ventas_importadas.annotate(
+                    total=Sum(Coalesce('quantity', Value(Decimal('1'), output_field=DecimalField())))
+                ).values('total')),
+                decimal_zero
+            ),
+        ).values(
+            'id', 'nombre', 'stock_actual', 'precio_venta', 'categoria__nombre',
+            'units_moved', 'moves_count', 'imported_count', 'imported_units'
+        )
 
-        for producto in productos_qs:
-            # Calcular ventas en el período
-            sales = Transaction.objects.filter(
-                type='INCOME_PRODUCT',
-                description__icontains=producto.nombre,  # Assuming product name is in description
-                date__gte=start_date
-            ).count()
+        rotation_data = []
 
+        for producto in productos:
             # Stock actual
-            current_stock = float(producto.stock_actual)
+            current_stock = float(producto['stock_actual'])
 
-            # Calcular tasa de rotación (ventas / días del período)
-            rotation_rate = sales / days if days > 0 else 0
+            units_sold = float(producto['units_moved']) + float(producto['imported_units'])
+            sales = producto['moves_count'] + producto['imported_count']
 
-            # Días de inventario restante (stock / tasa de rotación diaria)
+            # Calcular tasa de rotación (unidades vendidas por día del período)
+            rotation_rate = units_sold / days if days > 0 else 0
+
+            # Días de cobertura: cuántos días alcanza el stock al ritmo de venta actual
             days_of_inventory = current_stock / rotation_rate if rotation_rate > 0 else 999
 
             # Clasificar velocidad de rotación
-            if rotation_rate >= 1:  # Más de 1 venta por día
+            if rotation_rate >= 1:  # Más de 1 unidad por día
                 speed = 'FAST'
                 speed_label = 'Rápida'
-            elif rotation_rate >= 0.3:  # Al menos 1 venta cada 3 días
+            elif rotation_rate >= 0.3:  # Al menos 1 unidad cada 3 días
                 speed = 'MEDIUM'
                 speed_label = 'Media'
             elif rotation_rate > 0:
@@ -836,20 +741,22 @@ class AnalyticsCalculator:
                 speed_label = 'Sin Movimiento'
 
             # Valorización del stock (stock * precio)
-            stock_value = current_stock * float(producto.precio_venta or 0)
+            unit_price = float(producto['precio_venta'] or 0)
+            stock_value = current_stock * unit_price
 
             rotation_data.append({
-                'product_id': producto.id,
-                'product_name': producto.nombre,
-                'category': getattr(producto.categoria, 'nombre', 'Sin categoría') if hasattr(producto, 'categoria') else 'Sin categoría',
+                'product_id': producto['id'],
+                'product_name': producto['nombre'],
+                'category': producto['categoria__nombre'] or 'Sin categoría',
                 'current_stock': current_stock,
                 'sales_count': sales,
+                'units_sold': units_sold,
                 'rotation_rate': round(rotation_rate, 2),
-                'days_of_inventory': min(days_of_inventory, 999),  # Cap at 999 for display
+                'days_of_inventory': round(min(days_of_inventory, 999), 1),  # Cap at 999 for display
                 'speed': speed,
                 'speed_label': speed_label,
                 'stock_value': float(stock_value),
-                'unit_price': float(producto.precio_venta or 0)
+                'unit_price': unit_price
             })
 
         # Ordenar por tasa de rotación descendente
@@ -1041,124 +948,31 @@ class AnalyticsCalculator:
     # ========== OCCUPANCY ANALYTICS ==========
 
     @staticmethod
-    def get_occupancy_by_day_of_week(sucursal_id=None, start_date=None, end_date=None):
+    def get_occupancy(sucursal_id=None, start_date=None, end_date=None, granularity='slot'):
         """
-        Calcula ocupación por día de la semana con porcentaje
+        Ocupación por día de semana y heatmap a partir de una sola grilla
+        (una consulta agrupada + la capacidad de los profesionales)
         """
-        turnos_qs = Turno.objects.filter(
-            fecha_hora_inicio__date__gte=start_date,
-            fecha_hora_inicio__date__lte=end_date
-        )
-
-        if sucursal_id:
-            turnos_qs = turnos_qs.filter(sucursal_id=sucursal_id)
-
-        # Calcular días totales en el rango para capacidad teórica
-        total_days = (end_date - start_date).days + 1
-        weeks = total_days / 7
-
-        # Capacidad teórica: 10 turnos por día (simplificado)
-        capacity_per_day = 10 * weeks
-
-        # Contar turnos por día de semana
-        by_weekday = turnos_qs.annotate(
-            weekday=ExtractWeekDay('fecha_hora_inicio')
-        ).values('weekday').annotate(
-            total=Count('id'),
-            completed=Count('id', filter=Q(estado='COMPLETADO'))
-        ).order_by('weekday')
-
-        days_map = {
-            1: 'Sunday',
-            2: 'Monday',
-            3: 'Tuesday',
-            4: 'Wednesday',
-            5: 'Thursday',
-            6: 'Friday',
-            7: 'Saturday'
+        grid = occupancy.OccupancyGrid(sucursal_id, start_date, end_date)
+        return {
+            'by_weekday': grid.by_weekday(),
+            'heatmap': grid.heatmap(granularity)
         }
 
-        result = []
-        for day_num, day_name in days_map.items():
-            # Buscar datos para este día
-            day_data = next((item for item in by_weekday if item['weekday'] == day_num), None)
-
-            if day_data:
-                completed_count = day_data['completed']
-                occupancy_percentage = (completed_count / capacity_per_day * 100) if capacity_per_day > 0 else 0
-            else:
-                completed_count = 0
-                occupancy_percentage = 0
-
-            result.append({
-                'day': day_name,
-                'count': completed_count,
-                'occupancy_percentage': round(min(occupancy_percentage, 100), 1)  # Cap at 100%
-            })
-
-        return result
+    @staticmethod
+    def get_occupancy_by_day_of_week(sucursal_id=None, start_date=None, end_date=None):
+        """
+        Calcula ocupación por día de la semana con porcentaje
+        """
+        return occupancy.OccupancyGrid(sucursal_id, start_date, end_date).by_weekday()
 
     @staticmethod
-    def get_occupancy_heatmap(sucursal_id=None, start_date=None, end_date=None):
+    def get_occupancy_heatmap(sucursal_id=None, start_date=None, end_date=None, granularity='slot'):
         """
         Calcula ocupación por día de semana y franja horaria
-        Franjas: Morning (6-12), Afternoon (12-18), Evening (18-24)
+        Franjas: Morning (6-12), Afternoon (12-18), Evening (18-24), o por hora
         """
-        from datetime import time
-
-        turnos_qs = Turno.objects.filter(
-            fecha_hora_inicio__date__gte=start_date,
-            fecha_hora_inicio__date__lte=end_date,
-            estado__in=['COMPLETADO', 'CONFIRMADO']
-        )
-
-        if sucursal_id:
-            turnos_qs = turnos_qs.filter(sucursal_id=sucursal_id)
-
-        # Definir franjas horarias
-        time_slots = {
-            'morning': (6, 12),
-            'afternoon': (12, 18),
-            'evening': (18, 24)
-        }
-
-        days_map = {
-            1: 'Sunday',
-            2: 'Monday',
-            3: 'Tuesday',
-            4: 'Wednesday',
-            5: 'Thursday',
-            6: 'Friday',
-            7: 'Saturday'
-        }
-
-        # Calcular total de días en el rango para capacidad teórica
-        total_days = (end_date - start_date).days + 1
-        weeks = total_days / 7
-
-        # Capacidad teórica: 8 turnos por hora, asumiendo 1 empleado
-        # Esto es simplificado - en producción debería considerar empleados disponibles
-        capacity_per_slot = 8 * 6 * weeks  # 8 turnos/hora * 6 horas por franja * semanas
-
-        result = []
-        for day_num, day_name in days_map.items():
-            day_data = {'day': day_name}
-
-            for slot_name, (start_hour, end_hour) in time_slots.items():
-                # Contar turnos en esta franja
-                count = turnos_qs.filter(
-                    fecha_hora_inicio__iso_week_day=day_num,
-                    fecha_hora_inicio__hour__gte=start_hour,
-                    fecha_hora_inicio__hour__lt=end_hour
-                ).count()
-
-                # Calcular porcentaje de ocupación
-                occupancy_percentage = (count / capacity_per_slot * 100) if capacity_per_slot > 0 else 0
-                day_data[slot_name] = round(min(occupancy_percentage, 100), 1)  # Cap at 100%
-
-            result.append(day_data)
-
-        return result
+        return occupancy.OccupancyGrid(sucursal_id, start_date, end_date).heatmap(granularity)
 
     # ========== NO-SHOW ANALYTICS ==========
 
@@ -7,8 +7,6 @@ from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django.core.cache import cache
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
@@ -16,6 +14,9 @@ from django.utils import timezone
 from django.db.models import Sum, Count, Q
 
 from .utils import AnalyticsCalculator
+from .client_metrics import get_client_metrics
+from . import occupancy
+from .cache import CACHED_ENDPOINTS, cached_analytics, get_stats
 from .permissions import IsAdminOrManager, CanViewClientAnalytics
 
 
@@ -33,7 +34,7 @@ class DashboardSummaryView(APIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
-    @method_decorator(cache_page(60 * 5))  # Cache 5 minutos
+    @cached_analytics(60 * 5)  # Cache 5 minutos
     def get(self, request):
         # Obtener parámetros
         start_date = request.query_params.get('start_date')
@@ -81,7 +82,7 @@ class RevenueAnalyticsView(APIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
-    @method_decorator(cache_page(60 * 5))
+    @cached_analytics(60 * 5)
     def get(self, request):
         # Parsear parámetros
         start_date = request.query_params.get('start_date')
@@ -165,7 +166,7 @@ class ServiceAnalyticsView(APIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
-    @method_decorator(cache_page(60 * 10))
+    @cached_analytics(60 * 10)
     def get(self, request):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
@@ -225,7 +226,7 @@ class ProductAnalyticsView(APIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
-    @method_decorator(cache_page(60 * 10))
+    @cached_analytics(60 * 10)
     def get(self, request):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
@@ -275,7 +276,7 @@ class EmployeePerformanceView(APIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
-    @method_decorator(cache_page(60 * 10))
+    @cached_analytics(60 * 10)
     def get(self, request):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
@@ -326,7 +327,7 @@ class ClientAnalyticsView(APIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
-    @method_decorator(cache_page(60 * 15))
+    @cached_analytics(60 * 15)
     def get(self, request):
         sucursal_id = request.query_params.get('sucursal_id')
 
@@ -366,7 +367,7 @@ class OccupancyAnalyticsView(APIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
-    @method_decorator(cache_page(60 * 10))
+    @cached_analytics(60 * 10)
     def get(self, request):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
@@ -386,24 +387,21 @@ class OccupancyAnalyticsView(APIView):
         if sucursal_id:
             sucursal_id = int(sucursal_id)
 
-        # Obtener ocupación por día de semana
-        by_weekday = AnalyticsCalculator.get_occupancy_by_day_of_week(
-            sucursal_id=sucursal_id,
-            start_date=start_date,
-            end_date=end_date
-        )
+        # Heatmap por franjas (default) o por hora
+        granularity = request.query_params.get('granularity', 'slot')
+        if granularity not in occupancy.GRANULARITIES:
+            return Response(
+                {'error': f"granularity debe ser uno de: {', '.join(occupancy.GRANULARITIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        # Obtener heatmap de ocupación
-        heatmap = AnalyticsCalculator.get_occupancy_heatmap(
+        # Ocupación por día de semana y heatmap salen de la misma grilla
+        return Response(AnalyticsCalculator.get_occupancy(
             sucursal_id=sucursal_id,
             start_date=start_date,
-            end_date=end_date
-        )
-
-        return Response({
-            'by_weekday': by_weekday,
-            'heatmap': heatmap
-        })
+            end_date=end_date,
+            granularity=granularity
+        ))
 
 
 class SeasonalTrendsView(APIView):
@@ -414,7 +412,7 @@ class SeasonalTrendsView(APIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
-    @method_decorator(cache_page(60 * 15))
+    @cached_analytics(60 * 15)
     def get(self, request):
         sucursal_id = request.query_params.get('sucursal_id')
         year = request.query_params.get('year')
@@ -441,7 +439,7 @@ class NoShowAnalyticsView(APIView):
     """
     permission_classes = [IsAuthenticated, IsAdminOrManager]
 
-    @method_decorator(cache_page(60 * 10))
+    @cached_analytics(60 * 10)
     def get(self, request):
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
@@ -483,7 +481,6 @@ class ClientSummaryView(APIView):
 
     def get(self, request, cliente_id):
         from apps.clientes.models import Cliente
-        from apps.turnos.models import Turno
 
         # Obtener cliente
         try:
@@ -499,27 +496,16 @@ class ClientSummaryView(APIView):
         frequency = AnalyticsCalculator.get_client_frequency(cliente_id)
         client_status = AnalyticsCalculator.get_client_status(cliente_id)
 
-        # Obtener primera y última visita
-        first_visit = Turno.objects.filter(
-            cliente_id=cliente_id,
-            estado='COMPLETADO'
-        ).order_by('fecha_hora_inicio').first()
-
-        last_visit = Turno.objects.filter(
-            cliente_id=cliente_id,
-            estado='COMPLETADO'
-        ).order_by('-fecha_hora_inicio').first()
-
-        # Total de visitas
-        total_visits = Turno.objects.filter(
-            cliente_id=cliente_id,
-            estado='COMPLETADO'
-        ).count()
+        # Primera y última visita y total de visitas (ya calculadas en ClienteMetricas)
+        metricas = get_client_metrics(cliente_id)
+        first_visit = metricas.primera_visita
+        last_visit = metricas.ultima_visita
+        total_visits = metricas.visitas_completadas
 
         # Días desde última visita
         days_since_last = None
         if last_visit:
-            days_since_last = (timezone.now().date() - last_visit.fecha_hora_inicio.date()).days
+            days_since_last = (timezone.now().date() - last_visit.date()).days
 
         # Ticket promedio
         avg_ticket = ltv / total_visits if total_visits > 0 else 0
@@ -542,8 +528,8 @@ class ClientSummaryView(APIView):
             'summary': {
                 'lifetime_value': ltv,
                 'total_visits': total_visits,
-                'first_visit': first_visit.fecha_hora_inicio.date().isoformat() if first_visit else None,
-                'last_visit': last_visit.fecha_hora_inicio.date().isoformat() if last_visit else None,
+                'first_visit': first_visit.date().isoformat() if first_visit else None,
+                'last_visit': last_visit.date().isoformat() if last_visit else None,
                 'days_since_last_visit': days_since_last,
                 'average_frequency_days': frequency,
                 'average_ticket': round(avg_ticket, 2),
@@ -935,7 +921,6 @@ class ClientAlertsView(APIView):
     permission_classes = [IsAuthenticated, CanViewClientAnalytics]
 
     def get(self, request, cliente_id):
-        from apps.turnos.models import Turno
         from apps.clientes.models import Cliente
 
         # Obtener datos del cliente
@@ -952,14 +937,11 @@ class ClientAlertsView(APIView):
         client_status = AnalyticsCalculator.get_client_status(cliente_id)
 
         # Última visita
-        last_visit = Turno.objects.filter(
-            cliente_id=cliente_id,
-            estado='COMPLETADO'
-        ).order_by('-fecha_hora_inicio').first()
+        last_visit = get_client_metrics(cliente_id).ultima_visita
 
         days_since_last = None
         if last_visit:
-            days_since_last = (timezone.now().date() - last_visit.fecha_hora_inicio.date()).days
+            days_since_last = (timezone.now().date() - last_visit.date()).days
 
         alerts = []
         insights = []
@@ -1245,8 +1227,7 @@ class ClientBehaviorView(APIView):
         from apps.turnos.models import Turno
         from apps.clientes.models import Cliente
         from django.utils import timezone
-        from dateutil.relativedelta import relativedelta
-        from django.db.models import Count, Avg, StdDev
+        from django.db.models import Count
         from datetime import timedelta
 
         # Verificar que el cliente existe
@@ -1255,13 +1236,14 @@ class ClientBehaviorView(APIView):
         except Cliente.DoesNotExist:
             return Response({'error': 'Cliente no encontrado'}, status=404)
 
-        # Obtener todos los turnos completados
+        # Visitas, primera y última y LTV (ya calculados en ClienteMetricas)
+        metricas = get_client_metrics(cliente_id)
         turnos = Turno.objects.filter(
             cliente_id=cliente_id,
             estado='COMPLETADO'
         ).order_by('fecha_hora_inicio')
 
-        if not turnos.exists():
+        if not metricas.visitas_completadas:
             return Response({
                 'loyalty_score': 0,
                 'score_breakdown': {
@@ -1275,13 +1257,16 @@ class ClientBehaviorView(APIView):
                 'message': 'El cliente no tiene servicios completados'
             })
 
-        total_visits = turnos.count()
-        first_visit = turnos.first().fecha_hora_inicio.date()
-        last_visit = turnos.last().fecha_hora_inicio.date()
+        total_visits = metricas.visitas_completadas
+        first_visit = metricas.primera_visita.date()
+        last_visit = metricas.ultima_visita.date()
         today = timezone.now().date()
+        ltv = float(metricas.ltv)
 
-        # Calcular LTV
-        ltv = AnalyticsCalculator.get_client_lifetime_value(cliente_id)
+        # Fechas de cada visita, para la consistencia, el intervalo promedio y
+        # el mapa de actividad (una sola lectura)
+        visitas = list(turnos.values_list('fecha_hora_inicio', flat=True))
+        visit_dates = [visita.date() for visita in visitas]
 
         # ========== 1. FREQUENCY SCORE (30 puntos) ==========
         # Basado en número total de visitas
@@ -1342,7 +1327,6 @@ class ClientBehaviorView(APIView):
         # Basado en regularidad de visitas (desviación estándar de días entre visitas)
         if total_visits >= 2:
             # Calcular días entre cada visita
-            visit_dates = [t.fecha_hora_inicio.date() for t in turnos]
             days_between_visits = []
             for i in range(1, len(visit_dates)):
                 days_diff = (visit_dates[i] - visit_dates[i-1]).days
@@ -1429,21 +1413,12 @@ class ClientBehaviorView(APIView):
         activity_end_date = today
         activity_start_date = today - timedelta(days=365)
 
-        # Obtener todos los turnos en el rango
-        activity_turnos = Turno.objects.filter(
-            cliente_id=cliente_id,
-            estado='COMPLETADO',
-            fecha_hora_inicio__date__gte=activity_start_date,
-            fecha_hora_inicio__date__lte=activity_end_date
-        ).values('fecha_hora_inicio__date').annotate(
-            count=Count('id')
-        )
-
-        # Crear diccionario de actividad por día
+        # Crear diccionario de actividad por día (fecha local de cada visita)
         activity_by_day = {}
-        for item in activity_turnos:
-            date_str = item['fecha_hora_inicio__date'].isoformat()
-            activity_by_day[date_str] = item['count']
+        for visita in visitas:
+            dia = timezone.localtime(visita).date()
+            if activity_start_date <= dia <= activity_end_date:
+                activity_by_day[dia.isoformat()] = activity_by_day.get(dia.isoformat(), 0) + 1
 
         # Generar array con todos los días (365 días)
         activity_heatmap = []
@@ -1466,22 +1441,25 @@ class ClientBehaviorView(APIView):
             current_day += timedelta(days=1)
 
         # ========== BEHAVIOR METRICS ==========
-        # Obtener todos los turnos del cliente (no solo completados)
-        all_appointments = Turno.objects.filter(cliente_id=cliente_id)
-        total_appointments = all_appointments.count()
+        # Todos los turnos del cliente (no solo completados), en una agregación
+        appointments = Turno.objects.filter(cliente_id=cliente_id).aggregate(
+            total=Count('id'),
+            no_show=Count('id', filter=Q(estado='NO_SHOW')),
+            cancelled=Count('id', filter=Q(estado='CANCELADO')),
+        )
+        total_appointments = appointments['total']
 
         # Calcular tasa de no-show
-        no_show_count = all_appointments.filter(estado='NO_SHOW').count()
+        no_show_count = appointments['no_show']
         no_show_rate = round((no_show_count / total_appointments * 100), 2) if total_appointments > 0 else 0
 
         # Calcular tasa de cancelación
-        cancelled_count = all_appointments.filter(estado='CANCELADO').count()
+        cancelled_count = appointments['cancelled']
         cancellation_rate = round((cancelled_count / total_appointments * 100), 2) if total_appointments > 0 else 0
 
         # Calcular tiempo promedio entre visitas (usar días entre visitas calculado arriba)
         avg_interval_days = 0
         if total_visits >= 2:
-            visit_dates = [t.fecha_hora_inicio.date() for t in turnos]
             days_between = []
             for i in range(1, len(visit_dates)):
                 days_between.append((visit_dates[i] - visit_dates[i-1]).days)
@@ -1491,7 +1469,7 @@ class ClientBehaviorView(APIView):
 
         # Calcular puntuación de puntualidad (placeholder - podría mejorarse con datos de llegada real)
         # Por ahora, basado en tasa de completitud vs cancelaciones/no-shows
-        completed_count = turnos.count()
+        completed_count = total_visits
         punctuality_score = 0
         if total_appointments > 0:
             completion_rate = (completed_count / total_appointments) * 100
@@ -1540,3 +1518,26 @@ class ClientBehaviorView(APIView):
                 'cancelled_count': cancelled_count
             }
         })
+
+
+class AnalyticsCacheStatsView(APIView):
+    """
+    GET /api/analytics/cache/stats/
+
+    Hits, misses y tiempo promedio de cálculo del caché de analytics por endpoint
+    """
+    permission_classes = [IsAuthenticated, IsAdminOrManager]
+
+    def get(self, request):
+        stats = get_stats(CACHED_ENDPOINTS)
+        hits = sum(item['hits'] for item in stats.values())
+        misses = sum(item['misses'] for item in stats.values())
+
+        return Response({
+            'endpoints': stats,
+            'totals': {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses) * 100, 1) if hits + misses else 0
+            }
+        })
@@ -279,6 +279,63 @@ class DisponibilidadTests(TurnosAppTestBase):
         self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class DisponibilidadMesTests(TurnosAppTestBase):
+    def _get_mes(self, fecha, servicio=None):
+        return self.client.get(reverse('client-disponibilidad-mes'), {
+            'servicio': (servicio or self.servicio).id,
+            'mes': fecha.strftime('%Y-%m'),
+        })
+
+    def test_solo_dias_reservables_con_horarios(self):
+        fecha = timezone.localtime(_proximo_dia_habil()).date()
+        # Un profesional de 08 a 10 con un turno 08-09 y otro 09-10: día lleno
+        self.profesional.horario_inicio = time(8, 0)
+        self.profesional.horario_fin = time(10, 0)
+        self.profesional.save()
+        for hora in (8, 9):
+            self._crear_turno(inicio=timezone.make_aware(timezone.datetime.combine(fecha, time(hora, 0))))
+
+        self._auth(self.user_a)
+        resp = self._get_mes(fecha)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        fechas = [date.fromisoformat(f) for f in resp.data['fechas']]
+        self.assertNotIn(fecha, fechas)
+        self.assertTrue(fechas)
+        for dia in fechas:
+            self.assertEqual((dia.year, dia.month), (fecha.year, fecha.month))
+            self.assertIn(nombre_dia(dia), DIAS_RESERVA_APP)
+            self.assertGreater(dia, timezone.localdate())
+
+    def test_coincide_con_la_disponibilidad_del_dia(self):
+        fecha = timezone.localtime(_proximo_dia_habil()).date()
+
+        self._auth(self.user_a)
+        fechas = self._get_mes(fecha).data['fechas']
+        dia = self.client.get(reverse('client-disponibilidad'), {
+            'servicio': self.servicio.id, 'fecha': fechas[0],
+        })
+
+        self.assertTrue(dia.data['slots'])
+
+    def test_fechas_puntuales(self):
+        self._auth(self.user_a)
+        resp = self._get_mes(self.fecha_puntual, servicio=self.servicio_fecha_puntual)
+
+        self.assertEqual(resp.data['fechas'], [self.fecha_puntual.isoformat()])
+
+    def test_parametros_invalidos(self):
+        self._auth(self.user_a)
+        resp = self.client.get(reverse('client-disponibilidad-mes'), {
+            'servicio': self.servicio.id, 'mes': '2026-13',
+        })
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            self._get_mes(timezone.localdate(), servicio=self.servicio_b).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+
 class ReservaTests(TurnosAppTestBase):
     def _reservar(self, inicio=None, servicio=None, **extra):
         return self.client.post(reverse('client-turnos'), {
@@ -3,6 +3,7 @@ from django.urls import path
 from .views import (
     CancelarTurnoView,
     ClienteTokenRefreshView,
+    DisponibilidadMesView,
     DisponibilidadView,
     LoginView,
     MiRutinaView,
@@ -23,6 +24,8 @@ urlpatterns = [
     path('turnos/', TurnosView.as_view(), name='client-turnos'),
     path('turnos/servicios/', ServiciosReservablesView.as_view(), name='client-servicios-reservables'),
     path('turnos/disponibilidad/', DisponibilidadView.as_view(), name='client-disponibilidad'),
+    path('turnos/disponibilidad/mes/', DisponibilidadMesView.as_view(),
+         name='client-disponibilidad-mes'),
     path('turnos/<int:pk>/cancelar/', CancelarTurnoView.as_view(), name='client-cancelar-turno'),
     path('push/register/', PushRegisterView.as_view(), name='client-push-register'),
     path('notificaciones/preferencias/', PreferenciasNotificacionView.as_view(),
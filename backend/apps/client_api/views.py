@@ -1,4 +1,5 @@
-from datetime import datetime
+import calendar
+from datetime import date, datetime
 
 from django.db import transaction
 from django.db.models import Q
@@ -25,6 +26,7 @@ from apps.turnos.services import (
     ESTADOS_QUE_OCUPAN,
     HORAS_MINIMAS_CANCELACION,
     TurnoNoDisponible,
+    fechas_con_disponibilidad,
     motivo_fecha_no_reservable,
     primera_fecha_reservable,
     puede_cancelar,
@@ -382,6 +384,25 @@ class TurnosView(ClienteScopeMixin, APIView):
         return Response(TurnoAppSerializer(turno).data, status=status.HTTP_201_CREATED)
 
 
+def _servicio_del_centro(vinc, servicio_id):
+    """Servicio activo del centro del cliente, o None."""
+    try:
+        return Servicio.objects.select_related('sucursal').get(
+            pk=servicio_id,
+            activo=True,
+            sucursal__centro_estetica_id=vinc.cliente.centro_estetica_id,
+        )
+    except (Servicio.DoesNotExist, ValueError):
+        return None
+
+
+def _servicio_no_disponible():
+    return Response(
+        {'detail': 'Ese tratamiento no está disponible en tu centro'},
+        status=status.HTTP_404_NOT_FOUND,
+    )
+
+
 class DisponibilidadView(ClienteScopeMixin, APIView):
     """
     GET /api/client/turnos/disponibilidad/?servicio=<id>&fecha=YYYY-MM-DD
@@ -416,17 +437,9 @@ class DisponibilidadView(ClienteScopeMixin, APIView):
         if fecha < hoy or (fecha - hoy).days > DIAS_MAXIMOS_A_FUTURO:
             return Response({'fecha': fecha_str, 'slots': []})
 
-        try:
-            servicio = Servicio.objects.select_related('sucursal').get(
-                pk=servicio_id,
-                activo=True,
-                sucursal__centro_estetica_id=vinc.cliente.centro_estetica_id,
-            )
-        except (Servicio.DoesNotExist, ValueError):
-            return Response(
-                {'detail': 'Ese tratamiento no está disponible en tu centro'},
-                status=status.HTTP_404_NOT_FOUND,
-            )
+        servicio = _servicio_del_centro(vinc, servicio_id)
+        if servicio is None:
+            return _servicio_no_disponible()
 
         # Política de reserva de la app (día permitido, anticipación mínima).
         # Se responde 200 con el motivo para que el calendario lo pueda explicar.
@@ -459,6 +472,55 @@ class DisponibilidadView(ClienteScopeMixin, APIView):
         })
 
 
+class DisponibilidadMesView(ClienteScopeMixin, APIView):
+    """
+    GET /api/client/turnos/disponibilidad/mes/?servicio=<id>&mes=YYYY-MM
+
+    Días del mes con al menos un horario libre para ese servicio, calculados
+    de una vez para todo el mes. La app pinta el calendario con esto y pide
+    los horarios de un día recién cuando el cliente lo toca.
+    """
+
+    def get(self, request):
+        vinc = self.get_vinculacion(request)
+        if vinc is None:
+            return self.sin_vinculacion()
+
+        mes_str = request.query_params.get('mes')
+        servicio_id = request.query_params.get('servicio')
+        if not mes_str or not servicio_id:
+            return Response(
+                {'detail': 'Se requieren los parámetros "servicio" y "mes"'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            primer_dia = datetime.strptime(mes_str, '%Y-%m').date()
+        except ValueError:
+            return Response(
+                {'detail': 'Formato de mes inválido. Usá YYYY-MM'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ultimo_dia = date(
+            primer_dia.year, primer_dia.month,
+            calendar.monthrange(primer_dia.year, primer_dia.month)[1],
+        )
+
+        servicio = _servicio_del_centro(vinc, servicio_id)
+        if servicio is None:
+            return _servicio_no_disponible()
+
+        fechas = fechas_con_disponibilidad(
+            servicio, primer_dia, ultimo_dia, no_antes_de=timezone.now()
+        )
+
+        return Response({
+            'mes': mes_str,
+            'servicio': servicio.id,
+            'fechas': [fecha.isoformat() for fecha in fechas],
+        })
+
+
 class ServiciosReservablesView(ClienteScopeMixin, APIView):
     """
     GET /api/client/turnos/servicios/ — tratamientos que el cliente puede reservar.
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("clientes", "0008_remove_usuariocliente_push_token"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cliente",
+            name="telefono_sufijo",
+            field=models.CharField(blank=True, editable=False, max_length=8),
+        ),
+        # Mismo cálculo que utils.sufijo_telefono, en una sola sentencia.
+        migrations.RunSQL(
+            r"""
+            UPDATE clientes_cliente
+               SET telefono_sufijo = right(regexp_replace(telefono, '\D', '', 'g'), 8)
+             WHERE length(regexp_replace(telefono, '\D', '', 'g')) >= 8
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="cliente",
+            index=models.Index(
+                fields=["centro_estetica", "telefono_sufijo"],
+                name="clientes_cl_centro__b9a6c6_idx",
+            ),
+        ),
+    ]
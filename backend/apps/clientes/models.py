@@ -27,6 +27,9 @@ class Cliente(models.Model):
     # Forma canónica E.164 de ``telefono`` (ej: +5491123456789). Se calcula en save().
     # Se usa para el detector de duplicados y para el matching de vinculación.
     telefono_normalizado = models.CharField(max_length=20, blank=True, db_index=True)
+    # Últimos 8 dígitos de ``telefono`` (ver ``utils.sufijo_telefono``). Se calcula en
+    # save(); es la clave con la que las integraciones buscan una ficha por teléfono.
+    telefono_sufijo = models.CharField(max_length=8, blank=True, editable=False)
     fecha_nacimiento = models.DateField(null=True, blank=True)
 
     # Dirección
@@ -219,14 +222,19 @@ class Cliente(models.Model):
         indexes = [
             models.Index(fields=['centro_estetica', 'apellido']),
             models.Index(fields=['centro_estetica', 'telefono']),
+            models.Index(fields=['centro_estetica', 'telefono_sufijo']),
         ]
 
     def __str__(self):
         return f"{self.apellido}, {self.nombre}"
 
     def save(self, *args, **kwargs):
-        from .utils import normalizar_telefono
+        from .utils import normalizar_telefono, sufijo_telefono
         self.telefono_normalizado = normalizar_telefono(self.telefono)
+        self.telefono_sufijo = sufijo_telefono(self.telefono)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'telefono' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'telefono_normalizado', 'telefono_sufijo'}
         super().save(*args, **kwargs)
 
     @property
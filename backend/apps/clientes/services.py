@@ -90,8 +90,13 @@ def fusionar_clientes(principal: Cliente, duplicado: Cliente) -> Cliente:
                 f"Actualizá apps/clientes/services.py:fusionar_clientes."
             )
 
-    # 5) Borrar la ficha duplicada
+    # 5) Borrar la ficha duplicada (sus métricas se van en cascada)
     duplicado.delete()
+
+    # 6) Recalcular las métricas de la principal: los .update() de arriba no
+    # disparan las señales que las mantienen
+    from apps.analytics.client_metrics import refresh_client_metrics
+    refresh_client_metrics(principal.pk)
     return principal
 
 
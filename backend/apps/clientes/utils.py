@@ -1,6 +1,12 @@
 """Utilidades para el módulo de clientes."""
+import re
+
 import phonenumbers
 
+# Dígitos finales que identifican un teléfono argentino con o sin +54 y el 9
+# de celular. Menos empieza a chocar entre números distintos.
+DIGITOS_SUFIJO_TELEFONO = 8
+
 
 def normalizar_telefono(raw, region='AR'):
     """
@@ -25,3 +31,18 @@ def normalizar_telefono(raw, region='AR'):
         return ''
 
     return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+
+def sufijo_telefono(raw):
+    """
+    Últimos ``DIGITOS_SUFIJO_TELEFONO`` dígitos del teléfono, ignorando todo lo
+    que no sea dígito ('+54 9 11 3333-4444' y '1133334444' dan lo mismo).
+
+    A diferencia de ``normalizar_telefono`` no valida el número: sirve para
+    emparejar lo que cargó el staff con lo que llega de afuera, aunque alguno
+    de los dos esté mal escrito. Con menos dígitos devuelve ''.
+    """
+    digitos = re.sub(r'\D', '', raw or '')
+    if len(digitos) < DIGITOS_SUFIJO_TELEFONO:
+        return ''
+    return digitos[-DIGITOS_SUFIJO_TELEFONO:]
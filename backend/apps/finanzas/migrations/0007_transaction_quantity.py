@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("finanzas", "0006_transaction_service"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="quantity",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                help_text="Unidades vendidas de ``product`` cuando no hay movimiento de inventario (ventas importadas)",
+                max_digits=10,
+                null=True,
+            ),
+        ),
+    ]
@@ -166,6 +166,13 @@ class Transaction(models.Model):
         blank=True,
         related_name='transactions'
     )
+    quantity = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Unidades vendidas de ``product`` cuando no hay movimiento de inventario (ventas importadas)"
+    )
     service = models.ForeignKey(
         'servicios.Servicio',
         on_delete=models.SET_NULL,
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter, SearchFilter
 from django.db.models import Sum, Count, Q
@@ -199,6 +200,17 @@ class TransactionViewSet(viewsets.ModelViewSet):
             branch = Sucursal.objects.first()
             serializer.save(branch=branch)
 
+    # Filtros que se pueden resolver con los resúmenes diarios de analytics
+    # (una fila por sucursal y día) en lugar de agregar las transacciones
+    ROLLUP_SUMMARY_FILTERS = {
+        'date_from': 'fecha__gte',
+        'date_to': 'fecha__lte',
+        'date': 'fecha',
+        'date_year': 'fecha__year',
+        'date_month': 'fecha__month',
+        'branch': 'sucursal',
+    }
+
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """
@@ -206,37 +218,69 @@ class TransactionViewSet(viewsets.ModelViewSet):
         Query params:
         - date_from: Start date (default: first day of current month)
         - date_to: End date (default: today)
-        """
-        queryset = self.filter_queryset(self.get_queryset())
 
-        # Calculate totals
-        income_total = queryset.filter(
-            type__startswith='INCOME_'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-
-        expense_total = queryset.filter(
-            type='EXPENSE'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+        With only date/branch filters the totals come from the daily rollups;
+        any other filter (category, type, search...) aggregates the transactions.
+        """
+        params = {key for key, value in request.query_params.items() if value != ''}
+        if params <= set(self.ROLLUP_SUMMARY_FILTERS) | {'ordering'}:
+            totals = self._summary_from_rollups(request)
+        else:
+            totals = self._summary_from_transactions(self.filter_queryset(self.get_queryset()))
 
+        income_total = totals['income'] or Decimal('0')
+        expense_total = totals['expense'] or Decimal('0')
         balance = income_total - expense_total
 
-        # Calculate counts
-        income_count = queryset.filter(type__startswith='INCOME_').count()
-        expense_count = queryset.filter(type='EXPENSE').count()
-
         return Response({
             'income': {
                 'total': float(income_total),
-                'count': income_count
+                'count': totals['income_count'] or 0
             },
             'expense': {
                 'total': float(expense_total),
-                'count': expense_count
+                'count': totals['expense_count'] or 0
             },
             'balance': float(balance),
             'profit_margin': float((balance / income_total * 100) if income_total > 0 else 0)
         })
 
+    def _summary_from_transactions(self, queryset):
+        income = Q(type__startswith='INCOME_')
+        expense = Q(type='EXPENSE')
+        return queryset.order_by().aggregate(
+            income=Sum('amount', filter=income),
+            income_count=Count('id', filter=income),
+            expense=Sum('amount', filter=expense),
+            expense_count=Count('id', filter=expense)
+        )
+
+    def _summary_from_rollups(self, request):
+        from apps.analytics.models import ResumenDiario
+        from apps.analytics.rollups import INCOME_TOTAL
+
+        # Mismo filterset que el listado: valida los parámetros igual
+        filterset = self.filterset_class(
+            request.query_params, queryset=self.get_queryset(), request=request
+        )
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+
+        rollups_qs = ResumenDiario.objects.all()
+        if not request.user.is_superuser:
+            rollups_qs = rollups_qs.filter(sucursal=request.user.sucursal)
+        for param, lookup in self.ROLLUP_SUMMARY_FILTERS.items():
+            value = filterset.form.cleaned_data.get(param)
+            if value is not None:
+                rollups_qs = rollups_qs.filter(**{lookup: value})
+
+        return rollups_qs.aggregate(
+            income=Sum(INCOME_TOTAL),
+            income_count=Sum('cantidad_ingresos'),
+            expense=Sum('egresos'),
+            expense_count=Sum('cantidad_egresos')
+        )
+
     @action(detail=False, methods=['get'])
     def by_category(self, request):
         """
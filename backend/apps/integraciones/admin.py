@@ -9,9 +9,9 @@ from django.contrib import admin, messages
 from django.utils import timezone
 from django.utils.html import format_html
 
+from . import scheduling
 from .models import ContoIntegration, ContoSale
 from .services import ContoClient, ContoError
-from .sync import SalesImporter, StockSynchronizer
 
 
 class ContoIntegrationForm(forms.ModelForm):
@@ -161,7 +161,7 @@ class ContoIntegrationAdmin(admin.ModelAdmin):
     def sincronizar_stock(self, request, queryset):
         """Only what changed in Conto since the last run."""
         self._run(request, queryset, 'Stock',
-                  lambda i: StockSynchronizer(i).run())
+                  lambda i: scheduling.run_sync(i, scheduling.STOCK))
 
     @admin.action(description='Sincronizar stock desde Conto (catálogo completo)')
     def sincronizar_stock_completo(self, request, queryset):
@@ -173,12 +173,12 @@ class ContoIntegrationAdmin(admin.ModelAdmin):
         nothing, because nothing changed in Conto: the change was on our side.
         """
         self._run(request, queryset, 'Stock (completo)',
-                  lambda i: StockSynchronizer(i).run(full=True))
+                  lambda i: scheduling.run_sync(i, scheduling.STOCK, full=True))
 
     @admin.action(description='Importar ventas desde Conto')
     def importar_ventas(self, request, queryset):
         self._run(request, queryset, 'Ventas',
-                  lambda i: SalesImporter(i).run())
+                  lambda i: scheduling.run_sync(i, scheduling.SALES))
 
     def _run(self, request, queryset, label, work):
         """
@@ -187,6 +187,9 @@ class ContoIntegrationAdmin(admin.ModelAdmin):
         Inline because there is no Celery worker deployed. A very large first
         import should go through the `sincronizar_conto` command instead, to
         avoid the request timing out.
+
+        Under the same per-integration lock as every other run: an integration
+        that is already syncing is skipped, not imported twice.
         """
         for integration in queryset:
             if not integration.can_sync:
@@ -205,6 +208,15 @@ class ContoIntegrationAdmin(admin.ModelAdmin):
                 )
                 continue
 
+            if result is None:
+                self.message_user(
+                    request,
+                    f'{integration} — {label}: ya hay una sincronización en curso, '
+                    f'se saltea. Probá de nuevo cuando termine.',
+                    level=messages.WARNING,
+                )
+                continue
+
             level = messages.ERROR if result.errors else messages.SUCCESS
             self.message_user(
                 request, f'{integration} — {label}: {result.summary}', level=level
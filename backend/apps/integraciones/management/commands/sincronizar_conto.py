@@ -8,12 +8,19 @@ process and a Redis broker to be deployed.
     python manage.py sincronizar_conto                 # ventas
     python manage.py sincronizar_conto --que todo
     python manage.py sincronizar_conto --que stock --full
+    python manage.py sincronizar_conto --paralelo 8
+
+Integrations run side by side (`--paralelo`, see scheduling.py), each under its
+own lock: an integration that is still syncing from a previous run is skipped,
+not run twice. Each integration's output is printed as a block once it
+finishes, followed by how long each one took.
 
 Exits non-zero when something failed, so a scheduler surfaces it instead of
 reporting a successful run that imported nothing.
 """
 from django.core.management.base import BaseCommand, CommandError
 
+from apps.integraciones import scheduling
 from apps.integraciones.models import ContoIntegration
 from apps.integraciones.services import (
     ContoAccountInactive,
@@ -23,7 +30,8 @@ from apps.integraciones.services import (
     ContoNotLinked,
     ContoUnavailable,
 )
-from apps.integraciones.sync import SalesImporter, StockSynchronizer
+
+LABELS = {scheduling.STOCK: 'Stock', scheduling.SALES: 'Ventas'}
 
 
 class Command(BaseCommand):
@@ -46,6 +54,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Para stock: traer el catálogo completo, ignorando el cursor'
         )
+        parser.add_argument(
+            '--paralelo',
+            type=int,
+            default=scheduling.WORKERS,
+            help=f'Integraciones a la vez (default: {scheduling.WORKERS})'
+        )
 
     def handle(self, *args, **options):
         integrations = ContoIntegration.objects.filter(
@@ -64,31 +78,22 @@ class Command(BaseCommand):
             return
 
         what = options['que']
+        kinds = [
+            kind for kind in (scheduling.STOCK, scheduling.SALES)
+            if what in (kind, 'todo')
+        ]
         failed = []
 
-        for integration in integrations:
-            self.stdout.write(self.style.MIGRATE_HEADING(
-                f'Conto — {integration.center.nombre}'
-            ))
+        for _, (out, problems) in scheduling.map_integrations(
+            lambda integration: self._sync(integration, kinds, options['full']),
+            integrations,
+            options['paralelo'],
+        ):
+            for line in out:
+                self.stdout.write(line)
+            failed += problems
 
-            problem = self._verify_link(integration)
-            if problem:
-                failed.append(problem)
-                continue
-
-            if what in ('stock', 'todo'):
-                failed += self._run(
-                    'Stock',
-                    lambda: StockSynchronizer(integration).run(full=options['full']),
-                    integration,
-                )
-
-            if what in ('ventas', 'todo'):
-                failed += self._run(
-                    'Ventas',
-                    lambda: SalesImporter(integration).run(),
-                    integration,
-                )
+        self._report_durations(integrations, kinds)
 
         if failed:
             raise CommandError(
@@ -96,7 +101,37 @@ class Command(BaseCommand):
                 "\n  ".join(failed)
             )
 
-    def _verify_link(self, integration):
+    def _sync(self, integration, kinds, full):
+        """
+        Everything for one integration. Returns `(lines, failures)`: the lines are
+        collected instead of written, because with several integrations running
+        at once they would interleave.
+        """
+        out = [self.style.MIGRATE_HEADING(f'Conto — {integration.center.nombre}')]
+
+        problem = self._verify_link(integration, out)
+        if problem:
+            return out, [problem]
+
+        failed = []
+        for kind in kinds:
+            failed += self._run(kind, integration, full, out)
+        return out, failed
+
+    def _report_durations(self, integrations, kinds):
+        """The slowest integrations first: those are the ones to look at."""
+        if len(integrations) < 2:
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING('Duración por integración'))
+        for kind in kinds:
+            for metrics in scheduling.sync_metrics(integrations, kind):
+                lag = metrics['atraso_segundos']
+                self.stdout.write(
+                    f"  {metrics['centro']} / {kind}: {metrics['segundos']:.1f} s"
+                    + (f", atraso {lag} s" if lag is not None else '')
+                )
+
+    def _verify_link(self, integration, out):
         """
         Confirm the token still resolves to the linked account, before syncing.
 
@@ -112,12 +147,12 @@ class Command(BaseCommand):
         try:
             account = ContoClient(integration).get_account()
         except ContoUnavailable as exc:
-            self.stdout.write(self.style.WARNING(
+            out.append(self.style.WARNING(
                 f'  Vínculo: Conto no disponible ({exc})'
             ))
             return f'{integration.center.nombre}: {exc}'
         except ContoError as exc:
-            self.stdout.write(self.style.ERROR(f'  Vínculo: {exc}'))
+            out.append(self.style.ERROR(f'  Vínculo: {exc}'))
             return f'{integration.center.nombre}: {exc}'
 
         received = account.get('cuenta_id')
@@ -131,56 +166,64 @@ class Command(BaseCommand):
                 f'está vinculada a {integration.conto_account_id!r}. '
                 f'Se desactivó la integración.'
             )
-            self.stdout.write(self.style.ERROR(f'  Vínculo: {message}'))
+            out.append(self.style.ERROR(f'  Vínculo: {message}'))
             return f'{integration.center.nombre}: {message}'
 
         if not account.get('activa', True):
-            self.stdout.write(self.style.WARNING(
+            out.append(self.style.WARNING(
                 '  Vínculo: la cuenta de Conto está desactivada'
             ))
             return f'{integration.center.nombre}: cuenta de Conto desactivada'
 
-        self.stdout.write(f'  Vínculo: OK ({account.get("nombre") or received})')
+        out.append(f'  Vínculo: OK ({account.get("nombre") or received})')
         return None
 
-    def _run(self, label, work, integration):
+    def _run(self, kind, integration, full, out):
         """
         Run one synchronization, reporting the outcome.
 
         Auth and isolation errors are reported but do not stop the other
         integrations: one revoked token should not silence everybody else.
         """
+        label = LABELS[kind]
         try:
-            result = work()
+            result = scheduling.run_sync(integration, kind, full=full)
         except (ContoAuthError, ContoAccountMismatch,
                 ContoAccountInactive, ContoNotLinked) as exc:
-            self.stdout.write(self.style.ERROR(f'  {label}: {exc}'))
+            out.append(self.style.ERROR(f'  {label}: {exc}'))
             return [f'{integration.center.nombre} / {label}: {exc}']
         except ContoUnavailable as exc:
-            self.stdout.write(self.style.WARNING(
+            out.append(self.style.WARNING(
                 f'  {label}: Conto no disponible ({exc}). '
                 f'La próxima corrida recupera lo que falte.'
             ))
             return [f'{integration.center.nombre} / {label}: {exc}']
         except ContoError as exc:
-            self.stdout.write(self.style.ERROR(f'  {label}: {exc}'))
+            out.append(self.style.ERROR(f'  {label}: {exc}'))
             return [f'{integration.center.nombre} / {label}: {exc}']
 
+        if result is None:
+            # Another run holds the lock; it is doing this work right now.
+            out.append(self.style.WARNING(
+                f'  {label}: ya hay una sincronización en curso, se saltea'
+            ))
+            return []
+
         style = self.style.ERROR if result.errors else self.style.SUCCESS
-        self.stdout.write(style(f'  {label}: {result.summary}'))
+        out.append(style(f'  {label}: {result.summary}'))
 
         # The unmatched list is the point of the first stock run: it is the Conto
         # catalog to pair the local products against.
         unmatched = getattr(result, 'unmatched', None)
         if unmatched:
-            self.stdout.write(self.style.WARNING(
+            out.append(self.style.WARNING(
                 f'    SKU de Conto sin producto en la sucursal ({len(unmatched)}):'
             ))
             for sku in unmatched:
-                self.stdout.write(f'      {sku}')
+                out.append(f'      {sku}')
 
         for error in result.errors[:10]:
-            self.stdout.write(self.style.ERROR(f'    - {error}'))
+            out.append(self.style.ERROR(f'    - {error}'))
 
         # Per-voucher errors are recorded on the voucher and reprocessable, so
         # they do not make the whole run fail.
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Quantity of the product lines imported before Transaction.quantity existed.
+
+    The importer has always written it as the description prefix ("2x Sérum"),
+    so it is read back from there. Lines without the prefix stay empty and keep
+    counting as one unit.
+    """
+
+    dependencies = [
+        ("finanzas", "0007_transaction_quantity"),
+        ("integraciones", "0003_contosale_total_discrepancy"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            r"""
+            UPDATE finanzas_transaction t
+               SET quantity = substring(t.description from '^(\d{1,8}(?:\.\d{1,2})?)x ')::numeric
+             WHERE t.type = 'INCOME_PRODUCT'
+               AND t.product_id IS NOT NULL
+               AND t.quantity IS NULL
+               AND t.description ~ '^\d{1,8}(\.\d{1,2})?x '
+               AND EXISTS (
+                   SELECT 1 FROM integraciones_contosale_transactions ct
+                    WHERE ct.transaction_id = t.id
+               )
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
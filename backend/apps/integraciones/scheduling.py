@@ -0,0 +1,191 @@
+"""
+Running the Conto syncs of many integrations side by side.
+
+The periodic tasks used to walk every integration in one loop, so one slow
+account delayed every other center, and two overlapping runs (two beat ticks, a
+beat tick and the "sincronizar" button, a cron and a manual command) could
+import the same integration at the same time.
+
+- **One run per integration.** With Celery the periodic task fans out one task
+  per integration; without a worker, `sincronizar_conto` runs them on a thread
+  pool (`map_integrations`).
+- **Never twice at once.** `run_sync` holds a Postgres advisory lock keyed on
+  (kind, integration) for the whole run. A second run finds it taken and skips:
+  the next scheduled run brings whatever it would have. The lock belongs to the
+  database session, so a process that dies mid-run releases it with its
+  connection. Stock and sales of the same integration do not block each other;
+  they touch different tables.
+- **Measured.** Every run records, per integration, how long it took and how
+  stale the integration was when it started (its cursor against now). They live
+  in the cache like the push drainer's metrics; `sync_metrics` sorts them so the
+  accounts that eat the 15-minute window come first.
+"""
+import logging
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from .sync import SalesImporter, StockSynchronizer
+
+logger = logging.getLogger(__name__)
+
+SALES = 'ventas'
+STOCK = 'stock'
+
+# Integrations synced at once when there is no worker. Each one holds a
+# database connection and, while a page is prefetched, a second thread.
+WORKERS = 4
+
+METRICS_KEY_PREFIX = 'integraciones:conto:sync'
+# Long enough to still show an integration that stopped syncing a while ago.
+METRICS_TTL = 7 * 24 * 60 * 60
+
+# First half of the advisory lock key; the integration id is the second. Derived
+# from a name so it cannot collide with another feature's locks by accident.
+_LOCK_NAMESPACES = {
+    kind: zlib.crc32(f'integraciones.conto.{kind}'.encode()) & 0x7FFFFFFF
+    for kind in (SALES, STOCK)
+}
+
+_CURSORS = {SALES: 'last_sales_sync', STOCK: 'last_stock_sync'}
+
+
+@contextmanager
+def integration_lock(integration, kind):
+    """
+    Yields True when this process holds the lock for (kind, integration), False
+    when another run does. Outside Postgres there is nothing to coordinate with
+    — the development SQLite has one process — and it always yields True.
+    """
+    if connection.vendor != 'postgresql':
+        yield True
+        return
+
+    key = (_LOCK_NAMESPACES[kind], integration.pk)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', key)
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(%s, %s)', key)
+            except Exception:
+                # A broken connection already lost the lock; closing it makes
+                # sure a half-dead session does not keep it either.
+                logger.warning("No se pudo liberar el lock de %s de la integración %s",
+                               kind, integration.pk, exc_info=True)
+                connection.close()
+
+
+def _metrics_key(kind, integration_id):
+    return f'{METRICS_KEY_PREFIX}:{kind}:{integration_id}'
+
+
+def _record(integration, kind, started_at, seconds, lag, outcome):
+    metrics = {
+        'integracion': integration.pk,
+        'centro': integration.center.nombre,
+        'que': kind,
+        'inicio': started_at.isoformat(),
+        'segundos': round(seconds, 2),
+        'atraso_segundos': None if lag is None else round(lag),
+        'resultado': outcome,
+    }
+    try:
+        cache.set(_metrics_key(kind, integration.pk), metrics, METRICS_TTL)
+    except Exception:
+        # Losing a measurement must not fail a sync that already happened.
+        logger.warning("No se pudieron guardar las métricas del sync", exc_info=True)
+    logger.info(
+        "Sync de %s de la integración %s: %.1f s, atraso %s s",
+        kind, integration.pk, seconds, metrics['atraso_segundos'],
+    )
+
+
+def run_sync(integration, kind, full=False):
+    """
+    Run one sync of one integration under its lock, and measure it.
+
+    Returns the sync's result, or None when another run holds the lock. Conto
+    errors propagate as they always did, after being recorded.
+    """
+    with integration_lock(integration, kind) as acquired:
+        if not acquired:
+            logger.info("Sync de %s de la integración %s ya en curso: se saltea",
+                        kind, integration.pk)
+            return None
+
+        # The instance may have been loaded before the run that just released
+        # the lock moved the cursor.
+        cursor_field = _CURSORS[kind]
+        integration.refresh_from_db(fields=[cursor_field])
+        cursor = getattr(integration, cursor_field)
+
+        started_at = timezone.now()
+        lag = (started_at - cursor).total_seconds() if cursor else None
+        start = time.monotonic()
+        outcome = 'error'
+        try:
+            if kind == STOCK:
+                result = StockSynchronizer(integration).run(full=full)
+            else:
+                result = SalesImporter(integration).run()
+            outcome = result.summary
+            return result
+        except Exception as exc:
+            outcome = f'error: {exc}'
+            raise
+        finally:
+            _record(integration, kind, started_at, time.monotonic() - start, lag, outcome)
+
+
+def integration_metrics(integration) -> dict:
+    """The last measured run of each kind for one integration, or None."""
+    stored = cache.get_many([_metrics_key(kind, integration.pk) for kind in (SALES, STOCK)])
+    return {kind: stored.get(_metrics_key(kind, integration.pk)) for kind in (SALES, STOCK)}
+
+
+def sync_metrics(integrations, kind=SALES) -> list:
+    """Last run of `kind` for each integration, slowest first."""
+    keys = [_metrics_key(kind, integration.pk) for integration in integrations]
+    measured = [metrics for metrics in cache.get_many(keys).values() if metrics]
+    return sorted(measured, key=lambda metrics: metrics['segundos'], reverse=True)
+
+
+def _in_own_connection(work, integration):
+    try:
+        return work(integration)
+    finally:
+        # Threads get a connection of their own; nothing else would close it.
+        connection.close()
+
+
+def map_integrations(work, integrations, workers=WORKERS):
+    """
+    Run `work(integration)` for each integration, `workers` at a time, and yield
+    `(integration, return value)` as each finishes.
+
+    With one worker everything runs inline, on the caller's connection.
+    """
+    integrations = list(integrations)
+    if workers <= 1 or len(integrations) <= 1:
+        for integration in integrations:
+            yield integration, work(integration)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(integrations)),
+                            thread_name_prefix='conto-sync') as pool:
+        futures = {
+            pool.submit(_in_own_connection, work, integration): integration
+            for integration in integrations
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -13,13 +13,18 @@ on. Funnelling every lookup through `ContoScope` means there is no second path
 that could forget the filter. See INTEGRACION_CONTO_SPEC.md §3.
 """
 import logging
-import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timezone as datetime_timezone
+from functools import partial
 from urllib.parse import urlparse
 
 import requests
+from django.db import transaction as db_transaction
 
+from apps.analytics.cache import bump_branch_version
 from apps.clientes.models import Cliente
+from apps.clientes.utils import sufijo_telefono
 from apps.inventario.models import Producto
 
 logger = logging.getLogger(__name__)
@@ -78,6 +83,10 @@ class ContoClient:
     TIMEOUT = 20
     # Guard against a malformed `next` chain looping forever.
     MAX_PAGES = 500
+    # Seconds to wait before each retry of a page that failed with a 5xx or a
+    # network error. Past the last one the error propagates and the task's own
+    # retry takes over.
+    RETRY_BACKOFF = (1, 4, 15)
 
     def __init__(self, integration, session=None):
         self.integration = integration
@@ -120,6 +129,13 @@ class ContoClient:
 
         The tripwire runs per page, not just on the first one: a token could in
         principle stop resolving to the same account mid-walk.
+
+        The next page is fetched on a background thread while the caller works
+        through the current one, so the sync pays for the network or for the
+        database, not for both one after the other. Only one page is ever ahead,
+        and it is requested only once the current page passed the tripwire and
+        its `next` passed the origin check. The thread does HTTP and nothing
+        else: no database connection is ever opened there.
         """
         expected = self.integration.conto_account_id
         if not expected:
@@ -128,30 +144,64 @@ class ContoClient:
                 "Verificá la vinculación antes de sincronizar."
             )
 
-        next_url = url
-        for page in range(self.MAX_PAGES):
-            payload = self._request(next_url, params if page == 0 else None)
-
-            received = payload.get('cuenta_id')
-            if received != expected:
-                raise ContoAccountMismatch(
-                    f"La respuesta de Conto pertenece a la cuenta {received!r} "
-                    f"y esta integración está vinculada a {expected!r}. "
-                    f"Sincronización abortada."
+        prefetch = ThreadPoolExecutor(max_workers=1, thread_name_prefix='conto-prefetch')
+        try:
+            pending = prefetch.submit(self._fetch_page, url, params)
+            for page in range(self.MAX_PAGES):
+                payload = pending.result()
+
+                received = payload.get('cuenta_id')
+                if received != expected:
+                    raise ContoAccountMismatch(
+                        f"La respuesta de Conto pertenece a la cuenta {received!r} "
+                        f"y esta integración está vinculada a {expected!r}. "
+                        f"Sincronización abortada."
+                    )
+
+                next_url = payload.get('next')
+                if next_url and page + 1 < self.MAX_PAGES and self._is_same_origin(next_url):
+                    pending = prefetch.submit(self._fetch_page, next_url, None)
+
+                for item in payload.get('results') or []:
+                    yield item
+
+                if not next_url:
+                    return
+                self._assert_same_origin(next_url)
+            else:
+                raise ContoError(
+                    f"La paginación superó {self.MAX_PAGES} páginas. "
+                    f"Puede haber un bucle en el campo 'next'."
                 )
+        finally:
+            # A walk abandoned halfway (an aborted run, a tripwire) does not
+            # wait for the page in flight; its result is simply dropped.
+            prefetch.shutdown(wait=False, cancel_futures=True)
 
-            for item in payload.get('results') or []:
-                yield item
+    def _fetch_page(self, url, params):
+        """
+        `_request` with retries on `ContoUnavailable`, waiting `RETRY_BACKOFF`.
 
-            next_url = payload.get('next')
-            if not next_url:
-                return
-            self._assert_same_origin(next_url)
-        else:
-            raise ContoError(
-                f"La paginación superó {self.MAX_PAGES} páginas. "
-                f"Puede haber un bucle en el campo 'next'."
-            )
+        Only pages are retried: a blip halfway through a long walk should not
+        throw away the pages already imported. `get_account` runs while someone
+        waits on the screen and fails at once.
+        """
+        for attempt, delay in enumerate((*self.RETRY_BACKOFF, None)):
+            try:
+                return self._request(url, params)
+            except ContoUnavailable as exc:
+                if delay is None:
+                    raise
+                logger.warning(
+                    "Conto no disponible (intento %s), reintento en %ss: %s",
+                    attempt + 1, delay, exc,
+                )
+                time.sleep(delay)
+
+    def _is_same_origin(self, url):
+        expected = urlparse(self.base_url)
+        received = urlparse(url)
+        return (received.scheme, received.netloc) == (expected.scheme, expected.netloc)
 
     def _assert_same_origin(self, url):
         """
@@ -160,12 +210,10 @@ class ContoClient:
         Following it blindly would let a compromised or misconfigured response
         redirect our authenticated requests elsewhere.
         """
-        expected = urlparse(self.base_url)
-        received = urlparse(url)
-        if (received.scheme, received.netloc) != (expected.scheme, expected.netloc):
+        if not self._is_same_origin(url):
             raise ContoError(
-                f"El campo 'next' apunta a otro origen ({received.netloc}), "
-                f"se esperaba {expected.netloc}"
+                f"El campo 'next' apunta a otro origen ({urlparse(url).netloc}), "
+                f"se esperaba {urlparse(self.base_url).netloc}"
             )
 
     def _request(self, url, params=None):
@@ -232,11 +280,6 @@ class ContoScope:
     def normalize_email(email):
         return (email or '').strip().lower()
 
-    @staticmethod
-    def normalize_phone(phone):
-        """Reduce to digits so formatting differences do not block a match."""
-        return re.sub(r'\D', '', phone or '')
-
     # -- products ---------------------------------------------------------- #
 
     def find_product(self, sku):
@@ -273,6 +316,30 @@ class ContoScope:
             )
         return None
 
+    def products_by_sku(self):
+        """
+        Every product of the branch keyed by normalized SKU, in one query.
+
+        Same semantics as `find_product`, for callers that resolve thousands of
+        SKUs in a run: an ambiguous SKU maps to None rather than to either
+        product.
+        """
+        products = {}
+        ambiguous = set()
+        for producto in Producto.objects.filter(sucursal=self.branch).exclude(sku=''):
+            key = self.normalize_sku(producto.sku)
+            if key in products:
+                ambiguous.add(key)
+            products[key] = producto
+
+        for key in ambiguous:
+            logger.warning(
+                "SKU ambiguo %r en la sucursal %s: matchea más de un producto",
+                key, self.branch_id,
+            )
+            products[key] = None
+        return products
+
     def create_product(self, sku, name, cost, price, stock=0, active=True):
         """
         Create a product mirrored from Conto.
@@ -324,9 +391,59 @@ class ContoScope:
         if not fields:
             return False
 
-        Producto.objects.filter(pk=producto.pk, sucursal=self.branch).update(**fields)
+        if Producto.objects.filter(pk=producto.pk, sucursal=self.branch).update(**fields):
+            db_transaction.on_commit(partial(bump_branch_version, self.branch_id))
         return True
 
+    def create_products(self, rows, batch_size=None):
+        """
+        `create_product` for a whole batch, in one INSERT per `batch_size`.
+
+        `rows` are dicts with the arguments of `create_product`. Here the stock
+        goes in directly: `bulk_create` sends no `post_save`, so
+        `create_initial_stock_movement` never runs and there is no phantom
+        purchase to avoid. The analytics cache that the signal would have
+        invalidated is bumped once for the batch, after the commit.
+        """
+        productos = Producto.objects.bulk_create(
+            [
+                Producto(
+                    sucursal=self.branch,
+                    nombre=row['name'],
+                    sku=self.normalize_sku(row['sku']),
+                    precio_costo=row.get('cost') or 0,
+                    precio_venta=row.get('price') or 0,
+                    stock_actual=row.get('stock') or 0,
+                    activo=row.get('active', True),
+                )
+                for row in rows
+            ],
+            batch_size=batch_size,
+        )
+        if productos:
+            db_transaction.on_commit(partial(bump_branch_version, self.branch_id))
+            logger.info(
+                "%s productos creados desde Conto en sucursal %s",
+                len(productos), self.branch_id,
+            )
+        return productos
+
+    def update_products(self, productos, fields, batch_size=None):
+        """
+        `update_stock` for a whole batch: writes `fields` from each instance.
+
+        Same guarantees: a queryset write, so no movements, and the branch
+        filter applies to every row, whatever instances the caller passes.
+        No `post_save` either, so the analytics cache is bumped here, once
+        for the batch and after the commit, when any row changed.
+        """
+        updated = Producto.objects.filter(sucursal=self.branch).bulk_update(
+            productos, fields, batch_size=batch_size
+        )
+        if updated:
+            db_transaction.on_commit(partial(bump_branch_version, self.branch_id))
+        return updated
+
     # -- clients ----------------------------------------------------------- #
 
     def find_client(self, email=None, phone=None):
@@ -345,23 +462,14 @@ class ContoScope:
             if match:
                 return match
 
-        digits = self.normalize_phone(phone)
-        if len(digits) >= 8:
-            # Compare on digits only, so "+54 9 11 3333-4444" and "1133334444"
-            # can match. Requires 8+ digits to avoid absurd collisions.
-            for candidate in queryset.exclude(telefono='').only('id', 'telefono'):
-                candidate_digits = self.normalize_phone(candidate.telefono)
-                if candidate_digits and self._phones_match(digits, candidate_digits):
-                    return candidate
+        suffix = sufijo_telefono(phone)
+        if suffix:
+            # Argentine numbers arrive with and without country code and the
+            # mobile 9, so "+54 9 11 3333-4444" and "1133334444" have to match.
+            # Comparing the last 8 digits is what actually works in practice;
+            # anything stricter fails on real data and anything looser starts
+            # colliding. The suffix is stored on Cliente, so this is one indexed
+            # lookup instead of a scan of the center's clients.
+            return queryset.filter(telefono_sufijo=suffix).first()
 
         return None
-
-    @staticmethod
-    def _phones_match(left, right):
-        """
-        Argentine numbers arrive with and without country code and the mobile 9.
-
-        Comparing the last 8 digits is what actually works in practice; anything
-        stricter fails on real data and anything looser starts colliding.
-        """
-        return left[-8:] == right[-8:]
@@ -17,6 +17,7 @@ transaction through the inventory signal.
 """
 import logging
 import re
+import time
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
@@ -25,6 +26,7 @@ from django.db import transaction as db_transaction
 from django.utils import timezone
 
 from apps.clientes.models import Cliente
+from apps.clientes.utils import sufijo_telefono
 from apps.finanzas.models import Transaction, TransactionCategory
 
 from .models import ContoSale
@@ -112,6 +114,94 @@ def get_expense_category(branch, name):
     )
 
 
+class RunLookups:
+    """
+    Lookups memoized for the length of one run.
+
+    A run resolves the same handful of categories and the same SKUs over and
+    over: a full stock sync is one `find_product` per catalog row, a sales
+    import one per line item plus a category per voucher. Here the branch's
+    products are read once, on first use, and categories and clients are
+    remembered by key.
+
+    Scoped to a run on purpose. Nothing outlives it, so a product created by
+    hand between two runs is seen by the next one, and the branch filter still
+    comes from `ContoScope`.
+
+    Rows created inside a voucher's `atomic()` are only remembered once it
+    commits. A voucher that fails rolls back its new client or category; caching
+    it anyway would hand the next voucher a foreign key to a row that no longer
+    exists.
+
+    With `preload=False` products are looked up one by one, for callers that
+    resolve a single voucher and would not amortize reading the whole branch.
+    """
+
+    def __init__(self, scope, preload=True):
+        self.scope = scope
+        self.preload = preload
+        self._products = None
+        self._categories = {}
+        self._clients = {}
+
+    # -- products ---------------------------------------------------------- #
+
+    def product(self, sku):
+        if not self.preload:
+            return self.scope.find_product(sku)
+        if self._products is None:
+            self._products = self.scope.products_by_sku()
+        return self._products.get(self.scope.normalize_sku(sku))
+
+    def add_product(self, producto):
+        if self._products is not None:
+            self._products[self.scope.normalize_sku(producto.sku)] = producto
+
+    # -- categories -------------------------------------------------------- #
+
+    def income_category(self, name):
+        return self._category(get_income_category, name)
+
+    def expense_category(self, name):
+        return self._category(get_expense_category, name)
+
+    def _category(self, resolve, name):
+        key = (resolve, name)
+        if key in self._categories:
+            return self._categories[key]
+        category = resolve(self.scope.branch, name)
+        self._remember(self._categories, key, category)
+        return category
+
+    # -- clients ----------------------------------------------------------- #
+
+    def client_key(self, email, phone):
+        """Whatever `find_client` would actually compare."""
+        return self.scope.normalize_email(email), sufijo_telefono(phone)
+
+    def find_client(self, email, phone):
+        key = self.client_key(email, phone)
+        if key not in self._clients:
+            self._clients[key] = self.scope.find_client(email=email, phone=phone)
+        return self._clients[key]
+
+    def add_client(self, email, phone, cliente):
+        self._remember(self._clients, self.client_key(email, phone), cliente)
+
+    @staticmethod
+    def _remember(store, key, value):
+        """
+        Cache now, or on commit if the row may still be rolled back. Until then
+        the key is dropped, so a remembered "not found" cannot outlive the
+        creation and the next lookup asks the database.
+        """
+        if db_transaction.get_connection().in_atomic_block:
+            store.pop(key, None)
+            db_transaction.on_commit(lambda: store.__setitem__(key, value))
+        else:
+            store[key] = value
+
+
 # --------------------------------------------------------------------------- #
 # Stock
 # --------------------------------------------------------------------------- #
@@ -119,66 +209,123 @@ def get_expense_category(branch, name):
 @dataclass
 class StockSyncResult:
     updated: int = 0
+    unchanged: int = 0
     created: int = 0
     unmatched: list = field(default_factory=list)
     errors: list = field(default_factory=list)
+    seconds: float = 0.0
 
     @property
     def summary(self):
         return (
-            f"{self.updated} actualizados, {self.created} creados, "
-            f"{len(self.unmatched)} sin match, {len(self.errors)} con error"
+            f"{self.updated} actualizados, {self.unchanged} sin cambios, "
+            f"{self.created} creados, {len(self.unmatched)} sin match, "
+            f"{len(self.errors)} con error en {self.seconds:.1f} s"
         )
 
 
+def stock_changes(producto, stock, cost, price):
+    """
+    The fields Conto's values would actually change, as `{field: value}`.
+
+    A zero cost or price means Conto does not have one, and never overwrites
+    ours — the same rule `update_stock` has always applied.
+    """
+    wanted = {'stock_actual': stock}
+    if cost:
+        wanted['precio_costo'] = cost
+    if price:
+        wanted['precio_venta'] = price
+    return {
+        name: value for name, value in wanted.items()
+        if getattr(producto, name) != value
+    }
+
+
 class StockSynchronizer:
-    """Pulls the catalog state from Conto onto our products."""
+    """
+    Pulls the catalog state from Conto onto our products.
+
+    Rows whose stock, cost and price already match are not written. A full sync
+    goes further and writes in bulk: the catalog is read in chunks of
+    `BULK_CHUNK`, compared against the products preloaded by `RunLookups`, and
+    only what changed is written with `bulk_update`, plus one `bulk_create`
+    for the missing products. An incremental sync brings a handful of rows and
+    keeps the per-row path, where one bad row cannot fail the ones around it;
+    a chunk whose bulk write fails falls back to that same path.
+    """
+
+    BULK_CHUNK = 1000
 
     def __init__(self, integration, client=None):
         self.integration = integration
         self.client = client or ContoClient(integration)
         self.scope = ContoScope(integration)
+        self.lookups = None   # a RunLookups per run, made where the run starts
 
     def run(self, full=False):
         # Captured before the pull: anything modified during the pull must be
         # picked up by the next run, not skipped.
         started_at = timezone.now()
+        start = time.monotonic()
         since = None if full else self.integration.last_stock_sync
 
         result = StockSyncResult()
+        self.lookups = RunLookups(self.scope)
 
-        for item in self.client.iter_stock(since=since):
-            try:
-                self._process(item, result)
-            except Exception as exc:
-                logger.exception("Error sincronizando stock de Conto")
-                result.errors.append(f"{item.get('sku')}: {exc}")
+        items = self.client.iter_stock(since=since)
+        if full:
+            for chunk in self._chunks(items):
+                self._apply_chunk(chunk, result)
+        else:
+            for item in items:
+                try:
+                    self._process(item, result)
+                except Exception as exc:
+                    logger.exception("Error sincronizando stock de Conto")
+                    result.errors.append(f"{item.get('sku')}: {exc}")
 
         self.integration.last_stock_sync = started_at
         self.integration.save(update_fields=['last_stock_sync', 'updated_at'])
 
+        result.seconds = time.monotonic() - start
         logger.info("Sync de stock de Conto: %s", result.summary)
         return result
 
-    def _process(self, item, result):
+    def _parse(self, item, result):
+        """`(sku, stock, cost, price)`, or None when the row has no SKU."""
         sku = item.get('sku')
         if not self.scope.normalize_sku(sku):
             result.unmatched.append(item.get('nombre') or '(sin sku ni nombre)')
-            return
+            return None
+        return (
+            sku,
+            to_decimal(item.get('stock')),
+            to_decimal(item.get('costo')),
+            to_decimal(item.get('precio')),
+        )
 
-        stock = to_decimal(item.get('stock'))
-        cost = to_decimal(item.get('costo'))
-        price = to_decimal(item.get('precio'))
+    def _process(self, item, result):
+        parsed = self._parse(item, result)
+        if parsed is None:
+            return
+        sku, stock, cost, price = parsed
 
-        producto = self.scope.find_product(sku)
+        producto = self.lookups.product(sku)
 
         if producto:
+            changes = stock_changes(producto, stock, cost, price)
+            if not changes:
+                result.unchanged += 1
+                return
             self.scope.update_stock(
                 producto,
-                stock=stock,
-                cost=cost or None,
-                price=price or None,
+                stock=changes.get('stock_actual'),
+                cost=changes.get('precio_costo'),
+                price=changes.get('precio_venta'),
             )
+            for name, value in changes.items():
+                setattr(producto, name, value)
             result.updated += 1
             return
 
@@ -186,7 +333,7 @@ class StockSynchronizer:
             result.unmatched.append(sku)
             return
 
-        self.scope.create_product(
+        producto = self.scope.create_product(
             sku=sku,
             name=item.get('nombre') or sku,
             cost=cost,
@@ -194,8 +341,118 @@ class StockSynchronizer:
             stock=stock,
             active=item.get('activo', True),
         )
+        # A catalog that repeats a SKU must update the product, not create a
+        # second one that the unique constraint would reject.
+        self.lookups.add_product(producto)
         result.created += 1
 
+    # -- bulk (full sync) -------------------------------------------------- #
+
+    def _chunks(self, items):
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= self.BULK_CHUNK:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _apply_chunk(self, chunk, result):
+        """
+        Diff a chunk against the preloaded products and write what changed.
+
+        A row repeated within the chunk is applied over the previous one, so the
+        last value wins, as it does row by row. If the bulk write fails, the
+        chunk is applied again one row at a time, so the failure is reported
+        against its SKU and the rows around it still land.
+        """
+        # Where this chunk's reports start, to drop them if it is replayed.
+        marks = (len(result.unmatched), len(result.errors))
+        changed = {}          # pk -> (producto, {fields})
+        to_create = {}        # normalized sku -> row for create_products
+        unchanged = set()
+
+        for item in chunk:
+            try:
+                parsed = self._parse(item, result)
+            except Exception as exc:
+                logger.exception("Error sincronizando stock de Conto")
+                result.errors.append(f"{item.get('sku')}: {exc}")
+                continue
+            if parsed is None:
+                continue
+            sku, stock, cost, price = parsed
+            key = self.scope.normalize_sku(sku)
+
+            producto = self.lookups.product(sku)
+            if producto:
+                changes = stock_changes(producto, stock, cost, price)
+                if not changes:
+                    if producto.pk not in changed:
+                        unchanged.add(producto.pk)
+                    continue
+                for name, value in changes.items():
+                    setattr(producto, name, value)
+                unchanged.discard(producto.pk)
+                _, fields = changed.setdefault(producto.pk, (producto, set()))
+                fields.update(changes)
+            elif key in to_create:
+                row = to_create[key]
+                row['stock'] = stock
+                row['cost'] = cost or row['cost']
+                row['price'] = price or row['price']
+            elif self.integration.create_missing_products:
+                to_create[key] = {
+                    'sku': sku, 'name': item.get('nombre') or sku,
+                    'cost': cost, 'price': price, 'stock': stock,
+                    'active': item.get('activo', True),
+                }
+            else:
+                result.unmatched.append(sku)
+
+        try:
+            with db_transaction.atomic():
+                self._write_changes(changed.values())
+                created = self.scope.create_products(
+                    to_create.values(), batch_size=self.BULK_CHUNK
+                )
+        except Exception:
+            logger.warning(
+                "Falló el lote de %s ítems del sync de stock de Conto; se aplica fila por fila",
+                len(chunk), exc_info=True,
+            )
+            # The preloaded instances may hold values that were rolled back.
+            self.lookups = RunLookups(self.scope)
+            del result.unmatched[marks[0]:]
+            del result.errors[marks[1]:]
+            self._replay(chunk, result)
+            return
+
+        for producto in created:
+            self.lookups.add_product(producto)
+        result.updated += len(changed)
+        result.unchanged += len(unchanged)
+        result.created += len(created)
+
+    def _replay(self, chunk, result):
+        """The per-row path, each row in a savepoint so a failure stays on its row."""
+        for item in chunk:
+            try:
+                with db_transaction.atomic():
+                    self._process(item, result)
+            except Exception as exc:
+                logger.exception("Error sincronizando stock de Conto")
+                result.errors.append(f"{item.get('sku')}: {exc}")
+
+    def _write_changes(self, changed):
+        """One `bulk_update` per set of changed fields: untouched columns are not rewritten."""
+        by_fields = {}
+        for producto, fields in changed:
+            by_fields.setdefault(tuple(sorted(fields)), []).append(producto)
+        for fields, productos in by_fields.items():
+            self.scope.update_products(productos, list(fields), batch_size=self.BULK_CHUNK)
+
 
 # --------------------------------------------------------------------------- #
 # Sales
@@ -233,6 +490,7 @@ class SalesImporter:
         self.integration = integration
         self.client = client or ContoClient(integration)
         self.scope = ContoScope(integration)
+        self.lookups = None   # a RunLookups per run, made where the run starts
 
     # -- entry point ------------------------------------------------------- #
 
@@ -241,6 +499,7 @@ class SalesImporter:
         since = self._window_start()
 
         result = SalesImportResult()
+        self.lookups = RunLookups(self.scope)
 
         for voucher in self.client.iter_sales(since):
             try:
@@ -270,6 +529,7 @@ class SalesImporter:
         correction. The raw payload was kept precisely so this is possible.
         """
         result = SalesImportResult()
+        self.lookups = RunLookups(self.scope, preload=False)
         try:
             with db_transaction.atomic():
                 self._process(sale.payload, result)
@@ -400,15 +660,16 @@ class SalesImporter:
 
         created = []
 
-        product_category = get_income_category(branch, 'Productos')
+        product_category = self.lookups.income_category('Productos')
         for index, item in enumerate(product_items):
             amount = self._line_total(item) - discounts['product'][index]
-            producto = self.scope.find_product(item.get('sku'))
+            producto = self.lookups.product(item.get('sku'))
             created.append(Transaction.objects.create(
                 branch=branch,
                 category=product_category,
                 client=client,
                 product=producto,
+                quantity=to_decimal(item.get('cantidad') or 1),
                 type='INCOME_PRODUCT',
                 amount=amount,
                 payment_method=payment_method,
@@ -419,7 +680,7 @@ class SalesImporter:
             ))
 
         if other_items:
-            other_category = get_income_category(branch, 'Otros Ingresos')
+            other_category = self.lookups.income_category('Otros Ingresos')
             for index, item in enumerate(other_items):
                 amount = self._line_total(item) - discounts['other'][index]
                 if amount <= ZERO:
@@ -547,7 +808,7 @@ class SalesImporter:
         if amount <= ZERO:
             raise ValueError("La nota de crédito no trae un total válido")
 
-        category = get_expense_category(self.integration.branch, 'Devoluciones')
+        category = self.lookups.expense_category('Devoluciones')
         reference = sale.related_voucher_id or 's/d'
 
         compensating = Transaction.objects.create(
@@ -644,7 +905,7 @@ class SalesImporter:
         email = data.get('email')
         phone = data.get('telefono')
 
-        existing = self.scope.find_client(email=email, phone=phone)
+        existing = self.lookups.find_client(email, phone)
         if existing:
             return existing
 
@@ -656,7 +917,7 @@ class SalesImporter:
             return None
 
         first, _, last = full_name.partition(' ')
-        return Cliente.objects.create(
+        cliente = Cliente.objects.create(
             centro_estetica=self.integration.center,
             nombre=first or 'Sin nombre',
             apellido=last or '',
@@ -664,6 +925,8 @@ class SalesImporter:
             telefono=(phone or '')[:20],
             detalle_general='Cliente creado automáticamente desde Conto',
         )
+        self.lookups.add_client(email, phone, cliente)
+        return cliente
 
     @staticmethod
     def _description(item, voucher):
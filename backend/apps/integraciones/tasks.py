@@ -1,13 +1,15 @@
 """
 Celery tasks for the Conto integration.
 
-Thin wrappers: all the logic lives in sync.py so it can be tested without a
-broker. These handle scheduling, iteration over integrations and retries.
+Thin wrappers: all the logic lives in sync.py and scheduling.py so it can be
+tested without a broker. These handle fanning out to one task per integration
+and retries.
 """
 import logging
 
 from celery import shared_task
 
+from . import scheduling
 from .models import ContoIntegration
 from .services import (
     ContoAccountInactive,
@@ -16,7 +18,6 @@ from .services import (
     ContoNotLinked,
     ContoUnavailable,
 )
-from .sync import SalesImporter, StockSynchronizer
 
 logger = logging.getLogger(__name__)
 
@@ -49,24 +50,30 @@ def _syncable_integrations(integration_id=None):
     return queryset
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=300)
-def sync_conto_stock(self, integration_id=None, full=False):
+def _fan_out(task, **kwargs):
     """
-    Pull the catalog state from Conto.
-
-    Scheduled every 30 minutes. Stock is state, not events, so a missed run is
-    corrected by the next one.
+    One task per integration instead of one loop over all of them: a slow or
+    failing account no longer delays the rest, and a retry repeats only the
+    integration that needs it.
     """
+    queued = {}
+    for integration in _syncable_integrations():
+        task.delay(integration_id=integration.pk, **kwargs)
+        queued[integration.pk] = 'ENCOLADA'
+    return queued
+
+
+def _run(task, kind, integration_id, **kwargs):
     results = {}
 
     for integration in _syncable_integrations(integration_id):
         try:
-            result = StockSynchronizer(integration).run(full=full)
-            results[integration.pk] = result.summary
+            result = scheduling.run_sync(integration, kind, **kwargs)
+            results[integration.pk] = result.summary if result else 'EN CURSO'
         except FATAL_ERRORS as exc:
             logger.error(
-                "Sync de stock detenido para la integración %s: %s",
-                integration.pk, exc,
+                "Sync de %s detenido para la integración %s: %s",
+                kind, integration.pk, exc,
             )
             results[integration.pk] = f"ERROR: {exc}"
         except ContoUnavailable as exc:
@@ -74,11 +81,24 @@ def sync_conto_stock(self, integration_id=None, full=False):
                 "Conto no disponible para la integración %s: %s", integration.pk, exc
             )
             results[integration.pk] = f"REINTENTO: {exc}"
-            raise self.retry(exc=exc)
+            raise task.retry(exc=exc)
 
     return results
 
 
+@shared_task(bind=True, max_retries=3, default_retry_delay=300)
+def sync_conto_stock(self, integration_id=None, full=False):
+    """
+    Pull the catalog state from Conto.
+
+    Scheduled every 30 minutes. Stock is state, not events, so a missed run is
+    corrected by the next one. Without an integration it only fans out.
+    """
+    if integration_id is None:
+        return _fan_out(sync_conto_stock, full=full)
+    return _run(self, scheduling.STOCK, integration_id, full=full)
+
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=300)
 def import_conto_sales(self, integration_id=None):
     """
@@ -86,28 +106,12 @@ def import_conto_sales(self, integration_id=None):
 
     Scheduled every 15 minutes. The window overlaps the previous run and
     duplicates are absorbed by the uniqueness of (integration, voucher_id), so
-    running it more often than needed is harmless.
+    running it more often than needed is harmless. Without an integration it
+    only fans out.
     """
-    results = {}
-
-    for integration in _syncable_integrations(integration_id):
-        try:
-            result = SalesImporter(integration).run()
-            results[integration.pk] = result.summary
-        except FATAL_ERRORS as exc:
-            logger.error(
-                "Import de ventas detenido para la integración %s: %s",
-                integration.pk, exc,
-            )
-            results[integration.pk] = f"ERROR: {exc}"
-        except ContoUnavailable as exc:
-            logger.warning(
-                "Conto no disponible para la integración %s: %s", integration.pk, exc
-            )
-            results[integration.pk] = f"REINTENTO: {exc}"
-            raise self.retry(exc=exc)
-
-    return results
+    if integration_id is None:
+        return _fan_out(import_conto_sales)
+    return _run(self, scheduling.SALES, integration_id)
 
 
 @shared_task
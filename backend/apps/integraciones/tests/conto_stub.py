@@ -0,0 +1,123 @@
+"""
+A fake Conto API over local HTTP.
+
+Unlike `FakeClient` (which replaces the client entirely), this lets the real
+`ContoClient` run end to end — session, pagination, the account tripwire, the
+prefetch thread, retries — against a server on 127.0.0.1. It exists to measure
+how long an import takes when Conto is slow, and to produce failures the real
+API cannot be asked for.
+
+Behaviour:
+
+- `/api/cuenta/` returns the account.
+- `/api/stock/` and `/api/ventas/` page `stock` and `sales` by `page_size`,
+  with an absolute `next` URL, as the contract describes. `desde` is ignored.
+- `latency` delays every response.
+- `fail_pages`: `{page: [status, ...]}`, the page answers with those statuses,
+  one per request, before answering normally.
+- Requests without the expected bearer token get a 401.
+
+Records every page request with its start and end times, so a test can check
+whether fetching overlapped with processing.
+
+Usage::
+
+    with ContoStub('cnt_aaa', token='token-cnt_aaa', sales=vouchers, latency=0.05) as conto:
+        integration.base_url = conto.url
+        SalesImporter(integration).run()
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'     # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        started = time.monotonic()
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        if self.headers.get('Authorization') != f'Bearer {stub.token}':
+            return self._respond(401, {'detail': 'token inválido'})
+
+        parsed = urlparse(self.path)
+        if parsed.path == '/api/cuenta/':
+            return self._respond(200, {
+                'cuenta_id': stub.account_id, 'nombre': 'Stub', 'activa': True,
+            })
+
+        collections = {'/api/stock/': stub.stock, '/api/ventas/': stub.sales}
+        if parsed.path not in collections:
+            return self._respond(404, {'detail': 'no existe'})
+
+        page = int(parse_qs(parsed.query).get('page', ['1'])[0])
+        stub._record(parsed.path, page, started)
+
+        status = stub._forced_status(page)
+        if status:
+            return self._respond(status, {'detail': 'falla provocada'})
+
+        items = collections[parsed.path]
+        start = (page - 1) * stub.page_size
+        has_next = start + stub.page_size < len(items)
+        self._respond(200, {
+            'cuenta_id': stub.account_id,
+            'results': items[start:start + stub.page_size],
+            'next': f'{stub.url}{parsed.path}?page={page + 1}' if has_next else None,
+        })
+
+    def _respond(self, status, data):
+        raw = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+class ContoStub:
+    def __init__(self, account_id, *, token, stock=(), sales=(), page_size=100,
+                 latency=0.0, fail_pages=None):
+        self.account_id = account_id
+        self.token = token
+        self.stock = list(stock)
+        self.sales = list(sales)
+        self.page_size = page_size
+        self.latency = latency
+        self.fail_pages = {page: list(statuses) for page, statuses in (fail_pages or {}).items()}
+        self.pages = []                 # (path, page, started, finished)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _record(self, path, page, started):
+        with self._lock:
+            self.pages.append((path, page, started, time.monotonic()))
+
+    def _forced_status(self, page):
+        with self._lock:
+            statuses = self.fail_pages.get(page)
+            return statuses.pop(0) if statuses else None
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -8,12 +8,15 @@ from unittest.mock import Mock, patch
 
 import pytest
 from django.contrib.admin.sites import AdminSite
-from django.contrib.messages import ERROR, SUCCESS
+from django.contrib.messages import ERROR, SUCCESS, WARNING
+from django.db import connections
 from django.utils import timezone
 
 from apps.finanzas.models import Transaction
+from apps.integraciones import scheduling
 from apps.integraciones.admin import ContoIntegrationAdmin
 from apps.integraciones.models import ContoIntegration
+from apps.integraciones.services import ContoClient
 
 from .test_services import fake_response, make_center, make_product
 from .test_sync import make_syncable_center, product_line, voucher
@@ -151,13 +154,33 @@ class TestSyncActions:
         assert 'vinculada y activa' in messages[0][0]
         assert Transaction.objects.count() == 0
 
+    def test_an_integration_already_syncing_is_skipped(self):
+        """The action takes the same lock as the scheduled runs and the API button."""
+        _, _, integration = make_syncable_center('A', 'cnt_aaa')
+        scheduled_run = connections.create_connection('default')
+        try:
+            with scheduled_run.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_lock(%s, %s)',
+                               (scheduling._LOCK_NAMESPACES[scheduling.STOCK], integration.pk))
+            with patch('requests.Session.request') as request:
+                messages = run_action('sincronizar_stock_completo', integration)
+        finally:
+            scheduled_run.close()
+
+        request.assert_not_called()
+        [(message, level)] = messages
+        assert level == WARNING
+        assert 'en curso' in message
+
     def test_a_transport_error_is_reported_not_raised(self):
         _, branch, integration = make_syncable_center('A', 'cnt_aaa')
         make_product(branch, 'SER-VITC-30')
 
-        messages = run_action(
-            'importar_ventas', integration, [fake_response(status=500)]
-        )
+        # No page retries: what is under test is the report, not the backoff.
+        with patch.object(ContoClient, 'RETRY_BACKOFF', ()):
+            messages = run_action(
+                'importar_ventas', integration, [fake_response(status=500)]
+            )
 
         assert messages[0][1] == ERROR
         assert Transaction.objects.count() == 0
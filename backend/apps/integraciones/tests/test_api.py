@@ -460,6 +460,32 @@ class TestManualSync:
 
         assert response.status_code == 400
 
+    def test_it_answers_409_while_a_sync_is_running(self):
+        """The button must not import the same vouchers a scheduled run is importing."""
+        from django.db import connections
+
+        from apps.integraciones import scheduling
+        from .test_sync import make_syncable_center
+
+        center, _, integration = make_syncable_center('A', 'cnt_aaa')
+        admin = make_admin(center)
+        scheduled_run = connections.create_connection('default')
+        try:
+            with scheduled_run.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_lock(%s, %s)',
+                               (scheduling._LOCK_NAMESPACES[scheduling.SALES], integration.pk))
+            with patch('requests.Session.request') as request:
+                response = api(admin).post(
+                    action_url('sincronizar', integration.pk), {'que': 'ventas'},
+                    format='json'
+                )
+        finally:
+            scheduled_run.close()
+
+        assert response.status_code == 409
+        assert 'en curso' in response.json()['error']
+        request.assert_not_called()
+
 
 # --------------------------------------------------------------------------- #
 # Reprocessing
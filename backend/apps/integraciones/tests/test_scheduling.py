@@ -0,0 +1,210 @@
+"""
+Tests for running many integrations side by side.
+
+The lock tests hold the lock from a second database connection, which is what
+another worker or an overlapping cron looks like from here.
+"""
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import Mock, patch
+
+import pytest
+from django.core.management import call_command
+from django.db import connections
+from django.utils import timezone
+
+from apps.integraciones import scheduling
+from apps.integraciones.services import ContoUnavailable
+from apps.integraciones.sync import StockSynchronizer
+from apps.integraciones.tasks import import_conto_sales, sync_conto_stock
+from apps.inventario.models import Producto
+
+from .test_services import fake_response
+from .test_sync import make_syncable_center
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture(autouse=True)
+def local_cache(settings):
+    settings.CACHES = LOCMEM
+
+
+@pytest.fixture
+def other_session():
+    """A second database session, as another process would have."""
+    conn = connections.create_connection('default')
+    yield conn
+    conn.close()
+
+
+def hold_lock(conn, kind, integration):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s, %s)',
+                       (scheduling._LOCK_NAMESPACES[kind], integration.pk))
+
+
+def try_lock(conn, kind, integration):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, %s)',
+                       (scheduling._LOCK_NAMESPACES[kind], integration.pk))
+        return cursor.fetchone()[0]
+
+
+def catalog_dispatch(*args, **kwargs):
+    """Answers every integration with its own account and one catalog row."""
+    url = args[1] if len(args) > 1 else kwargs.get('url', '')
+    account = kwargs['headers']['Authorization'].removeprefix('Bearer token-')
+    if '/api/cuenta/' in url:
+        return fake_response(payload={'cuenta_id': account, 'nombre': account, 'activa': True})
+    return fake_response(payload={
+        'cuenta_id': account, 'next': None,
+        'results': [{'sku': 'NUEVO', 'nombre': 'Nuevo', 'stock': 5,
+                     'costo': '10.00', 'precio': '20.00', 'activo': True}],
+    })
+
+
+@pytest.mark.django_db
+class TestIntegrationLock:
+
+    def test_a_run_is_skipped_while_another_holds_the_lock(self, other_session):
+        _, _, integration = make_syncable_center('A', 'cnt_aaa')
+        hold_lock(other_session, scheduling.STOCK, integration)
+
+        with patch('requests.Session.request', side_effect=catalog_dispatch):
+            assert scheduling.run_sync(integration, scheduling.STOCK) is None
+
+        integration.refresh_from_db()
+        assert integration.last_stock_sync is None
+
+    def test_stock_and_sales_do_not_block_each_other(self, other_session):
+        _, _, integration = make_syncable_center('A', 'cnt_aaa')
+        hold_lock(other_session, scheduling.SALES, integration)
+
+        with patch('requests.Session.request', side_effect=catalog_dispatch):
+            result = scheduling.run_sync(integration, scheduling.STOCK)
+
+        assert result.created == 1
+
+    def test_the_lock_is_released_after_a_failure(self, other_session, monkeypatch):
+        _, _, integration = make_syncable_center('A', 'cnt_aaa')
+        monkeypatch.setattr(StockSynchronizer, 'run', Mock(side_effect=ContoUnavailable('caído')))
+
+        with pytest.raises(ContoUnavailable):
+            scheduling.run_sync(integration, scheduling.STOCK)
+
+        assert try_lock(other_session, scheduling.STOCK, integration) is True
+
+    def test_the_cursor_is_read_after_taking_the_lock(self):
+        _, _, integration = make_syncable_center('A', 'cnt_aaa')
+        stale = type(integration).objects.get(pk=integration.pk)
+        # The run that just released the lock moved the cursor.
+        integration.last_stock_sync = timezone.now() - timedelta(minutes=10)
+        integration.save()
+
+        with patch('requests.Session.request', side_effect=catalog_dispatch) as request:
+            scheduling.run_sync(stale, scheduling.STOCK)
+
+        assert 'desde' in request.call_args.kwargs['params']
+
+
+@pytest.mark.django_db
+class TestMetrics:
+
+    def test_duration_and_lag_are_recorded(self):
+        _, _, integration = make_syncable_center('A', 'cnt_aaa')
+        integration.last_stock_sync = timezone.now() - timedelta(minutes=10)
+        integration.save()
+
+        with patch('requests.Session.request', side_effect=catalog_dispatch):
+            scheduling.run_sync(integration, scheduling.STOCK)
+
+        metrics = scheduling.integration_metrics(integration)
+        assert metrics[scheduling.SALES] is None
+        stock = metrics[scheduling.STOCK]
+        assert stock['centro'] == 'A'
+        assert 600 <= stock['atraso_segundos'] < 660
+        assert stock['segundos'] >= 0
+        assert '1 creados' in stock['resultado']
+
+    def test_a_failed_run_is_recorded_too(self, monkeypatch):
+        _, _, integration = make_syncable_center('A', 'cnt_aaa')
+        monkeypatch.setattr(StockSynchronizer, 'run', Mock(side_effect=ContoUnavailable('caído')))
+
+        with pytest.raises(ContoUnavailable):
+            scheduling.run_sync(integration, scheduling.STOCK)
+
+        stock = scheduling.integration_metrics(integration)[scheduling.STOCK]
+        assert stock['resultado'] == 'error: caído'
+        assert stock['atraso_segundos'] is None
+
+    def test_slowest_integrations_come_first(self):
+        integrations = [make_syncable_center(name, f'cnt_{name}')[2] for name in 'ABC']
+        for integration, seconds in zip(integrations, (1, 30, 5)):
+            scheduling._record(integration, scheduling.SALES, timezone.now(), seconds, None, 'ok')
+
+        slowest = scheduling.sync_metrics(integrations, scheduling.SALES)
+
+        assert [metrics['centro'] for metrics in slowest] == ['B', 'C', 'A']
+
+
+@pytest.mark.django_db
+class TestTasks:
+
+    def test_without_an_integration_it_fans_out(self):
+        _, _, integration_a = make_syncable_center('A', 'cnt_aaa')
+        _, _, integration_b = make_syncable_center('B', 'cnt_bbb')
+
+        with patch.object(sync_conto_stock, 'delay') as delay:
+            queued = sync_conto_stock(full=True)
+
+        assert queued == {integration_a.pk: 'ENCOLADA', integration_b.pk: 'ENCOLADA'}
+        assert sorted(call.kwargs['integration_id'] for call in delay.call_args_list) == \
+            sorted([integration_a.pk, integration_b.pk])
+        assert all(call.kwargs['full'] is True for call in delay.call_args_list)
+
+    def test_one_integration_runs_under_its_lock(self, other_session):
+        _, _, integration = make_syncable_center('A', 'cnt_aaa')
+        hold_lock(other_session, scheduling.SALES, integration)
+
+        assert import_conto_sales(integration_id=integration.pk) == {integration.pk: 'EN CURSO'}
+
+    def test_one_integration_is_synced(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+
+        with patch('requests.Session.request', side_effect=catalog_dispatch):
+            results = sync_conto_stock(integration_id=integration.pk)
+
+        assert '1 creados' in results[integration.pk]
+        assert Producto.objects.filter(sucursal=branch, sku='NUEVO').exists()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestParallelCommand:
+    """Committed data: the worker threads use connections of their own."""
+
+    def test_integrations_run_side_by_side(self):
+        integrations = [make_syncable_center(name, f'cnt_{name}')[2] for name in 'ABC']
+
+        out = StringIO()
+        with patch('requests.Session.request', side_effect=catalog_dispatch):
+            call_command('sincronizar_conto', que='stock', paralelo=3, stdout=out)
+        output = out.getvalue()
+
+        for integration in integrations:
+            assert Producto.objects.filter(sucursal=integration.branch, sku='NUEVO').exists()
+        # Each integration's block is printed whole.
+        for name in 'ABC':
+            block = output.split(f'Conto — {name}')[1]
+            assert block.split('Conto — ')[0].count('Stock:') == 1
+        assert 'Duración por integración' in output
+
+    def test_a_locked_integration_is_skipped_not_failed(self, other_session):
+        _, _, integration = make_syncable_center('A', 'cnt_aaa')
+        hold_lock(other_session, scheduling.STOCK, integration)
+
+        out = StringIO()
+        with patch('requests.Session.request', side_effect=catalog_dispatch):
+            call_command('sincronizar_conto', que='stock', stdout=out)
+
+        assert 'ya hay una sincronización en curso' in out.getvalue()
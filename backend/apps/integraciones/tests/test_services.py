@@ -5,13 +5,17 @@ The isolation tests (two centers sharing a SKU and an email) are the reason this
 file exists: those are the failures that would silently mix two businesses' data
 and that nobody would notice for months.
 """
+import time
 from decimal import Decimal
 from unittest.mock import Mock
 
 import pytest
 import requests
+from django.utils import timezone
 
+from apps.analytics.cache import get_version
 from apps.clientes.models import Cliente
+from apps.clientes.utils import sufijo_telefono
 from apps.empleados.models import CentroEstetica, Sucursal
 from apps.finanzas.models import Transaction
 from apps.integraciones.models import ContoIntegration
@@ -26,6 +30,8 @@ from apps.integraciones.services import (
 )
 from apps.inventario.models import MovimientoInventario, Producto
 
+from .conto_stub import ContoStub
+
 
 # --------------------------------------------------------------------------- #
 # Helpers
@@ -192,6 +198,108 @@ class TestContoClientPagination:
         assert list(client.iter_stock()) == []
 
 
+@pytest.mark.django_db
+class TestContoClientPrefetch:
+    """The next page is fetched while the current one is being processed."""
+
+    def page(self, results, next_url=None, account='cnt_aaa'):
+        return fake_response(payload={
+            'cuenta_id': account, 'results': results, 'next': next_url,
+        })
+
+    def wait_for_calls(self, session, count):
+        deadline = time.monotonic() + 5
+        while session.request.call_count < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return session.request.call_count
+
+    def test_next_page_is_requested_before_the_current_one_is_consumed(self):
+        _, _, integration = make_center('A', 'cnt_aaa')
+        session = Mock()
+        session.request.side_effect = [
+            self.page([{'id': '1'}, {'id': '2'}], 'https://conto.test/api/ventas/?page=2'),
+            self.page([{'id': '3'}]),
+        ]
+        items = ContoClient(integration, session=session).iter_sales(timezone.now())
+
+        assert next(items) == {'id': '1'}
+        assert self.wait_for_calls(session, 2) == 2
+        assert [item['id'] for item in items] == ['2', '3']
+
+    def test_a_page_from_another_account_stops_the_prefetch(self):
+        _, _, integration = make_center('A', 'cnt_aaa')
+        session = Mock()
+        session.request.return_value = self.page(
+            [{'id': '1'}], 'https://conto.test/api/ventas/?page=2', account='cnt_OTHER'
+        )
+
+        with pytest.raises(ContoAccountMismatch):
+            list(ContoClient(integration, session=session).iter_sales(timezone.now()))
+
+        assert session.request.call_count == 1
+
+    def test_a_foreign_next_is_never_requested(self):
+        _, _, integration = make_center('A', 'cnt_aaa')
+        session = Mock()
+        session.request.return_value = self.page(
+            [{'id': '1'}], 'https://attacker.example/api/ventas/'
+        )
+        items = ContoClient(integration, session=session).iter_sales(timezone.now())
+
+        assert next(items) == {'id': '1'}
+        with pytest.raises(ContoError, match='otro origen'):
+            next(items)
+        assert session.request.call_count == 1
+
+    def test_an_unavailable_page_is_retried(self):
+        _, _, integration = make_center('A', 'cnt_aaa')
+        session = Mock()
+        session.request.side_effect = [
+            self.page([{'id': '1'}], 'https://conto.test/api/ventas/?page=2'),
+            fake_response(status=503),
+            requests.ConnectionError('boom'),
+            self.page([{'id': '2'}]),
+        ]
+        client = ContoClient(integration, session=session)
+        client.RETRY_BACKOFF = (0, 0)
+
+        assert [item['id'] for item in client.iter_sales(timezone.now())] == ['1', '2']
+
+    def test_retries_give_up_eventually(self):
+        _, _, integration = make_center('A', 'cnt_aaa')
+        session = Mock()
+        session.request.return_value = fake_response(status=503)
+        client = ContoClient(integration, session=session)
+        client.RETRY_BACKOFF = (0, 0)
+
+        with pytest.raises(ContoUnavailable):
+            list(client.iter_sales(timezone.now()))
+        assert session.request.call_count == 3
+
+    def test_get_account_is_not_retried(self):
+        _, _, integration = make_center('A', 'cnt_aaa')
+        session = Mock()
+        session.request.return_value = fake_response(status=503)
+
+        with pytest.raises(ContoUnavailable):
+            ContoClient(integration, session=session).get_account()
+        assert session.request.call_count == 1
+
+    def test_against_a_local_server(self):
+        _, _, integration = make_center('A', 'cnt_aaa')
+        sales = [{'id': str(i)} for i in range(25)]
+
+        with ContoStub('cnt_aaa', token='token-cnt_aaa', sales=sales, page_size=10,
+                       fail_pages={2: [502]}) as conto:
+            integration.base_url = conto.url
+            client = ContoClient(integration)
+            client.RETRY_BACKOFF = (0,)
+            items = list(client.iter_sales(timezone.now()))
+
+        assert [item['id'] for item in items] == [str(i) for i in range(25)]
+        assert [page for _, page, _, _ in conto.pages] == [1, 2, 2, 3]
+
+
 @pytest.mark.django_db
 class TestContoClientErrors:
 
@@ -355,6 +463,43 @@ class TestScopeClientIsolation:
         assert scope.find_client() is None
         assert scope.find_client(email='', phone='') is None
 
+    def test_short_phones_never_match(self):
+        center, _, integration = make_center('A', 'cnt_aaa')
+        Cliente.objects.create(
+            centro_estetica=center, nombre='Corto', apellido='A',
+            email='', telefono='3333-444',
+        )
+
+        scope = ContoScope(integration)
+        assert scope.find_client(phone='3333444') is None
+        assert scope.find_client(phone='9 3333-444') is None
+
+    def test_phone_lookup_is_a_single_query(self, django_assert_num_queries):
+        center, _, integration = make_center('A', 'cnt_aaa')
+        for i in range(20):
+            Cliente.objects.create(
+                centro_estetica=center, nombre=f'C{i}', apellido='A',
+                email='', telefono=f'11 4000-{i:04}',
+            )
+
+        scope = ContoScope(integration)
+        with django_assert_num_queries(1):
+            found = scope.find_client(phone='+54 9 11 4000-0007')
+        assert found.nombre == 'C7'
+
+    def test_phone_key_follows_the_phone(self):
+        center, _, integration = make_center('A', 'cnt_aaa')
+        client = Cliente.objects.create(
+            centro_estetica=center, nombre='Ana', apellido='Gómez',
+            email='', telefono='1133334444',
+        )
+        client.telefono = '11 5555-6666'
+        client.save(update_fields=['telefono'])
+
+        scope = ContoScope(integration)
+        assert scope.find_client(phone='1133334444') is None
+        assert scope.find_client(phone='1155556666') == client
+
 
 # --------------------------------------------------------------------------- #
 # ContoScope — product creation without phantom expenses
@@ -430,3 +575,106 @@ class TestScopeCreateProduct:
         foreign.refresh_from_db()
 
         assert foreign.stock_actual == 1
+
+    def test_bulk_update_cannot_touch_another_branch(self):
+        _, branch_a, integration_a = make_center('A', 'cnt_aaa')
+        _, branch_b, _ = make_center('B', 'cnt_bbb')
+        own = make_product(branch_a, 'SER-VITC-30', stock=1)
+        foreign = make_product(branch_b, 'SER-VITC-30', stock=1)
+        own.stock_actual = foreign.stock_actual = 999
+
+        ContoScope(integration_a).update_products([own, foreign], ['stock_actual'])
+        own.refresh_from_db()
+        foreign.refresh_from_db()
+
+        assert (own.stock_actual, foreign.stock_actual) == (999, 1)
+
+    def test_updates_invalidate_the_branch_analytics(self, settings, django_capture_on_commit_callbacks):
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        _, branch, integration = make_center('A', 'cnt_aaa')
+        product = make_product(branch, 'SER-VITC-30', stock=1)
+        scope = ContoScope(integration)
+        before = get_version(branch.pk)
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            scope.update_stock(product, stock=7)
+            product.stock_actual = 8
+            scope.update_products([product], ['stock_actual'])
+        # Not before the commit: a read in between would cache the old data
+        # under the new version.
+        assert get_version(branch.pk) == before
+
+        for callback in callbacks:
+            callback()
+        assert get_version(branch.pk) == before + 2
+
+    def test_an_update_that_touches_nothing_keeps_the_cache(self, settings, django_capture_on_commit_callbacks):
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        _, _, integration_a = make_center('A', 'cnt_aaa')
+        _, branch_b, _ = make_center('B', 'cnt_bbb')
+        foreign = make_product(branch_b, 'SER-VITC-30', stock=1)
+        before = get_version(integration_a.branch_id)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            ContoScope(integration_a).update_products([foreign], ['stock_actual'])
+
+        assert get_version(integration_a.branch_id) == before
+
+
+# --------------------------------------------------------------------------- #
+# ContoScope — phone lookup at volume
+# --------------------------------------------------------------------------- #
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+class TestPhoneLookupBenchmark:
+    """
+    A center with 50k clients and a sync of 1k vouchers. The old lookup scanned
+    and normalized every client with a phone for each voucher; it is measured on
+    a sample and extrapolated, because the full run takes minutes.
+    """
+    CLIENTS = 50_000
+    VOUCHERS = 1_000
+    OLD_SAMPLE = 20
+
+    def test_find_client_by_phone(self, django_assert_max_num_queries):
+        center, _, integration = make_center('A', 'cnt_aaa')
+        phones = [f'11 {4000_0000 + i:08}' for i in range(self.CLIENTS)]
+        Cliente.objects.bulk_create(
+            [
+                Cliente(
+                    centro_estetica=center, nombre=f'C{i}', apellido='X', email='',
+                    telefono=phone, telefono_sufijo=sufijo_telefono(phone),
+                )
+                for i, phone in enumerate(phones)
+            ],
+            batch_size=5000,
+        )
+        wanted = [f'+54 9 {phones[i * 37 % self.CLIENTS]}' for i in range(self.VOUCHERS)]
+        scope = ContoScope(integration)
+
+        def old_find(phone):
+            suffix = sufijo_telefono(phone)
+            candidates = Cliente.objects.filter(centro_estetica=center).exclude(telefono='').only('id', 'telefono')
+            for candidate in candidates:
+                if sufijo_telefono(candidate.telefono) == suffix:
+                    return candidate
+            return None
+
+        start = time.perf_counter()
+        old = [old_find(phone) for phone in wanted[:self.OLD_SAMPLE]]
+        old_per_voucher = (time.perf_counter() - start) / self.OLD_SAMPLE
+
+        with django_assert_max_num_queries(self.VOUCHERS):
+            start = time.perf_counter()
+            new = [scope.find_client(phone=phone) for phone in wanted]
+            new_elapsed = time.perf_counter() - start
+
+        print(
+            f'\n{self.VOUCHERS} vouchers over {self.CLIENTS} clients: '
+            f'before ~{old_per_voucher * self.VOUCHERS:.1f} s '
+            f'({old_per_voucher * 1000:.1f} ms/voucher), '
+            f'after {new_elapsed:.2f} s ({new_elapsed / self.VOUCHERS * 1000:.2f} ms/voucher)'
+        )
+        assert [c.id for c in new[:self.OLD_SAMPLE]] == [c.id for c in old]
+        assert all(new)
@@ -5,18 +5,22 @@ Uses a stub client instead of HTTP mocks: what matters here is the accounting
 behaviour — how many transactions get created, for how much, and what happens
 when a voucher comes back changed.
 """
+import time
 from decimal import Decimal
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from apps.clientes.models import Cliente
 from apps.finanzas.models import Transaction
 from apps.integraciones.models import ContoSale
-from apps.integraciones.services import ContoError
-from apps.integraciones.sync import SalesImporter, StockSynchronizer
+from apps.integraciones.services import ContoClient, ContoError, ContoScope
+from apps.integraciones.sync import RunLookups, SalesImporter, StockSynchronizer
 from apps.inventario.models import MovimientoInventario, Producto
 
+from .conto_stub import ContoStub
 from .test_services import make_center, make_product
 
 
@@ -151,6 +155,147 @@ class TestStockSynchronizer:
         assert not Producto.objects.filter(sucursal=branch).exists()
 
 
+def statements(sql_kind):
+    """Count executed statements of one kind (UPDATE, INSERT...) in a block."""
+    class Counter:
+        count = 0
+
+        def __call__(self, execute, sql, *args):
+            if sql.lstrip().upper().startswith(sql_kind):
+                self.count += 1
+            return execute(sql, *args)
+    return Counter()
+
+
+@pytest.mark.django_db
+class TestBulkStockSync:
+    """`run(full=True)`: diff in memory, write only what changed."""
+
+    def test_unchanged_rows_are_not_written(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        for i in range(5):
+            make_product(branch, f'SKU-{i}', stock=i)
+        catalog = [stock_item(sku=f'SKU-{i}', stock=i) for i in range(5)]
+
+        updates = statements('UPDATE "INVENTARIO_PRODUCTO"')
+        with connection.execute_wrapper(updates):
+            result = StockSynchronizer(integration, client=FakeClient(stock=catalog)).run(full=True)
+
+        assert (result.updated, result.unchanged) == (0, 5)
+        assert updates.count == 0
+        assert '5 sin cambios' in result.summary
+
+    def test_only_changed_rows_and_fields_are_written(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        same = make_product(branch, 'SAME', stock=3)
+        moved = make_product(branch, 'MOVED', stock=3)
+        repriced = make_product(branch, 'REPRICED', stock=3)
+        catalog = [
+            stock_item(sku='SAME', stock=3),
+            stock_item(sku='MOVED', stock=1),
+            # No cost in Conto: ours stays.
+            stock_item(sku='REPRICED', stock=3, cost='0', price='20000.00'),
+        ]
+        movements = MovimientoInventario.objects.count()
+
+        updates = statements('UPDATE "INVENTARIO_PRODUCTO"')
+        with connection.execute_wrapper(updates):
+            result = StockSynchronizer(integration, client=FakeClient(stock=catalog)).run(full=True)
+
+        assert (result.updated, result.unchanged) == (2, 1)
+        # One bulk_update per set of changed fields.
+        assert updates.count == 2
+        for producto in (same, moved, repriced):
+            producto.refresh_from_db()
+        assert moved.stock_actual == Decimal('1.00')
+        assert repriced.precio_venta == Decimal('20000.00')
+        assert repriced.precio_costo == Decimal('9200.00')
+        assert MovimientoInventario.objects.count() == movements
+
+    def test_missing_products_are_created_in_bulk_without_phantom_expense(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        catalog = [stock_item(sku=f'NEW-{i}', stock=4) for i in range(3)]
+
+        inserts = statements('INSERT INTO "INVENTARIO_PRODUCTO"')
+        with connection.execute_wrapper(inserts):
+            result = StockSynchronizer(integration, client=FakeClient(stock=catalog)).run(full=True)
+
+        assert result.created == 3
+        assert inserts.count == 1
+        assert Producto.objects.get(sucursal=branch, sku='NEW-1').stock_actual == Decimal('4.00')
+        assert MovimientoInventario.objects.count() == 0
+        assert Transaction.objects.count() == 0
+
+    def test_a_sku_repeated_across_chunks_is_created_once(self, monkeypatch):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        monkeypatch.setattr(StockSynchronizer, 'BULK_CHUNK', 2)
+        catalog = [
+            stock_item(sku='DUP', stock=1),
+            stock_item(sku='dup', stock=2),
+            stock_item(sku='OTHER', stock=1),
+            stock_item(sku='DUP', stock=7),
+        ]
+
+        result = StockSynchronizer(integration, client=FakeClient(stock=catalog)).run(full=True)
+
+        assert (result.created, result.updated) == (2, 1)
+        assert Producto.objects.get(sucursal=branch, sku='DUP').stock_actual == Decimal('7.00')
+
+    def test_a_failed_chunk_does_not_stop_the_run(self, monkeypatch):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        make_product(branch, 'OK', stock=0)
+        monkeypatch.setattr(StockSynchronizer, 'BULK_CHUNK', 1)
+        synchronizer = StockSynchronizer(
+            integration, client=FakeClient(stock=[stock_item(sku='BAD'), stock_item(sku='OK')])
+        )
+        create_products = synchronizer.scope.create_products
+
+        def fail_on_bad(rows, **kwargs):
+            rows = list(rows)
+            if any(row['sku'] == 'BAD' for row in rows):
+                raise ValueError('boom')
+            return create_products(rows, **kwargs)
+        monkeypatch.setattr(synchronizer.scope, 'create_products', fail_on_bad)
+
+        result = synchronizer.run(full=True)
+
+        # The failed chunk is replayed row by row, where BAD goes through create_product.
+        assert result.errors == []
+        assert (result.created, result.updated) == (1, 1)
+        assert Producto.objects.filter(sucursal=branch, sku='BAD').exists()
+        assert Producto.objects.get(sucursal=branch, sku='OK').stock_actual == Decimal('12.00')
+
+    def test_a_bad_row_fails_alone_not_its_chunk(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        make_product(branch, 'GOOD-1', stock=1)
+        catalog = [
+            stock_item(sku='GOOD-1', stock=50),
+            stock_item(sku='LONG', name='x' * 500),
+            stock_item(sku='GOOD-2', stock=3),
+            stock_item(sku='', name='Sin código'),
+        ]
+
+        result = StockSynchronizer(integration, client=FakeClient(stock=catalog)).run(full=True)
+
+        assert (result.updated, result.created) == (1, 1)
+        assert len(result.errors) == 1 and result.errors[0].startswith('LONG: ')
+        assert result.unmatched == ['Sin código']
+        assert Producto.objects.get(sucursal=branch, sku='GOOD-1').stock_actual == Decimal('50.00')
+        assert Producto.objects.filter(sucursal=branch, sku='GOOD-2').exists()
+        assert not Producto.objects.filter(sucursal=branch, sku='LONG').exists()
+
+    def test_does_not_create_when_flag_is_off(self):
+        _, branch, integration = make_syncable_center(
+            'A', 'cnt_aaa', create_missing_products=False
+        )
+
+        client = FakeClient(stock=[stock_item()])
+        result = StockSynchronizer(integration, client=client).run(full=True)
+
+        assert result.unmatched == ['SER-VITC-30']
+        assert not Producto.objects.filter(sucursal=branch).exists()
+
+
 # --------------------------------------------------------------------------- #
 # Sales — the happy path
 # --------------------------------------------------------------------------- #
@@ -192,6 +337,18 @@ class TestSalesImport:
 
         assert Transaction.objects.get().amount == Decimal('3000.00')
 
+    def test_the_line_quantity_is_kept_on_the_income(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        make_product(branch, 'SER-VITC-30')
+
+        client = FakeClient(sales=[voucher(
+            date=timezone.localdate().isoformat(),
+            items=[product_line(quantity=3, unit='1000.00')],
+        )])
+        SalesImporter(integration, client=client).run()
+
+        assert Transaction.objects.get().quantity == Decimal('3')
+
     def test_shipping_becomes_a_separate_other_income(self):
         _, branch, integration = make_syncable_center('A', 'cnt_aaa')
         make_product(branch, 'SER-VITC-30')
@@ -775,3 +932,193 @@ class TestGuards:
         assert len(result.errors) == 1
         assert Transaction.objects.count() == 0
         assert ContoSale.objects.get().status == ContoSale.Status.ERROR
+
+
+# --------------------------------------------------------------------------- #
+# Run lookups
+# --------------------------------------------------------------------------- #
+
+def reads(queries):
+    return [q for q in queries if q['sql'].lstrip().upper().startswith('SELECT')]
+
+
+@pytest.mark.django_db
+class TestRunLookups:
+
+    def test_full_stock_sync_reads_the_branch_once(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        Producto.objects.bulk_create([
+            Producto(sucursal=branch, nombre=f'P{i}', sku=f'sku-{i}',
+                     precio_costo=Decimal('1'), precio_venta=Decimal('2'))
+            for i in range(300)
+        ])
+        catalog = [stock_item(sku=f'SKU-{i}', stock=i) for i in range(300)]
+
+        with CaptureQueriesContext(connection) as queries:
+            result = StockSynchronizer(integration, client=FakeClient(stock=catalog)).run(full=True)
+
+        assert result.updated == 300
+        assert len(reads(queries)) <= 2
+        assert Producto.objects.get(sucursal=branch, sku='sku-7').stock_actual == 7
+
+    def test_a_repeated_sku_is_created_once(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+
+        client = FakeClient(stock=[stock_item(stock=3), stock_item(stock=5)])
+        result = StockSynchronizer(integration, client=client).run()
+
+        assert (result.created, result.updated) == (1, 1)
+        assert Producto.objects.get(sucursal=branch).stock_actual == 5
+
+    def test_products_of_another_branch_are_not_preloaded(self):
+        _, _, integration_a = make_syncable_center('A', 'cnt_aaa')
+        _, branch_b, _ = make_syncable_center('B', 'cnt_bbb')
+        make_product(branch_b, 'SER-VITC-30')
+
+        assert RunLookups(ContoScope(integration_a)).product('SER-VITC-30') is None
+
+
+@pytest.mark.django_db(transaction=True)
+class TestRunLookupsAcrossVouchers:
+    """Committed vouchers, so what gets remembered on commit actually is."""
+
+    def today(self):
+        return timezone.localdate().isoformat()
+
+    def test_category_product_and_client_are_resolved_once_per_run(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        make_product(branch, 'SER-VITC-30')
+        buyer = {'nombre': 'Ana Gómez', 'email': 'ana@ejemplo.com', 'telefono': '1133334444'}
+        sales = [
+            voucher(voucher_id=str(i), client=buyer, date=self.today())
+            for i in range(20)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            result = SalesImporter(integration, client=FakeClient(sales=sales)).run()
+
+        assert result.processed == 20
+        sql = [q['sql'] for q in reads(queries)]
+        assert sum('"finanzas_transactioncategory"' in q and 'WHERE' in q for q in sql) <= 2
+        assert sum('"inventario_producto"' in q for q in sql) == 1
+                # The email and the phone of the first voucher; then it is remembered.
+        assert sum('FROM "clientes_cliente"' in q and 'LIMIT 1' in q for q in sql) == 2
+        assert Cliente.objects.count() == 1
+
+    def test_a_failed_voucher_does_not_leave_its_client_behind(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        make_product(branch, 'SER-VITC-30')
+        buyer = {'nombre': 'Ana Gómez', 'email': 'ana@ejemplo.com', 'telefono': '1133334444'}
+        sales = [
+            # Creates the client, then fails: nothing chargeable.
+            voucher(voucher_id='1', client=buyer, items=[], date=self.today()),
+            voucher(voucher_id='2', client=buyer, date=self.today()),
+        ]
+
+        result = SalesImporter(integration, client=FakeClient(sales=sales)).run()
+
+        assert (result.processed, len(result.errors)) == (1, 1)
+        assert Transaction.objects.get().client == Cliente.objects.get()
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+class TestFullStockSyncBenchmark:
+    """
+    A 10k-SKU catalog where one row in ten moved, 500 are new, and the rest
+    already match: row by row (the incremental path) against the bulk apply of
+    a full sync.
+    """
+    SKUS = 10_000
+    NEW = 500
+
+    def catalog(self, run):
+        return [
+            stock_item(sku=f'SKU-{i}', stock=(i % 50) + (run if i % 10 == 0 else 0))
+            for i in range(self.SKUS)
+        ] + [stock_item(sku=f'NEW-{i}') for i in range(self.NEW)]
+
+    def test_full_sync(self):
+        _, branch, integration = make_syncable_center('A', 'cnt_aaa')
+        Producto.objects.bulk_create(
+            [
+                Producto(sucursal=branch, nombre=f'P{i}', sku=f'SKU-{i}', stock_actual=i % 50,
+                         precio_costo=Decimal('9200.00'), precio_venta=Decimal('18500.00'))
+                for i in range(self.SKUS)
+            ],
+            batch_size=2000,
+        )
+
+        for run, full in ((1, False), (2, True)):
+            Producto.objects.filter(sucursal=branch, sku__startswith='NEW-').delete()
+            # Counted through a wrapper: CaptureQueriesContext keeps only the last 9000.
+            statements = []
+
+            def count(execute, sql, *args):
+                statements.append(sql.lstrip().split(None, 1)[0].upper())
+                return execute(sql, *args)
+
+            client = FakeClient(stock=self.catalog(run))
+            integration.last_stock_sync = None
+            with connection.execute_wrapper(count):
+                result = StockSynchronizer(integration, client=client).run(full=full)
+
+            reads = statements.count('SELECT')
+            print(
+                f'\n{"Bulk" if full else "Row by row"}: {result.summary}; '
+                f'{reads} reads, {len(statements) - reads} writes'
+            )
+            assert (result.updated, result.created) == (self.SKUS // 10, self.NEW)
+            assert reads <= 2
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+class TestSalesImportAgainstSlowContoBenchmark:
+    """
+    1000 vouchers in 20 pages from a local Conto answering in `LATENCY`. Without
+    prefetching the import takes fetching plus processing; with it, closer to
+    the larger of the two.
+    """
+    VOUCHERS = 1000
+    PAGE_SIZE = 50
+    LATENCY = 0.5
+
+    def sales(self):
+        today = timezone.localdate().isoformat()
+        return [voucher(voucher_id=str(i), date=today) for i in range(self.VOUCHERS)]
+
+    def test_import(self):
+        integrations = {}
+        for name in ('fetch', 'process', 'import'):
+            _, branch, integration = make_syncable_center(name, f'cnt_{name}')
+            make_product(branch, 'SER-VITC-30')
+            integrations[name] = integration
+
+        start = time.perf_counter()
+        SalesImporter(integrations['process'], client=FakeClient(sales=self.sales())).run()
+        processing = time.perf_counter() - start
+
+        timings = {}
+        for name in ('fetch', 'import'):
+            integration = integrations[name]
+            with ContoStub(integration.conto_account_id, token=integration.token,
+                           sales=self.sales(), page_size=self.PAGE_SIZE,
+                           latency=self.LATENCY) as conto:
+                integration.base_url = conto.url
+                start = time.perf_counter()
+                if name == 'fetch':
+                    fetched = len(list(ContoClient(integration).iter_sales(timezone.now())))
+                else:
+                    result = SalesImporter(integration).run()
+                timings[name] = time.perf_counter() - start
+
+        print(
+            f'\n{self.VOUCHERS} vouchers, {self.VOUCHERS // self.PAGE_SIZE} pages at '
+            f'{self.LATENCY * 1000:.0f} ms: fetch only {timings["fetch"]:.2f} s, '
+            f'processing only {processing:.2f} s, '
+            f'serial would be ~{timings["fetch"] + processing:.2f} s, '
+            f'pipelined import {timings["import"]:.2f} s'
+        )
+        assert fetched == self.VOUCHERS
+        assert result.processed == self.VOUCHERS
@@ -17,6 +17,7 @@ from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from . import scheduling
 from .models import ContoIntegration, ContoSale
 from .permissions import IsIntegrationAdmin
 from .serializers import (
@@ -26,7 +27,7 @@ from .serializers import (
     ContoSaleSerializer,
 )
 from .services import ContoClient, ContoError
-from .sync import SalesImporter, StockSynchronizer
+from .sync import SalesImporter
 
 logger = logging.getLogger(__name__)
 
@@ -169,6 +170,7 @@ class ContoIntegrationViewSet(viewsets.ModelViewSet):
                 'con_error': counts.get(ContoSale.Status.ERROR, 0),
             },
             'ultimos_errores': ContoSaleSerializer(failed, many=True).data,
+            'ultimas_sincronizaciones': scheduling.integration_metrics(integration),
             'alertas': self._build_alerts(integration, counts),
         })
 
@@ -269,6 +271,9 @@ class ContoIntegrationViewSet(viewsets.ModelViewSet):
 
         If a first import ever grows large enough to hit the request timeout,
         use the `sincronizar_conto` management command for the initial load.
+
+        Takes the same per-integration lock as the scheduled runs: while one of
+        them is importing, the button answers 409 instead of importing twice.
         """
         integration = self.get_object()
 
@@ -288,10 +293,19 @@ class ContoIntegrationViewSet(viewsets.ModelViewSet):
 
         resultados = {}
         try:
-            if what in ('stock', 'todo'):
-                resultados['stock'] = StockSynchronizer(integration).run().summary
-            if what in ('ventas', 'todo'):
-                resultados['ventas'] = SalesImporter(integration).run().summary
+            for kind in (scheduling.STOCK, scheduling.SALES):
+                if what not in (kind, 'todo'):
+                    continue
+                result = scheduling.run_sync(integration, kind)
+                if result is None:
+                    return Response(
+                        {'success': False,
+                         'error': f'Ya hay una sincronización de {kind} en curso. '
+                                  f'Esperá a que termine.',
+                         'resultados': resultados},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                resultados[kind] = result.summary
         except ContoError as exc:
             return Response(
                 {'success': False, 'error': str(exc), 'resultados': resultados},
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventario", "0008_producto_beneficios"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="movimientoinventario",
+            index=models.Index(
+                fields=["producto", "tipo", "creado_en"],
+                name="inventario__product_475272_idx",
+            ),
+        ),
+    ]
@@ -461,6 +461,10 @@ class MovimientoInventario(models.Model):
         verbose_name = 'Movimiento de Inventario'
         verbose_name_plural = 'Movimientos de Inventario'
         ordering = ['-creado_en']
+        indexes = [
+            # Ventas de un producto en un período (rotación de inventario)
+            models.Index(fields=['producto', 'tipo', 'creado_en']),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.producto.nombre} ({self.cantidad})"
@@ -5,3 +5,6 @@ class NotificacionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.notificaciones'
     verbose_name = 'Notificaciones'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -14,18 +14,28 @@ Contrato de https://docs.expo.dev/push-notifications/sending-notifications/ :
 No usamos ``exponent-server-sdk`` a propósito: son dos endpoints HTTP y el SDK
 agregaría una dependencia para envolver lo que ya hace ``requests``, que el
 proyecto tiene por la integración con Conto.
+
+Transporte: una sola ``requests.Session`` por proceso, con un pool de
+conexiones keep-alive, así cada lote no paga un handshake TLS nuevo. Los lotes
+de una llamada salen en paralelo por un pool de hilos acotado
+(``EXPO_ENVIOS_EN_PARALELO``) y los resultados se juntan en el orden de
+entrada: un resultado por mensaje, en la misma posición, que es lo que la cola
+usa para aparear cada ``EnvioPush`` con su ticket.
 """
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
 
 from .base import MensajeSaliente, Resultado
 
 logger = logging.getLogger(__name__)
 
-URL_ENVIO = 'https://exp.host/--/api/v2/push/send'
-URL_RECIBOS = 'https://exp.host/--/api/v2/push/getReceipts'
+URL_API = 'https://exp.host/--/api/v2'
 
 # Topes del proveedor. No son configurables: los define Expo.
 MAX_MENSAJES_POR_REQUEST = 100
@@ -57,6 +67,53 @@ def _headers():
     return cabeceras
 
 
+def _url(ruta):
+    # Configurable para apuntar a un Expo falso en los tests y benchmarks
+    return f"{getattr(settings, 'EXPO_API_URL', URL_API).rstrip('/')}/{ruta}"
+
+
+def _en_paralelo():
+    return max(1, settings.EXPO_ENVIOS_EN_PARALELO)
+
+
+_sesion = None
+_sesion_clave = None
+_sesion_lock = threading.Lock()
+
+
+def _obtener_sesion() -> requests.Session:
+    """
+    Sesión compartida del proceso. Se crea en el primer uso y de nuevo después
+    de un fork (worker de Celery), para no compartir sockets con el padre, o si
+    cambió el paralelismo, que define el tamaño del pool.
+    """
+    global _sesion, _sesion_clave
+    clave = (os.getpid(), _en_paralelo())
+    with _sesion_lock:
+        if _sesion is None or _sesion_clave != clave:
+            sesion = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=clave[1])
+            sesion.mount('https://', adaptador)
+            sesion.mount('http://', adaptador)
+            _sesion, _sesion_clave = sesion, clave
+        return _sesion
+
+
+def _post(url, cuerpo):
+    return _obtener_sesion().post(url, json=cuerpo, headers=_headers(), timeout=TIMEOUT)
+
+
+def _por_lote(funcion, lotes):
+    """
+    Aplica ``funcion`` a cada lote, en paralelo si hay más de uno, y devuelve
+    los resultados en el orden de los lotes.
+    """
+    if len(lotes) <= 1:
+        return [funcion(lote) for lote in lotes]
+    with ThreadPoolExecutor(max_workers=min(len(lotes), _en_paralelo())) as pool:
+        return list(pool.map(funcion, lotes))
+
+
 def _lotes(secuencia, tamano):
     for inicio in range(0, len(secuencia), tamano):
         yield secuencia[inicio:inicio + tamano]
@@ -92,63 +149,79 @@ def _resultado_de_ticket(destino: str, ticket: dict) -> Resultado:
     )
 
 
+def _enviar_lote(lote: list[MensajeSaliente]) -> list[Resultado]:
+    payload = [_a_payload(m) for m in lote]
+    try:
+        respuesta = _post(_url('push/send'), payload)
+        respuesta.raise_for_status()
+        tickets = respuesta.json().get('data') or []
+    except requests.RequestException as exc:
+        # Expo no contestó o contestó mal: todo el lote queda para reintentar.
+        logger.warning("Falló el envío push a Expo: %s", exc)
+        return [
+            Resultado(destino=m.destino, ok=False, error=str(exc)[:300], reintentable=True)
+            for m in lote
+        ]
+    except ValueError as exc:
+        logger.error("Expo devolvió una respuesta ilegible: %s", exc)
+        return [
+            Resultado(destino=m.destino, ok=False, error='Respuesta ilegible de Expo',
+                      reintentable=True)
+            for m in lote
+        ]
+
+    if len(tickets) != len(lote):
+        # No debería pasar; si pasa, no podemos aparear ticket con mensaje.
+        logger.error(
+            "Expo devolvió %d tickets para %d mensajes", len(tickets), len(lote)
+        )
+        return [
+            Resultado(destino=m.destino, ok=False,
+                      error='Expo devolvió una cantidad de tickets inesperada',
+                      reintentable=True)
+            for m in lote
+        ]
+
+    return [
+        _resultado_de_ticket(mensaje.destino, ticket)
+        for mensaje, ticket in zip(lote, tickets)
+    ]
+
+
 def enviar(mensajes: list[MensajeSaliente]) -> list[Resultado]:
     """
-    Entrega una lista de mensajes y devuelve un resultado por mensaje.
+    Entrega una lista de mensajes y devuelve un resultado por mensaje, en el
+    mismo orden.
 
     Nunca levanta excepción: un corte de red o un 500 de Expo se traducen a
-    resultados reintentables, porque quien llama está adentro de un ciclo de cola
-    y tiene que poder seguir con el resto.
+    resultados reintentables del lote afectado, porque quien llama está adentro
+    de un ciclo de cola y tiene que poder seguir con el resto.
     """
     if not mensajes:
         return []
 
-    resultados: list[Resultado] = []
-
-    for lote in _lotes(mensajes, MAX_MENSAJES_POR_REQUEST):
-        payload = [_a_payload(m) for m in lote]
-        try:
-            respuesta = requests.post(
-                URL_ENVIO, json=payload, headers=_headers(), timeout=TIMEOUT
-            )
-            respuesta.raise_for_status()
-            tickets = respuesta.json().get('data') or []
-        except requests.RequestException as exc:
-            # Expo no contestó o contestó mal: todo el lote queda para reintentar.
-            logger.warning("Falló el envío push a Expo: %s", exc)
-            resultados.extend(
-                Resultado(destino=m.destino, ok=False, error=str(exc)[:300], reintentable=True)
-                for m in lote
-            )
-            continue
-        except ValueError as exc:
-            logger.error("Expo devolvió una respuesta ilegible: %s", exc)
-            resultados.extend(
-                Resultado(destino=m.destino, ok=False, error='Respuesta ilegible de Expo',
-                          reintentable=True)
-                for m in lote
-            )
-            continue
-
-        if len(tickets) != len(lote):
-            # No debería pasar; si pasa, no podemos aparear ticket con mensaje.
-            logger.error(
-                "Expo devolvió %d tickets para %d mensajes", len(tickets), len(lote)
-            )
-            resultados.extend(
-                Resultado(destino=m.destino, ok=False,
-                          error='Expo devolvió una cantidad de tickets inesperada',
-                          reintentable=True)
-                for m in lote
-            )
-            continue
-
-        resultados.extend(
-            _resultado_de_ticket(mensaje.destino, ticket)
-            for mensaje, ticket in zip(lote, tickets)
-        )
+    lotes = list(_lotes(mensajes, MAX_MENSAJES_POR_REQUEST))
+    return [
+        resultado
+        for resultados in _por_lote(_enviar_lote, lotes)
+        for resultado in resultados
+    ]
+
+
+def _consultar_lote(lote: list[str]) -> dict[str, Resultado]:
+    try:
+        respuesta = _post(_url('push/getReceipts'), {'ids': lote})
+        respuesta.raise_for_status()
+        datos = respuesta.json().get('data') or {}
+    except (requests.RequestException, ValueError) as exc:
+        logger.warning("No se pudieron consultar recibos de push: %s", exc)
+        return {}
 
-    return resultados
+    # El destino no viaja en el recibo; lo resuelve quien llama por ticket.
+    return {
+        ticket_id: _resultado_de_ticket('', recibo)
+        for ticket_id, recibo in datos.items()
+    }
 
 
 def consultar_recibos(ticket_ids: list[str]) -> dict[str, Resultado]:
@@ -163,20 +236,6 @@ def consultar_recibos(ticket_ids: list[str]) -> dict[str, Resultado]:
         return {}
 
     recibos: dict[str, Resultado] = {}
-
-    for lote in _lotes(ticket_ids, MAX_RECIBOS_POR_REQUEST):
-        try:
-            respuesta = requests.post(
-                URL_RECIBOS, json={'ids': lote}, headers=_headers(), timeout=TIMEOUT
-            )
-            respuesta.raise_for_status()
-            datos = respuesta.json().get('data') or {}
-        except (requests.RequestException, ValueError) as exc:
-            logger.warning("No se pudieron consultar recibos de push: %s", exc)
-            continue
-
-        for ticket_id, recibo in datos.items():
-            # El destino no viaja en el recibo; lo resuelve quien llama por ticket.
-            recibos[ticket_id] = _resultado_de_ticket('', recibo)
-
+    for parcial in _por_lote(_consultar_lote, list(_lotes(ticket_ids, MAX_RECIBOS_POR_REQUEST))):
+        recibos.update(parcial)
     return recibos
@@ -42,8 +42,22 @@ MINUTOS_ANTES_DEL_RECIBO = 15
 # Expo borra los recibos a las 24 horas: después de eso ya no hay qué preguntar.
 HORAS_PARA_DESISTIR_DEL_RECIBO = 24
 
-# Tope de recibos por corrida. Coincide con el máximo que acepta Expo por request.
-MAX_RECIBOS_POR_CORRIDA = 1000
+# Sin recibo todavía: se vuelve a preguntar a los 15, 30, 60... minutos, hasta
+# este techo. Así un ticket que Expo tarda en resolver no se consulta en cada
+# corrida durante 24 horas.
+MINUTOS_ENTRE_CONSULTAS_DE_RECIBO = 15
+MINUTOS_MAXIMOS_ENTRE_CONSULTAS_DE_RECIBO = 240
+
+# Recibos por tanda: una lectura, los requests a Expo (el canal los parte de a
+# mil y los manda en paralelo) y un puñado de UPDATEs. Seis requests llenos.
+RECIBOS_POR_TANDA = 6000
+
+# Tope de recibos por corrida. Alcanza para ponerse al día tras un corte largo
+# sin que una corrida se eternice.
+MAX_RECIBOS_POR_CORRIDA = 60000
+
+# Filas por INSERT al anotar los envíos de una tanda.
+FILAS_POR_INSERT = 1000
 
 
 def _canal_android(aviso: Aviso) -> str:
@@ -178,22 +192,31 @@ def procesar_pendientes(limite: int = LOTE_POR_CORRIDA, ahora=None) -> dict:
 
 
 def _asentar(avisos, sin_destino, pares, resultados, ahora, rescatados) -> dict:
-    """Escribe el desenlace de cada envío y el estado final de cada aviso."""
+    """
+    Escribe el desenlace de cada envío y el estado final de cada aviso.
+
+    Un INSERT ... ON CONFLICT por cada ``FILAS_POR_INSERT`` envíos (el reintento
+    de un aviso pisa el envío anterior al mismo dispositivo) y un UPDATE por
+    estado final de los avisos: la cantidad de consultas no crece con la tanda.
+    """
     # aviso_id -> (hubo_alguno_ok, hubo_alguno_reintentable)
     balance: dict[int, list[bool]] = {}
     tokens_muertos: list[int] = []
+    envios: list[EnvioPush] = []
 
     for (aviso, dispositivo), resultado in zip(pares, resultados):
-        EnvioPush.objects.update_or_create(
+        envios.append(EnvioPush(
             aviso=aviso,
             dispositivo=dispositivo,
-            defaults={
-                'estado': EnvioPush.Estado.ACEPTADO if resultado.ok else EnvioPush.Estado.FALLIDO,
-                'ticket_id': resultado.ticket_id,
-                'error': resultado.error,
-                'confirmado_en': None if resultado.ok else ahora,
-            },
-        )
+            estado=EnvioPush.Estado.ACEPTADO if resultado.ok else EnvioPush.Estado.FALLIDO,
+            ticket_id=resultado.ticket_id,
+            error=resultado.error,
+            confirmado_en=None if resultado.ok else ahora,
+            proxima_consulta_en=(
+                ahora + timedelta(minutes=MINUTOS_ANTES_DEL_RECIBO) if resultado.ok else None
+            ),
+            consultas_de_recibo=0,
+        ))
         if resultado.destino_muerto:
             tokens_muertos.append(dispositivo.id)
 
@@ -201,6 +224,15 @@ def _asentar(avisos, sin_destino, pares, resultados, ahora, rescatados) -> dict:
         estado[0] = estado[0] or resultado.ok
         estado[1] = estado[1] or resultado.reintentable
 
+    EnvioPush.objects.bulk_create(
+        envios,
+        batch_size=FILAS_POR_INSERT,
+        update_conflicts=True,
+        unique_fields=['aviso', 'dispositivo'],
+        update_fields=['estado', 'ticket_id', 'error', 'confirmado_en',
+                       'proxima_consulta_en', 'consultas_de_recibo'],
+    )
+
     if tokens_muertos:
         # La app se desinstaló o el token se revocó: se apaga y deja de gastar
         # requests en cada corrida.
@@ -248,12 +280,23 @@ def _asentar(avisos, sin_destino, pares, resultados, ahora, rescatados) -> dict:
     return resumen
 
 
+def _espera_de_recibo(consultas: int) -> timedelta:
+    """Cuánto esperar después de la consulta número ``consultas`` sin respuesta."""
+    minutos = MINUTOS_ENTRE_CONSULTAS_DE_RECIBO * 2 ** min(consultas, 8)
+    return timedelta(minutes=min(minutos, MINUTOS_MAXIMOS_ENTRE_CONSULTAS_DE_RECIBO))
+
+
 def procesar_recibos(limite: int = MAX_RECIBOS_POR_CORRIDA, ahora=None) -> dict:
     """
     Cierra el círculo: pregunta a Expo qué pasó de verdad con lo que aceptó.
 
     Es lo que detecta las apps desinstaladas. Sin esto la tabla de dispositivos
     se llena de tokens muertos a los que se les manda para siempre.
+
+    Va por tandas de ``RECIBOS_POR_TANDA`` hasta vaciar lo vencido o llegar a
+    ``limite``. Cada envío consultado sale de la tanda siguiente: o se confirmó,
+    o su ``proxima_consulta_en`` se corrió para adelante, así que no hace falta
+    paginar y un ticket sin respuesta no se vuelve a pedir en la misma corrida.
     """
     ahora = ahora or timezone.now()
 
@@ -264,53 +307,81 @@ def procesar_recibos(limite: int = MAX_RECIBOS_POR_CORRIDA, ahora=None) -> dict:
         creado_en__lte=ahora - timedelta(hours=HORAS_PARA_DESISTIR_DEL_RECIBO),
     ).update(confirmado_en=ahora)
 
+    resumen = {'consultados': 0, 'entregados': 0, 'fallidos': 0, 'sin_respuesta': 0,
+               'tokens_dados_de_baja': 0, 'sin_recibo': vencidos}
+    while resumen['consultados'] < limite:
+        tanda = min(RECIBOS_POR_TANDA, limite - resumen['consultados'])
+        parcial = _procesar_tanda_de_recibos(tanda, ahora)
+        for clave, cantidad in parcial.items():
+            resumen[clave] += cantidad
+        if parcial['consultados'] < tanda:
+            break
+
+    if resumen['consultados'] or vencidos:
+        logger.info("Recibos de push procesados: %s", resumen)
+    return resumen
+
+
+def _procesar_tanda_de_recibos(tanda: int, ahora) -> dict:
+    # (id, ticket, dispositivo, consultas) sobre el índice parcial de los que esperan recibo
     envios = list(
         EnvioPush.objects
         .filter(
             estado=EnvioPush.Estado.ACEPTADO,
             confirmado_en__isnull=True,
-            creado_en__lte=ahora - timedelta(minutes=MINUTOS_ANTES_DEL_RECIBO),
+            proxima_consulta_en__lte=ahora,
         )
         .exclude(ticket_id='')
-        .select_related('dispositivo')[:limite]
+        .order_by('proxima_consulta_en')
+        .values_list('id', 'ticket_id', 'dispositivo_id', 'consultas_de_recibo')[:tanda]
     )
     if not envios:
-        return {'consultados': 0, 'entregados': 0, 'fallidos': 0,
-                'tokens_dados_de_baja': 0, 'sin_recibo': vencidos}
+        return {'consultados': 0, 'entregados': 0, 'fallidos': 0, 'sin_respuesta': 0,
+                'tokens_dados_de_baja': 0}
 
-    recibos = canales.activo().consultar_recibos([e.ticket_id for e in envios])
+    recibos = canales.activo().consultar_recibos([ticket for _, ticket, _, _ in envios])
 
     entregados, fallidos, tokens_muertos = [], [], []
-    for envio in envios:
-        recibo = recibos.get(envio.ticket_id)
+    # error -> ids: los recibos fallidos repiten pocos mensajes distintos, así
+    # que se anotan con un UPDATE por mensaje y no uno por envío. Lo mismo los
+    # que siguen sin respuesta, agrupados por cuántas veces se preguntó.
+    fallidos_por_error: dict[str, list[int]] = {}
+    sin_respuesta_por_consultas: dict[int, list[int]] = {}
+    for envio_id, ticket_id, dispositivo_id, consultas in envios:
+        recibo = recibos.get(ticket_id)
         if recibo is None:
-            continue  # Expo todavía no lo resolvió; se vuelve a preguntar
-        if recibo.ok:
-            entregados.append(envio.id)
+            # Expo todavía no lo resolvió (o el request falló): más adelante
+            sin_respuesta_por_consultas.setdefault(consultas, []).append(envio_id)
+        elif recibo.ok:
+            entregados.append(envio_id)
         else:
-            envio.estado = EnvioPush.Estado.FALLIDO
-            envio.error = recibo.error
-            envio.confirmado_en = ahora
-            envio.save(update_fields=['estado', 'error', 'confirmado_en'])
-            fallidos.append(envio.id)
+            fallidos.append(envio_id)
+            fallidos_por_error.setdefault(recibo.error, []).append(envio_id)
             if recibo.destino_muerto:
-                tokens_muertos.append(envio.dispositivo_id)
+                tokens_muertos.append(dispositivo_id)
 
     if entregados:
         EnvioPush.objects.filter(id__in=entregados).update(
             estado=EnvioPush.Estado.ENTREGADO, confirmado_en=ahora
         )
+    for error, ids in fallidos_por_error.items():
+        EnvioPush.objects.filter(id__in=ids).update(
+            estado=EnvioPush.Estado.FALLIDO, error=error, confirmado_en=ahora
+        )
+    for consultas, ids in sin_respuesta_por_consultas.items():
+        EnvioPush.objects.filter(id__in=ids).update(
+            proxima_consulta_en=ahora + _espera_de_recibo(consultas),
+            consultas_de_recibo=F('consultas_de_recibo') + 1,
+        )
     if tokens_muertos:
         DispositivoPush.objects.filter(id__in=tokens_muertos).update(
             activo=False, motivo_baja=DispositivoPush.MotivoBaja.TOKEN_MUERTO
         )
 
-    resumen = {
+    return {
         'consultados': len(envios),
         'entregados': len(entregados),
         'fallidos': len(fallidos),
+        'sin_respuesta': sum(len(ids) for ids in sin_respuesta_por_consultas.values()),
         'tokens_dados_de_baja': len(tokens_muertos),
-        'sin_recibo': vencidos,
     }
-    logger.info("Recibos de push procesados: %s", resumen)
-    return resumen
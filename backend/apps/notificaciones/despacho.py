@@ -15,15 +15,26 @@ Nada de esto envía: escribir la fila es todo el trabajo. El envío es de
 request ni pierda mensajes si el proceso de envío está caído.
 """
 import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import Any
 
 from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.utils import timezone
 
-from . import eventos
-from .models import Aviso, PlantillaNotificacion, PreferenciaNotificacion
+from apps.clientes.models import VinculacionCliente
+
+from . import eventos, plantillas
+from .models import Aviso, PreferenciaNotificacion
 
 logger = logging.getLogger(__name__)
 
+# Solicitudes que ``crear_avisos_para_clientes`` resuelve por tanda de consultas.
+SOLICITUDES_POR_LOTE = 2000
+
 
 def categoria_habilitada(usuario_cliente, categoria) -> bool:
     """
@@ -46,20 +57,18 @@ def resolver_textos(evento: eventos.Evento, centro_estetica, contexto: dict):
     plantilla, se usa el del catálogo. La ruta no es editable: es navegación de
     la app, no contenido.
     """
-    titulo_base, cuerpo_base = evento.titulo, evento.cuerpo
-
+    plantilla = None
     if centro_estetica is not None:
-        plantilla = PlantillaNotificacion.objects.filter(
-            centro_estetica=centro_estetica,
-            evento=evento.clave,
-            activa=True,
-        ).first()
-        if plantilla:
-            titulo_base, cuerpo_base = plantilla.titulo, plantilla.cuerpo
+        plantilla = plantillas.plantilla_push(centro_estetica.id, evento.clave)
+    return _renderizar_textos(evento, plantilla, contexto)
 
+
+def _renderizar_textos(evento: eventos.Evento, plantilla, contexto: dict):
+    """``plantilla``: ``(titulo, cuerpo)`` compilados del centro, o None."""
+    titulo, cuerpo = plantilla or (eventos.compilar(evento.titulo), eventos.compilar(evento.cuerpo))
     return (
-        eventos.renderizar(titulo_base, contexto),
-        eventos.renderizar(cuerpo_base, contexto),
+        titulo.renderizar(contexto),
+        cuerpo.renderizar(contexto),
         eventos.renderizar(evento.ruta, contexto) if evento.ruta else '',
     )
 
@@ -233,6 +242,121 @@ def crear_avisos_masivos(
     return {'creados': creados, 'omitidos': len(usuarios) - creados}
 
 
+@dataclass(frozen=True)
+class SolicitudAviso:
+    """Un aviso a crear para una ficha del CRM, como en ``crear_aviso_para_cliente``."""
+    evento: str
+    cliente: Any
+    contexto: dict = field(default_factory=dict)
+    clave: str | None = None
+    programado_para: datetime | None = None
+    datos_extra: dict | None = None
+
+
+def crear_avisos_para_clientes(solicitudes, *, tamano_lote: int = SOLICITUDES_POR_LOTE) -> int:
+    """
+    ``crear_aviso_para_cliente`` para muchas fichas a la vez, cada una con su
+    evento, texto y momento. Es el camino de los barridos de ``disparadores``,
+    que vuelven a pasar por los mismos turnos en cada corrida.
+
+    Por cada lote de ``tamano_lote`` solicitudes: una consulta de vinculaciones,
+    una de preferencias y una ``clave__in`` para saltear los avisos que ya
+    existen (el caso normal en un barrido repetido) sin siquiera renderizarlos.
+    Las plantillas salen del caché de ``plantillas`` (una consulta solo para los
+    centros que no estaban cargados). El resto entra en un ``bulk_create``; si otro proceso creó la
+    misma clave en el medio, ``ignore_conflicts`` lo descarta.
+
+    Devuelve cuántos avisos se crearon. Los que ya existían y las claves
+    repetidas dentro del lote no cuentan; el aviso que otro proceso insertó en
+    el medio con la misma clave sí (existe, aunque no lo haya escrito este).
+    """
+    solicitudes = iter(solicitudes)
+    creados = 0
+    while lote := list(islice(solicitudes, tamano_lote)):
+        creados += _crear_lote(lote)
+    return creados
+
+
+def _crear_lote(solicitudes: list[SolicitudAviso]) -> int:
+    definiciones = {s.evento: eventos.obtener(s.evento) for s in solicitudes}
+
+    usuarios_por_cliente = defaultdict(list)
+    for vinculacion in VinculacionCliente.objects.filter(
+        cliente_id__in={s.cliente.id for s in solicitudes},
+        usuario_cliente__activo=True,
+    ).select_related('usuario_cliente'):
+        usuarios_por_cliente[vinculacion.cliente_id].append(vinculacion.usuario_cliente)
+
+    # (solicitud, usuario, clave final) de cada aviso posible
+    candidatos = [
+        (solicitud, usuario, f"{solicitud.clave}:u{usuario.id}" if solicitud.clave else None)
+        for solicitud in solicitudes
+        for usuario in usuarios_por_cliente[solicitud.cliente.id]
+    ]
+    existentes = set(Aviso.objects.filter(
+        clave__in=[clave for _, _, clave in candidatos if clave]
+    ).values_list('clave', flat=True))
+    candidatos = [c for c in candidatos if c[2] not in existentes]
+    if not candidatos:
+        return 0
+
+    categorias_opcionales = {
+        d.categoria for d in definiciones.values() if not d.transaccional
+    }
+    apagaron = set()
+    if categorias_opcionales:
+        apagaron = set(PreferenciaNotificacion.objects.filter(
+            usuario_cliente_id__in={usuario.id for _, usuario, _ in candidatos},
+            categoria__in=categorias_opcionales,
+            habilitada=False,
+        ).values_list('usuario_cliente_id', 'categoria'))
+
+    plantillas_del_lote = plantillas.plantillas_push(
+        (s.cliente.centro_estetica_id, s.evento) for s in solicitudes
+    )
+
+    ahora = timezone.now()
+    textos = {}
+    avisos = []
+    for solicitud, usuario, clave in candidatos:
+        definicion = definiciones[solicitud.evento]
+        if (usuario.id, definicion.categoria) in apagaron and not definicion.transaccional:
+            continue
+        # El texto depende de la solicitud, no de la cuenta: una vez por solicitud
+        if id(solicitud) not in textos:
+            titulo, cuerpo, ruta = _renderizar_textos(
+                definicion,
+                plantillas_del_lote.get((solicitud.cliente.centro_estetica_id, definicion.clave)),
+                solicitud.contexto,
+            )
+            datos = {'evento': definicion.clave}
+            if ruta:
+                datos['ruta'] = ruta
+            if solicitud.datos_extra:
+                datos.update(solicitud.datos_extra)
+            textos[id(solicitud)] = (titulo, cuerpo, datos)
+        titulo, cuerpo, datos = textos[id(solicitud)]
+        avisos.append(Aviso(
+            evento=definicion.clave,
+            categoria=definicion.categoria,
+            usuario_cliente=usuario,
+            centro_estetica_id=solicitud.cliente.centro_estetica_id,
+            cliente=solicitud.cliente,
+            titulo=titulo,
+            cuerpo=cuerpo,
+            datos=datos,
+            clave=clave,
+            programado_para=solicitud.programado_para or ahora,
+        ))
+
+    Aviso.objects.bulk_create(avisos, ignore_conflicts=True)
+    # ignore_conflicts no dice cuántas filas entraron: las que no tienen clave
+    # entran siempre, las demás se cuentan como en crear_avisos_masivos
+    claves = {aviso.clave for aviso in avisos if aviso.clave}
+    sin_clave = sum(1 for aviso in avisos if not aviso.clave)
+    return sin_clave + (Aviso.objects.filter(clave__in=claves).count() if claves else 0)
+
+
 def descartar_pendientes(*, clave_prefijo: str) -> int:
     """
     Borra avisos que todavía no salieron.
@@ -252,3 +376,15 @@ def descartar_pendientes(*, clave_prefijo: str) -> int:
         estado=Aviso.Estado.PENDIENTE,
     ).delete()
     return borrados
+
+
+def descartar_pendientes_de_varios(*, clave_prefijos) -> int:
+    """``descartar_pendientes`` para varios prefijos en un solo DELETE."""
+    filtro = Q()
+    for prefijo in clave_prefijos:
+        filtro |= Q(clave__startswith=prefijo)
+    if not filtro:
+        return 0
+
+    borrados, _ = Aviso.objects.filter(filtro, estado=Aviso.Estado.PENDIENTE).delete()
+    return borrados
@@ -22,7 +22,7 @@ from apps.clientes.models import Cliente, RutinaCuidado, RutinaItem, Vinculacion
 from apps.turnos.models import Turno
 
 from . import eventos
-from .despacho import crear_aviso_para_cliente
+from .despacho import SolicitudAviso, crear_avisos_para_clientes
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +48,10 @@ HORA_CUMPLEANOS = 10
 # Hora local del recordatorio de rutina nocturna.
 HORA_RUTINA = 21
 
+# Filas por viaje al leer turnos, clientas o rutinas: los barridos recorren la
+# tabla en streaming y crean los avisos por lotes (despacho.crear_avisos_para_clientes).
+LEIDOS_POR_CONSULTA = 2000
+
 
 def contexto_de_turno(turno) -> dict:
     """Variables disponibles en las plantillas de los eventos de turno."""
@@ -91,24 +95,23 @@ def programar_recordatorios_de_turnos(ahora=None) -> dict:
         .select_related('cliente', 'servicio', 'sucursal__centro_estetica', 'profesional')
     )
 
-    creados = 0
-    for turno in turnos:
-        contexto = contexto_de_turno(turno)
-        for evento, anticipacion in RECORDATORIOS_DE_TURNO:
-            momento = turno.fecha_hora_inicio - anticipacion
-            if momento < ahora - TOLERANCIA_ATRASO:
-                continue  # se reservó demasiado sobre la hora para este recordatorio
-            avisos = crear_aviso_para_cliente(
-                evento=evento,
-                cliente=turno.cliente,
-                contexto=contexto,
-                clave=clave_de_turno(turno.id, evento),
-                programado_para=max(momento, ahora),
-                datos_extra={'turnoId': turno.id},
-            )
-            creados += len(avisos)
-
-    return {'recordatorios_encolados': creados}
+    def solicitudes():
+        for turno in turnos.iterator(chunk_size=LEIDOS_POR_CONSULTA):
+            contexto = contexto_de_turno(turno)
+            for evento, anticipacion in RECORDATORIOS_DE_TURNO:
+                momento = turno.fecha_hora_inicio - anticipacion
+                if momento < ahora - TOLERANCIA_ATRASO:
+                    continue  # se reservó demasiado sobre la hora para este recordatorio
+                yield SolicitudAviso(
+                    evento=evento,
+                    cliente=turno.cliente,
+                    contexto=contexto,
+                    clave=clave_de_turno(turno.id, evento),
+                    programado_para=max(momento, ahora),
+                    datos_extra={'turnoId': turno.id},
+                )
+
+    return {'recordatorios_encolados': crear_avisos_para_clientes(solicitudes())}
 
 
 def saludar_cumpleanos(ahora=None) -> dict:
@@ -136,9 +139,8 @@ def saludar_cumpleanos(ahora=None) -> dict:
         .select_related('centro_estetica')
     )
 
-    creados = 0
-    for cliente in cumpleaneras:
-        avisos = crear_aviso_para_cliente(
+    creados = crear_avisos_para_clientes(
+        SolicitudAviso(
             evento=eventos.CUMPLEANOS,
             cliente=cliente,
             contexto={
@@ -148,7 +150,8 @@ def saludar_cumpleanos(ahora=None) -> dict:
             clave=f"cumple:{cliente.id}:{hoy.year}",
             programado_para=max(momento, ahora),
         )
-        creados += len(avisos)
+        for cliente in cumpleaneras.iterator(chunk_size=LEIDOS_POR_CONSULTA)
+    )
 
     return {'cumpleanos_encolados': creados}
 
@@ -180,16 +183,16 @@ def recordar_rutina(ahora=None) -> dict:
         .select_related('cliente__centro_estetica')
     )
 
-    creados = 0
-    for rutina in rutinas:
-        avisos = crear_aviso_para_cliente(
+    creados = crear_avisos_para_clientes(
+        SolicitudAviso(
             evento=eventos.RUTINA_RECORDATORIO,
             cliente=rutina.cliente,
             contexto={'momento': 'noche'},
             clave=f"rutina:{rutina.id}:{hoy.isoformat()}:nocturna",
             programado_para=max(momento, ahora),
         )
-        creados += len(avisos)
+        for rutina in rutinas.iterator(chunk_size=LEIDOS_POR_CONSULTA)
+    )
 
     return {'rutina_encolados': creados}
 
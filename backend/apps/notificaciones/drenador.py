@@ -0,0 +1,341 @@
+"""
+Drenado continuo de la cola de avisos.
+
+El cron corre ``procesar_pendientes`` cada cinco minutos, así que un turno
+confirmado puede tardar eso en llegar al teléfono. El drenador es el mismo
+trabajo en un proceso que no termina:
+
+- **Varios trabajadores.** Cada hilo llama a ``cola.procesar_pendientes``, que ya
+  toma en dos fases con ``skip_locked``: los hilos (y cualquier cron que siga
+  corriendo) se reparten la cola sin pisarse ni coordinarse entre ellos.
+- **Se despierta al insertar.** En Postgres escucha el canal ``avisos_nuevos``,
+  que avisa un trigger sobre la tabla de avisos; en cualquier otra base (o si la
+  escucha se cae) sondea cada ``intervalo`` segundos. Los programados a futuro
+  salen por el sondeo, que sigue corriendo igual.
+- **Lote según la cola.** Con la cola casi vacía cada hilo toma poco, para que
+  el primero no se lleve todo; con la cola llena, ``LOTE_POR_CORRIDA`` por hilo.
+- **Se apaga prolijo.** ``detener()`` deja que cada hilo termine de asentar la
+  tanda que tiene en la mano: no queda nada ``PROCESANDO`` esperando el rescate.
+
+Las métricas (atraso de la cola, avisos por segundo, latencia por corrida) se
+publican en el cache para que las lea el staff y se pueden volcar al log.
+"""
+import logging
+import math
+import select
+import threading
+import time
+from collections import deque
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from . import cola, disparadores
+from .models import Aviso
+
+logger = logging.getLogger(__name__)
+
+# Canal de NOTIFY; lo dispara el trigger de la migración 0005.
+CANAL = 'avisos_nuevos'
+
+# Donde queda la última foto de las métricas.
+CLAVE_METRICAS = 'notificaciones:drenador:metricas'
+SEGUNDOS_DE_METRICAS = 300
+
+TRABAJADORES = 4
+
+# Cada cuánto se mira la cola aunque nadie avise: los programados a futuro no
+# disparan el trigger al vencer.
+SEGUNDOS_ENTRE_SONDEOS = 5
+
+# Disparadores y recibos no necesitan correr más seguido que con el cron.
+SEGUNDOS_ENTRE_TAREAS = 300
+
+# Un request entero a Expo: por debajo de esto partir la cola no gana nada.
+LOTE_MINIMO = 100
+
+# Lo más que tarda la escucha en enterarse de un detener().
+SEGUNDOS_PARA_NOTAR_LA_PARADA = 1
+
+# Corridas que entran en los percentiles de latencia.
+CORRIDAS_EN_VENTANA = 200
+
+# Ventana del throughput.
+SEGUNDOS_DE_THROUGHPUT = 60
+
+
+def tamano_de_lote(profundidad: int, trabajadores: int) -> int:
+    """La cola repartida entre los hilos, entre ``LOTE_MINIMO`` y ``LOTE_POR_CORRIDA``."""
+    parte = math.ceil(profundidad / max(trabajadores, 1))
+    return max(LOTE_MINIMO, min(cola.LOTE_POR_CORRIDA, parte))
+
+
+def estado_de_la_cola(ahora=None) -> dict:
+    """
+    Avisos vencidos sin tomar y cuánto hace que espera el más viejo, en una
+    consulta sobre el índice (estado, programado_para).
+    """
+    ahora = ahora or timezone.now()
+    fila = Aviso.objects.filter(
+        estado=Aviso.Estado.PENDIENTE, programado_para__lte=ahora
+    ).aggregate(profundidad=Count('id'), mas_viejo=Min('programado_para'))
+    atraso = (ahora - fila['mas_viejo']).total_seconds() if fila['mas_viejo'] else 0.0
+    return {'profundidad': fila['profundidad'], 'atraso_segundos': round(atraso, 1)}
+
+
+def metricas_publicadas() -> dict | None:
+    """La última foto que publicó algún drenador, o None si no hay ninguno corriendo."""
+    return cache.get(CLAVE_METRICAS)
+
+
+def _percentil(valores, fraccion):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(fraccion * len(ordenados)))]
+
+
+class Metricas:
+    """Contadores del drenador. Los escriben los trabajadores, de ahí el lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.corridas = 0
+        self.tomados = 0
+        self.enviados = 0
+        self.errores = 0
+        self._latencias = deque(maxlen=CORRIDAS_EN_VENTANA)
+        self._recientes = deque()       # (instante, tomados)
+
+    def registrar(self, resumen: dict, segundos: float):
+        # Las corridas vacías no cuentan para la latencia: tardan lo que una
+        # consulta y bajarían los percentiles sin decir nada.
+        if not resumen['tomados']:
+            return
+        instante = time.monotonic()
+        with self._lock:
+            self.corridas += 1
+            self.tomados += resumen['tomados']
+            self.enviados += resumen['enviados']
+            self._latencias.append(segundos)
+            self._recientes.append((instante, resumen['tomados']))
+
+    def registrar_error(self):
+        with self._lock:
+            self.errores += 1
+
+    def foto(self) -> dict:
+        corte = time.monotonic() - SEGUNDOS_DE_THROUGHPUT
+        with self._lock:
+            while self._recientes and self._recientes[0][0] < corte:
+                self._recientes.popleft()
+            recientes = sum(tomados for _, tomados in self._recientes)
+            latencias = list(self._latencias)
+            foto = {
+                'corridas': self.corridas,
+                'tomados': self.tomados,
+                'enviados': self.enviados,
+                'errores': self.errores,
+            }
+        foto['avisos_por_segundo'] = round(recientes / SEGUNDOS_DE_THROUGHPUT, 2)
+        if latencias:
+            foto['latencia_ms'] = {
+                'p50': round(_percentil(latencias, 0.5) * 1000),
+                'p95': round(_percentil(latencias, 0.95) * 1000),
+                'max': round(max(latencias) * 1000),
+            }
+        return foto
+
+
+class _Escucha:
+    """
+    LISTEN sobre una conexión propia: la del hilo principal sigue libre para las
+    consultas de siempre.
+    """
+
+    def __init__(self):
+        self._conexion = connections.create_connection('default')
+        with self._conexion.cursor() as cursor:
+            cursor.execute(f'LISTEN {CANAL}')
+
+    def esperar(self, segundos: float, parar: threading.Event) -> bool:
+        """
+        True si llegó algún aviso nuevo antes de ``segundos``. Espera de a
+        tramos cortos para que ``parar`` no tenga que esperar el sondeo entero.
+        """
+        crudo = self._conexion.connection
+        limite = time.monotonic() + segundos
+        while not parar.is_set():
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return False
+            if select.select([crudo], [], [], min(restante, SEGUNDOS_PARA_NOTAR_LA_PARADA))[0]:
+                crudo.poll()
+                hubo = bool(crudo.notifies)
+                crudo.notifies.clear()
+                if hubo:
+                    return True
+        return False
+
+    def cerrar(self):
+        self._conexion.close()
+
+
+class Drenador:
+    """
+    Uso::
+
+        drenador = Drenador(trabajadores=4)
+        signal.signal(signal.SIGTERM, lambda *_: drenador.detener())
+        drenador.correr()      # vuelve cuando alguien llama a detener()
+    """
+
+    def __init__(self, *, trabajadores=TRABAJADORES, intervalo=SEGUNDOS_ENTRE_SONDEOS,
+                 escuchar=True, enviar=True, disparadores=True, recibos=True,
+                 tareas_cada=SEGUNDOS_ENTRE_TAREAS, reportar_cada=None, al_reportar=None):
+        # Sin enviar no hay trabajadores: solo corren las tareas periódicas
+        self.trabajadores = trabajadores if enviar else 0
+        self.intervalo = intervalo
+        self.escuchar = escuchar
+        self.disparadores = disparadores
+        self.recibos = recibos
+        self.tareas_cada = tareas_cada
+        self.reportar_cada = reportar_cada
+        self.al_reportar = al_reportar
+        self.metricas = Metricas()
+        self._parar = threading.Event()
+        self._despertadores = [threading.Event() for _ in range(self.trabajadores)]
+        self._profundidad = 0
+        self._cola = {'profundidad': 0, 'atraso_segundos': 0.0}
+
+    def detener(self):
+        """Se puede llamar desde un handler de señal: solo levanta banderas."""
+        self._parar.set()
+        self._despertar()
+
+    def _despertar(self):
+        for evento in self._despertadores:
+            evento.set()
+
+    # ---------- Trabajadores ----------
+
+    def _trabajar(self, despertador: threading.Event):
+        try:
+            while not self._parar.is_set():
+                # Se baja antes de tomar: un aviso que entra durante la corrida
+                # deja la bandera arriba y la espera de abajo no se duerme.
+                despertador.clear()
+                lote = tamano_de_lote(self._profundidad, self.trabajadores)
+                inicio = time.monotonic()
+                try:
+                    resumen = cola.procesar_pendientes(limite=lote)
+                except Exception:
+                    logger.exception("Falló una corrida del drenador de avisos")
+                    self.metricas.registrar_error()
+                    # La conexión puede haber quedado rota: la próxima se abre de nuevo
+                    connection.close()
+                    self._parar.wait(self.intervalo)
+                    continue
+                self.metricas.registrar(resumen, time.monotonic() - inicio)
+                if resumen['tomados'] < lote:
+                    despertador.wait(self.intervalo)
+        finally:
+            connection.close()
+
+    # ---------- Hilo principal ----------
+
+    def foto(self) -> dict:
+        return {
+            **self._cola,
+            'trabajadores': self.trabajadores,
+            'lote': tamano_de_lote(self._profundidad, self.trabajadores),
+            **self.metricas.foto(),
+            'medido_en': timezone.now().isoformat(),
+        }
+
+    def _medir(self):
+        self._cola = estado_de_la_cola()
+        self._profundidad = self._cola['profundidad']
+        foto = self.foto()
+        try:
+            cache.set(CLAVE_METRICAS, foto, SEGUNDOS_DE_METRICAS)
+        except Exception:
+            # Sin cache no hay métricas publicadas, pero la cola sigue saliendo
+            logger.warning("No se pudieron publicar las métricas del drenador", exc_info=True)
+        return foto
+
+    def _correr_tareas(self):
+        resumen = {}
+        if self.disparadores:
+            resumen['disparadores'] = disparadores.correr_todos()
+        if self.recibos:
+            resumen['recibos'] = cola.procesar_recibos()
+        return resumen
+
+    def _abrir_escucha(self):
+        if not (self.escuchar and self.trabajadores) or connection.vendor != 'postgresql':
+            return None
+        try:
+            return _Escucha()
+        except Exception:
+            logger.exception("No se pudo escuchar %s: el drenador sondea cada %ss",
+                             CANAL, self.intervalo)
+            return None
+
+    def correr(self):
+        hilos = [
+            threading.Thread(target=self._trabajar, args=(despertador,),
+                             name=f'drenador-avisos-{i}', daemon=True)
+            for i, despertador in enumerate(self._despertadores)
+        ]
+        for hilo in hilos:
+            hilo.start()
+
+        escucha = self._abrir_escucha()
+        proximas_tareas = time.monotonic() if self.tareas_cada else math.inf
+        proximo_reporte = time.monotonic() + (self.reportar_cada or math.inf)
+        logger.info("Drenador de avisos en marcha: %d trabajadores, %s",
+                    self.trabajadores, 'LISTEN' if escucha else 'sondeo')
+        try:
+            while not self._parar.is_set():
+                ahora = time.monotonic()
+                if ahora >= proximas_tareas:
+                    try:
+                        self._correr_tareas()
+                    except Exception:
+                        logger.exception("Fallaron los disparadores o los recibos del drenador")
+                        connection.close()
+                    proximas_tareas = ahora + self.tareas_cada
+
+                try:
+                    foto = self._medir()
+                    if foto['profundidad']:
+                        self._despertar()
+                    if self.al_reportar and ahora >= proximo_reporte:
+                        proximo_reporte = ahora + self.reportar_cada
+                        self.al_reportar(foto)
+                except Exception:
+                    # Sin medición los trabajadores siguen con su propio sondeo;
+                    # la próxima vuelta abre otra conexión.
+                    logger.exception("No se pudo medir la cola del drenador")
+                    connection.close()
+
+                if escucha is None:
+                    self._parar.wait(self.intervalo)
+                    continue
+                try:
+                    if escucha.esperar(self.intervalo, self._parar):
+                        self._despertar()
+                except Exception:
+                    logger.exception("Se cayó la escucha de %s: el drenador pasa a sondear", CANAL)
+                    escucha.cerrar()
+                    escucha = None
+        finally:
+            self._parar.set()
+            self._despertar()
+            for hilo in hilos:
+                hilo.join()
+            if escucha is not None:
+                escucha.cerrar()
+            connection.close()
+            logger.info("Drenador de avisos detenido: %s", self.metricas.foto())
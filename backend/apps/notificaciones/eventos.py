@@ -10,7 +10,9 @@ Este archivo no importa modelos a propósito: es datos puros, se puede leer sin
 base y los tests lo usan directo.
 """
 import logging
+import string
 from dataclasses import dataclass, field
+from functools import lru_cache
 
 from django.db import models
 
@@ -204,6 +206,69 @@ class _ContextoTolerante(dict):
         return ''
 
 
+def _renderizar_con_format_map(plantilla: str, contexto: dict) -> str:
+    try:
+        return plantilla.format_map(_ContextoTolerante(contexto)).strip()
+    except (ValueError, IndexError):
+        logger.exception("Plantilla de notificación mal formada: %r", plantilla)
+        return plantilla
+
+
+class PlantillaCompilada:
+    """
+    Un texto con variables ``{asi}`` ya partido en pedazos: renderizar es
+    concatenar, sin volver a parsear.
+
+    Solo se compilan las variables simples, que son todas las del catálogo y
+    las que escribe un centro. Si el texto trae algo más (``{a.b}``,
+    ``{x:>5}``, llaves sin cerrar) se renderiza con ``format_map`` como
+    siempre, así el resultado es idéntico en los dos caminos.
+    """
+    __slots__ = ('texto', '_partes')
+
+    def __init__(self, texto: str):
+        self.texto = texto
+        self._partes = self._partir(texto)
+
+    @staticmethod
+    def _partir(texto):
+        partes = []     # (literal, None) o (None, variable)
+        try:
+            for literal, variable, formato, conversion in string.Formatter().parse(texto):
+                if literal:
+                    partes.append((literal, None))
+                if variable is None:
+                    continue
+                if formato or conversion or not variable.isidentifier():
+                    return None
+                partes.append((None, variable))
+        except ValueError:
+            return None
+        return partes
+
+    def renderizar(self, contexto: dict) -> str:
+        if self._partes is None:
+            return _renderizar_con_format_map(self.texto, contexto)
+        trozos = []
+        for literal, variable in self._partes:
+            if variable is None:
+                trozos.append(literal)
+            elif variable in contexto:
+                trozos.append(format(contexto[variable], ''))
+            else:
+                logger.warning("Falta la variable '%s' al renderizar una notificación", variable)
+        return ''.join(trozos).strip()
+
+
+@lru_cache(maxsize=1024)
+def compilar(plantilla: str) -> PlantillaCompilada:
+    """
+    La versión compilada de un texto. Se memoiza por el texto mismo: los del
+    catálogo se parsean una vez por proceso y uno editado es otra entrada.
+    """
+    return PlantillaCompilada(plantilla)
+
+
 def renderizar(plantilla: str, contexto: dict) -> str:
     """
     Reemplaza las variables ``{asi}`` de una plantilla.
@@ -211,8 +276,4 @@ def renderizar(plantilla: str, contexto: dict) -> str:
     Tolera variables faltantes y plantillas mal escritas: el centro edita estos
     textos desde el CRM y una llave sin cerrar no puede tumbar el envío.
     """
-    try:
-        return plantilla.format_map(_ContextoTolerante(contexto)).strip()
-    except (ValueError, IndexError):
-        logger.exception("Plantilla de notificación mal formada: %r", plantilla)
-        return plantilla
+    return compilar(plantilla).renderizar(contexto)
@@ -12,12 +12,23 @@ Las tres etapas son independientes y se pueden correr por separado:
     python manage.py procesar_notificaciones --disparadores  # solo encolar
     python manage.py procesar_notificaciones --cola          # solo enviar
     python manage.py procesar_notificaciones --recibos       # solo confirmar
+
+Con ``--continuo`` no termina: si se pidió la cola la drena apenas entran
+avisos (ver ``drenador``), y corre las otras etapas pedidas cada
+``--tareas-cada`` segundos. Cada ``--reporte`` segundos escribe una línea con
+las métricas de la cola. SIGTERM o Ctrl+C lo detienen después de asentar lo que
+esté enviando.
+
+    python manage.py procesar_notificaciones --continuo --trabajadores 4
+    python manage.py procesar_notificaciones --continuo --cola          # otro cron hace el resto
+    python manage.py procesar_notificaciones --continuo --disparadores  # otro proceso envía
 """
 import json
+import signal
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from apps.notificaciones import cola, disparadores
+from apps.notificaciones import cola, disparadores, drenador
 
 
 class Command(BaseCommand):
@@ -40,6 +51,30 @@ class Command(BaseCommand):
             '--limite', type=int, default=cola.LOTE_POR_CORRIDA,
             help='Máximo de avisos a enviar en esta corrida.',
         )
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help='No terminar: drenar la cola a medida que entran avisos.',
+        )
+        parser.add_argument(
+            '--trabajadores', type=int, default=drenador.TRABAJADORES,
+            help='Hilos que envían en paralelo (solo con --continuo).',
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=drenador.SEGUNDOS_ENTRE_SONDEOS,
+            help='Segundos entre sondeos de la cola (solo con --continuo).',
+        )
+        parser.add_argument(
+            '--tareas-cada', type=float, default=drenador.SEGUNDOS_ENTRE_TAREAS,
+            help='Segundos entre disparadores y recibos; 0 para no correrlos (solo con --continuo).',
+        )
+        parser.add_argument(
+            '--reporte', type=float, default=60,
+            help='Segundos entre líneas de métricas (solo con --continuo).',
+        )
+        parser.add_argument(
+            '--sin-listen', action='store_true',
+            help='Sondear aunque la base soporte LISTEN/NOTIFY.',
+        )
 
     def handle(self, *args, **opciones):
         # Sin flags se corren las tres etapas, que es lo que hace el cron.
@@ -51,6 +86,9 @@ class Command(BaseCommand):
         if not any(etapas.values()):
             etapas = dict.fromkeys(etapas, True)
 
+        if opciones['continuo']:
+            return self._correr_continuo(etapas, opciones)
+
         resumen = {}
 
         if etapas['disparadores']:
@@ -64,3 +102,26 @@ class Command(BaseCommand):
 
         # JSON en una línea: los logs de Railway se leen mejor así.
         self.stdout.write(json.dumps(resumen, ensure_ascii=False))
+
+    def _correr_continuo(self, etapas, opciones):
+        if not etapas['cola'] and not opciones['tareas_cada']:
+            raise CommandError(
+                'Con --tareas-cada 0 y sin --cola, --continuo no tiene nada que hacer.'
+            )
+        motor = drenador.Drenador(
+            trabajadores=opciones['trabajadores'],
+            intervalo=opciones['intervalo'],
+            escuchar=not opciones['sin_listen'],
+            enviar=etapas['cola'],
+            disparadores=etapas['disparadores'],
+            recibos=etapas['recibos'],
+            tareas_cada=opciones['tareas_cada'],
+            reportar_cada=opciones['reporte'],
+            al_reportar=lambda foto: self.stdout.write(
+                json.dumps({'drenador': foto}, ensure_ascii=False)
+            ),
+        )
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(senal, lambda *_: motor.detener())
+        motor.correr()
+        self.stdout.write(json.dumps({'drenador': motor.foto()}, ensure_ascii=False))
@@ -0,0 +1,39 @@
+"""
+NOTIFY avisos_nuevos en cada INSERT de avisos, para que el drenador continuo se
+despierte sin esperar al próximo sondeo.
+
+Un trigger por sentencia y no por fila: un envío masivo de miles de avisos es
+una sola notificación. Postgres además junta las repetidas dentro de la misma
+transacción y solo las entrega al hacer commit, así que el drenador nunca se
+despierta a buscar filas que todavía no puede ver.
+"""
+from django.db import migrations
+
+
+CREAR = """
+CREATE FUNCTION notificaciones_aviso_notificar() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('avisos_nuevos', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notificaciones_aviso_notificar
+AFTER INSERT ON notificaciones_aviso
+FOR EACH STATEMENT EXECUTE FUNCTION notificaciones_aviso_notificar();
+"""
+
+BORRAR = """
+DROP TRIGGER IF EXISTS notificaciones_aviso_notificar ON notificaciones_aviso;
+DROP FUNCTION IF EXISTS notificaciones_aviso_notificar();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notificaciones", "0004_aviso_dispositivopush_preferencianotificacion_and_more"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREAR, BORRAR),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notificaciones", "0005_aviso_notify_trigger"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="enviopush",
+            name="notificacio_estado_957326_idx",
+        ),
+        migrations.AddField(
+            model_name="enviopush",
+            name="consultas_de_recibo",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                help_text="Veces que se pidió el recibo y Expo todavía no lo tenía.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="enviopush",
+            name="proxima_consulta_en",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Cuándo volver a pedir el recibo. Se aleja con cada consulta sin respuesta.",
+                null=True,
+            ),
+        ),
+        # Los que ya esperaban recibo se consultan como antes: 15 minutos
+        # después de aceptados.
+        migrations.RunSQL(
+            """
+            UPDATE notificaciones_enviopush
+               SET proxima_consulta_en = creado_en + interval '15 minutes'
+             WHERE estado = 'ACEPTADO' AND confirmado_en IS NULL
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="enviopush",
+            index=models.Index(
+                fields=["estado", "confirmado_en", "creado_en"],
+                name="notificacio_estado_8e7fd8_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="enviopush",
+            index=models.Index(
+                condition=models.Q(
+                    ("confirmado_en__isnull", True), ("estado", "ACEPTADO")
+                ),
+                fields=["proxima_consulta_en"],
+                name="envio_esperando_recibo",
+            ),
+        ),
+    ]
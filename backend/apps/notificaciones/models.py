@@ -433,6 +433,15 @@ class EnvioPush(models.Model):
         blank=True,
         help_text="Cuándo se leyó el recibo definitivo de Expo.",
     )
+    proxima_consulta_en = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Cuándo volver a pedir el recibo. Se aleja con cada consulta sin respuesta.",
+    )
+    consultas_de_recibo = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Veces que se pidió el recibo y Expo todavía no lo tenía.",
+    )
 
     class Meta:
         verbose_name = 'Envío push'
@@ -440,8 +449,14 @@ class EnvioPush(models.Model):
         unique_together = ['aviso', 'dispositivo']
         ordering = ['-creado_en']
         indexes = [
-            # Los que esperan recibo.
-            models.Index(fields=['estado', 'creado_en']),
+            # Los que se dan por perdidos a las 24 horas.
+            models.Index(fields=['estado', 'confirmado_en', 'creado_en']),
+            # Los que toca consultar: parcial, así que solo pesa lo que espera recibo.
+            models.Index(
+                fields=['proxima_consulta_en'],
+                name='envio_esperando_recibo',
+                condition=models.Q(estado='ACEPTADO', confirmado_en__isnull=True),
+            ),
         ]
 
     def __str__(self):
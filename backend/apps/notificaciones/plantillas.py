@@ -0,0 +1,195 @@
+"""
+Plantillas de los centros, compiladas y guardadas en la memoria del proceso.
+
+Los textos que un centro edita (``PlantillaNotificacion`` para push,
+``MensajeTemplate`` para WhatsApp) cambian muy de vez en cuando y se leen en
+cada aviso: un barrido de disparadores arma miles en una corrida. Acá se leen
+de la base una vez, se compilan una vez y quedan en un dict del proceso.
+
+Invalidación: un contador de versión por centro (push) o por sucursal
+(WhatsApp) en el caché compartido. Guardar, restaurar o borrar una plantilla lo
+incrementa (señales en ``apps.notificaciones.signals``); cada proceso compara la
+versión con la que cargó sus entradas y, si cambió, vuelve a leer. Se consulta
+la versión en cada búsqueda --una lectura de Redis por centro y por tanda, no
+una consulta a la base por aviso-- así que un cambio se ve en el próximo aviso
+de cualquier proceso.
+
+Si el caché compartido no responde se lee siempre de la base: el texto
+correcto vale más que la consulta que se ahorra.
+"""
+import logging
+import re
+import threading
+from functools import lru_cache
+
+from django.core.cache import cache
+
+from . import eventos
+from .models import MensajeTemplate, PlantillaNotificacion
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'notificaciones:plantillas'
+
+CENTRO = 'centro'
+SUCURSAL = 'sucursal'
+
+# (ámbito, id) -> (versión, {clave: valor}). ``valor`` None es "no tiene
+# plantilla propia": también se recuerda, es el caso más común.
+_entradas: dict[tuple[str, int], tuple[int, dict]] = {}
+_lock = threading.Lock()
+
+
+def _version_key(ambito, id_):
+    return f'{KEY_PREFIX}:version:{ambito}:{id_}'
+
+
+def _versiones(ambito, ids) -> dict | None:
+    """Versión compartida de cada id, o None si el caché no responde."""
+    try:
+        guardadas = cache.get_many([_version_key(ambito, id_) for id_ in ids])
+    except Exception:
+        logger.warning('Caché de plantillas no disponible', exc_info=True)
+        return None
+    return {id_: guardadas.get(_version_key(ambito, id_), 0) for id_ in ids}
+
+
+def invalidar(ambito, id_):
+    """
+    Las plantillas de ese centro o sucursal cambiaron. Un problema de caché no
+    puede romper el guardado que lo dispara.
+    """
+    with _lock:
+        _entradas.pop((ambito, id_), None)
+    try:
+        clave = _version_key(ambito, id_)
+        cache.add(clave, 0, timeout=None)
+        cache.incr(clave)
+    except Exception:
+        logger.warning('No se pudo invalidar el caché de plantillas de %s %s',
+                       ambito, id_, exc_info=True)
+
+
+def limpiar():
+    """Olvida todo lo de este proceso (para tests)."""
+    with _lock:
+        _entradas.clear()
+
+
+def _buscar(ambito, pedidos: dict[int, set], cargar) -> dict:
+    """
+    ``pedidos``: ``{id: {claves}}``. Devuelve ``{(id, clave): valor}`` para
+    todos los pedidos; lo que no está vigente en memoria lo trae ``cargar(faltan)``,
+    que recibe el mismo formato y devuelve ``{(id, clave): valor}`` solo de las
+    que existen.
+
+    La versión se lee antes que la base: si alguien guarda en el medio, la
+    entrada queda con la versión vieja y se recarga en la próxima búsqueda.
+    """
+    versiones = _versiones(ambito, list(pedidos))
+    encontrados, faltan = {}, {}
+    with _lock:
+        for id_, claves in pedidos.items():
+            version, valores = _entradas.get((ambito, id_), (None, {}))
+            vigente = versiones is not None and version == versiones[id_]
+            for clave in claves:
+                if vigente and clave in valores:
+                    encontrados[(id_, clave)] = valores[clave]
+                else:
+                    faltan.setdefault(id_, set()).add(clave)
+    if not faltan:
+        return encontrados
+
+    cargados = cargar(faltan)
+    with _lock:
+        for id_, claves in faltan.items():
+            valores = {clave: cargados.get((id_, clave)) for clave in claves}
+            encontrados.update({(id_, clave): valor for clave, valor in valores.items()})
+            if versiones is None:
+                continue
+            version, anteriores = _entradas.get((ambito, id_), (None, {}))
+            if version != versiones[id_]:
+                anteriores = {}
+            _entradas[(ambito, id_)] = (versiones[id_], {**anteriores, **valores})
+    return encontrados
+
+
+# ---------- Push ----------
+
+def _cargar_push(faltan):
+    filas = PlantillaNotificacion.objects.filter(
+        centro_estetica_id__in=list(faltan),
+        evento__in={evento for eventos_ in faltan.values() for evento in eventos_},
+        activa=True,
+    ).values_list('centro_estetica_id', 'evento', 'titulo', 'cuerpo')
+    return {
+        (centro_id, evento): (eventos.PlantillaCompilada(titulo), eventos.PlantillaCompilada(cuerpo))
+        for centro_id, evento, titulo, cuerpo in filas
+    }
+
+
+def plantillas_push(pares) -> dict:
+    """
+    ``pares``: iterable de ``(centro_id, evento)``. Devuelve
+    ``{(centro_id, evento): (titulo, cuerpo)}`` compilados, o ``None`` si el
+    centro no tiene plantilla activa para ese evento.
+    """
+    pedidos: dict[int, set] = {}
+    for centro_id, evento in pares:
+        if centro_id is not None:
+            pedidos.setdefault(centro_id, set()).add(evento)
+    if not pedidos:
+        return {}
+    return _buscar(CENTRO, pedidos, _cargar_push)
+
+
+def plantilla_push(centro_id, evento):
+    """``(titulo, cuerpo)`` compilados del centro, o None."""
+    return plantillas_push([(centro_id, evento)]).get((centro_id, evento))
+
+
+# ---------- WhatsApp ----------
+
+# Las variables que reemplaza ``WhatsAppService``. El resto del texto, llaves
+# incluidas, sale tal cual.
+VARIABLES_WHATSAPP = (
+    'nombre_cliente', 'fecha', 'hora', 'servicio', 'profesional', 'sucursal_nombre',
+    'sucursal_direccion', 'sucursal_telefono', 'duracion', 'precio',
+)
+_VARIABLE_WHATSAPP = re.compile(r'\{(' + '|'.join(VARIABLES_WHATSAPP) + r')\}')
+
+
+class MensajeCompilado:
+    """Texto de WhatsApp partido por sus variables: en los impares, el nombre."""
+    __slots__ = ('texto', '_partes')
+
+    def __init__(self, texto: str):
+        self.texto = texto
+        self._partes = _VARIABLE_WHATSAPP.split(texto)
+
+    def renderizar(self, variables: dict) -> str:
+        partes = self._partes[:]
+        for i in range(1, len(partes), 2):
+            partes[i] = str(variables[partes[i]])
+        return ''.join(partes)
+
+
+@lru_cache(maxsize=64)
+def compilar_mensaje(texto: str) -> MensajeCompilado:
+    return MensajeCompilado(texto)
+
+
+def _cargar_whatsapp(faltan):
+    filas = MensajeTemplate.objects.filter(
+        sucursal_id__in=list(faltan),
+        tipo__in={tipo for tipos in faltan.values() for tipo in tipos},
+        activo=True,
+    ).values_list('sucursal_id', 'tipo', 'mensaje')
+    return {(sucursal_id, tipo): MensajeCompilado(mensaje) for sucursal_id, tipo, mensaje in filas}
+
+
+def mensaje_whatsapp(sucursal_id, tipo) -> MensajeCompilado | None:
+    """El template activo de la sucursal para ese tipo, compilado, o None."""
+    if sucursal_id is None:
+        return None
+    return _buscar(SUCURSAL, {sucursal_id: {tipo}}, _cargar_whatsapp)[(sucursal_id, tipo)]
@@ -9,7 +9,8 @@ from twilio.base.exceptions import TwilioRestException
 import logging
 import pytz
 
-from .models import Notificacion, MensajeTemplate
+from . import plantillas
+from .models import Notificacion
 
 logger = logging.getLogger(__name__)
 
@@ -219,65 +220,65 @@ class WhatsAppService:
         """
         Obtener template configurado o usar default hardcodeado
 
+        El configurado sale del caché de plantillas compiladas: no se relee de
+        la base en cada mensaje.
+
         Args:
             tipo: Tipo de mensaje (ej: 'CONFIRMACION')
             sucursal: Instancia de Sucursal
 
         Returns:
-            str: Contenido del template
+            MensajeCompilado: Template listo para reemplazar variables
         """
-        try:
-            template = MensajeTemplate.objects.get(
-                sucursal=sucursal,
-                tipo=tipo,
-                activo=True
-            )
-            return template.mensaje
-        except MensajeTemplate.DoesNotExist:
-            # Usar templates hardcodeados como fallback
-            if tipo == 'CONFIRMACION':
-                return self._template_default_confirmacion()
-            elif tipo == 'RECORDATORIO_24H':
-                return self._template_default_recordatorio_24h()
-            elif tipo == 'RECORDATORIO_2H':
-                return self._template_default_recordatorio_2h()
-            elif tipo == 'CANCELACION':
-                return self._template_default_cancelacion()
-            return ""
+        template = plantillas.mensaje_whatsapp(getattr(sucursal, 'id', None), tipo)
+        if template is not None:
+            return template
+
+        # Usar templates hardcodeados como fallback
+        if tipo == 'CONFIRMACION':
+            texto = self._template_default_confirmacion()
+        elif tipo == 'RECORDATORIO_24H':
+            texto = self._template_default_recordatorio_24h()
+        elif tipo == 'RECORDATORIO_2H':
+            texto = self._template_default_recordatorio_2h()
+        elif tipo == 'CANCELACION':
+            texto = self._template_default_cancelacion()
+        else:
+            texto = ""
+        return plantillas.compilar_mensaje(texto)
 
     def _reemplazar_variables(self, template, turno):
         """
         Reemplazar variables en el template con datos reales del turno
 
         Args:
-            template: String con el template del mensaje
+            template: MensajeCompilado (o el texto, que se compila)
             turno: Instancia de Turno
 
         Returns:
             str: Mensaje con variables reemplazadas
         """
+        if isinstance(template, str):
+            template = plantillas.compilar_mensaje(template)
+
         fecha_hora_local = self._convertir_a_hora_local(turno.fecha_hora_inicio)
 
-        # Definir todas las variables disponibles
+        # Definir todas las variables disponibles (plantillas.VARIABLES_WHATSAPP)
         variables = {
-            '{nombre_cliente}': turno.cliente.nombre,
-            '{fecha}': fecha_hora_local.strftime('%d/%m/%Y'),
-            '{hora}': fecha_hora_local.strftime('%H:%M'),
-            '{servicio}': turno.servicio.nombre,
-            '{profesional}': turno.profesional.nombre_completo if turno.profesional else 'Por asignar',
-            '{sucursal_nombre}': turno.sucursal.nombre,
-            '{sucursal_direccion}': turno.sucursal.direccion if turno.sucursal.direccion else turno.sucursal.nombre,
-            '{sucursal_telefono}': getattr(turno.sucursal, 'telefono', ''),
-            '{duracion}': str(turno.servicio.duracion_minutos),
-            '{precio}': f"${turno.servicio.precio}",
+            'nombre_cliente': turno.cliente.nombre,
+            'fecha': fecha_hora_local.strftime('%d/%m/%Y'),
+            'hora': fecha_hora_local.strftime('%H:%M'),
+            'servicio': turno.servicio.nombre,
+            'profesional': turno.profesional.nombre_completo if turno.profesional else 'Por asignar',
+            'sucursal_nombre': turno.sucursal.nombre,
+            'sucursal_direccion': turno.sucursal.direccion if turno.sucursal.direccion else turno.sucursal.nombre,
+            'sucursal_telefono': getattr(turno.sucursal, 'telefono', ''),
+            'duracion': str(turno.servicio.duracion_minutos),
+            'precio': f"${turno.servicio.precio}",
         }
 
-        # Reemplazar cada variable en el template
-        mensaje = template
-        for variable, valor in variables.items():
-            mensaje = mensaje.replace(variable, str(valor))
-
-        return mensaje
+        # Una pasada sobre los pedazos ya partidos
+        return template.renderizar(variables)
 
     # Templates de mensajes - AHORA USAN CONFIGURACIÓN
     def _generar_mensaje_confirmacion(self, turno):
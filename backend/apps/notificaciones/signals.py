@@ -0,0 +1,31 @@
+"""
+Señales de notificaciones.
+
+Invalidan el caché de plantillas compiladas (``plantillas.py``) cuando un centro
+o una sucursal guarda, restaura o borra un texto. Se invalida en el momento y de
+nuevo al confirmar la transacción: un proceso que recargó entre medio leyó el
+texto viejo y lo habría dejado guardado con la versión nueva.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import plantillas
+from .models import MensajeTemplate, PlantillaNotificacion
+
+
+def _invalidar(ambito, id_):
+    plantillas.invalidar(ambito, id_)
+    transaction.on_commit(partial(plantillas.invalidar, ambito, id_))
+
+
+@receiver([post_save, post_delete], sender=PlantillaNotificacion)
+def invalidar_plantillas_push(sender, instance, **kwargs):
+    _invalidar(plantillas.CENTRO, instance.centro_estetica_id)
+
+
+@receiver([post_save, post_delete], sender=MensajeTemplate)
+def invalidar_mensajes_whatsapp(sender, instance, **kwargs):
+    _invalidar(plantillas.SUCURSAL, instance.sucursal_id)
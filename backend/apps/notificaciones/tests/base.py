@@ -2,7 +2,7 @@
 from datetime import timedelta
 from decimal import Decimal
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 
 from apps.clientes.models import Cliente, UsuarioCliente, VinculacionCliente
@@ -42,7 +42,7 @@ class CanalFalso:
         return {t: self.recibos[t] for t in ticket_ids if t in self.recibos}
 
 
-class NotificacionesTestBase(TestCase):
+class _DatosDePrueba:
     def setUp(self):
         self.centro = CentroEstetica.objects.create(
             nombre='Centro AME', telefono='1111', email='centro@ame.com'
@@ -92,3 +92,11 @@ class NotificacionesTestBase(TestCase):
             estado=estado,
             monto_total=self.servicio.precio,
         )
+
+
+class NotificacionesTestBase(_DatosDePrueba, TestCase):
+    pass
+
+
+class NotificacionesTransactionTestBase(_DatosDePrueba, TransactionTestCase):
+    """Para los tests con hilos: cada hilo tiene su conexión y solo ve lo commiteado."""
@@ -0,0 +1,140 @@
+"""
+Expo Push API falsa, sobre HTTP local.
+
+A diferencia de ``CanalFalso`` (que reemplaza al canal entero), esto deja correr
+el canal real de punta a punta --sesión, pool de conexiones, hilos, parseo de
+tickets-- contra un servidor en 127.0.0.1. Sirve para medir throughput y para
+provocar fallas parciales que con la API real no se pueden pedir.
+
+Comportamiento:
+
+- ``/push/send`` devuelve un ticket ``ok`` por mensaje, salvo los tokens que
+  contienen ``muerto`` (``DeviceNotRegistered``).
+- ``latencia`` demora cada respuesta; ``latencia_por_lote`` permite una distinta
+  según el primer token del lote, para que los lotes terminen desordenados.
+- ``fallar_lotes_con``: ``{token: status}``, el lote que trae ese token
+  responde con ese status HTTP. ``tickets_de_menos``: lo mismo, pero responde
+  200 con un ticket menos.
+- ``/push/getReceipts`` devuelve ``ok`` para todos los ids pedidos, salvo los
+  que contienen ``demorado``: esos no aparecen, como un recibo que Expo todavía
+  no resolvió. También demora ``latencia``.
+
+Cuenta conexiones TCP abiertas, requests, mensajes y el máximo de lotes en
+vuelo a la vez.
+
+Uso::
+
+    with ExpoFalso(latencia=0.05) as expo, override_settings(EXPO_API_URL=expo.url):
+        canal.enviar(mensajes)
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'     # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.falso._registrar_conexion()
+
+    def do_POST(self):
+        falso = self.server.falso
+        cuerpo = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+
+        if self.path.endswith('/push/getReceipts'):
+            falso._registrar_request(len(cuerpo['ids']))
+            if falso.latencia:
+                time.sleep(falso.latencia)
+            return self._responder(200, {'data': {
+                i: {'status': 'ok'} for i in cuerpo['ids'] if 'demorado' not in i
+            }})
+
+        falso._registrar_request(len(cuerpo))
+        primero = cuerpo[0]['to'] if cuerpo else ''
+        demora = falso.latencia_por_lote.get(primero, falso.latencia)
+        falso._entra()
+        try:
+            if demora:
+                time.sleep(demora)
+        finally:
+            falso._sale()
+
+        tokens = {mensaje['to'] for mensaje in cuerpo}
+        for token, status in falso.fallar_lotes_con.items():
+            if token in tokens:
+                return self._responder(status, {'errors': [{'message': 'falla provocada'}]})
+
+        tickets = [
+            {'status': 'error', 'message': f"{m['to']} no está registrado",
+             'details': {'error': 'DeviceNotRegistered'}}
+            if 'muerto' in m['to'] else
+            {'status': 'ok', 'id': f"ticket-{m['to']}"}
+            for m in cuerpo
+        ]
+        if tokens & falso.tickets_de_menos:
+            tickets = tickets[:-1]
+        self._responder(200, {'data': tickets})
+
+    def _responder(self, status, datos):
+        crudo = json.dumps(datos).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(crudo)))
+        self.end_headers()
+        self.wfile.write(crudo)
+
+
+class ExpoFalso:
+    def __init__(self, *, latencia=0.0, latencia_por_lote=None, fallar_lotes_con=None,
+                 tickets_de_menos=()):
+        self.latencia = latencia
+        self.latencia_por_lote = latencia_por_lote or {}
+        self.fallar_lotes_con = fallar_lotes_con or {}
+        self.tickets_de_menos = set(tickets_de_menos)
+        self.conexiones = 0
+        self.requests = 0
+        self.mensajes = 0
+        self.en_vuelo_maximo = 0
+        self._en_vuelo = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f'http://{host}:{puerto}/--/api/v2'
+
+    def _registrar_conexion(self):
+        with self._lock:
+            self.conexiones += 1
+
+    def _registrar_request(self, mensajes):
+        with self._lock:
+            self.requests += 1
+            self.mensajes += mensajes
+
+    def _entra(self):
+        with self._lock:
+            self._en_vuelo += 1
+            self.en_vuelo_maximo = max(self.en_vuelo_maximo, self._en_vuelo)
+
+    def _sale(self):
+        with self._lock:
+            self._en_vuelo -= 1
+
+    def __enter__(self):
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._servidor.daemon_threads = True
+        self._servidor.falso = self
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._servidor.shutdown()
+        self._servidor.server_close()
@@ -5,13 +5,18 @@ Lo importante acá es que simular no sea un camino aparte: la cola tiene que
 comportarse igual con el canal de consola que con el real, para que probar con
 uno diga algo sobre el otro.
 """
-from django.test import override_settings
+import time
+
+import pytest
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
 
 from apps.notificaciones import canales, cola, despacho, eventos
 from apps.notificaciones.canales import MensajeSaliente, consola, expo
 from apps.notificaciones.models import Aviso, EnvioPush
 
 from .base import NotificacionesTestBase
+from .expo_falso import ExpoFalso
 
 
 class SeleccionDeCanalTests(NotificacionesTestBase):
@@ -98,3 +103,105 @@ class ColaConCanalDeConsolaTests(NotificacionesTestBase):
 
         self.assertEqual(resumen['sin_destino'], 1)
         self.assertEqual(EnvioPush.objects.count(), 0)
+
+
+def _mensajes(cantidad, prefijo='tok'):
+    return [
+        MensajeSaliente(destino=f'ExponentPushToken[{prefijo}{i}]', titulo='T', cuerpo='c')
+        for i in range(cantidad)
+    ]
+
+
+class CanalExpoTests(SimpleTestCase):
+    """El canal real contra la Expo falsa de ``expo_falso``: HTTP de verdad, sin internet."""
+
+    def enviar(self, mensajes, **comportamiento):
+        with ExpoFalso(**comportamiento) as servidor, override_settings(
+            EXPO_API_URL=servidor.url, EXPO_ENVIOS_EN_PARALELO=4
+        ):
+            return expo.enviar(mensajes), servidor
+
+    def test_orden_y_cantidad_aunque_los_lotes_terminen_desordenados(self):
+        mensajes = _mensajes(350)
+        # El primer lote es el más lento: termina último
+        resultados, servidor = self.enviar(
+            mensajes, latencia_por_lote={mensajes[0].destino: 0.2}, latencia=0.01
+        )
+
+        self.assertEqual([r.destino for r in resultados], [m.destino for m in mensajes])
+        self.assertEqual([r.ticket_id for r in resultados], [f'ticket-{m.destino}' for m in mensajes])
+        self.assertEqual(servidor.requests, 4)
+        self.assertGreater(servidor.en_vuelo_maximo, 1)
+
+    def test_respeta_el_tope_de_lotes_en_paralelo_y_reusa_conexiones(self):
+        _, servidor = self.enviar(_mensajes(1200), latencia=0.02)
+
+        self.assertEqual(servidor.requests, 12)
+        self.assertLessEqual(servidor.en_vuelo_maximo, 4)
+        self.assertLessEqual(servidor.conexiones, 4)
+
+    def test_un_lote_caido_no_arrastra_a_los_demas(self):
+        mensajes = _mensajes(250)
+        resultados, _ = self.enviar(mensajes, fallar_lotes_con={mensajes[150].destino: 502})
+
+        self.assertTrue(all(r.ok for r in resultados[:100] + resultados[200:]))
+        self.assertTrue(all(not r.ok and r.reintentable for r in resultados[100:200]))
+
+    def test_tickets_de_menos_y_destinos_muertos(self):
+        mensajes = _mensajes(150) + _mensajes(1, prefijo='muerto')
+        resultados, _ = self.enviar(mensajes, tickets_de_menos={mensajes[0].destino})
+
+        self.assertTrue(all(r.reintentable and 'inesperada' in r.error for r in resultados[:100]))
+        self.assertTrue(all(r.ok for r in resultados[100:150]))
+        self.assertTrue(resultados[150].destino_muerto)
+
+    def test_recibos_en_varios_lotes(self):
+        ids = [f'ticket-{i}' for i in range(2500)]
+        with ExpoFalso() as servidor, override_settings(EXPO_API_URL=servidor.url):
+            recibos = expo.consultar_recibos(ids)
+
+        self.assertEqual(set(recibos), set(ids))
+        self.assertEqual(servidor.requests, 3)
+
+
+@override_settings(NOTIFICACIONES_CANAL='expo')
+class ColaConExpoFalsoTests(NotificacionesTestBase):
+
+    def test_un_token_muerto_se_da_de_baja_y_el_resto_sale(self):
+        vivo = self.crear_dispositivo(token='ExponentPushToken[vivo]')
+        muerto = self.crear_dispositivo(token='ExponentPushToken[muerto]')
+        despacho.crear_aviso(evento=eventos.CUMPLEANOS, usuario_cliente=self.usuario)
+
+        with ExpoFalso() as servidor, override_settings(EXPO_API_URL=servidor.url):
+            cola.procesar_pendientes()
+
+        vivo.refresh_from_db()
+        muerto.refresh_from_db()
+        self.assertTrue(vivo.activo)
+        self.assertFalse(muerto.activo)
+        self.assertEqual(
+            EnvioPush.objects.get(dispositivo=vivo).estado, EnvioPush.Estado.ACEPTADO
+        )
+
+
+@pytest.mark.benchmark
+class ThroughputExpoBenchmark(SimpleTestCase):
+    """
+    Mensajes por segundo contra la Expo falsa con 50 ms por request: lotes de a
+    uno (como antes) contra el pool de lotes en paralelo.
+    """
+    MENSAJES = 5000
+
+    def test_mensajes_por_segundo(self):
+        mensajes = _mensajes(self.MENSAJES)
+        for paralelo in (1, settings.EXPO_ENVIOS_EN_PARALELO):
+            with ExpoFalso(latencia=0.05) as servidor, override_settings(
+                EXPO_API_URL=servidor.url, EXPO_ENVIOS_EN_PARALELO=paralelo
+            ):
+                inicio = time.perf_counter()
+                resultados = expo.enviar(mensajes)
+                duracion = time.perf_counter() - inicio
+
+            self.assertEqual(len(resultados), self.MENSAJES)
+            print(f'\nExpo, {paralelo} lote(s) en paralelo: {self.MENSAJES / duracion:.0f} mensajes/s '
+                  f'({servidor.requests} requests, {servidor.conexiones} conexiones)')
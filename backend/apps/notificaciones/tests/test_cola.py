@@ -4,16 +4,23 @@ Tests de la cola: envío, multi-dispositivo, reintentos y limpieza de tokens.
 Nada de esto sale a la red: se sustituye el canal por un doble y se verifica lo
 que la cola decide, que es lo propio del sistema.
 """
+import time
 from datetime import timedelta
 from unittest.mock import patch
 
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
+from apps.clientes.models import UsuarioCliente
 from apps.notificaciones import cola, despacho, eventos
 from apps.notificaciones.canales import Resultado
 from apps.notificaciones.models import Aviso, DispositivoPush, EnvioPush
 
 from .base import CanalFalso, NotificacionesTestBase
+from .expo_falso import ExpoFalso
 
 
 class ColaTests(NotificacionesTestBase):
@@ -149,6 +156,23 @@ class ColaTests(NotificacionesTestBase):
         self.assertEqual(aviso.estado, Aviso.Estado.FALLIDO)
         self.assertEqual(aviso.intentos, 3)
 
+    def test_el_reintento_pisa_el_envio_anterior(self):
+        self.crear_dispositivo()
+        self.canal.respuesta = lambda m, i: Resultado(
+            destino=m.destino, ok=False, error='Se cayó la red', reintentable=True,
+        )
+        self._crear_aviso()
+        cola.procesar_pendientes()
+
+        self.canal.respuesta = None
+        cola.procesar_pendientes()
+
+        envio = EnvioPush.objects.get()
+        self.assertEqual(
+            (envio.estado, envio.ticket_id, envio.error, envio.confirmado_en),
+            (EnvioPush.Estado.ACEPTADO, 'ticket-0', '', None),
+        )
+
     def test_alcanza_con_que_llegue_a_un_telefono(self):
         """Si el token viejo murió pero el nuevo recibió, el aviso salió."""
         self.crear_dispositivo(token='ExponentPushToken[muerto]')
@@ -203,12 +227,9 @@ class ColaTests(NotificacionesTestBase):
 
         envio = EnvioPush.objects.get()
         self.assertEqual(envio.estado, EnvioPush.Estado.ACEPTADO)
-        EnvioPush.objects.filter(id=envio.id).update(
-            creado_en=timezone.now() - timedelta(minutes=30)
-        )
         self.canal.recibos = {envio.ticket_id: Resultado(destino='', ok=True)}
 
-        resumen = cola.procesar_recibos()
+        resumen = cola.procesar_recibos(ahora=timezone.now() + timedelta(minutes=30))
 
         self.assertEqual(resumen['entregados'], 1)
         envio.refresh_from_db()
@@ -220,16 +241,13 @@ class ColaTests(NotificacionesTestBase):
         cola.procesar_pendientes()
 
         envio = EnvioPush.objects.get()
-        EnvioPush.objects.filter(id=envio.id).update(
-            creado_en=timezone.now() - timedelta(minutes=30)
-        )
         self.canal.recibos = {
             envio.ticket_id: Resultado(
                 destino='', ok=False, error='DeviceNotRegistered', destino_muerto=True
             )
         }
 
-        cola.procesar_recibos()
+        cola.procesar_recibos(ahora=timezone.now() + timedelta(minutes=30))
 
         dispositivo.refresh_from_db()
         self.assertFalse(dispositivo.activo)
@@ -244,6 +262,57 @@ class ColaTests(NotificacionesTestBase):
         self.assertEqual(resumen['consultados'], 0)
         self.assertEqual(self.canal.recibos_pedidos, [])
 
+    def test_sin_respuesta_se_vuelve_a_preguntar_cada_vez_mas_espaciado(self):
+        self.crear_dispositivo()
+        self._crear_aviso()
+        inicio = timezone.now()
+        cola.procesar_pendientes(ahora=inicio)
+        envio = EnvioPush.objects.get()
+
+        consultas = []
+        for minutos in range(15, 24 * 60, 5):
+            self.canal.recibos_pedidos = []
+            cola.procesar_recibos(ahora=inicio + timedelta(minutes=minutos))
+            if self.canal.recibos_pedidos:
+                consultas.append(minutos)
+
+        self.assertEqual(consultas[:6], [15, 30, 60, 120, 240, 480])
+        envio.refresh_from_db()
+        self.assertEqual(envio.consultas_de_recibo, len(consultas))
+        self.assertEqual(envio.estado, EnvioPush.Estado.ACEPTADO)
+
+    def test_un_atraso_grande_se_consulta_en_una_corrida(self):
+        usuarios = UsuarioCliente.objects.bulk_create(
+            UsuarioCliente(email=f'r{i}@mail.com', password='!') for i in range(25)
+        )
+        DispositivoPush.objects.bulk_create(
+            DispositivoPush(usuario_cliente=u, token=f'ExponentPushToken[r{u.id}]',
+                            plataforma=DispositivoPush.Plataforma.ANDROID)
+            for u in usuarios
+        )
+        despacho.crear_avisos_masivos(
+            evento=eventos.OFERTA_NUEVA, usuarios=usuarios, centro_estetica=self.centro,
+        )
+        cola.procesar_pendientes()
+        tickets = list(EnvioPush.objects.values_list('ticket_id', flat=True))
+        # La mitad resuelta, un error repetido y el resto todavía sin recibo
+        self.canal.recibos = {t: Resultado(destino='', ok=True) for t in tickets[:12]}
+        self.canal.recibos.update({
+            t: Resultado(destino='', ok=False, error='MessageTooBig') for t in tickets[12:20]
+        })
+
+        with patch.object(cola, 'RECIBOS_POR_TANDA', 10), \
+                CaptureQueriesContext(connection) as consultas:
+            resumen = cola.procesar_recibos(ahora=timezone.now() + timedelta(minutes=20))
+
+        self.assertEqual(
+            {k: resumen[k] for k in ('consultados', 'entregados', 'fallidos', 'sin_respuesta')},
+            {'consultados': 25, 'entregados': 12, 'fallidos': 8, 'sin_respuesta': 5},
+        )
+        self.assertEqual(sorted(self.canal.recibos_pedidos), sorted(tickets))
+        # vencidos + por tanda (lectura y un UPDATE por desenlace) + la última lectura vacía
+        self.assertLessEqual(len(consultas), 1 + 3 * 4 + 1)
+
     def test_pasadas_24h_se_deja_de_esperar_el_recibo(self):
         self.crear_dispositivo()
         self._crear_aviso()
@@ -260,3 +329,106 @@ class ColaTests(NotificacionesTestBase):
         self.assertEqual(resumen['consultados'], 0)
         envio.refresh_from_db()
         self.assertIsNotNone(envio.confirmado_en)
+
+
+@pytest.mark.benchmark
+class AsentarBenchmark(NotificacionesTestBase):
+    """
+    Tiempo y consultas de ``_asentar`` (anotar el resultado de cada envío) por
+    tanda, con dos dispositivos por cuenta y uno de cada diez envíos fallido.
+    """
+    TANDAS = (100, 250, 500)
+
+    def _preparar(self, cantidad, tanda):
+        usuarios = UsuarioCliente.objects.bulk_create(
+            UsuarioCliente(email=f'b{tanda}-{i}@mail.com', password='!')
+            for i in range(cantidad)
+        )
+        DispositivoPush.objects.bulk_create(
+            DispositivoPush(
+                usuario_cliente=usuario, token=f'ExponentPushToken[{tanda}-{usuario.id}-{n}]',
+                plataforma=DispositivoPush.Plataforma.ANDROID,
+            )
+            for usuario in usuarios for n in range(2)
+        )
+        despacho.crear_avisos_masivos(
+            evento=eventos.OFERTA_NUEVA, usuarios=usuarios, centro_estetica=self.centro,
+        )
+
+    def test_tiempo_de_asentar_por_tanda(self):
+        canal = CanalFalso()
+        canal.respuesta = lambda mensaje, i: (
+            Resultado(destino=mensaje.destino, ok=False, error='x', reintentable=True)
+            if i % 10 == 0 else Resultado(destino=mensaje.destino, ok=True, ticket_id=f't-{i}')
+        )
+        asentar = cola._asentar
+        medidas = {}
+
+        def medir(*args):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                resumen = asentar(*args)
+                medidas['duracion'] = time.perf_counter() - inicio
+            medidas['consultas'] = len(consultas)
+            return resumen
+
+        with patch('apps.notificaciones.canales.activo', return_value=canal), \
+                patch.object(cola, '_asentar', side_effect=medir):
+            for tanda in self.TANDAS:
+                Aviso.objects.all().delete()
+                self._preparar(tanda, tanda)
+                cola.procesar_pendientes(limite=tanda)
+                print(f'\n_asentar de {tanda} avisos ({2 * tanda} envíos): '
+                      f'{medidas["duracion"] * 1000:.0f} ms, {medidas["consultas"]} consultas')
+
+
+@pytest.mark.benchmark
+class RecibosBenchmark(NotificacionesTestBase):
+    """
+    Atraso de 20.000 envíos aceptados tras un corte, contra la Expo falsa con
+    50 ms por request y uno de cada diez recibos todavía sin resolver: cuánto
+    tarda una corrida y qué queda para la siguiente.
+    """
+    ENVIOS = 20000
+    DISPOSITIVOS = 200
+
+    def test_atraso_de_recibos(self):
+        usuarios = UsuarioCliente.objects.bulk_create(
+            UsuarioCliente(email=f'rb{i}@mail.com', password='!') for i in range(self.DISPOSITIVOS)
+        )
+        dispositivos = DispositivoPush.objects.bulk_create(
+            DispositivoPush(
+                usuario_cliente=usuario, plataforma=DispositivoPush.Plataforma.ANDROID,
+                token=f'ExponentPushToken[{"demorado" if i % 10 == 0 else "ok"}-{i}]',
+            )
+            for i, usuario in enumerate(usuarios)
+        )
+        avisos = Aviso.objects.bulk_create(
+            Aviso(evento=eventos.OFERTA_NUEVA, categoria=eventos.Categoria.PROMOCIONES,
+                  usuario_cliente=self.usuario, titulo='t', cuerpo='c', estado=Aviso.Estado.ENVIADO,
+                  programado_para=timezone.now())
+            for _ in range(self.ENVIOS // self.DISPOSITIVOS)
+        )
+        vencido = timezone.now() - timedelta(hours=2)
+        EnvioPush.objects.bulk_create(
+            (EnvioPush(aviso=aviso, dispositivo=dispositivo, estado=EnvioPush.Estado.ACEPTADO,
+                       ticket_id=f'{dispositivo.token}-{aviso.id}', proxima_consulta_en=vencido)
+             for aviso in avisos for dispositivo in dispositivos),
+            batch_size=5000,
+        )
+
+        with ExpoFalso(latencia=0.05) as servidor, override_settings(
+            NOTIFICACIONES_CANAL='expo', EXPO_API_URL=servidor.url
+        ):
+            for corrida in (1, 2):
+                with CaptureQueriesContext(connection) as consultas:
+                    inicio = time.perf_counter()
+                    resumen = cola.procesar_recibos()
+                    duracion = time.perf_counter() - inicio
+                print(f'\nRecibos, corrida {corrida}: {resumen["consultados"]} consultados '
+                      f'({resumen["entregados"]} entregados, {resumen["sin_respuesta"]} sin respuesta) '
+                      f'en {duracion:.2f}s, {len(consultas)} consultas, {servidor.requests} requests')
+
+        self.assertEqual(
+            EnvioPush.objects.filter(estado=EnvioPush.Estado.ENTREGADO).count(), self.ENVIOS * 9 // 10
+        )
@@ -203,6 +203,52 @@ class DespachoTests(NotificacionesTestBase):
             )
         self.assertEqual(Aviso.objects.count(), 1)
 
+    def test_avisos_por_ficha_en_lote_usan_la_plantilla_y_no_duplican(self):
+        PlantillaNotificacion.objects.create(
+            centro_estetica=self.centro,
+            evento=eventos.TURNO_CONFIRMADO,
+            titulo='Listo, {servicio}',
+            cuerpo='Nos vemos el {fecha}.',
+        )
+        solicitud = despacho.SolicitudAviso(
+            evento=eventos.TURNO_CONFIRMADO, cliente=self.cliente,
+            contexto={'servicio': 'Facial', 'fecha': '3 de mayo'},
+            clave='turno:7:x', datos_extra={'turnoId': 7},
+        )
+
+        creados = [despacho.crear_avisos_para_clientes([solicitud]) for _ in range(2)]
+
+        self.assertEqual(creados, [1, 0])
+        aviso = Aviso.objects.get()
+        self.assertEqual((aviso.titulo, aviso.cuerpo), ('Listo, Facial', 'Nos vemos el 3 de mayo.'))
+        self.assertEqual(aviso.clave, f'turno:7:x:u{self.usuario.id}')
+        self.assertEqual(aviso.datos['turnoId'], 7)
+
+    def test_avisos_en_lote_respetan_las_preferencias(self):
+        PreferenciaNotificacion.objects.create(
+            usuario_cliente=self.usuario,
+            categoria=eventos.Categoria.TURNOS,
+            habilitada=False,
+        )
+
+        creados = despacho.crear_avisos_para_clientes([
+            despacho.SolicitudAviso(evento=eventos.TURNO_RECORDATORIO_24H, cliente=self.cliente, clave='a'),
+            despacho.SolicitudAviso(evento=eventos.TURNO_CANCELADO, cliente=self.cliente, clave='b'),
+        ])
+
+        self.assertEqual(creados, 1)
+        self.assertEqual(Aviso.objects.get().evento, eventos.TURNO_CANCELADO)
+
+    def test_avisos_en_lote_cuentan_solo_los_que_entraron(self):
+        # Dos barridos que se pisan mandan la misma clave dos veces en el lote
+        creados = despacho.crear_avisos_para_clientes([
+            despacho.SolicitudAviso(evento=eventos.TURNO_CANCELADO, cliente=self.cliente, clave='c'),
+            despacho.SolicitudAviso(evento=eventos.TURNO_CANCELADO, cliente=self.cliente, clave='c'),
+        ])
+
+        self.assertEqual(creados, 1)
+        self.assertEqual(Aviso.objects.count(), 1)
+
 
 class EventosTests(NotificacionesTestBase):
 
@@ -5,12 +5,18 @@ Lo que se prueba acá es que el cron puede correr las veces que quiera sin
 duplicar nada, y que un turno que cambia no deja recordatorios viejos apuntando a
 una hora que ya no existe.
 """
+import time
 from datetime import timedelta
 
+import pytest
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from apps.clientes.models import Cliente, RutinaCuidado, RutinaItem
+from apps.clientes.models import (
+    Cliente, RutinaCuidado, RutinaItem, UsuarioCliente, VinculacionCliente,
+)
 from apps.notificaciones import disparadores, eventos
 from apps.notificaciones.models import Aviso
 from apps.turnos.models import Turno
@@ -215,3 +221,49 @@ class CorrerTodosTests(NotificacionesTestBase):
 
         self.assertTrue(resumen['explota_error'])
         self.assertEqual(resumen['recordatorios_encolados'], 2)
+
+
+@pytest.mark.benchmark
+class BarridoDeRecordatoriosBenchmark(NotificacionesTestBase):
+    """
+    Barrido de recordatorios sobre muchos turnos próximos de clientas con app:
+    la primera corrida crea los avisos y la segunda (el caso de todos los días
+    del cron) los encuentra ya creados.
+    """
+    TURNOS = 5000
+
+    def test_barrido(self):
+        clientes = Cliente.objects.bulk_create(
+            Cliente(centro_estetica=self.centro, nombre=f'C{i}', apellido='B', telefono=str(i))
+            for i in range(self.TURNOS)
+        )
+        usuarios = UsuarioCliente.objects.bulk_create(
+            UsuarioCliente(email=f'c{i}@mail.com', password='!') for i in range(self.TURNOS)
+        )
+        VinculacionCliente.objects.bulk_create(
+            VinculacionCliente(
+                usuario_cliente=usuario, cliente=cliente,
+                metodo_vinculacion=VinculacionCliente.Metodo.CODIGO_INVITACION,
+            )
+            for usuario, cliente in zip(usuarios, clientes)
+        )
+        ahora = timezone.now()
+        Turno.objects.bulk_create(
+            Turno(
+                sucursal=self.sucursal, cliente=cliente, servicio=self.servicio,
+                fecha_hora_inicio=ahora + timedelta(days=1, seconds=20 * i),
+                fecha_hora_fin=ahora + timedelta(days=1, seconds=20 * i + 3600),
+                estado=Turno.Estado.CONFIRMADO, monto_total=self.servicio.precio,
+            )
+            for i, cliente in enumerate(clientes)
+        )
+
+        for corrida in ('primera', 'segunda'):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                resumen = disparadores.programar_recordatorios_de_turnos(ahora)
+                duracion = time.perf_counter() - inicio
+            print(f'\nBarrido de {self.TURNOS} turnos, {corrida} corrida: {duracion:.2f}s, '
+                  f'{len(consultas)} consultas, {resumen["recordatorios_encolados"]} encolados')
+
+        self.assertEqual(Aviso.objects.count(), 2 * self.TURNOS)
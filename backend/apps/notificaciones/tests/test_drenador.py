@@ -0,0 +1,247 @@
+"""
+Drenador continuo: reparto entre hilos, despertar por NOTIFY, lote según la
+cola y métricas.
+"""
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.clientes.models import UsuarioCliente
+from apps.empleados.models import Usuario
+from apps.notificaciones import cola, despacho, drenador, eventos
+from apps.notificaciones.models import Aviso, DispositivoPush
+
+from .base import CanalFalso, NotificacionesTestBase, NotificacionesTransactionTestBase
+
+
+class TamanoDeLoteTests(SimpleTestCase):
+
+    def test_con_la_cola_casi_vacia_toma_el_minimo(self):
+        self.assertEqual(drenador.tamano_de_lote(0, 4), drenador.LOTE_MINIMO)
+        self.assertEqual(drenador.tamano_de_lote(30, 4), drenador.LOTE_MINIMO)
+
+    def test_reparte_la_cola_entre_los_trabajadores(self):
+        self.assertEqual(drenador.tamano_de_lote(1000, 4), 250)
+
+    def test_con_la_cola_llena_no_pasa_del_lote_de_una_corrida(self):
+        self.assertEqual(drenador.tamano_de_lote(100_000, 4), cola.LOTE_POR_CORRIDA)
+
+
+class MetricasTests(SimpleTestCase):
+
+    def test_percentiles_y_throughput_de_las_corridas_con_trabajo(self):
+        metricas = drenador.Metricas()
+        for ms in range(1, 101):
+            metricas.registrar({'tomados': 10, 'enviados': 9}, ms / 1000)
+        metricas.registrar({'tomados': 0, 'enviados': 0}, 0.0001)
+
+        foto = metricas.foto()
+
+        self.assertEqual((foto['corridas'], foto['tomados'], foto['enviados']), (100, 1000, 900))
+        self.assertEqual(foto['latencia_ms'], {'p50': 51, 'p95': 96, 'max': 100})
+        self.assertEqual(foto['avisos_por_segundo'], round(1000 / drenador.SEGUNDOS_DE_THROUGHPUT, 2))
+
+
+class EstadoDeLaColaTests(NotificacionesTestBase):
+
+    def test_profundidad_y_atraso_del_mas_viejo(self):
+        ahora = timezone.now()
+        for minutos in (10, 2):
+            despacho.crear_aviso(
+                evento=eventos.OFERTA_NUEVA, usuario_cliente=self.usuario,
+                programado_para=ahora - timedelta(minutes=minutos),
+            )
+        despacho.crear_aviso(
+            evento=eventos.OFERTA_NUEVA, usuario_cliente=self.usuario,
+            programado_para=ahora + timedelta(hours=1),
+        )
+
+        estado = drenador.estado_de_la_cola(ahora)
+
+        self.assertEqual(estado, {'profundidad': 2, 'atraso_segundos': 600.0})
+
+    def test_la_cola_vacia_no_tiene_atraso(self):
+        self.assertEqual(drenador.estado_de_la_cola(), {'profundidad': 0, 'atraso_segundos': 0.0})
+
+    def test_el_staff_ve_las_metricas(self):
+        admin = Usuario.objects.create_user(
+            username='admin', password='x', centro_estetica=self.centro,
+            sucursal=self.sucursal, rol=Usuario.Rol.ADMIN,
+        )
+        cache.set(drenador.CLAVE_METRICAS, {'corridas': 3})
+        self.addCleanup(cache.delete, drenador.CLAVE_METRICAS)
+        cliente = APIClient()
+
+        cliente.force_authenticate(self.profesional)
+        self.assertEqual(cliente.get(reverse('cola-push-metricas')).status_code, 403)
+
+        cliente.force_authenticate(admin)
+        respuesta = cliente.get(reverse('cola-push-metricas'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['drenador'], {'corridas': 3})
+        self.assertEqual(respuesta.data['cola']['profundidad'], 0)
+
+
+class DrenadorEnVivoTests(NotificacionesTransactionTestBase):
+    """El drenador de verdad, con sus hilos, contra la base de verdad."""
+
+    def setUp(self):
+        super().setUp()
+        self.canal = CanalFalso()
+        parche = patch('apps.notificaciones.canales.activo', return_value=self.canal)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _arrancar(self, **kwargs):
+        motor = drenador.Drenador(disparadores=False, recibos=False, **kwargs)
+        hilo = threading.Thread(target=motor.correr)
+        hilo.start()
+
+        def parar():
+            motor.detener()
+            hilo.join(timeout=30)
+        self.addCleanup(parar)
+        return motor, parar
+
+    def _esperar(self, condicion, segundos=20):
+        limite = time.monotonic() + segundos
+        while time.monotonic() < limite:
+            if condicion():
+                return
+            time.sleep(0.05)
+        self.fail('El drenador no terminó a tiempo')
+
+    def test_los_trabajadores_se_reparten_la_cola_sin_repetir(self):
+        usuarios = UsuarioCliente.objects.bulk_create(
+            UsuarioCliente(email=f'd{i}@mail.com', password='!') for i in range(600)
+        )
+        DispositivoPush.objects.bulk_create(
+            DispositivoPush(usuario_cliente=u, token=f'ExponentPushToken[{u.id}]',
+                            plataforma=DispositivoPush.Plataforma.ANDROID)
+            for u in usuarios
+        )
+        despacho.crear_avisos_masivos(
+            evento=eventos.OFERTA_NUEVA, usuarios=usuarios, centro_estetica=self.centro,
+        )
+
+        motor, parar = self._arrancar(trabajadores=3, intervalo=0.2, escuchar=False)
+        pendientes = Aviso.objects.exclude(estado=Aviso.Estado.ENVIADO)
+        self._esperar(lambda: not pendientes.exists())
+        parar()
+
+        avisos_enviados = [m.datos['avisoId'] for m in self.canal.enviados]
+        self.assertEqual(len(avisos_enviados), 600)
+        self.assertEqual(len(set(avisos_enviados)), 600)
+        foto = motor.foto()
+        self.assertEqual(foto['enviados'], 600)
+        self.assertGreater(foto['corridas'], 1)
+        self.assertIn('latencia_ms', foto)
+        self.assertEqual(cache.get(drenador.CLAVE_METRICAS)['trabajadores'], 3)
+
+    def test_un_aviso_nuevo_lo_despierta_sin_esperar_al_sondeo(self):
+        self.crear_dispositivo()
+        # Sondeo larguísimo: si sale rápido es porque llegó el NOTIFY.
+        self._arrancar(trabajadores=2, intervalo=60)
+        time.sleep(0.3)
+
+        inicio = time.monotonic()
+        aviso = despacho.crear_aviso(evento=eventos.TURNO_CONFIRMADO, usuario_cliente=self.usuario)
+        self._esperar(lambda: Aviso.objects.filter(id=aviso.id, estado=Aviso.Estado.ENVIADO).exists(),
+                      segundos=10)
+
+        self.assertLess(time.monotonic() - inicio, 10)
+
+    def test_detener_deja_asentada_la_tanda_en_curso(self):
+        self.crear_dispositivo()
+        for _ in range(5):
+            despacho.crear_aviso(evento=eventos.OFERTA_NUEVA, usuario_cliente=self.usuario)
+        enviando = threading.Event()
+        original = self.canal.enviar
+
+        def lento(mensajes):
+            enviando.set()
+            time.sleep(0.5)
+            return original(mensajes)
+        self.canal.enviar = lento
+
+        motor, parar = self._arrancar(trabajadores=1, intervalo=0.2, escuchar=False)
+        self.assertTrue(enviando.wait(10))
+        parar()
+
+        self.assertFalse(Aviso.objects.filter(estado=Aviso.Estado.PROCESANDO).exists())
+        self.assertEqual(Aviso.objects.filter(estado=Aviso.Estado.ENVIADO).count(), 5)
+
+    def test_una_falla_al_medir_no_lo_detiene(self):
+        self.crear_dispositivo()
+        fallas = []
+        original = drenador.estado_de_la_cola
+
+        def con_fallas(*args, **kwargs):
+            if len(fallas) < 3:
+                fallas.append(1)
+                raise ConnectionError('se cayó la base')
+            return original(*args, **kwargs)
+
+        with patch('apps.notificaciones.drenador.estado_de_la_cola', side_effect=con_fallas), \
+                patch('apps.notificaciones.drenador.cache.set', side_effect=ConnectionError('redis')):
+            motor, parar = self._arrancar(trabajadores=1, intervalo=0.1, escuchar=False,
+                                          reportar_cada=0.1, al_reportar=self._reporte_roto)
+            self._esperar(lambda: len(fallas) == 3)
+            aviso = despacho.crear_aviso(evento=eventos.TURNO_CONFIRMADO, usuario_cliente=self.usuario)
+            self._esperar(lambda: Aviso.objects.filter(id=aviso.id, estado=Aviso.Estado.ENVIADO).exists())
+
+        self.assertGreater(motor.foto()['corridas'], 0)
+
+    @staticmethod
+    def _reporte_roto(foto):
+        raise ValueError('no se pudo escribir el reporte')
+
+    def test_sin_la_cola_solo_corre_las_tareas(self):
+        self.crear_dispositivo()
+        aviso = despacho.crear_aviso(evento=eventos.TURNO_CONFIRMADO, usuario_cliente=self.usuario)
+        corridas = []
+
+        with patch('apps.notificaciones.drenador.disparadores.correr_todos',
+                   side_effect=lambda: corridas.append(1)):
+            motor = drenador.Drenador(enviar=False, recibos=False, intervalo=0.05, tareas_cada=0.05)
+            hilo = threading.Thread(target=motor.correr)
+            hilo.start()
+            self._esperar(lambda: len(corridas) >= 2)
+            motor.detener()
+            hilo.join(timeout=30)
+
+        self.assertEqual(motor.foto()['trabajadores'], 0)
+        self.assertEqual(Aviso.objects.get(id=aviso.id).estado, Aviso.Estado.PENDIENTE)
+
+
+class ComandoContinuoTests(SimpleTestCase):
+
+    def _opciones_del_drenador(self, *flags):
+        # Sin instalar los handlers de SIGTERM/SIGINT en el proceso de los tests
+        with patch('signal.signal'), patch.object(drenador.Drenador, 'correr'), \
+                patch.object(drenador.Drenador, 'foto', return_value={}), \
+                patch.object(drenador.Drenador, '__init__', return_value=None) as crear:
+            call_command('procesar_notificaciones', '--continuo', *flags, stdout=StringIO())
+        return crear.call_args.kwargs
+
+    def test_respeta_las_etapas_pedidas(self):
+        solo_disparadores = self._opciones_del_drenador('--disparadores')
+        self.assertEqual(
+            (solo_disparadores['enviar'], solo_disparadores['disparadores'], solo_disparadores['recibos']),
+            (False, True, False),
+        )
+        todas = self._opciones_del_drenador()
+        self.assertEqual((todas['enviar'], todas['disparadores'], todas['recibos']), (True, True, True))
+
+    def test_sin_cola_ni_tareas_no_arranca(self):
+        with self.assertRaises(CommandError):
+            call_command('procesar_notificaciones', '--continuo', '--recibos', '--tareas-cada', '0')
@@ -0,0 +1,214 @@
+"""
+Plantillas compiladas y su caché por centro/sucursal: mismo texto que antes,
+sin consultas repetidas, y un cambio se ve en el próximo aviso.
+"""
+import time
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.notificaciones import despacho, eventos, plantillas
+from apps.notificaciones.models import MensajeTemplate, PlantillaNotificacion
+from apps.notificaciones.services import whatsapp_service
+
+from .base import NotificacionesTestBase
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class PlantillaCompiladaTests(SimpleTestCase):
+    CASOS = [
+        ('Hola {nombre}, tu turno es a las {hora}.', {'nombre': 'Sofi', 'hora': '15:00'}),
+        ('  {nombre}  ', {'nombre': 'Sofi'}),
+        ('Llaves {{literales}} y {nombre}', {'nombre': 'x'}),
+        ('Falta {nada}', {}),
+        ('Número {n}', {'n': 3}),
+        ('Precio ${precio}', {'precio': Decimal('10.50')}),
+        ('Con formato {n:>4}', {'n': 3}),
+        ('Atributo {fecha.year}', {'fecha': date(2026, 5, 1)}),
+        ('Hola {sin cerrar', {}),
+        ('Posicional {}', {}),
+        ('Suelta }', {}),
+    ]
+
+    def test_da_lo_mismo_que_format_map(self):
+        for texto, contexto in self.CASOS:
+            with self.subTest(texto=texto):
+                self.assertEqual(
+                    eventos.compilar(texto).renderizar(contexto),
+                    eventos._renderizar_con_format_map(texto, contexto),
+                )
+
+    def test_el_texto_del_catalogo_se_compila_una_vez(self):
+        texto = eventos.obtener(eventos.TURNO_CONFIRMADO).cuerpo
+        self.assertIs(eventos.compilar(texto), eventos.compilar(texto))
+
+    def test_el_mensaje_de_whatsapp_solo_reemplaza_sus_variables(self):
+        mensaje = plantillas.MensajeCompilado('Hola {nombre_cliente} {otra} {hora}{hora}')
+        self.assertEqual(
+            mensaje.renderizar({'nombre_cliente': 'Sofi', 'hora': '10'}),
+            'Hola Sofi {otra} 1010',
+        )
+
+
+@override_settings(CACHES=LOCMEM)
+class CacheDePlantillasTests(NotificacionesTestBase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        plantillas.limpiar()
+        self.addCleanup(plantillas.limpiar)
+
+    def _crear_aviso(self):
+        return despacho.crear_aviso(
+            evento=eventos.TURNO_CONFIRMADO, usuario_cliente=self.usuario,
+            centro_estetica=self.centro, contexto={'servicio': 'Peeling', 'fecha': '3/5'},
+        )
+
+    def _consultas_de_plantillas(self, funcion):
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = funcion()
+        return resultado, sum('notificaciones_plantillanotificacion' in c['sql'] for c in consultas)
+
+    def test_la_plantilla_se_lee_una_sola_vez(self):
+        PlantillaNotificacion.objects.create(
+            centro_estetica=self.centro, evento=eventos.TURNO_CONFIRMADO,
+            titulo='Listo, {servicio}', cuerpo='Nos vemos el {fecha}.',
+        )
+        _, primera = self._consultas_de_plantillas(self._crear_aviso)
+        aviso, segunda = self._consultas_de_plantillas(self._crear_aviso)
+
+        self.assertEqual((primera, segunda), (1, 0))
+        self.assertEqual(aviso.titulo, 'Listo, Peeling')
+
+    def test_sin_plantilla_propia_tampoco_vuelve_a_preguntar(self):
+        self._consultas_de_plantillas(self._crear_aviso)
+        aviso, consultas = self._consultas_de_plantillas(self._crear_aviso)
+
+        self.assertEqual(consultas, 0)
+        self.assertEqual(aviso.titulo, 'Turno confirmado')
+
+    def test_editar_borrar_o_desactivar_se_ve_en_el_proximo_aviso(self):
+        self._crear_aviso()
+        plantilla = PlantillaNotificacion.objects.create(
+            centro_estetica=self.centro, evento=eventos.TURNO_CONFIRMADO,
+            titulo='Primera', cuerpo='x',
+        )
+        self.assertEqual(self._crear_aviso().titulo, 'Primera')
+
+        plantilla.titulo = 'Segunda'
+        plantilla.save()
+        self.assertEqual(self._crear_aviso().titulo, 'Segunda')
+
+        plantilla.activa = False
+        plantilla.save()
+        self.assertEqual(self._crear_aviso().titulo, 'Turno confirmado')
+
+        plantilla.activa = True
+        plantilla.save()
+        plantilla.delete()
+        self.assertEqual(self._crear_aviso().titulo, 'Turno confirmado')
+
+    def test_un_cambio_en_otro_proceso_se_ve_por_la_version(self):
+        """Otro proceso solo puede avisar por el caché compartido, no por la memoria de este."""
+        self._crear_aviso()
+        PlantillaNotificacion.objects.bulk_create([PlantillaNotificacion(
+            centro_estetica=self.centro, evento=eventos.TURNO_CONFIRMADO,
+            titulo='Desde otro proceso', cuerpo='x',
+        )])  # sin señales: este proceso no se entera
+        self.assertEqual(self._crear_aviso().titulo, 'Turno confirmado')
+
+        cache.set(plantillas._version_key(plantillas.CENTRO, self.centro.id), 1)
+        self.assertEqual(self._crear_aviso().titulo, 'Desde otro proceso')
+
+    def test_sin_cache_compartido_lee_siempre_de_la_base(self):
+        with patch('apps.notificaciones.plantillas.cache') as caido:
+            caido.get_many.side_effect = ConnectionError
+            _, primera = self._consultas_de_plantillas(self._crear_aviso)
+            _, segunda = self._consultas_de_plantillas(self._crear_aviso)
+        self.assertEqual((primera, segunda), (1, 1))
+
+    def test_el_template_de_whatsapp_restaurado_se_ve_enseguida(self):
+        turno = self.crear_turno()
+        turno.profesional = None
+        MensajeTemplate.objects.create(
+            sucursal=self.sucursal, tipo='CONFIRMACION', mensaje='Hola {nombre_cliente}',
+        )
+        self.assertEqual(whatsapp_service._generar_mensaje_confirmacion(turno), 'Hola Sofía')
+
+        with self.assertNumQueries(0):
+            whatsapp_service._generar_mensaje_confirmacion(turno)
+
+        # Lo mismo que hace reset_defaults
+        MensajeTemplate.objects.update_or_create(
+            sucursal=self.sucursal, tipo='CONFIRMACION',
+            defaults={'mensaje': 'Chau {nombre_cliente}, {servicio} a las {hora}', 'activo': True},
+        )
+        self.assertRegex(
+            whatsapp_service._generar_mensaje_confirmacion(turno),
+            r'^Chau Sofía, Limpieza facial a las \d\d:\d\d$',
+        )
+
+
+@pytest.mark.benchmark
+@override_settings(CACHES=LOCMEM)
+class RenderizadoBenchmark(NotificacionesTestBase):
+    """
+    Textos de 2000 avisos de un centro con plantilla propia: una consulta y un
+    parseo por aviso (lo de antes) contra el caché compilado.
+    """
+    AVISOS = 2000
+
+    def test_resolver_textos(self):
+        plantillas.limpiar()
+        PlantillaNotificacion.objects.create(
+            centro_estetica=self.centro, evento=eventos.TURNO_RECORDATORIO_24H,
+            titulo='Mañana: {servicio}', cuerpo='Te esperamos el {fecha} a las {hora}. {centro}',
+        )
+        definicion = eventos.obtener(eventos.TURNO_RECORDATORIO_24H)
+        contextos = [
+            {'servicio': f'Servicio {i}', 'fecha': '3 de mayo', 'hora': f'{i % 24:02}:00', 'centro': 'AME'}
+            for i in range(self.AVISOS)
+        ]
+
+        def antes(contexto):
+            plantilla = PlantillaNotificacion.objects.filter(
+                centro_estetica=self.centro, evento=definicion.clave, activa=True,
+            ).first()
+            return (
+                eventos._renderizar_con_format_map(plantilla.titulo, contexto),
+                eventos._renderizar_con_format_map(plantilla.cuerpo, contexto),
+                eventos._renderizar_con_format_map(definicion.ruta, contexto),
+            )
+
+        def ahora(contexto):
+            return despacho.resolver_textos(definicion, self.centro, contexto)
+
+        resultados = {}
+        for nombre, funcion in (('antes', antes), ('ahora', ahora)):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                resultados[nombre] = [funcion(contexto) for contexto in contextos]
+                duracion = time.perf_counter() - inicio
+            print(f'\nTextos de {self.AVISOS} avisos ({nombre}): {duracion * 1000:.0f} ms, '
+                  f'{len(consultas)} consultas')
+        self.assertEqual(resultados['antes'], resultados['ahora'])
+
+        # Solo el renderizado, sin base: parsear cada vez contra pedazos ya partidos
+        texto = 'Te esperamos el {fecha} a las {hora}. {centro}'
+        for nombre, funcion in (
+            ('format_map', lambda c: eventos._renderizar_con_format_map(texto, c)),
+            ('compilada', eventos.compilar(texto).renderizar),
+        ):
+            inicio = time.perf_counter()
+            for _ in range(10):
+                for contexto in contextos:
+                    funcion(contexto)
+            print(f'{nombre}: {(time.perf_counter() - inicio) / (10 * self.AVISOS) * 1e6:.2f} µs por texto')
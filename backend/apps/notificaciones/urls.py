@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import NotificacionViewSet, MensajeTemplateViewSet, twilio_status_webhook
+from .views import NotificacionViewSet, MensajeTemplateViewSet, twilio_status_webhook, metricas_cola_push
 
 router = DefaultRouter()
 router.register(r'notificaciones', NotificacionViewSet, basename='notificacion')
@@ -10,4 +10,5 @@ urlpatterns = [
     path('', include(router.urls)),
     # Webhook de Twilio para status callbacks (NO requiere autenticación)
     path('notificaciones/webhook/status/', twilio_status_webhook, name='twilio-status-webhook'),
+    path('cola/metricas/', metricas_cola_push, name='cola-push-metricas'),
 ]
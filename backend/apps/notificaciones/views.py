@@ -10,6 +10,7 @@ from datetime import timedelta
 from django.db.models import Count, Q
 import logging
 
+from . import drenador
 from .models import Notificacion, MensajeTemplate
 from .serializers import (
     NotificacionSerializer,
@@ -22,6 +23,7 @@ from .tasks import enviar_confirmacion_turno_task
 from .services import whatsapp_service
 from apps.clientes.models import Cliente
 from apps.turnos.models import Turno
+from apps.empleados.permissions import IsAdmin
 
 
 class NotificacionViewSet(viewsets.ReadOnlyModelViewSet):
@@ -666,3 +668,16 @@ def twilio_status_webhook(request):
 
     # Twilio espera respuesta 200 vacía o con TwiML
     return Response({'status': 'ok'})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdmin])
+def metricas_cola_push(request):
+    """
+    Estado de la cola de avisos push: profundidad y atraso medidos ahora, y la
+    última foto del drenador continuo (``None`` si no hay ninguno corriendo).
+    """
+    return Response({
+        'cola': drenador.estado_de_la_cola(),
+        'drenador': drenador.metricas_publicadas(),
+    })
@@ -0,0 +1,103 @@
+"""
+Caché de horarios libres por (profesional, fecha).
+
+Guarda los intervalos libres de la jornada de un profesional en un día, que es
+lo que recalculan en cada toque la disponibilidad de la app y
+``horarios_disponibles`` del staff. Los slots de cada servicio se derivan de
+ahí en memoria (dependen solo de la duración y el intervalo).
+
+Invalidación:
+
+- Turnos: las señales de ``apps.turnos.signals`` borran las entradas de los
+  días que ocupaba y ocupa el turno (de ambos profesionales si cambió) cuando
+  se crea, se mueve, se cancela, cambia de estado o se borra. Se borra en el
+  momento y de nuevo al confirmar la transacción, para que un lector que
+  recalculó con el estado anterior no deje la entrada vieja guardada.
+- Agenda del profesional: cada entrada guarda la ventana (apertura, cierre)
+  con la que se calculó; si el horario cambió no coincide y se recalcula. Los
+  días que el profesional no trabaja ni siquiera se consultan.
+
+Los ``QuerySet.update()`` sobre turnos no disparan señales: esas entradas
+vencen por ``TIMEOUT``. La reserva nunca confía en este caché: ``reservar_turno``
+vuelve a chequear contra la base dentro de la transacción.
+"""
+import logging
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'turnos:libres'
+
+# Red de seguridad para escrituras que no pasan por las señales
+TIMEOUT = 10 * 60
+
+
+def _key(profesional_id, fecha):
+    return f'{KEY_PREFIX}:{profesional_id}:{fecha.isoformat()}'
+
+
+def leer(ventanas):
+    """
+    ``ventanas``: ``{(profesional_id, fecha): (apertura, cierre)}``.
+    Devuelve ``{(profesional_id, fecha): huecos}`` de las entradas guardadas
+    con la misma ventana. Si el caché no responde devuelve vacío.
+    """
+    claves = {_key(*par): par for par in ventanas}
+    try:
+        guardados = cache.get_many(list(claves))
+    except Exception:
+        logger.warning('Caché de disponibilidad no disponible', exc_info=True)
+        return {}
+
+    encontrados = {}
+    for clave, (ventana, huecos) in guardados.items():
+        par = claves[clave]
+        if ventana == ventanas[par]:
+            encontrados[par] = huecos
+    return encontrados
+
+
+def guardar(ventanas, huecos):
+    """Guarda los huecos calculados junto con la ventana de cada par"""
+    try:
+        cache.set_many(
+            {_key(*par): (ventanas[par], huecos[par]) for par in huecos},
+            TIMEOUT
+        )
+    except Exception:
+        logger.warning('No se pudo guardar en el caché de disponibilidad', exc_info=True)
+
+
+def dias_ocupados(inicio, fin):
+    """Fechas locales que toca el intervalo [inicio, fin)"""
+    primero = timezone.localtime(inicio).date()
+    ultimo = timezone.localtime(max(fin - timedelta(microseconds=1), inicio)).date()
+    return [primero + timedelta(days=i) for i in range((ultimo - primero).days + 1)]
+
+
+def _borrar(claves):
+    try:
+        cache.delete_many(claves)
+    except Exception:
+        logger.warning('No se pudo invalidar el caché de disponibilidad', exc_info=True)
+
+
+def invalidar(ocupaciones):
+    """
+    ``ocupaciones``: iterable de ``(profesional_id, inicio, fin)``. Borra las
+    entradas de cada día que toca cada intervalo, ahora y al confirmar.
+    """
+    claves = sorted({
+        _key(profesional_id, fecha)
+        for profesional_id, inicio, fin in ocupaciones
+        if profesional_id and inicio and fin
+        for fecha in dias_ocupados(inicio, fin)
+    })
+    if not claves:
+        return
+    _borrar(claves)
+    transaction.on_commit(lambda: _borrar(claves))
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:21
+
+import apps.turnos.models
+import django.contrib.postgres.constraints
+from django.db import migrations, models
+
+
+def verificar_solapamientos(apps, schema_editor):
+    """
+    La restricción no se puede crear si ya hay turnos vigentes solapados. En vez
+    del error genérico de Postgres, listar cuáles son para resolverlos a mano.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT a.id, b.id
+            FROM turnos_turno a
+            JOIN turnos_turno b
+              ON a.profesional_id = b.profesional_id
+             AND a.id < b.id
+             AND a.fecha_hora_inicio < b.fecha_hora_fin
+             AND b.fecha_hora_inicio < a.fecha_hora_fin
+            WHERE a.estado IN ('PENDIENTE', 'CONFIRMADO')
+              AND b.estado IN ('PENDIENTE', 'CONFIRMADO')
+            LIMIT 50
+        """)
+        pares = cursor.fetchall()
+    if pares:
+        detalle = ', '.join(f'#{a} y #{b}' for a, b in pares)
+        raise RuntimeError(
+            f'Hay turnos vigentes solapados del mismo profesional ({detalle}). '
+            'Cancelá o mové uno de cada par y volvé a correr la migración.'
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("turnos", "0002_alter_turno_creado_por"),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_solapamientos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="turno",
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(
+                condition=models.Q(
+                    ("estado__in", ["PENDIENTE", "CONFIRMADO"]),
+                    ("profesional__isnull", False),
+                ),
+                expressions=[
+                    (apps.turnos.models.ProfesionalRange("profesional"), "&&"),
+                    (
+                        apps.turnos.models.TsTzRange(
+                            "fecha_hora_inicio", "fecha_hora_fin"
+                        ),
+                        "&&",
+                    ),
+                ],
+                name="turno_sin_solapamiento",
+            ),
+        ),
+    ]
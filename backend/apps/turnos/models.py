@@ -1,3 +1,5 @@
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, BigIntegerRangeField, RangeOperators
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -6,10 +8,53 @@ from apps.servicios.models import Servicio
 from apps.empleados.models import Usuario, Sucursal
 
 
+# Nombre de la restricción que impide dos turnos solapados del mismo profesional
+SOLAPAMIENTO = 'turno_sin_solapamiento'
+
+
+class TsTzRange(models.Func):
+    """tstzrange(inicio, fin) — intervalo [inicio, fin) para la restricción de solapamiento"""
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+class ProfesionalRange(models.Func):
+    """
+    int8range(profesional, profesional, '[]'): el profesional como rango de un
+    solo valor. Dos rangos así se solapan solo si son el mismo profesional, y
+    la igualdad queda expresada con el operador de rangos que GiST ya soporta,
+    sin depender de la extensión btree_gist.
+    """
+    function = 'INT8RANGE'
+    output_field = BigIntegerRangeField()
+
+    def __init__(self, field):
+        super().__init__(field, field, models.Value('[]'))
+
+
+def es_solapamiento(error):
+    """True si el IntegrityError es la restricción de turnos solapados"""
+    diag = getattr(error.__cause__, 'diag', None)
+    return getattr(diag, 'constraint_name', None) == SOLAPAMIENTO
+
+
 class Turno(models.Model):
     """
     Sistema de turnos/citas con prevención de double-booking
+
+    La base impide que un profesional tenga dos turnos pendientes o confirmados
+    que se pisen (restricción de exclusión sobre tstzrange). Los chequeos en
+    Python quedan para dar un mensaje claro; la garantía es la restricción.
+
+    Cada instancia recuerda los valores de ``CAMPOS_SEGUIDOS`` con los que se
+    cargó (o se guardó por última vez), así las señales comparan contra el
+    estado anterior sin volver a leer la fila.
     """
+    CAMPOS_SEGUIDOS = (
+        'estado', 'estado_pago', 'fecha_hora_inicio', 'fecha_hora_fin',
+        'sucursal_id', 'cliente_id', 'servicio_id', 'profesional_id',
+    )
+
     class Estado(models.TextChoices):
         PENDIENTE = 'PENDIENTE', 'Pendiente de Confirmación'
         CONFIRMADO = 'CONFIRMADO', 'Confirmado'
@@ -104,10 +149,75 @@ class Turno(models.Model):
             models.Index(fields=['cliente', 'fecha_hora_inicio']),
             models.Index(fields=['estado', 'fecha_hora_inicio']),
         ]
+        constraints = [
+            ExclusionConstraint(
+                name=SOLAPAMIENTO,
+                expressions=[
+                    (ProfesionalRange('profesional'), RangeOperators.OVERLAPS),
+                    (TsTzRange('fecha_hora_inicio', 'fecha_hora_fin'), RangeOperators.OVERLAPS),
+                ],
+                # Sin profesional el rango sería infinito y chocaría con todos
+                condition=models.Q(
+                    estado__in=['PENDIENTE', 'CONFIRMADO'],
+                    profesional__isnull=False,
+                ),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.cliente.nombre_completo} - {self.servicio.nombre} - {self.fecha_hora_inicio.strftime('%d/%m/%Y %H:%M')}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._recordar_valores()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None:
+            self._recordar_valores()
+        else:
+            recargados = {self._meta.get_field(campo).attname for campo in fields}
+            self._valores_cargados = {
+                **getattr(self, '_valores_cargados', {}),
+                **{campo: self.__dict__[campo] for campo in self.CAMPOS_SEGUIDOS if campo in recargados},
+            }
+
+    def _recordar_valores(self):
+        # Por __dict__: un campo diferido no se carga solo para recordarlo
+        self._valores_cargados = {
+            campo: self.__dict__[campo]
+            for campo in self.CAMPOS_SEGUIDOS if campo in self.__dict__
+        }
+
+    def valores_anteriores(self):
+        """
+        Valores de ``CAMPOS_SEGUIDOS`` que tiene la fila en la base antes de
+        este guardado; vacío si el turno es nuevo. Sale de lo recordado al
+        cargar: solo consulta si la instancia no vino de la base o vino con
+        campos diferidos.
+        """
+        if self.pk is None:
+            return {}
+        cargados = getattr(self, '_valores_cargados', {})
+        faltan = [campo for campo in self.CAMPOS_SEGUIDOS if campo not in cargados]
+        if faltan:
+            fila = Turno.objects.filter(pk=self.pk).values(*faltan).first()
+            if fila is None:
+                return {}
+            cargados = {**cargados, **fila}
+        return cargados
+
+    def _sucursal_de(self, relacion, modelo):
+        """sucursal_id del profesional o servicio, sin cargarlo si no está en memoria"""
+        campo = self._meta.get_field(relacion)
+        if campo.is_cached(self):
+            return getattr(self, relacion).sucursal_id
+        return modelo.objects.filter(
+            pk=getattr(self, campo.attname)
+        ).values_list('sucursal_id', flat=True).first()
+
     def clean(self):
         """
         Validaciones antes de guardar
@@ -116,12 +226,20 @@ class Turno(models.Model):
         if self.fecha_hora_fin <= self.fecha_hora_inicio:
             raise ValidationError("La fecha de fin debe ser posterior a la fecha de inicio")
 
+        # Sucursal de profesional y servicio: solo si alguna relación cambió
+        # desde que se cargó (o el turno es nuevo); un cambio de estado no
+        # vuelve a leerlas
+        anteriores = getattr(self, '_valores_cargados', {})
+        relaciones = ('sucursal_id', 'servicio_id', 'profesional_id')
+        if all(campo in anteriores and anteriores[campo] == getattr(self, campo) for campo in relaciones):
+            return
+
         # Validar que el profesional pertenezca a la misma sucursal
-        if self.profesional and self.profesional.sucursal != self.sucursal:
+        if self.profesional_id and self._sucursal_de('profesional', Usuario) != self.sucursal_id:
             raise ValidationError("El profesional debe pertenecer a la misma sucursal")
 
         # Validar que el servicio pertenezca a la misma sucursal
-        if self.servicio.sucursal != self.sucursal:
+        if self._sucursal_de('servicio', Servicio) != self.sucursal_id:
             raise ValidationError("El servicio debe pertenecer a la misma sucursal")
 
     def save(self, *args, **kwargs):
@@ -136,8 +254,17 @@ class Turno(models.Model):
         if not self.monto_total:
             self.monto_total = self.servicio.precio
 
-        self.full_clean()
+        # La restricción de solapamiento la valida la base al insertar: chequearla
+        # acá sería una consulta más y no evita la carrera entre dos requests.
+        # Lo mismo la existencia de cada FK (una consulta por relación); clean()
+        # compara ids
+        self.full_clean(
+            exclude=[campo.name for campo in self._meta.concrete_fields if campo.is_relation],
+            validate_constraints=False,
+        )
         super().save(*args, **kwargs)
+        # Después de las señales post_save, que todavía comparan con lo anterior
+        self._recordar_valores()
 
     def verificar_disponibilidad(self):
         """
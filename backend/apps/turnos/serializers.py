@@ -1,7 +1,7 @@
 from rest_framework import serializers
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.utils import timezone
-from .models import Turno
+from .models import Turno, es_solapamiento
 from apps.clientes.serializers import ClienteSerializer
 from apps.servicios.serializers import ServicioSerializer
 from apps.empleados.serializers import UsuarioSerializer
@@ -151,7 +151,10 @@ class TurnoCreateUpdateSerializer(serializers.ModelSerializer):
             if 'monto_total' not in validated_data:
                 validated_data['monto_total'] = validated_data['servicio'].precio
 
-            turno = Turno.objects.create(**validated_data)
+            try:
+                turno = Turno.objects.create(**validated_data)
+            except IntegrityError as exc:
+                raise self._error_de_solapamiento(exc)
             return turno
 
     def update(self, instance, validated_data):
@@ -161,5 +164,20 @@ class TurnoCreateUpdateSerializer(serializers.ModelSerializer):
         with transaction.atomic():
             for attr, value in validated_data.items():
                 setattr(instance, attr, value)
-            instance.save()
+            try:
+                instance.save()
+            except IntegrityError as exc:
+                raise self._error_de_solapamiento(exc)
             return instance
+
+    @staticmethod
+    def _error_de_solapamiento(exc):
+        """
+        Otro request tomó el horario entre validate() y el guardado: la
+        restricción de la base lo rechaza y se responde como en validate().
+        """
+        if not es_solapamiento(exc):
+            return exc
+        return serializers.ValidationError({
+            'fecha_hora_inicio': 'El profesional ya tiene un turno asignado en ese horario'
+        })
@@ -8,14 +8,19 @@ endpoint ``UsuarioViewSet.horarios_disponibles``; se extrajo acá para que la ap
 reserve con exactamente las mismas reglas y no haya dos implementaciones que
 puedan divergir.
 """
+from bisect import bisect_right
 from datetime import datetime, time, timedelta
+from itertools import groupby
+from operator import itemgetter
 
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
 from apps.empleados.models import Usuario
 
-from .models import Turno
+from . import cache as cache_libres
+from .models import Turno, es_solapamiento
+from .signals import estados_cambiados
 
 # Horario asumido cuando el profesional no tiene agenda cargada en su ficha.
 HORARIO_DEFAULT_INICIO = time(8, 0)
@@ -48,6 +53,15 @@ FECHAS_A_OFRECER = 30
 # Estados que ocupan la agenda (los demás liberan el horario).
 ESTADOS_QUE_OCUPAN = [Turno.Estado.PENDIENTE, Turno.Estado.CONFIRMADO]
 
+# Tope de turnos por pedido de cambio de estado masivo.
+MAXIMO_CAMBIO_MASIVO = 200
+
+# Resultado por turno de ``cambiar_estados``.
+CAMBIADO = 'ok'
+SIN_CAMBIOS = 'sin_cambios'
+NO_ENCONTRADO = 'no_encontrado'
+SOLAPADO = 'solapado'
+
 DIAS_SEMANA = {
     0: 'lunes', 1: 'martes', 2: 'miercoles', 3: 'jueves',
     4: 'viernes', 5: 'sabado', 6: 'domingo',
@@ -221,6 +235,104 @@ def _turnos_que_ocupan(profesional, desde, hasta, excluir_turno_id=None):
     return qs.order_by('fecha_hora_inicio')
 
 
+def _fusionar(turnos):
+    """
+    [(inicio, fin)] ordenados por inicio → intervalos ocupados en hora local,
+    fusionando los que se solapan o se tocan. Dos turnos pegados son un solo
+    bloque: ningún slot con duración puede empezar entre medio.
+    """
+    bloques = []
+    for inicio, fin in turnos:
+        # localtime(): la DB devuelve UTC y los slots se formatean en hora local
+        inicio, fin = timezone.localtime(inicio), timezone.localtime(fin)
+        if bloques and inicio <= bloques[-1][1]:
+            if fin > bloques[-1][1]:
+                bloques[-1] = (bloques[-1][0], fin)
+        else:
+            bloques.append((inicio, fin))
+    return bloques
+
+
+def _huecos(apertura, cierre, bloques):
+    """
+    Intervalos libres de la jornada: el complemento de los bloques ocupados
+    (ordenados y disjuntos) dentro de [apertura, cierre). Arranca por
+    bisección en el primer bloque que termina después de la apertura, así que
+    cada día cuesta lo que sus propios turnos y no los de todo el rango.
+    """
+    huecos = []
+    cursor = apertura
+    i = bisect_right(bloques, apertura, key=itemgetter(1))
+    while i < len(bloques) and bloques[i][0] < cierre:
+        inicio, fin = bloques[i]
+        if inicio > cursor:
+            huecos.append((cursor, inicio))
+        cursor = max(cursor, fin)
+        i += 1
+    if cursor < cierre:
+        huecos.append((cursor, cierre))
+    return huecos
+
+
+def _slots_en_huecos(huecos, duracion, intervalo, no_antes_de=None):
+    """
+    Recorre cada hueco con la granularidad del profesional. Cada hueco empieza
+    donde termina un turno, así que el horario se ofrece apenas se libera.
+    """
+    slots = []
+    for inicio, fin in huecos:
+        cursor = inicio
+        while cursor + duracion <= fin:
+            if no_antes_de is None or cursor >= no_antes_de:
+                slots.append({'inicio': cursor, 'fin': cursor + duracion})
+            cursor += intervalo
+    return slots
+
+
+def _bloques_por_profesional(profesional_ids, desde, hasta):
+    """
+    Bloques ocupados de varios profesionales en [desde, hasta), en UNA consulta:
+    ``{profesional_id: [(inicio, fin), ...]}``.
+    """
+    turnos = Turno.objects.filter(
+        profesional_id__in=profesional_ids,
+        estado__in=ESTADOS_QUE_OCUPAN,
+        fecha_hora_inicio__lt=hasta,
+        fecha_hora_fin__gt=desde,
+    ).order_by('profesional_id', 'fecha_hora_inicio').values_list(
+        'profesional_id', 'fecha_hora_inicio', 'fecha_hora_fin'
+    )
+    return {
+        profesional_id: _fusionar((inicio, fin) for _, inicio, fin in filas)
+        for profesional_id, filas in groupby(turnos, key=itemgetter(0))
+    }
+
+
+def _huecos_por_dia(ventanas):
+    """
+    ``ventanas``: ``{(profesional_id, fecha): (apertura, cierre)}`` →
+    ``{(profesional_id, fecha): huecos}``. Lo que no está en el caché se
+    calcula con UNA consulta de turnos para todos los pares que faltan.
+    """
+    huecos = cache_libres.leer(ventanas)
+    faltan = [par for par in ventanas if par not in huecos]
+    if not faltan:
+        return huecos
+
+    bloques = _bloques_por_profesional(
+        {profesional_id for profesional_id, _ in faltan},
+        min(ventanas[par][0] for par in faltan),
+        max(ventanas[par][1] for par in faltan),
+    )
+    calculados = {
+        par: _huecos(*ventanas[par], bloques.get(par[0], []))
+        for par in faltan
+    }
+    cache_libres.guardar(ventanas, calculados)
+    huecos.update(calculados)
+    return huecos
+
+
 def calcular_slots(profesional, servicio, fecha, *, no_antes_de=None, excluir_turno_id=None):
     """
     Horarios libres del profesional para un servicio en una fecha.
@@ -233,38 +345,65 @@ def calcular_slots(profesional, servicio, fecha, *, no_antes_de=None, excluir_tu
     ``no_antes_de``: descarta slots anteriores a ese instante (para no ofrecer
     horarios de hoy que ya pasaron).
 
+    ``excluir_turno_id`` (reprogramar un turno sin chocar consigo mismo) no
+    pasa por el caché de huecos.
+
     Devuelve una lista de ``{'inicio': datetime, 'fin': datetime}`` (aware).
     """
     if not trabaja_el_dia(profesional, fecha):
         return []
 
-    apertura, cierre = _ventana_del_dia(profesional, fecha)
-    duracion = timedelta(minutes=servicio.duracion_minutos)
-    intervalo = timedelta(minutes=profesional.intervalo_minutos or 30)
+    ventana = _ventana_del_dia(profesional, fecha)
+    if excluir_turno_id:
+        ocupados = _turnos_que_ocupan(profesional, *ventana, excluir_turno_id)
+        huecos = _huecos(*ventana, _fusionar(ocupados.values_list('fecha_hora_inicio', 'fecha_hora_fin')))
+    else:
+        huecos = _huecos_por_dia({(profesional.id, fecha): ventana})[(profesional.id, fecha)]
+
+    return _slots_en_huecos(
+        huecos,
+        timedelta(minutes=servicio.duracion_minutos),
+        timedelta(minutes=profesional.intervalo_minutos or 30),
+        no_antes_de,
+    )
 
-    ocupados = list(_turnos_que_ocupan(profesional, apertura, cierre, excluir_turno_id))
 
-    slots = []
-    cursor = apertura
-    while cursor + duracion <= cierre:
-        slot_fin = cursor + duracion
+def disponibilidad_por_fecha(servicio, fechas, *, no_antes_de=None):
+    """
+    Horarios libres del servicio para varias fechas, combinando a todos los
+    profesionales de la sucursal: ``{fecha: [slot, ...]}``.
 
-        conflicto = next(
-            (t for t in ocupados if cursor < t.fecha_hora_fin and slot_fin > t.fecha_hora_inicio),
-            None,
-        )
-        if conflicto:
-            # El fin del turno en conflicto siempre es > cursor, así que avanza sí o sí.
-            # localtime() es necesario: la DB devuelve el datetime en UTC y el cursor
-            # tiene que seguir en hora local para que los slots se formateen bien.
-            cursor = timezone.localtime(conflicto.fecha_hora_fin)
-            continue
+    Son a lo sumo dos consultas (profesionales y turnos que ocupan los días que
+    no estaban en el caché), sin importar cuántas fechas o profesionales haya.
+    Cada horario aparece UNA sola vez, con el primer profesional libre.
+    """
+    fechas = sorted(set(fechas))
+    profesionales = list(profesionales_de(servicio.sucursal))
+    ventanas = {
+        (profesional.id, fecha): _ventana_del_dia(profesional, fecha)
+        for profesional in profesionales
+        for fecha in fechas
+        if trabaja_el_dia(profesional, fecha)
+    }
+    huecos = _huecos_por_dia(ventanas) if ventanas else {}
+    duracion = timedelta(minutes=servicio.duracion_minutos)
 
-        if no_antes_de is None or cursor >= no_antes_de:
-            slots.append({'inicio': cursor, 'fin': slot_fin})
-        cursor += intervalo
+    resultado = {}
+    for fecha in fechas:
+        por_horario = {}
+        for profesional in profesionales:
+            if (profesional.id, fecha) not in huecos:
+                continue
+            slots = _slots_en_huecos(
+                huecos[(profesional.id, fecha)], duracion,
+                timedelta(minutes=profesional.intervalo_minutos or 30),
+                no_antes_de,
+            )
+            for slot in slots:
+                por_horario.setdefault(slot['inicio'], {**slot, 'profesional': profesional})
+        resultado[fecha] = [por_horario[inicio] for inicio in sorted(por_horario)]
 
-    return slots
+    return resultado
 
 
 def slots_agregados(servicio, fecha, *, no_antes_de=None):
@@ -275,12 +414,30 @@ def slots_agregados(servicio, fecha, *, no_antes_de=None):
     cliente elige hora y el sistema resuelve con quién, sin exponer la agenda de
     cada empleado.
     """
-    por_horario = {}
-    for profesional in profesionales_de(servicio.sucursal):
-        for slot in calcular_slots(profesional, servicio, fecha, no_antes_de=no_antes_de):
-            por_horario.setdefault(slot['inicio'], {**slot, 'profesional': profesional})
+    return disponibilidad_por_fecha(servicio, [fecha], no_antes_de=no_antes_de)[fecha]
+
+
+def fechas_con_disponibilidad(servicio, desde, hasta, *, no_antes_de=None, hoy=None):
+    """
+    Fechas entre ``desde`` y ``hasta`` (inclusive) que el cliente puede reservar
+    desde la app y tienen al menos un horario libre. Alimenta el calendario
+    mensual: se calcula todo el rango de una vez en vez de día por día.
+    """
+    hoy = hoy or timezone.localdate()
+    desde = max(desde, primera_fecha_reservable(hoy))
+    hasta = min(hasta, hoy + timedelta(days=DIAS_MAXIMOS_A_FUTURO))
+
+    candidatas = []
+    fecha = desde
+    while fecha <= hasta:
+        if motivo_fecha_no_reservable(servicio, fecha, hoy=hoy) is None:
+            candidatas.append(fecha)
+        fecha += timedelta(days=1)
 
-    return [por_horario[inicio] for inicio in sorted(por_horario)]
+    if not candidatas:
+        return []
+    disponibilidad = disponibilidad_por_fecha(servicio, candidatas, no_antes_de=no_antes_de)
+    return [fecha for fecha in candidatas if disponibilidad[fecha]]
 
 
 def _entra_en_la_jornada(profesional, inicio, fin):
@@ -295,12 +452,14 @@ def _entra_en_la_jornada(profesional, inicio, fin):
 def reservar_turno(*, cliente, servicio, inicio, profesional=None, notas='',
                    estado=Turno.Estado.PENDIENTE, creado_por=None):
     """
-    Crea un turno verificando la disponibilidad dentro de la transacción.
+    Crea un turno; la base decide si el horario sigue libre.
 
-    Sin ``profesional`` asigna el primero libre de la sucursal. Toma un lock sobre
-    la fila del profesional antes de re-chequear los conflictos: eso serializa dos
-    reservas concurrentes del mismo profesional (el chequeo previo por sí solo no
-    alcanza, porque ninguna de las dos ve el turno que la otra está insertando).
+    Sin ``profesional`` prueba con los de la sucursal en orden, salteando los
+    que ya se ven ocupados. Cada intento es un INSERT en su propio savepoint: si
+    otro turno vigente del profesional se solapa, la restricción de exclusión
+    ``turno_sin_solapamiento`` lo rechaza y se pasa al siguiente. Dos reservas
+    simultáneas del mismo horario no se bloquean entre sí ni bloquean la fila
+    del profesional: una inserta y la otra recibe la violación.
 
     Lanza ``TurnoNoDisponible`` si el horario ya no se puede tomar.
     """
@@ -312,29 +471,36 @@ def reservar_turno(*, cliente, servicio, inicio, profesional=None, notas='',
     if not candidatos:
         raise TurnoNoDisponible('El centro no tiene profesionales disponibles')
 
-    with transaction.atomic():
-        for candidato in candidatos:
-            if not _entra_en_la_jornada(candidato, inicio, fin):
-                continue
-
-            # Lock de la fila del profesional: serializa reservas simultáneas.
-            Usuario.objects.select_for_update().get(pk=candidato.pk)
+    # Una sola lectura sin locks para no intentar inserts que ya se sabe que
+    # fallan; lo que cambie entre esta consulta y el INSERT lo ataja la base
+    ocupados = set(Turno.objects.filter(
+        profesional__in=candidatos,
+        estado__in=ESTADOS_QUE_OCUPAN,
+        fecha_hora_inicio__lt=fin,
+        fecha_hora_fin__gt=inicio,
+    ).values_list('profesional_id', flat=True))
 
-            if _turnos_que_ocupan(candidato, inicio, fin).exists():
-                continue
+    for candidato in candidatos:
+        if candidato.id in ocupados or not _entra_en_la_jornada(candidato, inicio, fin):
+            continue
 
-            return Turno.objects.create(
-                sucursal=servicio.sucursal,
-                cliente=cliente,
-                servicio=servicio,
-                profesional=candidato,
-                fecha_hora_inicio=inicio,
-                fecha_hora_fin=fin,
-                estado=estado,
-                monto_total=servicio.precio,
-                notas=notas,
-                creado_por=creado_por,
-            )
+        try:
+            with transaction.atomic():
+                return Turno.objects.create(
+                    sucursal=servicio.sucursal,
+                    cliente=cliente,
+                    servicio=servicio,
+                    profesional=candidato,
+                    fecha_hora_inicio=inicio,
+                    fecha_hora_fin=fin,
+                    estado=estado,
+                    monto_total=servicio.precio,
+                    notas=notas,
+                    creado_por=creado_por,
+                )
+        except IntegrityError as exc:
+            if not es_solapamiento(exc):
+                raise
 
     raise TurnoNoDisponible('Ese horario ya no está disponible')
 
@@ -345,3 +511,67 @@ def puede_cancelar(turno, *, ahora=None):
         return False
     ahora = ahora or timezone.now()
     return turno.fecha_hora_inicio - ahora >= timedelta(hours=HORAS_MINIMAS_CANCELACION)
+
+
+def cambiar_estados(sucursal, turno_ids, estado):
+    """
+    Pasa varios turnos de la sucursal a ``estado`` en una sola transacción.
+
+    Devuelve ``{turno_id: resultado}`` con ``CAMBIADO``, ``SIN_CAMBIOS``,
+    ``NO_ENCONTRADO`` o ``SOLAPADO``. Los turnos se leen (y bloquean) en una
+    consulta y se actualizan con un único UPDATE. Las reactivaciones (un turno
+    que vuelve a ocupar la agenda) van de a una en su savepoint: cada una puede
+    chocar con la restricción de solapamiento sin tirar abajo al resto.
+
+    No pasa por ``save()``: los efectos de las señales post_save (avisos,
+    WhatsApp, caché de disponibilidad, analytics) los aplican en lote los
+    receptores de ``estados_cambiados``.
+    """
+    ids = list(dict.fromkeys(turno_ids))
+    resultados = dict.fromkeys(ids, NO_ENCONTRADO)
+
+    with transaction.atomic():
+        turnos = list(
+            Turno.objects.filter(sucursal=sucursal, pk__in=ids)
+            .select_related('cliente', 'servicio', 'profesional', 'sucursal__centro_estetica')
+            .select_for_update(of=('self',))
+        )
+
+        anteriores = {}
+        directos, reactivados = [], []
+        for turno in turnos:
+            if turno.estado == estado:
+                resultados[turno.id] = SIN_CAMBIOS
+                continue
+            anteriores[turno.id] = turno.estado
+            if estado in ESTADOS_QUE_OCUPAN and turno.estado not in ESTADOS_QUE_OCUPAN:
+                reactivados.append(turno)
+            else:
+                directos.append(turno)
+
+        ahora = timezone.now()
+        Turno.objects.filter(pk__in=[turno.id for turno in directos]).update(
+            estado=estado, actualizado_en=ahora
+        )
+        cambiados = directos
+        for turno in reactivados:
+            try:
+                with transaction.atomic():
+                    Turno.objects.filter(pk=turno.id).update(estado=estado, actualizado_en=ahora)
+            except IntegrityError as exc:
+                if not es_solapamiento(exc):
+                    raise
+                resultados[turno.id] = SOLAPADO
+                continue
+            cambiados.append(turno)
+
+        for turno in cambiados:
+            turno.estado = estado
+            turno.actualizado_en = ahora
+            turno._recordar_valores()
+            resultados[turno.id] = CAMBIADO
+
+        if cambiados:
+            estados_cambiados.send(sender=Turno, turnos=cambiados, anteriores=anteriores)
+
+    return resultados
@@ -3,32 +3,38 @@ Signals for appointments (turnos) app to automatically create financial transact
 when payment states change (deposits and completed services), and to send WhatsApp
 notifications when appointments are created or modified.
 """
-from django.db.models.signals import pre_save, post_save
-from django.dispatch import receiver
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
 from django.utils import timezone
+from . import cache as cache_libres
 from .models import Turno
 
 
+# Sent by services.cambiar_estados after a bulk state change, which does not go
+# through save(). ``turnos`` are the updated instances (cliente, servicio,
+# profesional and sucursal already loaded) and ``anteriores`` maps each id to
+# its previous estado. Receivers apply the post_save side effects in batch.
+estados_cambiados = Signal()
+
+
 @receiver(pre_save, sender=Turno)
 def track_previous_state(sender, instance, **kwargs):
     """
     Track the previous state of the appointment before saving.
     This allows us to detect state changes in post_save.
+
+    The previous values come from the snapshot the model takes when it is
+    loaded (Turno.valores_anteriores), so this no longer re-reads the row.
     """
-    if instance.pk:
-        try:
-            old_instance = Turno.objects.get(pk=instance.pk)
-            instance._previous_estado = old_instance.estado
-            instance._previous_estado_pago = old_instance.estado_pago
-            instance._previous_inicio = old_instance.fecha_hora_inicio
-        except Turno.DoesNotExist:
-            instance._previous_estado = None
-            instance._previous_estado_pago = None
-            instance._previous_inicio = None
-    else:
-        instance._previous_estado = None
-        instance._previous_estado_pago = None
-        instance._previous_inicio = None
+    anteriores = instance.valores_anteriores()
+    instance._previous_estado = anteriores.get('estado')
+    instance._previous_estado_pago = anteriores.get('estado_pago')
+    instance._previous_inicio = anteriores.get('fecha_hora_inicio')
+    instance._previous_fin = anteriores.get('fecha_hora_fin')
+    instance._previous_profesional_id = anteriores.get('profesional_id')
 
 
 @receiver(post_save, sender=Turno)
@@ -279,6 +285,57 @@ def send_whatsapp_notifications(sender, instance, created, **kwargs):
             print(f"⚠️ Cliente {instance.cliente.nombre_completo} does not accept WhatsApp or has no phone")
 
 
+@receiver(estados_cambiados, sender=Turno)
+def send_whatsapp_notifications_en_lote(sender, turnos, anteriores, **kwargs):
+    """
+    Cancellation WhatsApp for a bulk state change. Tasks are queued on commit
+    so the worker reads the turnos already cancelled.
+    """
+    from apps.notificaciones.tasks import enviar_cancelacion_turno_task
+
+    for turno in turnos:
+        if (turno.estado == Turno.Estado.CANCELADO
+                and turno.cliente.acepta_whatsapp and turno.cliente.telefono):
+            transaction.on_commit(partial(enviar_cancelacion_turno_task.delay, turno.id))
+
+
+# ==================== AVAILABILITY CACHE ====================
+
+@receiver(post_save, sender=Turno)
+def invalidar_disponibilidad(sender, instance, created, **kwargs):
+    """
+    Borra del caché de horarios libres los días del turno (el anterior y el
+    actual) cuando cambia algo que mueve la agenda: alta, estado, horario o
+    profesional. Cambios de pago o notas no tocan la disponibilidad.
+    """
+    actual = (instance.profesional_id, instance.fecha_hora_inicio, instance.fecha_hora_fin)
+    if created:
+        cache_libres.invalidar([actual])
+        return
+
+    anterior = (
+        getattr(instance, '_previous_profesional_id', None),
+        getattr(instance, '_previous_inicio', None),
+        getattr(instance, '_previous_fin', None),
+    )
+    if anterior != actual or getattr(instance, '_previous_estado', None) != instance.estado:
+        cache_libres.invalidar([anterior, actual])
+
+
+@receiver(estados_cambiados, sender=Turno)
+def invalidar_disponibilidad_en_lote(sender, turnos, anteriores, **kwargs):
+    cache_libres.invalidar([
+        (turno.profesional_id, turno.fecha_hora_inicio, turno.fecha_hora_fin) for turno in turnos
+    ])
+
+
+@receiver(post_delete, sender=Turno)
+def invalidar_disponibilidad_al_borrar(sender, instance, **kwargs):
+    cache_libres.invalidar([
+        (instance.profesional_id, instance.fecha_hora_inicio, instance.fecha_hora_fin)
+    ])
+
+
 # ==================== PUSH NOTIFICATION SIGNALS ====================
 
 @receiver(post_save, sender=Turno)
@@ -339,3 +396,36 @@ def encolar_avisos_push(sender, instance, created, **kwargs):
             despacho.descartar_pendientes(
                 clave_prefijo=clave_de_turno(instance.id, evento)
             )
+
+
+@receiver(estados_cambiados, sender=Turno)
+def encolar_avisos_push_en_lote(sender, turnos, anteriores, **kwargs):
+    """
+    ``encolar_avisos_push`` para un cambio de estado masivo: un solo DELETE
+    para los recordatorios de los cancelados y un ``bulk_create`` para los
+    avisos nuevos.
+    """
+    from apps.notificaciones import despacho, eventos
+    from apps.notificaciones.disparadores import clave_de_turno, contexto_de_turno
+
+    # Primero se descartan los pendientes: el prefijo también abarcaría el
+    # aviso de cancelación que se crea después
+    despacho.descartar_pendientes_de_varios(clave_prefijos=[
+        f'turno:{turno.id}:' for turno in turnos if turno.estado == Turno.Estado.CANCELADO
+    ])
+
+    por_estado = {
+        Turno.Estado.CONFIRMADO: eventos.TURNO_CONFIRMADO,
+        Turno.Estado.CANCELADO: eventos.TURNO_CANCELADO,
+    }
+    despacho.crear_avisos_para_clientes(
+        despacho.SolicitudAviso(
+            evento=por_estado[turno.estado],
+            cliente=turno.cliente,
+            contexto=contexto_de_turno(turno),
+            clave=clave_de_turno(turno.id, por_estado[turno.estado]),
+            datos_extra={'turnoId': turno.id},
+        )
+        for turno in turnos
+        if turno.estado in por_estado and anteriores[turno.id] != turno.estado
+    )
@@ -0,0 +1,135 @@
+"""
+Tests del modelo Turno: seguimiento de cambios desde la carga y validación
+por ids.
+"""
+import time as reloj
+from datetime import time, timedelta
+from decimal import Decimal
+
+import pytest
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.clientes.models import Cliente
+from apps.empleados.models import CentroEstetica, Sucursal, Usuario
+from apps.servicios.models import Servicio
+from apps.turnos.models import Turno
+
+
+class TurnoTestBase(TestCase):
+    def setUp(self):
+        self.centro = CentroEstetica.objects.create(
+            nombre='Centro', telefono='1111', email='c@centro.com'
+        )
+        self.sucursal = Sucursal.objects.create(
+            centro_estetica=self.centro, nombre='Suc', direccion='Calle 1',
+            telefono='1111', ciudad='CABA', provincia='BA',
+        )
+        self.ana = Usuario.objects.create_user(
+            username='ana', password='x', centro_estetica=self.centro, sucursal=self.sucursal,
+        )
+        self.servicio = Servicio.objects.create(
+            sucursal=self.sucursal, nombre='Facial', duracion_minutos=60, precio=Decimal('20000'),
+        )
+        self.cliente = Cliente.objects.create(
+            centro_estetica=self.centro, nombre='Flor', apellido='A', telefono='11',
+            acepta_whatsapp=False,
+        )
+        self.fecha = timezone.localdate() + timedelta(days=3)
+
+    def _hora(self, hh, dias=0):
+        return timezone.make_aware(
+            timezone.datetime.combine(self.fecha + timedelta(days=dias), time(hh))
+        )
+
+    def _turnos(self, cantidad):
+        return Turno.objects.bulk_create(
+            Turno(
+                sucursal=self.sucursal, cliente=self.cliente, servicio=self.servicio,
+                profesional=self.ana, fecha_hora_inicio=self._hora(8 + i % 12, dias=i // 12),
+                fecha_hora_fin=self._hora(9 + i % 12, dias=i // 12),
+                estado=Turno.Estado.PENDIENTE, monto_total=self.servicio.precio,
+            )
+            for i in range(cantidad)
+        )
+
+
+class SeguimientoDeCambiosTests(TurnoTestBase):
+    def test_cambiar_estado_no_relee_el_turno_ni_sus_relaciones(self):
+        self._turnos(1)
+        turno = Turno.objects.get()
+        turno.estado_pago = Turno.EstadoPago.PAGADO
+
+        with CaptureQueriesContext(connection) as consultas:
+            turno.save()
+
+        tablas = [q['sql'] for q in consultas.captured_queries]
+        self.assertFalse([
+            sql for sql in tablas
+            if sql.startswith('SELECT') and 'WHERE "turnos_turno"."id" =' in sql
+        ])
+        self.assertFalse([sql for sql in tablas if 'empleados_usuario' in sql or 'servicios_servicio' in sql])
+
+    def test_las_senales_ven_el_estado_anterior(self):
+        self._turnos(1)
+        turno = Turno.objects.get()
+
+        turno.estado = Turno.Estado.CONFIRMADO
+        turno.save()
+        self.assertEqual(turno._previous_estado, Turno.Estado.PENDIENTE)
+
+        # Un segundo guardado compara contra lo último guardado, no contra la carga
+        turno.estado = Turno.Estado.COMPLETADO
+        turno.save()
+        self.assertEqual(turno._previous_estado, Turno.Estado.CONFIRMADO)
+
+    def test_instancia_armada_a_mano_lee_la_fila(self):
+        original = self._turnos(1)[0]
+        Turno.objects.filter(pk=original.pk).update(estado=Turno.Estado.CONFIRMADO)
+        turno = Turno.objects.only('id', 'estado').get()
+
+        self.assertEqual(turno.valores_anteriores()['profesional_id'], self.ana.id)
+        self.assertEqual(turno.valores_anteriores()['estado'], Turno.Estado.CONFIRMADO)
+
+    def test_valida_sucursal_cuando_cambia_el_profesional(self):
+        self._turnos(1)
+        otra = Sucursal.objects.create(
+            centro_estetica=self.centro, nombre='Otra', direccion='Calle 2',
+            telefono='2222', ciudad='CABA', provincia='BA',
+        )
+        beto = Usuario.objects.create_user(
+            username='beto', password='x', centro_estetica=self.centro, sucursal=otra,
+        )
+        turno = Turno.objects.get()
+        turno.profesional_id = beto.id
+
+        with self.assertRaisesMessage(ValidationError, 'misma sucursal'):
+            turno.save()
+
+
+@pytest.mark.benchmark
+class TransicionesBenchmark(TurnoTestBase):
+    """
+    Turnos por segundo y consultas por guardado al pasar turnos cargados de la
+    base por PENDIENTE → CONFIRMADO → COMPLETADO.
+    """
+    TURNOS = 300
+
+    def test_transiciones_por_segundo(self):
+        self._turnos(self.TURNOS)
+        guardados = 0
+
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = reloj.perf_counter()
+            for estado in (Turno.Estado.CONFIRMADO, Turno.Estado.COMPLETADO):
+                for turno in Turno.objects.filter(sucursal=self.sucursal):
+                    turno.estado = estado
+                    turno.save()
+                    guardados += 1
+            duracion = reloj.perf_counter() - inicio
+
+        print(f'\nTransiciones de turno: {guardados} en {duracion:.2f}s '
+              f'({guardados / duracion:.0f}/s, {len(consultas) / guardados:.1f} consultas por guardado)')
@@ -4,27 +4,48 @@ Tests de la lógica compartida de disponibilidad y reserva (apps.turnos.services
 La usan tanto el CRM del staff (``horarios_disponibles``) como la app del cliente,
 así que se testea acá una sola vez.
 """
+import threading
+import time as reloj
 from datetime import time, timedelta
 from decimal import Decimal
 
-from django.test import TestCase
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
+from rest_framework.test import APIClient
 
-from apps.clientes.models import Cliente
+from apps.analytics.models import ClienteMetricas, ResumenDiario
+from apps.clientes.models import Cliente, UsuarioCliente, VinculacionCliente
 from apps.empleados.models import CentroEstetica, Sucursal, Usuario
 from apps.servicios.models import Servicio
-from apps.turnos.models import Turno
+from apps.turnos.models import Turno, es_solapamiento
+from apps.notificaciones import eventos
+from apps.notificaciones.models import Aviso
+from apps.turnos import services
 from apps.turnos.services import (
     TurnoNoDisponible,
     calcular_slots,
+    cambiar_estados,
+    disponibilidad_por_fecha,
     puede_cancelar,
     reservar_turno,
     slots_agregados,
 )
 
 
-class ServiciosDeTurnosTests(TestCase):
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM)
+class TurnosTestBase(TestCase):
     def setUp(self):
+        cache.clear()
         self.centro = CentroEstetica.objects.create(
             nombre='Centro', telefono='1111', email='c@centro.com'
         )
@@ -59,6 +80,8 @@ class ServiciosDeTurnosTests(TestCase):
             estado=estado, monto_total=self.servicio.precio,
         )
 
+
+class ServiciosDeTurnosTests(TurnosTestBase):
     def test_slots_dentro_del_horario_laboral(self):
         self.ana.horario_inicio = time(9, 0)
         self.ana.horario_fin = time(13, 0)
@@ -118,6 +141,43 @@ class ServiciosDeTurnosTests(TestCase):
         # Ana es la primera por id, así que toma los horarios libres de ambos
         self.assertEqual(por_hora[self._hora(9)], self.ana)
 
+    def test_turnos_pegados_y_huecos_cortos(self):
+        self._turno(self._hora(10))                   # 10:00-11:00
+        self._turno(self._hora(11))                   # 11:00-12:00, pegado
+        self._turno(self._hora(12, 30))               # 12:30-13:30: deja 30' libres
+
+        horas = [s['inicio'].strftime('%H:%M') for s in calcular_slots(self.ana, self.servicio, self.fecha)]
+
+        # El servicio dura 60': ni 12:00 entra antes del turno de 12:30
+        self.assertIn('09:00', horas)
+        self.assertNotIn('11:00', horas)
+        self.assertNotIn('12:00', horas)
+        self.assertEqual(horas[horas.index('09:00') + 1], '13:30')
+
+    def test_disponibilidad_por_fecha_en_dos_consultas(self):
+        beto = Usuario.objects.create_user(
+            username='beto', password='x', first_name='Beto',
+            centro_estetica=self.centro, sucursal=self.sucursal, intervalo_minutos=45,
+        )
+        fechas = [self.fecha + timedelta(days=i) for i in range(7)]
+        for i, fecha in enumerate(fechas):
+            self._turno(self._hora(9 + i, fecha=fecha))
+            self._turno(self._hora(14, 15, fecha=fecha), profesional=beto)
+
+        with self.assertNumQueries(2):
+            disponibilidad = disponibilidad_por_fecha(self.servicio, fechas)
+
+        # Mismo resultado que calcular día por día y profesional por profesional
+        for fecha in fechas:
+            esperado = {}
+            for profesional in (self.ana, beto):
+                for slot in calcular_slots(profesional, self.servicio, fecha):
+                    esperado.setdefault(slot['inicio'], profesional)
+            self.assertEqual(
+                [(s['inicio'], s['profesional']) for s in disponibilidad[fecha]],
+                sorted(esperado.items()),
+            )
+
     def test_reservar_asigna_al_primer_profesional_libre(self):
         beto = Usuario.objects.create_user(
             username='beto', password='x', first_name='Beto',
@@ -139,6 +199,25 @@ class ServiciosDeTurnosTests(TestCase):
                 inicio=self._hora(10, 30),
             )
 
+    def test_la_base_rechaza_turnos_solapados(self):
+        self._turno(self._hora(10))
+        self._turno(self._hora(10, 30), estado=Turno.Estado.CANCELADO)
+
+        with self.assertRaises(IntegrityError) as error, transaction.atomic():
+            self._turno(self._hora(10, 30))
+        self.assertTrue(es_solapamiento(error.exception))
+
+        # Pegado al anterior no se solapa: el rango es [inicio, fin)
+        self._turno(self._hora(11))
+
+    def test_reactivar_un_turno_cuyo_horario_se_tomo(self):
+        cancelado = self._turno(self._hora(10), estado=Turno.Estado.CANCELADO)
+        self._turno(self._hora(10))
+
+        cancelado.estado = Turno.Estado.CONFIRMADO
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            cancelado.save()
+
     def test_reservar_rechaza_fuera_de_la_jornada(self):
         self.ana.horario_inicio = time(9, 0)
         self.ana.horario_fin = time(13, 0)
@@ -159,3 +238,289 @@ class ServiciosDeTurnosTests(TestCase):
         self.assertTrue(puede_cancelar(lejano))
         self.assertFalse(puede_cancelar(cercano))
         self.assertFalse(puede_cancelar(completado))
+
+
+@pytest.mark.benchmark
+class ReservaConcurrenteBenchmark(TransactionTestCase):
+    """
+    N hilos reservan a la vez los mismos horarios de una sucursal con pocos
+    profesionales: cada horario termina con un turno por profesional, nunca
+    más, y se mide cuántos intentos por segundo resuelve la restricción.
+    """
+    HILOS = 16
+    PROFESIONALES = 3
+    HORARIOS = 20
+
+    def setUp(self):
+        centro = CentroEstetica.objects.create(nombre='Centro', telefono='1111', email='c@centro.com')
+        self.sucursal = Sucursal.objects.create(
+            centro_estetica=centro, nombre='Suc', direccion='Calle 1',
+            telefono='1111', ciudad='CABA', provincia='BA',
+        )
+        for i in range(self.PROFESIONALES):
+            Usuario.objects.create_user(
+                username=f'pro{i}', password='x', centro_estetica=centro, sucursal=self.sucursal,
+            )
+        self.servicio = Servicio.objects.create(
+            sucursal=self.sucursal, nombre='Facial', duracion_minutos=60, precio=Decimal('20000'),
+        )
+        self.cliente = Cliente.objects.create(
+            centro_estetica=centro, nombre='Flor', apellido='A', telefono='11', acepta_whatsapp=False,
+        )
+        fecha = timezone.localdate() + timedelta(days=3)
+        self.horarios = [
+            timezone.make_aware(timezone.datetime.combine(fecha + timedelta(days=i // 10), time(9 + i % 10)))
+            for i in range(self.HORARIOS)
+        ]
+
+    def reservar_todo(self, barrera, resultados):
+        barrera.wait()
+        try:
+            for inicio in self.horarios:
+                try:
+                    reservar_turno(cliente=self.cliente, servicio=self.servicio, inicio=inicio)
+                    resultados.append(True)
+                except TurnoNoDisponible:
+                    resultados.append(False)
+        finally:
+            connection.close()
+
+    def test_sin_doble_reserva(self):
+        barrera = threading.Barrier(self.HILOS + 1)
+        resultados = []
+        hilos = [
+            threading.Thread(target=self.reservar_todo, args=(barrera, resultados))
+            for _ in range(self.HILOS)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        barrera.wait()
+        inicio = reloj.perf_counter()
+        for hilo in hilos:
+            hilo.join()
+        duracion = reloj.perf_counter() - inicio
+
+        esperados = self.PROFESIONALES * self.HORARIOS
+        self.assertEqual(len(resultados), self.HILOS * self.HORARIOS)
+        self.assertEqual(sum(resultados), esperados)
+        self.assertEqual(Turno.objects.count(), esperados)
+        # Todos los horarios duran una hora y arrancan en punto: sin solapados
+        # es lo mismo que sin inicios repetidos por profesional
+        for profesional_id in Usuario.objects.filter(sucursal=self.sucursal).values_list('id', flat=True):
+            inicios = list(Turno.objects.filter(profesional_id=profesional_id).values_list(
+                'fecha_hora_inicio', flat=True
+            ))
+            self.assertEqual(len(inicios), len(set(inicios)))
+        print(f'\nReservas concurrentes: {self.HILOS} hilos, {len(resultados)} intentos, '
+              f'{esperados} turnos en {duracion:.2f}s ({len(resultados) / duracion:.0f} intentos/s)')
+
+
+class CacheDeDisponibilidadTests(TurnosTestBase):
+    """
+    El caché de huecos por (profesional, fecha) se invalida con cada escritura
+    de turnos que mueve la agenda y con los cambios de horario.
+    """
+
+    def horas(self, fecha=None):
+        fecha = fecha or self.fecha
+        return [s['inicio'].strftime('%H:%M') for s in disponibilidad_por_fecha(self.servicio, [fecha])[fecha]]
+
+    def test_segunda_consulta_sale_del_cache(self):
+        self.horas()
+
+        # Solo la lista de profesionales; los turnos no se vuelven a leer
+        with self.assertNumQueries(1):
+            self.horas()
+
+    def test_alta_cancelacion_y_borrado_invalidan(self):
+        self.assertIn('10:00', self.horas())
+
+        turno = self._turno(self._hora(10))
+        self.assertNotIn('10:00', self.horas())
+
+        turno.estado = Turno.Estado.CANCELADO
+        turno.save()
+        self.assertIn('10:00', self.horas())
+
+        turno.estado = Turno.Estado.CONFIRMADO
+        turno.save()
+        self.assertNotIn('10:00', self.horas())
+
+        turno.delete()
+        self.assertIn('10:00', self.horas())
+
+    def test_mover_el_turno_invalida_los_dos_dias(self):
+        otro_dia = self.fecha + timedelta(days=1)
+        turno = self._turno(self._hora(10))
+        self.horas(), self.horas(otro_dia)
+
+        turno.fecha_hora_inicio = self._hora(10, fecha=otro_dia)
+        turno.fecha_hora_fin = self._hora(11, fecha=otro_dia)
+        turno.save()
+
+        self.assertIn('10:00', self.horas())
+        self.assertNotIn('10:00', self.horas(otro_dia))
+
+    def test_cambio_de_pago_no_invalida(self):
+        turno = self._turno(self._hora(10))
+        self.horas()
+
+        turno.estado_pago = Turno.EstadoPago.PAGADO
+        turno.save()
+
+        with self.assertNumQueries(1):
+            self.horas()
+
+    def test_cambio_de_horario_del_profesional(self):
+        self.horas()
+
+        self.ana.horario_inicio = time(9, 0)
+        self.ana.horario_fin = time(12, 0)
+        self.ana.save()
+
+        self.assertEqual(self.horas(), ['09:00', '09:30', '10:00', '10:30', '11:00'])
+        self.assertEqual(
+            [s['inicio'].strftime('%H:%M') for s in calcular_slots(self.ana, self.servicio, self.fecha)][-1],
+            '11:00'
+        )
+
+    def test_la_reserva_no_confia_en_el_cache(self):
+        self.assertIn('10:00', self.horas())
+        # Un alta que no pasa por las señales deja el caché desactualizado
+        Turno.objects.bulk_create([Turno(
+            sucursal=self.sucursal, cliente=self.cliente, servicio=self.servicio,
+            profesional=self.ana, fecha_hora_inicio=self._hora(10),
+            fecha_hora_fin=self._hora(11), estado=Turno.Estado.CONFIRMADO,
+            monto_total=self.servicio.precio,
+        )])
+        self.assertIn('10:00', self.horas())
+
+        with self.assertRaises(TurnoNoDisponible):
+            reservar_turno(cliente=self.cliente, servicio=self.servicio, inicio=self._hora(10))
+
+
+class CambioDeEstadoMasivoTests(TurnosTestBase):
+    def setUp(self):
+        super().setUp()
+        self.cliente.acepta_whatsapp = True
+        self.cliente.save()
+        usuario = UsuarioCliente.objects.create_user(email='flor@mail.com', password='Secreta123!')
+        VinculacionCliente.objects.create(
+            usuario_cliente=usuario, cliente=self.cliente,
+            metodo_vinculacion=VinculacionCliente.Metodo.CODIGO_INVITACION,
+        )
+
+    def _pendientes(self, *horas):
+        return [self._turno(self._hora(hh), estado=Turno.Estado.PENDIENTE) for hh in horas]
+
+    def test_resultado_por_id(self):
+        pendiente, confirmado = self._pendientes(9, 11)
+        confirmado.estado = Turno.Estado.CONFIRMADO
+        confirmado.save()
+        otra = Sucursal.objects.create(
+            centro_estetica=self.centro, nombre='Otra', direccion='Calle 2',
+            telefono='2222', ciudad='CABA', provincia='BA',
+        )
+        servicio_ajeno = Servicio.objects.create(
+            sucursal=otra, nombre='Facial', duracion_minutos=60, precio=Decimal('20000'),
+        )
+        ajeno = Turno.objects.create(
+            sucursal=otra, cliente=self.cliente, servicio=servicio_ajeno,
+            fecha_hora_inicio=self._hora(15), fecha_hora_fin=self._hora(16),
+            monto_total=self.servicio.precio,
+        )
+
+        resultados = cambiar_estados(
+            self.sucursal, [pendiente.id, confirmado.id, ajeno.id, 999999], Turno.Estado.CONFIRMADO
+        )
+
+        self.assertEqual(resultados, {
+            pendiente.id: services.CAMBIADO,
+            confirmado.id: services.SIN_CAMBIOS,
+            ajeno.id: services.NO_ENCONTRADO,
+            999999: services.NO_ENCONTRADO,
+        })
+        pendiente.refresh_from_db()
+        self.assertEqual(pendiente.estado, Turno.Estado.CONFIRMADO)
+
+    def test_una_reactivacion_solapada_no_frena_al_resto(self):
+        cancelado = self._turno(self._hora(10), estado=Turno.Estado.CANCELADO)
+        self._turno(self._hora(10, 30))
+        libre = self._turno(self._hora(14), estado=Turno.Estado.CANCELADO)
+
+        resultados = cambiar_estados(self.sucursal, [cancelado.id, libre.id], Turno.Estado.PENDIENTE)
+
+        self.assertEqual(resultados, {cancelado.id: services.SOLAPADO, libre.id: services.CAMBIADO})
+        self.assertEqual(
+            dict(Turno.objects.filter(pk__in=[cancelado.id, libre.id]).values_list('id', 'estado')),
+            {cancelado.id: Turno.Estado.CANCELADO, libre.id: Turno.Estado.PENDIENTE},
+        )
+
+    def test_efectos_en_lote(self):
+        turnos = self._pendientes(9, 11)
+        Aviso.objects.all().delete()
+        recordatorio = Aviso.objects.create(
+            evento=eventos.TURNO_RECORDATORIO_24H, categoria='turnos',
+            usuario_cliente=UsuarioCliente.objects.get(), titulo='t', cuerpo='c',
+            clave=f'turno:{turnos[0].id}:{eventos.TURNO_RECORDATORIO_24H}:u1',
+            programado_para=timezone.now(),
+        )
+        ids = [turno.id for turno in turnos]
+
+        cambiar_estados(self.sucursal, ids, Turno.Estado.CONFIRMADO)
+        self.assertEqual(Aviso.objects.filter(evento=eventos.TURNO_CONFIRMADO).count(), 2)
+
+        with mock.patch('apps.notificaciones.tasks.enviar_cancelacion_turno_task.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                cambiar_estados(self.sucursal, ids, Turno.Estado.CANCELADO)
+
+        self.assertEqual(sorted(c.args[0] for c in delay.call_args_list), sorted(ids))
+        self.assertFalse(Aviso.objects.filter(pk=recordatorio.pk).exists())
+        self.assertEqual(Aviso.objects.filter(evento=eventos.TURNO_CANCELADO).count(), 2)
+        # Los avisos de confirmación que ya estaban pendientes se descartan, como en save()
+        self.assertFalse(Aviso.objects.filter(evento=eventos.TURNO_CONFIRMADO).exists())
+
+    def test_completar_actualiza_analytics(self):
+        turnos = self._pendientes(9, 11)
+
+        # Los resúmenes diarios se recalculan después del commit
+        with self.captureOnCommitCallbacks(execute=True):
+            cambiar_estados(self.sucursal, [turno.id for turno in turnos], Turno.Estado.COMPLETADO)
+
+        self.assertEqual(ClienteMetricas.objects.get(cliente=self.cliente).visitas_completadas, 2)
+        self.assertEqual(
+            ResumenDiario.objects.get(sucursal=self.sucursal, fecha=self.fecha).turnos_completados, 2
+        )
+
+    def test_consultas_no_dependen_de_la_cantidad(self):
+        def consultas(horas):
+            turnos = self._pendientes(*horas)
+            with CaptureQueriesContext(connection) as capturadas:
+                cambiar_estados(self.sucursal, [turno.id for turno in turnos], Turno.Estado.CONFIRMADO)
+            return len(capturadas)
+
+        consultas([7])  # la primera carga las plantillas de avisos del centro
+        self.assertEqual(consultas([8, 9]), consultas([12, 13, 14, 15, 16, 17, 18]))
+
+    def test_endpoint(self):
+        admin = Usuario.objects.create_user(
+            username='recepcion', password='x', centro_estetica=self.centro, sucursal=self.sucursal,
+        )
+        api = APIClient()
+        api.force_authenticate(admin)
+        url = reverse('turno-cambiar-estado-masivo')
+        turnos = self._pendientes(9, 11)
+
+        response = api.post(
+            url, {'ids': [turnos[0].id, turnos[1].id, 999999], 'estado': 'COMPLETADO'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cambiados'], 2)
+        self.assertEqual(response.data['resultados'][2], {'id': 999999, 'resultado': 'no_encontrado'})
+        self.assertEqual(api.post(url, {'ids': [1], 'estado': 'OTRO'}, format='json').status_code, 400)
+        self.assertEqual(api.post(url, {'ids': 'x', 'estado': 'COMPLETADO'}, format='json').status_code, 400)
+        self.assertEqual(
+            api.post(url, {'ids': list(range(1, 202)), 'estado': 'COMPLETADO'}, format='json').status_code,
+            400,
+        )
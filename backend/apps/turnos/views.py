@@ -4,9 +4,11 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
+from django.db import IntegrityError
 from django.utils import timezone
 from datetime import timedelta
-from .models import Turno
+from .models import Turno, es_solapamiento
+from . import services
 from .serializers import (
     TurnoListSerializer,
     TurnoDetailSerializer,
@@ -175,7 +177,16 @@ class TurnoViewSet(viewsets.ModelViewSet):
             )
 
         turno.estado = nuevo_estado
-        turno.save()
+        try:
+            turno.save()
+        except IntegrityError as exc:
+            # Reactivar un turno cancelado cuyo horario ya tomó otro
+            if not es_solapamiento(exc):
+                raise
+            return Response(
+                {'error': 'El profesional ya tiene otro turno vigente en ese horario'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         # Si se cancela un turno, enviar notificación
         if nuevo_estado == Turno.Estado.CANCELADO and estado_anterior != Turno.Estado.CANCELADO:
@@ -183,3 +194,47 @@ class TurnoViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(turno)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['post'])
+    def cambiar_estado_masivo(self, request):
+        """
+        Cambiar el estado de varios turnos de una vez (p. ej. completar los del
+        día). Body: {"ids": [1, 2, ...], "estado": "COMPLETADO"}.
+        Devuelve el resultado de cada id: ok, sin_cambios, no_encontrado o
+        solapado (un turno reactivado cuyo horario ya tomó otro).
+        """
+        sucursal = getattr(request.user, 'sucursal', None)
+        ids = request.data.get('ids')
+        nuevo_estado = request.data.get('estado')
+
+        if nuevo_estado not in dict(Turno.Estado.choices):
+            return Response(
+                {'error': 'Estado inválido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (not isinstance(ids, list) or not ids
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+            return Response(
+                {'error': 'ids debe ser una lista de ids de turnos'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ids) > services.MAXIMO_CAMBIO_MASIVO:
+            return Response(
+                {'error': f'Se pueden cambiar hasta {services.MAXIMO_CAMBIO_MASIVO} turnos por vez'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not sucursal:
+            return Response(
+                {'error': 'El usuario no tiene sucursal asignada'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultados = services.cambiar_estados(sucursal, ids, nuevo_estado)
+        return Response({
+            'estado': nuevo_estado,
+            'cambiados': sum(r == services.CAMBIADO for r in resultados.values()),
+            'resultados': [
+                {'id': turno_id, 'resultado': resultado}
+                for turno_id, resultado in resultados.items()
+            ],
+        })
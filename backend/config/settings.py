@@ -234,11 +234,22 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Analytics report exports (Excel/PDF) are enqueued on Celery only when a worker
+# is actually running. The Railway deploy has none, so by default the same
+# runner generates the file inside the request (see apps/analytics/reports.py).
+REPORTES_EN_CELERY = config('REPORTES_EN_CELERY', default=False, cast=bool)
+
 # Push Notifications (Expo)
 # Only needed if the Expo project has push security enabled; the Push API works
 # unauthenticated otherwise.
 EXPO_ACCESS_TOKEN = config('EXPO_ACCESS_TOKEN', default='')
 
+# Batches of 100 messages sent to Expo at the same time, over one pooled
+# keep-alive session per process (apps/notificaciones/canales/expo.py). Expo
+# rate-limits per project: going higher does not speed things up and starts
+# returning MessageRateExceeded.
+EXPO_ENVIOS_EN_PARALELO = config('EXPO_ENVIOS_EN_PARALELO', default=6, cast=int)
+
 # Delivery channel: 'expo' really sends, 'consola' prints instead. The console
 # channel runs the whole pipeline -- triggers, queue, receipts, retries -- with
 # no Expo account, no development build and no phone, which is how the system is